@@ -34,6 +34,36 @@ def create_app(config_name='default'):
     app.config.from_object(config[config_name])
     config[config_name].init_app(app)
 
+    from core import concurrency
+    concurrency.configure(app.config.get('OCR_CONCURRENCY', ''))
+    from core import ratelimit
+    ratelimit.configure(
+        app.config.get('OCR_RATELIMIT_PATH'),
+        app.config.get('OCR_RATE_LIMITS', ''),
+        max_wait=app.config.get('OCR_RATELIMIT_MAX_WAIT', 600),
+    )
+    from core import image_prep
+    image_prep.configure(
+        app.config.get('IMAGE_PREP_PROFILES', ''),
+        enabled=app.config.get('IMAGE_PREP_ENABLED', True),
+    )
+    from core import health
+    health.configure(
+        interval=app.config.get('BACKEND_HEALTH_INTERVAL', 30),
+        ttl=app.config.get('BACKEND_HEALTH_TTL', 90),
+    )
+    from core.extractors.local import postprocess
+    postprocess.configure(app.config.get('POSTPROCESS_BUDGETS', ''))
+    from core import clients
+    clients.configure(app.config.get('CLIENT_STAMP_PATH'))
+    from core import transport
+    transport.configure(
+        connect_timeout=app.config.get('OCR_HTTP_CONNECT_TIMEOUT'),
+        read_timeout=app.config.get('OCR_HTTP_READ_TIMEOUT'),
+        pool_size=app.config.get('OCR_HTTP_POOL_SIZE'),
+        max_retries=app.config.get('OCR_HTTP_MAX_RETRIES'),
+    )
+
     app.config['REMEMBER_COOKIE_DURATION'] = timedelta(days=30)
     app.config['REMEMBER_COOKIE_SECURE'] = os.environ.get('FLASK_ENV') == 'production'
     app.config['REMEMBER_COOKIE_HTTPONLY'] = True
@@ -46,6 +76,19 @@ def create_app(config_name='default'):
     moment.init_app(app)
     db.init_app(app)
     login_manager.init_app(app)
+
+    # 批量上传的请求体远大于单文件上限（MAX_CONTENT_LENGTH）。CSRFProtect
+    # 在 before_request 中就会读取表单，所以放宽限制的钩子必须先于它注册，
+    # 在视图函数里设置已经太晚。
+    @app.before_request
+    def batch_upload_content_length():
+        from flask import request
+        if request.endpoint == 'main.upload_batch':
+            try:
+                request.max_content_length = app.config.get('BATCH_MAX_CONTENT_LENGTH')
+            except AttributeError:  # Flask < 3.1 不支持按请求设置，沿用 MAX_CONTENT_LENGTH
+                pass
+
     csrf.init_app(app)
     limiter.init_app(app)
 
@@ -35,6 +35,68 @@ class Config:
     # 输出目录：默认 BASEDIR/data/output；可被 OUTPUT_DIR 覆盖。
     OUTPUT_DIR = os.environ.get('OUTPUT_DIR') or os.path.join(BASE_DIR, 'data', 'output')
 
+    # OCR 结果缓存（按文件 SHA-256 + doc_type + backend + 解析器版本）。
+    # 重复上传同一文件直接命中缓存，不再消耗 OCR 配额。见 core/ocr_cache.py。
+    OCR_CACHE_ENABLED = os.environ.get('OCR_CACHE_ENABLED', '1') != '0'
+    OCR_CACHE_PATH = os.environ.get('OCR_CACHE_PATH') or os.path.join(BASE_DIR, 'data', 'ocr_cache.db')
+    OCR_CACHE_MAX_ENTRIES = int(os.environ.get('OCR_CACHE_MAX_ENTRIES', 5000))
+    OCR_CACHE_MAX_BYTES = int(os.environ.get('OCR_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    OCR_CACHE_MAX_AGE_DAYS = int(os.environ.get('OCR_CACHE_MAX_AGE_DAYS', 90))
+
+    # 异步识别任务队列（见 app/jobs.py）。INGEST_ASYNC=0 时在请求线程里
+    # 同步执行；INGEST_WORKERS=0 时 Web 进程只入队，由 `flask jobs-worker` 执行。
+    INGEST_ASYNC = os.environ.get('INGEST_ASYNC', '1') != '0'
+    INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', 2))
+    INGEST_POLL_INTERVAL = float(os.environ.get('INGEST_POLL_INTERVAL', 2.0))
+    INGEST_STALE_AFTER = int(os.environ.get('INGEST_STALE_AFTER', 300))
+    INGEST_MAX_ATTEMPTS = int(os.environ.get('INGEST_MAX_ATTEMPTS', 3))
+
+    # 每个 OCR 后端的并发上限（腾讯云 QPS 配额 / 本地 vLLM 槽位 / CPU 核数）。
+    # 批量上传和任务 worker 并行处理时按后端排队，见 core/concurrency.py。
+    # 写成 vllm=auto 或 vllm=auto:16（上限）时按观测到的延迟自动调整并发。
+    # 实际并发不超过 OCR_RATE_LIMITS 的在途上限（默认 vllm 为 2），要让 auto
+    # 自行探测服务端容量，需把该上限设为 0 或服务端真实槽位数。
+    OCR_CONCURRENCY = os.environ.get('OCR_CONCURRENCY', 'tencent=5,vllm=2,local-pdf=4')
+    # 跨进程的 OCR 服务商限流（令牌桶 + 同时在途上限），所有 worker 共享，
+    # 见 core/ratelimit.py。格式: 服务商=每秒请求数:突发量:在途上限（0 表示不限）
+    OCR_RATE_LIMITS = os.environ.get('OCR_RATE_LIMITS', 'tencent=10:10:10,vllm=0:0:2')
+    OCR_RATELIMIT_PATH = os.environ.get('OCR_RATELIMIT_PATH') or os.path.join(BASE_DIR, 'data', 'ratelimit.db')
+    OCR_RATELIMIT_MAX_WAIT = float(os.environ.get('OCR_RATELIMIT_MAX_WAIT', 600))
+    # 发送给云端 / VLM OCR 前的图片预处理（缩小长边、灰度、重新编码、去 EXIF），
+    # 见 core/image_prep.py。格式: 后端=最长边:color|gray:jpeg|webp:质量
+    IMAGE_PREP_ENABLED = os.environ.get('IMAGE_PREP_ENABLED', '1') != '0'
+    IMAGE_PREP_PROFILES = os.environ.get('IMAGE_PREP_PROFILES', 'tencent=2400:color:jpeg:85,vllm=1600:gray:jpeg:80')
+    # 后端健康检查：后台线程定期探测（如 vllm 的 GET /models），
+    # is_available() 和 /health 直接读内存结果，见 core/health.py
+    BACKEND_HEALTH_INTERVAL = float(os.environ.get('BACKEND_HEALTH_INTERVAL', 30))
+    BACKEND_HEALTH_TTL = float(os.environ.get('BACKEND_HEALTH_TTL', 90))
+    # OCR 客户端复用：系统设置保存时更新此文件，通知所有进程重建客户端（core/clients.py）
+    CLIENT_STAMP_PATH = os.environ.get('CLIENT_STAMP_PATH') or os.path.join(BASE_DIR, 'data', 'clients.stamp')
+    # OCR API 的 HTTPS 连接池（keep-alive 复用连接），见 core/transport.py。
+    # 遇到 5xx / RequestLimitExceeded 时按指数退避（带抖动）重试。
+    OCR_HTTP_CONNECT_TIMEOUT = float(os.environ.get('OCR_HTTP_CONNECT_TIMEOUT', 5))
+    OCR_HTTP_READ_TIMEOUT = float(os.environ.get('OCR_HTTP_READ_TIMEOUT', 30))
+    OCR_HTTP_POOL_SIZE = int(os.environ.get('OCR_HTTP_POOL_SIZE', 8))
+    OCR_HTTP_MAX_RETRIES = int(os.environ.get('OCR_HTTP_MAX_RETRIES', 3))
+    # 批量上传（/upload/batch）：单次最多文件数、线程池大小、请求体上限
+    BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', 200))
+    BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', 16))
+    BATCH_MAX_CONTENT_LENGTH = int(os.environ.get('BATCH_MAX_CONTENT_LENGTH', 512 * 1024 * 1024))
+
+    # 多页PDF逐页识别（合并报销PDF / 带销货清单的发票），每页一个识别单元并行处理
+    MULTIPAGE_ENABLED = os.environ.get('MULTIPAGE_ENABLED', '1') != '0'
+    MULTIPAGE_MAX_WORKERS = int(os.environ.get('MULTIPAGE_MAX_WORKERS', 4))
+
+    # 上传时文档类型选"自动识别"：OCR 前按首页文本关键词本地判断类型（见
+    # core/doc_types/classify.py），置信度不足或无文本层（图片/扫描件）时用回退类型
+    DOC_TYPE_AUTO_MIN_CONFIDENCE = float(os.environ.get('DOC_TYPE_AUTO_MIN_CONFIDENCE', 0.5))
+    DOC_TYPE_AUTO_FALLBACK = os.environ.get('DOC_TYPE_AUTO_FALLBACK', 'vat')
+
+    # 本地 OCR 结果后处理（pdfplumber 文本校验等）每步的耗时预算（秒），
+    # 超出后停止该步余下的模糊匹配并记录警告，见 core/extractors/local/postprocess/pipeline.py。
+    # 格式: 步骤名=秒，留空使用各步骤默认值
+    POSTPROCESS_BUDGETS = os.environ.get('POSTPROCESS_BUDGETS', '')
+
     @staticmethod
     def init_app(app):
         """初始化应用"""
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""批量导入已有发票归档（``flask import-dir``）。
+
+遍历目录或 zip 包，把文件分组交给 ``process_invoice_batch``。pdfplumber
+解析是 CPU 密集型、受 GIL 限制，所以用进程池而不是线程池：每个子进程
+在初始化时创建自己的 Flask 应用（独立的数据库连接），主进程只负责
+分发任务和写清单。vllm 后端每组多个文件，组内的 VLM OCR 经
+``Backend.extract_many`` 保持多个请求在途。
+
+清单（manifest）是一个独立的 SQLite 文件，按 ``相对路径 + 大小 + 修改
+时间`` 记录每个文件的处理结果。导入中断后重新运行同一命令，已成功的
+文件会被跳过；文件内容变化（大小或时间变了）则重新导入。默认清单按
+来源的绝对路径区分（``default_manifest_path``），不同位置的同名目录
+互不干扰。
+"""
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+_MANIFEST_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    relpath    TEXT PRIMARY KEY,
+    size       INTEGER NOT NULL,
+    mtime      REAL NOT NULL,
+    status     TEXT NOT NULL,
+    invoice_id INTEGER,
+    source     TEXT,
+    message    TEXT,
+    elapsed    REAL,
+    updated_at REAL NOT NULL
+);
+"""
+
+# vllm 后端每个子进程任务的默认文件数（组内 OCR 并发，见 _import_batch）
+DEFAULT_VLLM_BATCH = 8
+
+# 这些来源说明没有调用付费/慢速 OCR 后端
+_NO_OCR_SOURCES = ('cache', 'local-pdf')
+
+
+def _allowed(name, extensions):
+    return '.' in name and name.rsplit('.', 1)[1].lower() in extensions
+
+
+def iter_sources(path, extensions):
+    """列出待导入文件：(relpath, size, mtime, locator)。
+
+    locator 是子进程读取文件内容所需的信息：目录中的文件为
+    ``('file', 绝对路径)``，zip 成员为 ``('zip', zip路径, 成员名)``。
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not _allowed(info.filename, extensions):
+                    continue
+                mtime = time.mktime(info.date_time + (0, 0, -1))
+                yield info.filename, info.file_size, mtime, ('zip', os.path.abspath(path), info.filename)
+        return
+
+    root = os.path.abspath(path)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.startswith('.') or not _allowed(name, extensions):
+                continue
+            full = os.path.join(dirpath, name)
+            st = os.stat(full)
+            yield os.path.relpath(full, root), st.st_size, st.st_mtime, ('file', full)
+
+
+def default_manifest_path(path, base_dir):
+    """来源的默认清单路径：data/imports/<名称>-<绝对路径哈希>.db
+
+    只用目录名的话，/a/invoices 与 /b/invoices 会共用一个清单，后导入的
+    目录会把前者同相对路径、同大小和时间的文件当作已导入而跳过。
+    """
+    source = os.path.realpath(path)
+    name = os.path.basename(source) or 'import'
+    digest = hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(base_dir, 'data', 'imports', f'{name}-{digest}.db')
+
+
+class Manifest:
+    """导入清单：每个文件一行，记录最后一次处理结果（仅主进程写入）"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(_MANIFEST_SCHEMA)
+
+    def is_done(self, relpath, size, mtime, retry_failed=False):
+        row = self.conn.execute(
+            "SELECT size, mtime, status FROM files WHERE relpath = ?", (relpath,)
+        ).fetchone()
+        if row is None or row[0] != size or abs(row[1] - mtime) > 1e-3:
+            return False
+        return row[2] == 'succeeded' or (row[2] == 'failed' and not retry_failed)
+
+    def record(self, relpath, size, mtime, result):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files "
+                "(relpath, size, mtime, status, invoice_id, source, message, elapsed, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (relpath, size, mtime,
+                 'succeeded' if result.get('success') else 'failed',
+                 result.get('invoice_id'), result.get('source'), result.get('message'),
+                 result.get('elapsed'), time.time()),
+            )
+
+    def counts(self):
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM files GROUP BY status").fetchall())
+
+    def close(self):
+        self.conn.close()
+
+
+# ---------------------------------------------------------------------------
+# 子进程
+# ---------------------------------------------------------------------------
+
+_worker_app = None
+
+
+def _init_worker(config_name):
+    """进程池初始化：每个子进程创建一次自己的应用"""
+    global _worker_app
+    import logging
+    from app import create_app
+
+    _worker_app = create_app(config_name)
+    _worker_app.logger.setLevel(logging.WARNING)
+
+
+def _copy_source(locator, temp_path):
+    if locator[0] == 'zip':
+        with zipfile.ZipFile(locator[1]) as zf, zf.open(locator[2]) as src, \
+                open(temp_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+    else:
+        shutil.copyfile(locator[1], temp_path)
+
+
+def _import_batch(sources, options):
+    """在子进程中导入一组文件 [(locator, relpath)]，按输入顺序返回结果（附耗时）
+
+    整组交给 ``process_invoice_batch``：vllm 后端的 OCR 经
+    ``Backend.extract_many`` 在本进程内保持多个请求在途，缓存与本地
+    解析、保存在其前后完成。耗时从本组开始计到该文件完成。
+    """
+    from app.utils import process_invoice_batch
+
+    started = time.monotonic()
+    results = [None] * len(sources)
+    with _worker_app.app_context():
+        # process_invoice_batch 会删除输入文件，所以先复制一份到上传目录
+        upload_folder = _worker_app.config['UPLOAD_FOLDER']
+        os.makedirs(upload_folder, exist_ok=True)
+        paths, positions = [], []
+        for position, (locator, relpath) in enumerate(sources):
+            name = os.path.basename(relpath)
+            temp_path = os.path.join(upload_folder, f"temp_{uuid.uuid4().hex[:8]}_{name}")
+            try:
+                _copy_source(locator, temp_path)
+            except Exception as e:
+                results[position] = {'success': False, 'message': f'导入失败: {str(e)}',
+                                     'elapsed': round(time.monotonic() - started, 3)}
+                continue
+            paths.append(temp_path)
+            positions.append(position)
+        try:
+            # 进程池本身提供并行，组内的缓存与本地解析逐个进行
+            for index, result in process_invoice_batch(paths, max_workers=1, **options):
+                result['elapsed'] = round(time.monotonic() - started, 3)
+                results[positions[index]] = result
+        except Exception as e:
+            for position in positions:
+                if results[position] is None:
+                    results[position] = {'success': False, 'message': f'导入失败: {str(e)}'}
+        finally:
+            for temp_path in paths:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+    return results
+
+
+# ---------------------------------------------------------------------------
+# 主进程
+# ---------------------------------------------------------------------------
+
+def import_path(path, config_name, manifest_path, extensions, workers=None,
+                project_id=None, doc_type='vat', backend='tencent',
+                retry_failed=False, progress=None, batch_size=None):
+    """导入目录或 zip 中的所有发票文件，返回统计信息字典。
+
+    progress: 可选回调 ``progress(done, total, relpath, result)``。
+    batch_size: 每个子进程任务包含的文件数。默认 vllm 后端为
+        DEFAULT_VLLM_BATCH（组内 OCR 经 extract_many 并发），其他后端为 1。
+    """
+    manifest = Manifest(manifest_path)
+    options = {'project_id': project_id, 'doc_type': doc_type, 'backend': backend}
+
+    pending = []
+    skipped = 0
+    for relpath, size, mtime, locator in iter_sources(path, extensions):
+        if manifest.is_done(relpath, size, mtime, retry_failed=retry_failed):
+            skipped += 1
+        else:
+            pending.append((relpath, size, mtime, locator))
+
+    stats = {
+        'total': len(pending) + skipped,
+        'skipped': skipped,
+        'processed': 0,
+        'succeeded': 0,
+        'failed': 0,
+        'duplicates': 0,
+        'ocr_saved': 0,
+        'elapsed': 0.0,
+        'files_per_s': 0.0,
+    }
+    started = time.monotonic()
+    workers = max(1, workers or os.cpu_count() or 1)
+    batch_size = max(1, batch_size or (DEFAULT_VLLM_BATCH if backend == 'vllm' else 1))
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+
+    # spawn：子进程不继承主进程的数据库连接和调度线程
+    pool = ProcessPoolExecutor(
+        max_workers=min(workers, len(batches)) or 1,
+        mp_context=get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(config_name,),
+    )
+    try:
+        futures = {
+            pool.submit(_import_batch, [(locator, relpath) for relpath, _, _, locator in batch],
+                        options): batch
+            for batch in batches
+        }
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                results = future.result()
+            except Exception as e:  # 子进程崩溃等
+                results = [{'success': False, 'message': f'导入失败: {str(e)}'}] * len(batch)
+            for (relpath, size, mtime, _), result in zip(batch, results):
+                manifest.record(relpath, size, mtime, result)
+
+                stats['processed'] += 1
+                if result.get('success'):
+                    stats['succeeded'] += 1
+                    if str(result.get('message', '')).startswith('发票已存在'):
+                        stats['duplicates'] += 1
+                else:
+                    stats['failed'] += 1
+                if result.get('source') in _NO_OCR_SOURCES:
+                    stats['ocr_saved'] += 1
+                if progress is not None:
+                    progress(stats['processed'], len(pending), relpath, result)
+    finally:
+        # Ctrl+C 时取消未开始的任务；已完成的已写入清单，下次从这里继续
+        pool.shutdown(wait=True, cancel_futures=True)
+        manifest.close()
+        stats['elapsed'] = round(time.monotonic() - started, 2)
+        if stats['elapsed'] > 0:
+            stats['files_per_s'] = round(stats['processed'] / stats['elapsed'], 2)
+    return stats
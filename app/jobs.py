@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""异步识别任务队列。
+
+上传请求只负责落盘 + 入队（``enqueue``），立即返回 job id；真正的
+``process_invoice_image``（可能阻塞 180 秒的 OCR 调用）由有界的后台
+worker 执行，不再占用 gunicorn 的请求线程。
+
+队列就是 ``ingest_jobs`` 表本身（见 models.IngestJob），因此：
+
+- 进程内：``JobRunner`` 在应用进程里起 N 个守护线程，入队时唤醒；
+- 跨进程：``flask jobs-worker`` 可单独运行，和 Web 进程共享同一张表；
+- 领取任务用条件 UPDATE（``WHERE status='queued'``），多个 worker
+  同时抢也只有一个成功；
+- worker 崩溃后，心跳超时（``INGEST_STALE_AFTER``）的 running 任务会被
+  重新放回队列，超过 ``INGEST_MAX_ATTEMPTS`` 次则标记失败；
+- 领取时写入的 worker 名与 attempts 就是这次执行的凭据：阶段、心跳和
+  最终状态的 UPDATE 都带上它，任务一旦被回收、重新领取，原 worker
+  迟到的写入匹配不到行，不会覆盖新一次执行的状态。
+"""
+
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, or_, update
+
+from .models import db, IngestJob
+
+
+def _worker_name(suffix=''):
+    return f"{socket.gethostname()}:{os.getpid()}{suffix}"
+
+
+def enqueue(file_path, original_name=None, project_id=None, doc_type='vat', backend='tencent'):
+    """新建一个排队中的识别任务并唤醒进程内 worker，返回 IngestJob"""
+    if project_id in ('', None):
+        project_id = None
+    else:
+        try:
+            project_id = int(project_id)
+        except (ValueError, TypeError):
+            project_id = None
+
+    job = IngestJob(
+        id=uuid.uuid4().hex,
+        status=IngestJob.STATUS_QUEUED,
+        stage='queued',
+        file_path=file_path,
+        original_name=original_name,
+        project_id=project_id,
+        doc_type=doc_type,
+        backend=backend,
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    runner = get_job_runner(current_app._get_current_object())
+    if runner is not None:
+        runner.wake()
+    return job
+
+
+def requeue_stale(stale_after=None, max_attempts=None):
+    """把心跳超时的 running 任务放回队列（或在超过重试次数后标记失败）"""
+    cfg = current_app.config
+    stale_after = stale_after if stale_after is not None else cfg.get('INGEST_STALE_AFTER', 300)
+    max_attempts = max_attempts if max_attempts is not None else cfg.get('INGEST_MAX_ATTEMPTS', 3)
+    cutoff = datetime.now() - timedelta(seconds=stale_after)
+
+    stale = (IngestJob.status == IngestJob.STATUS_RUNNING) & (IngestJob.heartbeat_at < cutoff)
+    failed = db.session.execute(
+        update(IngestJob)
+        .where(stale & (IngestJob.attempts >= max_attempts))
+        .values(status=IngestJob.STATUS_FAILED, stage='failed',
+                message='任务多次中断，已放弃', finished_at=datetime.now())
+    ).rowcount
+    requeued = db.session.execute(
+        update(IngestJob)
+        .where(stale & (IngestJob.attempts < max_attempts))
+        .values(status=IngestJob.STATUS_QUEUED, stage='queued', worker=None)
+    ).rowcount
+    db.session.commit()
+    if failed or requeued:
+        current_app.logger.warning(f"回收超时任务: 重新排队 {requeued} 个, 放弃 {failed} 个")
+    return requeued
+
+
+def claim_next(worker):
+    """原子地领取最早的一个排队任务；没有可领取的任务时返回 None"""
+    while True:
+        candidate = db.session.query(IngestJob.id) \
+            .filter(IngestJob.status == IngestJob.STATUS_QUEUED) \
+            .order_by(IngestJob.created_at) \
+            .first()
+        if candidate is None:
+            db.session.rollback()
+            return None
+
+        now = datetime.now()
+        claimed = db.session.execute(
+            update(IngestJob)
+            .where(IngestJob.id == candidate.id,
+                   IngestJob.status == IngestJob.STATUS_QUEUED)
+            .values(status=IngestJob.STATUS_RUNNING, stage='starting', worker=worker,
+                    attempts=IngestJob.attempts + 1,
+                    started_at=now, heartbeat_at=now)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(IngestJob, candidate.id)
+        # 被其他 worker 抢先了，换下一个
+
+
+def _claimed_by(job_id, worker, attempts):
+    """条件：任务仍在运行且由这次领取（worker + attempts）持有"""
+    return and_(IngestJob.id == job_id,
+                IngestJob.status == IngestJob.STATUS_RUNNING,
+                IngestJob.worker == worker,
+                IngestJob.attempts == attempts)
+
+
+def _update_claimed(job_id, worker, attempts, **values):
+    """仅当任务仍由这次领取（worker + attempts）持有时更新，返回是否更新成功"""
+    updated = db.session.execute(
+        update(IngestJob).where(_claimed_by(job_id, worker, attempts)).values(**values)
+    ).rowcount
+    db.session.commit()
+    return bool(updated)
+
+
+def touch_claims(claims):
+    """刷新一组领取 [(job id, worker, attempts)] 的心跳，返回更新的行数
+
+    与 _update_claimed 使用同一凭据：已结束、或被回收后重新领取的任务
+    （即使是同一个 worker）不会被旧的领取续上心跳。
+    """
+    if not claims:
+        return 0
+    touched = db.session.execute(
+        update(IngestJob)
+        .where(or_(*(_claimed_by(*claim) for claim in claims)))
+        .values(heartbeat_at=datetime.now())
+    ).rowcount
+    db.session.commit()
+    return touched
+
+
+def run_job(job):
+    """在当前应用上下文中执行一个已领取的任务，返回 process_invoice_image 的结果"""
+    from .utils import process_invoice_image
+
+    job_id, worker, attempts = job.id, job.worker, job.attempts
+
+    def on_stage(stage):
+        _update_claimed(job_id, worker, attempts, stage=stage, heartbeat_at=datetime.now())
+
+    try:
+        result = process_invoice_image(
+            job.file_path, project_id=job.project_id,
+            doc_type=job.doc_type or 'vat', backend=job.backend or 'tencent',
+            on_stage=on_stage,
+        )
+    except Exception as e:  # process_invoice_image 自己会兜底，这里只防意外
+        db.session.rollback()
+        current_app.logger.exception(f"任务 {job_id} 执行异常")
+        result = {'success': False, 'message': f'处理发票文件时出错: {str(e)}'}
+
+    success = bool(result.get('success'))
+    finished = _update_claimed(
+        job_id, worker, attempts,
+        status=IngestJob.STATUS_SUCCEEDED if success else IngestJob.STATUS_FAILED,
+        stage='done' if success else 'failed',
+        invoice_id=result.get('invoice_id'),
+        message=result.get('message'),
+        source=result.get('source'),
+        finished_at=datetime.now(),
+        heartbeat_at=datetime.now(),
+    )
+    if not finished:
+        current_app.logger.warning(f"任务 {job_id} 已被回收或重新领取，丢弃 {worker} 的执行结果")
+    return result
+
+
+def run_now(job):
+    """同步执行刚入队的任务（INGEST_ASYNC=0 时在请求线程里使用）"""
+    now = datetime.now()
+    claimed = db.session.execute(
+        update(IngestJob)
+        .where(IngestJob.id == job.id, IngestJob.status == IngestJob.STATUS_QUEUED)
+        .values(status=IngestJob.STATUS_RUNNING, stage='starting', worker=_worker_name(':inline'),
+                attempts=IngestJob.attempts + 1, started_at=now, heartbeat_at=now)
+    ).rowcount
+    db.session.commit()
+    db.session.refresh(job)
+    if claimed:
+        run_job(job)
+        db.session.refresh(job)
+    return job
+
+
+def work_once(worker):
+    """领取并执行一个任务；队列为空时返回 False"""
+    job = claim_next(worker)
+    if job is None:
+        return False
+    current_app.logger.info(f"[{worker}] 开始执行任务 {job.id} ({job.original_name})")
+    run_job(job)
+    return True
+
+
+class JobRunner:
+    """进程内的有界 worker 池（守护线程 + 数据库队列）。
+
+    线程数即同时进行的 OCR 调用上限。每个线程在自己的应用上下文中
+    循环领取任务；队列为空时等待 ``wake()`` 或轮询间隔到期（以便
+    拾取其他进程入队的任务）。另有一个心跳线程定期刷新执行中任务的
+    ``heartbeat_at``，防止慢 OCR 调用被误判为超时。
+    """
+
+    def __init__(self, app, workers=2, poll_interval=2.0, heartbeat_interval=30.0):
+        self.app = app
+        self.workers = max(1, int(workers))
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._active = {}  # 线程名 -> 正在执行的 (job id, worker, attempts)
+        self._lock = threading.Lock()
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._loop, name=f"ingest-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=self._heartbeat_loop, name="ingest-heartbeat", daemon=True)
+        t.start()
+        self._threads.append(t)
+        return self
+
+    def wake(self):
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wakeup.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    def _loop(self):
+        name = threading.current_thread().name
+        worker = _worker_name(f":{name}")
+        while not self._stop.is_set():
+            did_work = False
+            try:
+                with self.app.app_context():
+                    requeue_stale()
+                    job = claim_next(worker)
+                    if job is not None:
+                        with self._lock:
+                            self._active[name] = (job.id, worker, job.attempts)
+                        try:
+                            run_job(job)
+                        finally:
+                            with self._lock:
+                                self._active.pop(name, None)
+                        did_work = True
+            except Exception:
+                self.app.logger.exception(f"[{worker}] 任务循环出错")
+            if not did_work:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            with self._lock:
+                claims = list(self._active.values())
+            if not claims:
+                continue
+            try:
+                with self.app.app_context():
+                    touch_claims(claims)
+            except Exception:
+                self.app.logger.exception("刷新任务心跳失败")
+
+
+_RUNNER_LOCK = threading.Lock()
+
+
+def get_job_runner(app):
+    """返回应用的进程内 JobRunner（首次调用时启动）；未启用异步时返回 None"""
+    if not app.config.get('INGEST_ASYNC', True) or app.config.get('INGEST_WORKERS', 2) <= 0:
+        return None
+    with _RUNNER_LOCK:
+        runner = app.extensions.get('ingest_runner')
+        if runner is None:
+            runner = JobRunner(
+                app,
+                workers=app.config.get('INGEST_WORKERS', 2),
+                poll_interval=app.config.get('INGEST_POLL_INTERVAL', 2.0),
+            ).start()
+            app.extensions['ingest_runner'] = runner
+        return runner
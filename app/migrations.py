@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""数据库结构升级（``db.create_all()`` 只建新表，不会给已有的表加列）。
+
+目前只有一项：金额的整数分列（``*_cents``，见 core/money.py）。
+``upgrade()`` 补上旧库缺少的列与索引，再把金额字符串已有、分列仍为
+NULL 的行回填。可以重复执行：列与索引已存在时跳过，回填按 id 分批、
+每批提交一次，中断后再次运行从头扫描剩下的 NULL 行。
+
+启动时 ``run.py`` 的 check_and_init_db 会调用；也可手动执行
+``flask upgrade-db``。
+"""
+
+from sqlalchemy import and_, inspect, or_, select, text, update
+
+from core.money import to_cents
+from .models import db, Invoice, InvoiceItem
+
+# 模型 → 有整数分列的金额字符串列（分列名为 <列名>_cents）
+CENTS_COLUMNS = {
+    Invoice: ('total_amount', 'total_tax', 'amount_in_figures'),
+    InvoiceItem: ('amount', 'tax'),
+}
+
+
+def add_cents_columns():
+    """给旧表补上 *_cents 列与索引，返回新增的列名列表"""
+    inspector = inspect(db.engine)
+    added = []
+    for model, sources in CENTS_COLUMNS.items():
+        table = model.__tablename__
+        existing = {column['name'] for column in inspector.get_columns(table)}
+        for source in sources:
+            column = f'{source}_cents'
+            if column not in existing:
+                db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} INTEGER'))
+                added.append(f'{table}.{column}')
+    db.session.commit()
+
+    for model in CENTS_COLUMNS:
+        for index in model.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+    return added
+
+
+def backfill_cents(batch_size=500):
+    """回填金额字符串非空、分列为 NULL 的行，返回得到金额的行数
+
+    无法解析的金额保持 NULL（不计入返回值）；按 id 递增分批，同一次
+    运行中不会反复扫描同一批。
+    """
+    filled = 0
+    for model, sources in CENTS_COLUMNS.items():
+        pending = or_(*(
+            and_(getattr(model, f'{source}_cents').is_(None),
+                 getattr(model, source).isnot(None),
+                 getattr(model, source) != '')
+            for source in sources
+        ))
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                select(model.id, *(getattr(model, source) for source in sources))
+                .where(pending, model.id > last_id)
+                .order_by(model.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            values = [
+                {'id': row.id, **{f'{source}_cents': to_cents(getattr(row, source))
+                                  for source in sources}}
+                for row in rows
+            ]
+            db.session.execute(update(model), values)
+            db.session.commit()
+            filled += sum(1 for value in values
+                          if any(value[f'{source}_cents'] is not None for source in sources))
+            last_id = rows[-1].id
+    return filled
+
+
+def upgrade():
+    """补列、建索引并回填，返回 {'added': [...], 'backfilled': N}"""
+    return {'added': add_cents_columns(), 'backfilled': backfill_cents()}
@@ -9,10 +9,14 @@ import bcrypt
 import secrets
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import validates
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from decimal import Decimal
 
+from core.jsoncodec import dumps
+from core.money import to_cents
+
 db = SQLAlchemy()
 
 
@@ -160,6 +164,13 @@ class Invoice(db.Model):
     amount_in_words = db.Column(db.String(100), nullable=True)
     amount_in_figures = db.Column(db.String(50), nullable=True)
 
+    # 金额的整数分（core/money.py），写入金额字符串时自动同步；
+    # 排序、区间筛选与汇总都在 SQL 中使用这些列。旧库由
+    # app/migrations.py 补列并回填。
+    total_amount_cents = db.Column(db.Integer, nullable=True)
+    total_tax_cents = db.Column(db.Integer, nullable=True)
+    amount_in_figures_cents = db.Column(db.Integer, nullable=True, index=True)
+
     remarks = db.Column(db.String(200), nullable=True)
     payee = db.Column(db.String(50), nullable=True)
     reviewer = db.Column(db.String(50), nullable=True)
@@ -184,6 +195,11 @@ class Invoice(db.Model):
         db.UniqueConstraint('invoice_code', 'invoice_number', name='uix_invoice_code_number'),
     )
 
+    @validates('total_amount', 'total_tax', 'amount_in_figures')
+    def _sync_cents(self, key, value):
+        setattr(self, f'{key}_cents', to_cents(value))
+        return value
+
     @property
     def combined_id(self):
         if self.invoice_number:
@@ -202,7 +218,12 @@ class Invoice(db.Model):
             return Decimal('0')
 
     @classmethod
-    def from_formatted_data(cls, formatted_data, image_path=None):
+    def from_formatted_data(cls, formatted_data, image_path=None, json_data=None, **columns):
+        """由格式化数据构建发票记录
+
+        json_data 为 formatted_data 已编码好的 JSON 文本（如 OCR 缓存中的
+        同一份），给出时不再重复编码；columns 为其余列（project_id 等）。
+        """
         basic_info = formatted_data.get('基本信息', {})
         seller_info = formatted_data.get('销售方信息', {})
         buyer_info = formatted_data.get('购买方信息', {})
@@ -242,7 +263,8 @@ class Invoice(db.Model):
             reviewer=other_info.get('复核', ''),
             issuer=other_info.get('开票人', ''),
             image_path=image_path,
-            json_data=json.dumps(formatted_data, ensure_ascii=False)
+            json_data=json_data if json_data is not None else dumps(formatted_data),
+            **columns,
         )
 
         return invoice
@@ -272,12 +294,36 @@ class InvoiceItem(db.Model):
     tax_rate = db.Column(db.String(20), nullable=True)
     tax = db.Column(db.String(50), nullable=True)
 
+    # amount / tax 的整数分，与 Invoice 的 *_cents 列相同
+    amount_cents = db.Column(db.Integer, nullable=True)
+    tax_cents = db.Column(db.Integer, nullable=True)
+
     created_at = db.Column(db.DateTime, default=datetime.now)
 
     invoice = db.relationship('Invoice', backref=db.backref('items', lazy=True))
 
+    # 明细内容列（不含 id / invoice_id / created_at / *_cents）
+    CONTENT_COLUMNS = ('name', 'specification', 'unit', 'quantity',
+                       'price', 'amount', 'tax_rate', 'tax')
+
+    @validates('amount', 'tax')
+    def _sync_cents(self, key, value):
+        setattr(self, f'{key}_cents', to_cents(value))
+        return value
+
+    @staticmethod
+    def with_cents(row):
+        """明细列 dict 补上 amount_cents / tax_cents（批量写入绕过 validates）"""
+        return dict(row, amount_cents=to_cents(row.get('amount')),
+                    tax_cents=to_cents(row.get('tax')))
+
     @classmethod
     def from_item_data(cls, invoice_id, item_data):
+        return cls(invoice_id=invoice_id, **cls.row_from_item_data(item_data))
+
+    @staticmethod
+    def row_from_item_data(item_data):
+        """格式化数据中的一条商品信息 → 明细列的 dict（批量写入用）"""
         # Strip a leading ¥/￥ from amount/price if present (parsers may
         # already format them as ¥X.XX; the template re-adds the symbol).
         def _strip_currency(v):
@@ -285,8 +331,7 @@ class InvoiceItem(db.Model):
                 return v.replace("¥", "").replace("￥", "").strip()
             return v
 
-        return cls(
-            invoice_id=invoice_id,
+        return dict(
             name=item_data.get('Name', item_data.get('项目名称',
                  item_data.get('LineNo', item_data.get('name', '')))),
             specification=item_data.get('Specification', item_data.get('规格型号',
@@ -303,6 +348,68 @@ class InvoiceItem(db.Model):
         )
 
 
+class IngestJob(db.Model):
+    """异步识别任务（上传 → 队列 → 后台 worker 执行 process_invoice_image）。
+
+    表本身就是队列：任何进程（gunicorn worker 内的线程池、独立的
+    ``flask jobs-worker`` 进程）都通过条件 UPDATE 原子地领取任务，
+    所以重启或多进程部署时任务不会丢失也不会被执行两次。
+    """
+    __tablename__ = 'ingest_jobs'
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(20), default=STATUS_QUEUED, nullable=False, index=True)
+    stage = db.Column(db.String(20), nullable=True)
+
+    file_path = db.Column(db.String(500), nullable=False)
+    original_name = db.Column(db.String(200), nullable=True)
+    project_id = db.Column(db.Integer, nullable=True)
+    doc_type = db.Column(db.String(50), nullable=True)
+    backend = db.Column(db.String(50), nullable=True)
+
+    invoice_id = db.Column(db.Integer, nullable=True)
+    message = db.Column(db.Text, nullable=True)
+    source = db.Column(db.String(50), nullable=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    worker = db.Column(db.String(100), nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False, index=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_SUCCEEDED, self.STATUS_FAILED)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'finished': self.is_finished,
+            'success': self.status == self.STATUS_SUCCEEDED,
+            'original_name': self.original_name,
+            'doc_type': self.doc_type,
+            'backend': self.backend,
+            'invoice_id': self.invoice_id,
+            'message': self.message,
+            'source': self.source,
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self):
+        return f'<IngestJob {self.id} {self.status}>'
+
+
 class Settings(db.Model):
     __tablename__ = 'settings'
 
@@ -325,4 +432,7 @@ class Settings(db.Model):
             setting = cls(key=key, value=value)
             db.session.add(setting)
         db.session.commit()
+        # 设置（API 密钥 / 端点）变了：让所有进程重建 OCR 客户端
+        from core import clients
+        clients.invalidate()
         return setting
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""发票与明细的持久化（一个事务、批量写入）。
+
+上传原先先提交 ``Invoice``、再逐条 ``add`` 明细并第二次提交：SQLite 上
+每张发票两次 fsync，且两次提交之间其他请求能看到一张没有明细的"半张"
+发票。编辑时则删除全部明细再逐条插回。
+
+- ``save_invoice``：发票、明细与 json_data 在同一个事务内写入，明细用
+  一条 executemany 批量 INSERT（批量写入不经过 validates，金额分列在
+  这里补上），只提交一次；出错整体回滚。
+- ``sync_items``：按内容比对已有明细，未变的行不动，变了的原地 UPDATE，
+  多出的批量 INSERT，少了的 DELETE。不提交，由调用方与发票本身的修改
+  一起提交。
+"""
+
+from sqlalchemy import insert
+
+from .models import db, InvoiceItem
+
+
+def item_rows(items_data):
+    """格式化数据中的商品信息列表 → 明细列 dict 列表"""
+    return [InvoiceItem.row_from_item_data(item_data) for item_data in items_data or []]
+
+
+def _row_key(row):
+    return tuple(row.get(column) for column in InvoiceItem.CONTENT_COLUMNS)
+
+
+def _item_key(item):
+    return tuple(getattr(item, column) for column in InvoiceItem.CONTENT_COLUMNS)
+
+
+def save_invoice(invoice, rows):
+    """在一个事务内写入新发票及其明细（rows 为明细列 dict），提交一次"""
+    try:
+        db.session.add(invoice)
+        db.session.flush()  # 取得 invoice.id，尚未提交
+        if rows:
+            db.session.execute(
+                insert(InvoiceItem),
+                [InvoiceItem.with_cents(dict(row, invoice_id=invoice.id)) for row in rows],
+            )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return invoice
+
+
+def sync_items(invoice_id, rows):
+    """把发票的明细同步为 rows，返回 (新增, 修改, 删除) 行数
+
+    先按内容配对：与 rows 中某行完全相同的已有明细保持不动（删除中间
+    一行不会牵动后面的行）；剩下的已有明细按 id 顺序依次改写为剩下的
+    rows，仍多出的删除，不够的批量插入。
+    """
+    existing = InvoiceItem.query.filter_by(invoice_id=invoice_id) \
+        .order_by(InvoiceItem.id).all()
+
+    pool = {}
+    for item in existing:
+        pool.setdefault(_item_key(item), []).append(item)
+    changed = []
+    for row in rows:
+        same = pool.get(_row_key(row))
+        if same:
+            same.pop(0)
+        else:
+            changed.append(row)
+    stale = sorted((item for items in pool.values() for item in items),
+                   key=lambda item: item.id)
+
+    for item, row in zip(stale, changed):
+        for column in InvoiceItem.CONTENT_COLUMNS:
+            setattr(item, column, row.get(column))
+    for item in stale[len(changed):]:
+        db.session.delete(item)
+    added = changed[len(stale):]
+    if added:
+        db.session.execute(
+            insert(InvoiceItem),
+            [InvoiceItem.with_cents(dict(row, invoice_id=invoice_id)) for row in added],
+        )
+    updated = min(len(stale), len(changed))
+    return len(added), updated, len(stale) - updated
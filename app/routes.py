@@ -4,15 +4,19 @@
 import os
 import json
 from datetime import datetime, timedelta
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, send_file, session, abort
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, send_file, session, abort, Response, stream_with_context
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from sqlalchemy import desc, func
 from decimal import Decimal
 import re
+import time
+import uuid
 
-from .models import db, Invoice, InvoiceItem, Project, Settings
-from .utils import save_uploaded_file, process_invoice_image, get_invoice_statistics, export_invoice, delete_invoice, export_project
+from .models import db, Invoice, InvoiceItem, Project, Settings, IngestJob
+from .utils import save_uploaded_file, process_invoice_batch, get_invoice_statistics, export_invoice, delete_invoice, export_project
+from .jobs import enqueue as _enqueue_job, run_now as _run_job_now
+from .persistence import save_invoice as _save_invoice, sync_items as _sync_items
 from core.doc_types import get as _get_doc_type, all_types as _all_doc_types
 from core.extractors import all_backends as _all_backends
 
@@ -60,9 +64,12 @@ def health():
     liveness probe to fail with 429 — restarting the pod in a loop.
 
     Returns ``{"status": "ok"}`` 200 once the Flask process is serving
-    requests.
+    requests. ``backends`` carries the cached OCR backend health (last
+    probe result, age, recent latency) for readiness dashboards; it is
+    read from memory and never triggers a probe.
     """
-    return {'status': 'ok'}
+    from core import health
+    return {'status': 'ok', 'backends': health.snapshot()}
 
 @main.route('/')
 @main.route('/index')
@@ -119,6 +126,11 @@ def index():
     # 应用文档类型过滤
     if doc_type_filter:
         query = query.filter(Invoice.doc_type == doc_type_filter)
+
+    # 应用价税合计区间过滤（元，任一端可省略）
+    min_amount = request.args.get('min_amount', '').strip()
+    max_amount = request.args.get('max_amount', '').strip()
+    query = _filter_amount_range(query, min_amount, max_amount)
     
     # 应用排序
     if sort_by == 'invoice_date':
@@ -127,51 +139,11 @@ def index():
         else:
             query = query.order_by(Invoice.invoice_date.desc())
     elif sort_by == 'amount':
-        # 查询所有发票，再根据金额进行排序
-        all_invoices = query.all()
-        # 将金额从字符串转换为Decimal以用于排序
-        all_invoices.sort(
-            key=lambda inv: Decimal(re.sub(r'[^\d.]', '', inv.amount_in_figures)) if inv.amount_in_figures and re.sub(r'[^\d.]', '', inv.amount_in_figures) else Decimal('0'), 
-            reverse=(order == 'desc')
-        )
-        
-        # 应用分页 - 手动分页
-        total = len(all_invoices)
-        start = (page - 1) * per_page
-        end = min(start + per_page, total)
-        pagination_items = all_invoices[start:end]
-        
-        # 自定义分页对象
-        class PaginationObj:
-            def __init__(self, items, page, per_page, total):
-                self.items = items
-                self.page = page
-                self.per_page = per_page
-                self.total = total
-                self.pages = (total + per_page - 1) // per_page  # 总页数
-                self.prev_num = page - 1 if page > 1 else None
-                self.next_num = page + 1 if page < self.pages else None
-            
-            def iter_pages(self, left_edge=2, left_current=2, right_current=3, right_edge=2):
-                last = 0
-                for num in range(1, self.pages + 1):
-                    if num <= left_edge or \
-                       (num > self.page - left_current - 1 and \
-                        num < self.page + right_current) or \
-                       num > self.pages - right_edge:
-                        if last + 1 != num:
-                            yield None
-                        yield num
-                        last = num
-        
-        # 创建分页对象
-        pagination = PaginationObj(items=pagination_items, page=page, per_page=per_page, total=total)
-        
-        # 更新发票列表为分页后的结果
-        invoices = pagination_items
-        
-        # 设置已排序标志，防止执行后面的查询
-        already_sorted = True
+        # 按价税合计的整数分在 SQL 中排序（无法解析的金额为 NULL，视为最小）
+        if order == 'asc':
+            query = query.order_by(Invoice.amount_in_figures_cents.asc(), Invoice.id.asc())
+        else:
+            query = query.order_by(Invoice.amount_in_figures_cents.desc(), Invoice.id.desc())
     elif sort_by == 'items_count':
         # 查询所有发票，加载关联的项目数据
         all_invoices = query.all()
@@ -240,19 +212,19 @@ def index():
     projects = Project.query.order_by(Project.name).all()
     
     # 获取统计数据
-    # 根据当前过滤条件获取统计
+    # 根据当前过滤条件获取统计（在 SQL 中汇总）
     if project_id is not None:
         if project_id == 0:
             # 特殊情况：只统计未分类发票
-            filtered_invoices = Invoice.query.filter(Invoice.project_id == None).all()
+            stats_query = Invoice.query.filter(Invoice.project_id == None)
         else:
             # 查询特定项目ID的发票
-            filtered_invoices = Invoice.query.filter_by(project_id=project_id).all()
+            stats_query = Invoice.query.filter_by(project_id=project_id)
     else:
         # 不筛选项目，统计所有发票
-        filtered_invoices = Invoice.query.all()
+        stats_query = Invoice.query
         
-    stats = get_invoice_statistics(filtered_invoices)
+    stats = get_invoice_statistics(stats_query)
     
     return render_template('index.html', 
                           invoices=invoices,
@@ -265,9 +237,46 @@ def index():
                           order=order,
                           search_query=search_query,
                           doc_type_filter=doc_type_filter,
+                          min_amount=min_amount,
+                          max_amount=max_amount,
                           doc_types=_all_doc_types())
 
 
+def _filter_amount_range(query, min_amount='', max_amount=''):
+    """按价税合计（元）区间过滤，无法解析的边界忽略"""
+    from core.money import to_cents
+    low, high = to_cents(min_amount), to_cents(max_amount)
+    if low is not None:
+        query = query.filter(Invoice.amount_in_figures_cents >= low)
+    if high is not None:
+        query = query.filter(Invoice.amount_in_figures_cents <= high)
+    return query
+
+
+def _upload_options():
+    """从上传表单读取 (project_id, doc_type, backend)，未知值回退到默认"""
+    # 获取项目ID
+    project_id = request.form.get('project_id', None)
+    if project_id == '':
+        project_id = None
+
+    # 获取文档类型（决定调用哪个 OCR 端点）。默认为 'vat' 保持
+    # 向后兼容。空字符串 / 未知值都视为 'vat'；'auto' 在识别前本地判断。
+    doc_type = (request.form.get('doc_type', '') or 'vat').strip().lower()
+    if doc_type != 'auto' and _get_doc_type(doc_type) is None:
+        current_app.logger.warning(f"未知的 doc_type={doc_type!r}, 回退到 'vat'")
+        doc_type = 'vat'
+
+    # 获取 OCR 后端（'tencent' / 'vllm' / 'local'）。
+    # 默认为 'tencent' 保持向后兼容。
+    backend = (request.form.get('backend', '') or 'tencent').strip().lower()
+    from core.extractors import get_backend as _get_backend
+    if backend != 'tencent' and _get_backend(backend) is None:
+        current_app.logger.warning(f"未知的 backend={backend!r}, 回退到 'tencent'")
+        backend = 'tencent'
+    return project_id, doc_type, backend
+
+
 @main.route('/upload', methods=['GET', 'POST'])
 @login_required
 def upload():
@@ -323,68 +332,33 @@ def upload():
             if not os.path.exists(upload_folder):
                 os.makedirs(upload_folder)
             
-            # 先保存临时文件进行识别
-            temp_file_path = os.path.join(upload_folder, "temp_" + filename)
+            # 先保存临时文件进行识别（带随机前缀，避免并发上传同名文件互相覆盖）
+            temp_file_path = os.path.join(upload_folder, f"temp_{uuid.uuid4().hex[:8]}_{filename}")
             file.save(temp_file_path)
             
-            # 获取项目ID
-            project_id = request.form.get('project_id', None)
-            if project_id == '':
-                project_id = None
-
-            # 获取文档类型（决定调用哪个 OCR 端点）。默认为 'vat' 保持
-            # 向后兼容。空字符串 / 未知值都视为 'vat'。
-            doc_type = (request.form.get('doc_type', '') or 'vat').strip().lower()
-            if _get_doc_type(doc_type) is None:
-                current_app.logger.warning(f"未知的 doc_type={doc_type!r}, 回退到 'vat'")
-                doc_type = 'vat'
-
-            # 获取 OCR 后端（'tencent' / 'vllm' / 'local'）。
-            # 默认为 'tencent' 保持向后兼容。
-            backend = (request.form.get('backend', '') or 'tencent').strip().lower()
-            from core.extractors import get_backend as _get_backend
-            if _get_backend(backend) is None:
-                current_app.logger.warning(f"未知的 backend={backend!r}, 回退到 'tencent'")
-                backend = 'tencent'
-
-            # 处理发票文件
-            result = process_invoice_image(
-                temp_file_path, project_id=project_id, doc_type=doc_type,
-                backend=backend,
+            project_id, doc_type, backend = _upload_options()
+
+            # 入队，由后台 worker 执行识别（见 app/jobs.py）；
+            # INGEST_ASYNC=0 时在当前请求里同步执行。
+            job = _enqueue_job(
+                temp_file_path, original_name=file.filename, project_id=project_id,
+                doc_type=doc_type, backend=backend,
             )
-            
-            if not result.get('success'):
-                # 不再删除临时文件，因为process_invoice_image已经处理过或保存为failed_副本
-                
-                # 检查是否为XHR请求（AJAX）
-                if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.accept_mimetypes.best == 'application/json':
-                    return jsonify({
-                        'success': False,
-                        'message': f'发票识别失败: {result.get("message", "未知错误")}'
-                    })
-                
-                flash(f'发票识别失败: {result.get("message", "未知错误")}')
-                return redirect(request.url)
-            
+            if not current_app.config.get('INGEST_ASYNC', True):
+                _run_job_now(job)
+
             # 检查是否为XHR请求（AJAX）
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.accept_mimetypes.best == 'application/json':
-                # 获取发票详细信息，添加发票代码和发票号码到响应中
-                invoice_id = result.get('invoice_id')
-                invoice = Invoice.query.get(invoice_id)
-                
-                response_data = {
-                    'success': True,
-                    'message': '发票上传和识别成功',
-                    'invoice_id': invoice_id,
-                    'invoice_code': invoice.invoice_code,
-                    'invoice_number': invoice.invoice_number
-                }
-                print(f"返回JSON响应: {response_data}")
-                return jsonify(response_data)
-                
+                return jsonify(_job_payload(job)), (200 if job.is_finished else 202)
+
+            if not job.is_finished:
+                return redirect(url_for('main.job_status', job_id=job.id))
+            if job.status != IngestJob.STATUS_SUCCEEDED:
+                flash(f'发票识别失败: {job.message or "未知错误"}')
+                return redirect(request.url)
             # 重定向到发票详情页面
             flash('发票上传和识别成功')
-            return redirect(url_for('main.invoice_detail', invoice_id=result.get('invoice_id')))
+            return redirect(url_for('main.invoice_detail', invoice_id=job.invoice_id))
         else:
             error_message = '不支持的文件类型'
             
@@ -406,6 +380,128 @@ def upload():
                           backends=_all_backends())
 
 
+@main.route('/upload/batch', methods=['POST'])
+@login_required
+def upload_batch():
+    """批量上传：一个请求携带多个文件，服务端并行识别。
+
+    每个文件识别完成后立即以一行 JSON（NDJSON）写回，浏览器边收边更新
+    进度；总耗时约等于最慢的那次 OCR，而不是所有文件之和。识别由
+    process_invoice_batch 完成：缓存与本地解析的并行宽度由
+    BATCH_MAX_WORKERS 决定，vllm 的 OCR 经 Backend.extract_many 按
+    OCR_CONCURRENCY 保持多个请求在途（见 core/concurrency.py）。
+    """
+    # 请求体上限已由 create_app 中的 before_request 钩子放宽到
+    # BATCH_MAX_CONTENT_LENGTH（须在 CSRF 校验读取表单之前）
+    files = [f for f in request.files.getlist('invoice_files') if f and f.filename]
+    if not files:
+        return jsonify({'success': False, 'message': '没有选择文件'}), 400
+    max_files = current_app.config.get('BATCH_MAX_FILES', 200)
+    if len(files) > max_files:
+        return jsonify({'success': False, 'message': f'单次最多上传 {max_files} 个文件'}), 400
+
+    project_id, doc_type, backend = _upload_options()
+
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    os.makedirs(upload_folder, exist_ok=True)
+
+    # 先把所有文件落盘，再并行识别（请求体读完后工作线程不再依赖 request）
+    tasks = []
+    rejected = []
+    for index, file in enumerate(files):
+        if not allowed_file(file.filename):
+            rejected.append({'type': 'result', 'index': index, 'filename': file.filename,
+                             'success': False, 'message': '不支持的文件类型'})
+            continue
+        temp_path = os.path.join(
+            upload_folder, f"temp_{uuid.uuid4().hex[:8]}_{secure_filename(file.filename)}"
+        )
+        file.save(temp_path)
+        tasks.append((index, file.filename, temp_path))
+
+    def generate():
+        started = time.monotonic()
+        counts = {True: 0, False: 0}
+        yield json.dumps({'type': 'accepted', 'total': len(files)}, ensure_ascii=False) + '\n'
+        for line in rejected:
+            counts[False] += 1
+            yield json.dumps(line, ensure_ascii=False) + '\n'
+        if tasks:
+            workers = max(1, min(current_app.config.get('BATCH_MAX_WORKERS', 16), len(tasks)))
+            batch = process_invoice_batch(
+                [path for _, _, path in tasks], project_id=project_id,
+                doc_type=doc_type, backend=backend, max_workers=workers,
+            )
+            for position, result in batch:
+                index, filename, _ = tasks[position]
+                line = {
+                    'type': 'result',
+                    'index': index,
+                    'filename': filename,
+                    'success': bool(result.get('success')),
+                    'invoice_id': result.get('invoice_id'),
+                    'message': result.get('message'),
+                    'source': result.get('source'),
+                    'elapsed': round(time.monotonic() - started, 3),
+                }
+                counts[line['success']] += 1
+                yield json.dumps(line, ensure_ascii=False) + '\n'
+        yield json.dumps({
+            'type': 'done',
+            'succeeded': counts[True],
+            'failed': counts[False],
+            'elapsed': round(time.monotonic() - started, 3),
+        }, ensure_ascii=False) + '\n'
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # 关闭 nginx 缓冲，逐行推送
+    return response
+
+
+def _job_payload(job):
+    """识别任务的 JSON 表示（上传接口和 /api/jobs 共用）"""
+    data = job.to_dict()
+    data['job_id'] = job.id
+    data['status_url'] = url_for('main.api_job_status', job_id=job.id)
+    if not job.is_finished:
+        # 已受理：success 表示入队成功，最终结果看 status
+        data['success'] = True
+        data['message'] = '已加入识别队列' if job.status == IngestJob.STATUS_QUEUED else '正在识别'
+    elif job.status == IngestJob.STATUS_SUCCEEDED and job.invoice_id:
+        invoice = Invoice.query.get(job.invoice_id)
+        if invoice:
+            data['invoice_code'] = invoice.invoice_code
+            data['invoice_number'] = invoice.invoice_number
+    else:
+        data['message'] = f'发票识别失败: {job.message or "未知错误"}'
+    return data
+
+
+@main.route('/api/jobs/<job_id>')
+@limiter.exempt
+@login_required
+def api_job_status(job_id):
+    """识别任务状态（上传页轮询用，不计入全局限流）"""
+    job = db.session.get(IngestJob, job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': '任务不存在'}), 404
+    return jsonify(_job_payload(job))
+
+
+@main.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    """识别任务进度页（非 AJAX 上传 / 快速上传后跳转到这里）"""
+    job = db.session.get(IngestJob, job_id)
+    if job is None:
+        abort(404)
+    if job.status == IngestJob.STATUS_SUCCEEDED and job.invoice_id:
+        flash('发票识别成功', 'success')
+        return redirect(url_for('main.invoice_detail', invoice_id=job.invoice_id))
+    return render_template('job_status.html', job=job)
+
+
 @main.route('/invoice/<int:invoice_id>')
 @login_required
 def invoice_detail(invoice_id):
@@ -450,6 +546,27 @@ def invoice_detail(invoice_id):
                           extra_sections=extra_sections)
 
 
+def _form_item_rows():
+    """从表单的 items[i][...] 字段读取明细行（按 i 排序，名称为空的跳过）"""
+    form_data = request.form.to_dict(flat=False)
+    indexes = set()
+    for key in form_data:
+        if key.startswith('items[') and key.endswith('][name]'):
+            index = key[6:].split(']')[0]
+            if index.isdigit():
+                indexes.add(int(index))
+
+    rows = []
+    for i in sorted(indexes):
+        if not form_data[f'items[{i}][name]'][0].strip():
+            continue
+        rows.append({
+            column: form_data.get(f'items[{i}][{column}]', [''])[0]
+            for column in InvoiceItem.CONTENT_COLUMNS
+        })
+    return rows
+
+
 @main.route('/invoice/<int:invoice_id>/edit', methods=['GET', 'POST'])
 @login_required
 def invoice_edit(invoice_id):
@@ -491,39 +608,11 @@ def invoice_edit(invoice_id):
         project_id = request.form.get('project_id', type=int)
         invoice.project_id = project_id
         
-        # 处理发票明细项
-        # 首先删除现有的明细项
-        InvoiceItem.query.filter_by(invoice_id=invoice_id).delete()
-        
-        # 从表单中获取明细项数据
-        form_data = request.form.to_dict(flat=False)
-        items_count = 0
-        
-        # 计算有多少个明细项
-        for key in form_data:
-            if key.startswith('items[') and key.endswith('][name]'):
-                items_count = max(items_count, int(key.split('[')[1].split(']')[0]) + 1)
-        
-        # 添加新的明细项
-        for i in range(items_count):
-            # 检查该索引的明细是否存在
-            if f'items[{i}][name]' in form_data and form_data[f'items[{i}][name]'][0].strip():
-                item = InvoiceItem(
-                    invoice_id=invoice_id,
-                    name=form_data.get(f'items[{i}][name]', [''])[0],
-                    specification=form_data.get(f'items[{i}][specification]', [''])[0],
-                    unit=form_data.get(f'items[{i}][unit]', [''])[0],
-                    quantity=form_data.get(f'items[{i}][quantity]', [''])[0],
-                    price=form_data.get(f'items[{i}][price]', [''])[0],
-                    amount=form_data.get(f'items[{i}][amount]', [''])[0],
-                    tax_rate=form_data.get(f'items[{i}][tax_rate]', [''])[0],
-                    tax=form_data.get(f'items[{i}][tax]', [''])[0]
-                )
-                db.session.add(item)
-                current_app.logger.info(f"为发票ID={invoice_id}添加了明细项：{item.name}")
-        
-        # 保存到数据库
+        # 处理发票明细项：与现有明细比对，只写入变化的行
         try:
+            added, updated, deleted = _sync_items(invoice_id, _form_item_rows())
+            current_app.logger.info(f"发票ID={invoice_id}明细: 新增{added}, 修改{updated}, 删除{deleted}")
+            # 保存到数据库
             db.session.commit()
             flash('发票信息更新成功')
             return redirect(url_for('main.invoice_detail', invoice_id=invoice.id))
@@ -614,65 +703,31 @@ def invoice_export(invoice_id, format):
 @login_required
 def api_statistics():
     """获取发票统计数据（JSON格式）"""
-    # 获取所有发票
-    invoices = Invoice.query.all()
-    
-    # 总发票数
-    invoice_count = len(invoices)
-    
-    # 总金额 - 使用价税合计(小写)
-    total_amount = sum(float(invoice.amount_in_figures.replace('¥', '').replace('￥', '').replace(' ', '').replace('元', '').strip()) 
-                       if invoice.amount_in_figures else 0 
-                       for invoice in invoices)
-    
-    # 月度统计数据
-    monthly_data = {}
-    for invoice in invoices:
-        if invoice.invoice_date:
-            month_key = invoice.invoice_date.strftime('%Y-%m')
-            if month_key not in monthly_data:
-                monthly_data[month_key] = {
-                    'count': 0,
-                    'amount': 0
-                }
-            monthly_data[month_key]['count'] += 1
-            
-            # 累加金额
-            amount = 0
-            if invoice.amount_in_figures:
-                try:
-                    amount = float(invoice.amount_in_figures.replace('¥', '').replace('￥', '').replace(' ', '').replace('元', '').strip())
-                except ValueError:
-                    pass
-            monthly_data[month_key]['amount'] += amount
-    
-    # 按月份排序
-    sorted_months = sorted(monthly_data.keys())
-    
-    # 发票类型分布
-    type_data = {}
-    for invoice in invoices:
-        if invoice.invoice_type:
-            if invoice.invoice_type not in type_data:
-                type_data[invoice.invoice_type] = 0
-            type_data[invoice.invoice_type] += 1
-    
-    # 构建最终数据结构
-    formatted_data = {
-        'invoice_count': invoice_count,
-        'total_amount': "{:,.2f}".format(total_amount),
-        'monthly_data': {
-            'labels': sorted_months,
-            'counts': [monthly_data[month]['count'] for month in sorted_months],
-            'amounts': [monthly_data[month]['amount'] for month in sorted_months]
-        },
-        'type_data': {
-            'labels': list(type_data.keys()),
-            'counts': list(type_data.values())
-        }
-    }
-    
-    return jsonify(formatted_data)
+    stats = get_invoice_statistics()
+    return jsonify({key: stats[key] for key in ('invoice_count', 'total_amount', 'monthly_data', 'type_data')})
+
+
+@main.route('/api/ocr-cache')
+@login_required
+def api_ocr_cache():
+    """OCR 结果缓存的命中/未命中计数与占用（JSON格式）"""
+    from .utils import get_app_ocr_cache
+    cache = get_app_ocr_cache()
+    if cache is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(cache.stats(), enabled=True))
+
+
+@main.route('/api/ocr-limits')
+@login_required
+def api_ocr_limits():
+    """OCR 后端的并发占用、跨进程限流状态、排队等待时间与图片压缩统计（JSON格式）"""
+    from core import concurrency, image_prep, ratelimit
+    return jsonify({
+        'concurrency': concurrency.stats(),
+        'rate_limits': ratelimit.stats(),
+        'image_prep': image_prep.stats(),
+    })
 
 
 # 更新项目列表页面
@@ -959,30 +1014,14 @@ def quick_upload():
         if project_id == '':
             project_id = None
         
-        # 处理发票文件
-        result = process_invoice_image(saved_path, project_id=project_id)
-        
-        if result.get('success'):
-            invoice_id = result.get('invoice_id')
-            
-            # 如果提供了项目ID，则更新发票记录
-            if project_id:
-                try:
-                    project_id = int(project_id)
-                    invoice = Invoice.query.get(invoice_id)
-                    if invoice:
-                        invoice.project_id = project_id
-                        db.session.commit()
-                except (ValueError, TypeError):
-                    pass
-                
-            flash('发票识别成功', 'success')
-            
-            return redirect(url_for('main.invoice_detail', invoice_id=invoice_id))
-        else:
-            # 识别失败，process_invoice_image已经尝试删除临时文件
-            flash(f'发票识别失败: {result["message"]}', 'danger')
-            return redirect(url_for('main.index'))
+        # 入队识别，跳转到任务进度页（完成后自动进入发票详情）
+        job = _enqueue_job(saved_path, original_name=file.filename, project_id=project_id)
+        if not current_app.config.get('INGEST_ASYNC', True):
+            _run_job_now(job)
+            if job.status != IngestJob.STATUS_SUCCEEDED:
+                flash(f'发票识别失败: {job.message or "未知错误"}', 'danger')
+                return redirect(url_for('main.index'))
+        return redirect(url_for('main.job_status', job_id=job.id))
             
     except Exception as e:
         flash(f'处理过程中出错: {str(e)}', 'danger')
@@ -1047,43 +1086,12 @@ def invoice_create():
             # 重要：设置图片路径为None，确保后续不会出错
             invoice.image_path = None
             
-            # 先保存发票以获取ID
-            db.session.add(invoice)
-            db.session.flush()  # 获取ID但不提交事务
-            
-            current_app.logger.info(f"创建新发票: ID={invoice.id}, 类型={invoice.invoice_type}, 号码={invoice.invoice_number}")
-            
-            # 从表单中获取明细项数据
-            form_data = request.form.to_dict(flat=False)
-            items_added = 0
-            
-            # 查找并添加明细项
-            for key in form_data:
-                if key.startswith('items[') and key.endswith('][name]'):
-                    index = key[6:].split(']')[0]
-                    name = form_data.get(f'items[{index}][name]', [''])[0].strip()
-                    
-                    # 如果名称为空，跳过此项
-                    if not name:
-                        continue
-                    
-                    item = InvoiceItem(
-                        invoice_id=invoice.id,
-                        name=name,
-                        specification=form_data.get(f'items[{index}][specification]', [''])[0],
-                        unit=form_data.get(f'items[{index}][unit]', [''])[0],
-                        quantity=form_data.get(f'items[{index}][quantity]', [''])[0],
-                        price=form_data.get(f'items[{index}][price]', [''])[0],
-                        amount=form_data.get(f'items[{index}][amount]', [''])[0],
-                        tax_rate=form_data.get(f'items[{index}][tax_rate]', [''])[0],
-                        tax=form_data.get(f'items[{index}][tax]', [''])[0]
-                    )
-                    db.session.add(item)
-                    items_added += 1
-                    current_app.logger.info(f"为新发票添加了明细项：{item.name}")
-            
-            # 提交事务
-            db.session.commit()
+            # 发票与明细在一个事务内写入
+            rows = _form_item_rows()
+            _save_invoice(invoice, rows)
+            items_added = len(rows)
+            current_app.logger.info(f"创建新发票: ID={invoice.id}, 类型={invoice.invoice_type}, "
+                                    f"号码={invoice.invoice_number}, 明细{items_added}项")
             flash(f'新发票创建成功，添加了{items_added}个明细项')
             return redirect(url_for('main.invoice_detail', invoice_id=invoice.id))
         except Exception as e:
@@ -178,61 +178,229 @@ document.addEventListener('DOMContentLoaded', function() {
         // 获取项目ID
         const projectId = document.getElementById('project_id').value;
         
-        // 批量上传处理
-        uploadFiles(selectedFiles, projectId);
+        // 多个文件走批量接口（服务端并行识别），单个文件走任务队列
+        if (selectedFiles.length > 1) {
+            uploadBatch(selectedFiles, projectId);
+        } else {
+            uploadFiles(selectedFiles, projectId);
+        }
     });
     
-    // 批量上传文件
+    // 附加文档类型 / 后端选择
+    function appendOptions(formData, projectId) {
+        if (projectId) {
+            formData.append('project_id', projectId);
+        }
+        // Include doc_type + backend selections (added in multi-backend PR)
+        const docTypeEl = document.querySelector('#doc_type');
+        if (docTypeEl) {
+            formData.append('doc_type', docTypeEl.value);
+        }
+        const backendEl = document.querySelector('#backend');
+        if (backendEl) {
+            formData.append('backend', backendEl.value);
+        }
+    }
+    
+    function csrfToken() {
+        return document.querySelector('meta[name="csrf-token"]')?.getAttribute('content') || document.querySelector('input[name="csrf_token"]')?.value || '';
+    }
+    
+    // 批量上传：一个请求发送全部文件，服务端并行识别，逐行（NDJSON）返回每个文件的结果
+    function uploadBatch(files, projectId) {
+        const formData = new FormData();
+        files.forEach(file => formData.append('invoice_files', file));
+        appendOptions(formData, projectId);
+        
+        const stageText = document.getElementById('uploadStageText');
+        let done = 0;
+        let lastInvoiceId = null;
+        let buffer = '';
+        
+        if (stageText) {
+            stageText.textContent = '正在上传文件…';
+        }
+        
+        const handleLine = (line) => {
+            if (!line.trim()) {
+                return;
+            }
+            let data;
+            try {
+                data = JSON.parse(line);
+            } catch (error) {
+                console.error('解析结果失败:', line);
+                return;
+            }
+            if (data.type === 'accepted') {
+                if (stageText) {
+                    stageText.textContent = '正在识别…';
+                }
+            } else if (data.type === 'result') {
+                done++;
+                if (data.success) {
+                    lastInvoiceId = data.invoice_id;
+                } else {
+                    console.error('识别失败:', data.filename, data.message);
+                }
+                currentFileNum.textContent = done.toString();
+                uploadProgressBar.style.width = `${(done / files.length) * 100}%`;
+                if (stageText) {
+                    stageText.textContent = `${data.filename || ''} ${data.success ? '完成' : '失败'}`;
+                }
+            } else if (data.type === 'done') {
+                console.log(`批量识别完成: 成功 ${data.succeeded}, 失败 ${data.failed}, 耗时 ${data.elapsed}s`);
+            }
+        };
+        
+        const finish = () => {
+            setTimeout(() => {
+                progressModal.hide();
+                window.location.href = lastInvoiceId ? `/invoice/${lastInvoiceId}` : '/';
+            }, 500);
+        };
+        
+        fetch('/upload/batch', {
+            method: 'POST',
+            headers: {
+                'X-Requested-With': 'XMLHttpRequest',
+                'X-CSRFToken': csrfToken()
+            },
+            body: formData
+        })
+        .then(response => {
+            if (!response.ok || !response.body) {
+                return response.json().catch(() => ({})).then(data => {
+                    throw new Error(data.message || `HTTP ${response.status}`);
+                });
+            }
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            const read = () => reader.read().then(({ done: streamDone, value }) => {
+                if (streamDone) {
+                    handleLine(buffer);
+                    return;
+                }
+                buffer += decoder.decode(value, { stream: true });
+                const lines = buffer.split('\n');
+                buffer = lines.pop();
+                lines.forEach(handleLine);
+                return read();
+            });
+            return read();
+        })
+        .then(finish)
+        .catch(error => {
+            console.error('批量上传错误:', error);
+            if (stageText) {
+                stageText.textContent = `上传失败: ${error.message}`;
+            }
+            setTimeout(finish, 2000);
+        });
+    }
+    
+    // 批量上传文件：逐个上传入队（很快），再轮询各识别任务直到全部完成
     function uploadFiles(files, projectId) {
         let successCount = 0;
         let failCount = 0;
-        let completed = 0;
         let lastInvoiceId = null;
+        const pendingJobs = [];
+        const stageText = document.getElementById('uploadStageText');
+        
+        const stageLabels = {
+            'queued': '排队中',
+            'starting': '准备中',
+            'cache': '查询缓存',
+            'local-pdf': '提取PDF文本',
+            'ocr': 'OCR识别',
+            'saving': '保存结果'
+        };
+        
+        const updateProgress = () => {
+            const done = successCount + failCount;
+            currentFileNum.textContent = Math.min(done + 1, files.length).toString();
+            uploadProgressBar.style.width = `${(done / files.length) * 100}%`;
+        };
+        
+        const recordResult = (data) => {
+            if (data.success) {
+                successCount++;
+                lastInvoiceId = data.invoice_id;
+            } else {
+                failCount++;
+                console.error('识别失败:', data.message);
+            }
+            updateProgress();
+        };
+        
+        const finish = () => {
+            uploadProgressBar.style.width = '100%';
+            setTimeout(() => {
+                progressModal.hide();
+                
+                // 直接重定向，不显示弹窗
+                if (lastInvoiceId) {
+                    window.location.href = `/invoice/${lastInvoiceId}`;
+                } else {
+                    window.location.href = '/';
+                }
+            }, 500);
+        };
+        
+        // 轮询未完成的任务
+        const pollJobs = () => {
+            if (pendingJobs.length === 0) {
+                finish();
+                return;
+            }
+            Promise.all(pendingJobs.map(job =>
+                fetch(job.status_url, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+                    .then(response => response.json())
+                    .catch(() => ({ finished: false, stage: job.stage }))
+            )).then(results => {
+                for (let i = results.length - 1; i >= 0; i--) {
+                    const data = results[i];
+                    if (data.finished) {
+                        pendingJobs.splice(i, 1);
+                        recordResult(data);
+                    } else if (data.stage) {
+                        pendingJobs[i].stage = data.stage;
+                    }
+                }
+                if (stageText && pendingJobs.length > 0) {
+                    stageText.textContent = stageLabels[pendingJobs[0].stage] || pendingJobs[0].stage || '';
+                }
+                if (pendingJobs.length > 0) {
+                    setTimeout(pollJobs, 1000);
+                } else {
+                    finish();
+                }
+            });
+        };
         
-        // 顺序处理每个文件
+        // 顺序上传每个文件
         const processNext = (index) => {
             if (index >= files.length) {
-                // 所有文件处理完成
-                setTimeout(() => {
-                    progressModal.hide();
-                    
-                    // 直接重定向，不显示弹窗
-                    if (lastInvoiceId) {
-                        window.location.href = `/invoice/${lastInvoiceId}`;
-                    } else {
-                        window.location.href = '/';
-                    }
-                }, 500);
+                // 全部入队，开始等待识别结果
+                pollJobs();
                 return;
             }
             
             const file = files[index];
             const formData = new FormData();
             formData.append('invoice_file', file);
-            if (projectId) {
-                formData.append('project_id', projectId);
-            }
-            // Include doc_type + backend selections (added in multi-backend PR)
-            const docTypeEl = document.querySelector('#doc_type');
-            if (docTypeEl) {
-                formData.append('doc_type', docTypeEl.value);
-            }
-            const backendEl = document.querySelector('#backend');
-            if (backendEl) {
-                formData.append('backend', backendEl.value);
-            }
+            appendOptions(formData, projectId);
             
-            // 更新进度显示
-            currentFileNum.textContent = (index + 1).toString();
-            const progress = ((index + 1) / files.length) * 100;
-            uploadProgressBar.style.width = `${progress}%`;
+            if (stageText) {
+                stageText.textContent = `正在上传 ${file.name}`;
+            }
             
             // 发送请求
             fetch('/upload', {
                 method: 'POST',
                 headers: {
                     'X-Requested-With': 'XMLHttpRequest',
-                    'X-CSRFToken': document.querySelector('meta[name="csrf-token"]')?.getAttribute('content') || document.querySelector('input[name="csrf_token"]')?.value || ''
+                    'X-CSRFToken': csrfToken()
                 },
                 body: formData
             })
@@ -240,19 +408,17 @@ document.addEventListener('DOMContentLoaded', function() {
                 console.log('上传返回状态:', response.status);
                 return response.json().catch(error => {
                     console.error('解析JSON失败:', error);
-                    return { success: false, message: '服务器响应格式错误' };
+                    return { success: false, finished: true, message: '服务器响应格式错误' };
                 });
             })
             .then(data => {
                 console.log('收到响应数据:', data);
-                completed++;
                 
-                if (data.success) {
-                    successCount++;
-                    lastInvoiceId = data.invoice_id;
+                if (data.job_id && !data.finished) {
+                    // 已入队，稍后轮询结果
+                    pendingJobs.push({ id: data.job_id, status_url: data.status_url, stage: data.stage });
                 } else {
-                    failCount++;
-                    console.error('上传失败:', data.message);
+                    recordResult(data);
                 }
                 
                 // 处理下一个文件
@@ -260,8 +426,7 @@ document.addEventListener('DOMContentLoaded', function() {
             })
             .catch(error => {
                 console.error('上传错误:', error);
-                completed++;
-                failCount++;
+                recordResult({ success: false, message: String(error) });
                 
                 // 处理下一个文件
                 processNext(index + 1);
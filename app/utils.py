@@ -7,15 +7,20 @@ import json
 from datetime import datetime
 from werkzeug.utils import secure_filename
 from flask import current_app
+from sqlalchemy.orm import selectinload
 
 # 导入核心功能模块
-from core.ocr_api import OCRClient
+from core.ocr_api import get_ocr_client
 from core.invoice_formatter import InvoiceFormatter
 from core.invoice_export import InvoiceExporter
 from core.doc_types import get as _get_doc_type
+from core.ocr_cache import file_digest, get_ocr_cache, make_key
+from core.concurrency import backend_slot
+from core.jsoncodec import dumps, loads
 
 # 导入数据库模型
 from .models import db, Invoice, InvoiceItem, Project
+from .persistence import item_rows, save_invoice, sync_items
 
 
 def allowed_file(filename):
@@ -53,7 +58,403 @@ def save_uploaded_file(file):
     return None
 
 
-def process_invoice_image(image_path, project_id=None, doc_type='vat', backend='tencent'):
+def get_app_ocr_cache():
+    """返回当前应用配置的 OCR 结果缓存；禁用时返回 None"""
+    cfg = current_app.config
+    if not cfg.get('OCR_CACHE_ENABLED', True):
+        return None
+    return get_ocr_cache(
+        cfg['OCR_CACHE_PATH'],
+        max_entries=cfg.get('OCR_CACHE_MAX_ENTRIES', 5000),
+        max_bytes=cfg.get('OCR_CACHE_MAX_BYTES', 256 * 1024 * 1024),
+        max_age=cfg.get('OCR_CACHE_MAX_AGE_DAYS', 90) * 86400,
+    )
+
+
+def _local_pdf_extract(image_path, doc, doc_type):
+    """本地 pdfplumber 解析（不判断完整性），不可用或出错时返回 None"""
+    from core.extractors import get_backend
+    local_pdf = get_backend('local-pdf')
+    if local_pdf is None or not local_pdf.is_available():
+        return None
+    try:
+        with backend_slot('local-pdf'):
+            return local_pdf.extract(image_path, doc_type, doc=doc)
+    except Exception as e:
+        current_app.logger.warning(f"本地 pdfplumber 提取失败, 回退到 OCR: {e}")
+        return None
+
+
+def _local_pages(image_path, doc, doc_type):
+    """多页PDF逐页本地解析，返回按页序的 ParsedInvoice 列表
+
+    没有文本层（扫描件）或本地解析不可用时返回 None —— 只能逐页 OCR。
+    结果既用来数发票号码，也交给 _recognize_pages 作为各页的本地结果，
+    每页只解析一次。
+    """
+    if not doc.has_text_layer:
+        return None
+    candidates = []
+    for index in range(doc.page_count):
+        candidate = _local_pdf_extract(image_path, doc.page_view(index), doc_type)
+        if candidate is None:
+            return None
+        candidates.append(candidate)
+    return candidates
+
+
+def _invoice_numbers(candidates):
+    """本地解析结果中出现的发票号码集合"""
+    return {c.invoice_number.strip() for c in candidates if (c.invoice_number or '').strip()}
+
+
+# _recognize 的 local 参数默认值：在函数内自行做本地解析
+_EXTRACT_LOCAL = object()
+
+
+def _recognize(image_path, doc, doc_type, backend, cache=None, cache_key=None,
+               stage=None, page_number=1, allow_partial=False, defer_ocr=False,
+               local=_EXTRACT_LOCAL):
+    """
+    识别一个单元（整个文件，或多页PDF中的一页），返回 (formatted_data, source, payload)
+
+    doc 为 PdfDocument（整份PDF）或 PdfPage（其中一页），图片为 None。
+    识别不出内容时 formatted_data 为 None。allow_partial 为 True 时（多页
+    PDF 的单页）本地提取到商品明细即返回，供 group_pages 作为续页合并。
+    defer_ocr 为 True 时不调用 vllm 后端，需要 OCR 时返回 (None, None, None)，
+    由 process_invoice_batch 统一交给 extract_many。
+    local 为已做过的本地解析结果（ParsedInvoice，或不可用时的 None），
+    传入时不再重复解析。
+    payload 是 formatted_data
+    已编码的 JSON 文本（缓存命中或写入缓存时才有，否则为 None），
+    保存发票时直接作为 json_data，不再重复编码。
+    """
+    stage = stage or (lambda s: None)
+
+    # --- 第零步: 查 OCR 结果缓存（按文件内容哈希） ---
+    # 同一文件重复上传时直接复用上次的识别结果，不调用任何后端。
+    formatted_data = None
+    source = backend
+    if cache is not None and cache_key:
+        stage('cache')
+        payload = cache.get_payload(cache_key)
+        if payload is not None:
+            try:
+                formatted_data = loads(payload)
+            except ValueError as e:
+                current_app.logger.warning(f"OCR 缓存内容无法解析, 视为未命中: {e}")
+            else:
+                current_app.logger.info(f"OCR 缓存命中: {cache_key}")
+                return formatted_data, 'cache', payload
+
+    # --- 第一步: 自动尝试本地 pdfplumber 文本提取（仅PDF） ---
+    # 机器生成的电子发票是文本型PDF，pdfplumber 可无损提取（免费、ms级）。
+    # 但 pdfplumber 只是"读文本"，不理解版面 —— 某些布局（如京东发票的
+    # 竖排"名 称"）会漏字段。所以只有提取到**完整核心字段**才用本地结果，
+    # 否则回退到 OCR 后端。
+    # 多页PDF的单页（allow_partial）例外：续页（销货清单 / 跨页明细）
+    # 本来就没有金额，有商品明细就交给 group_pages 合并，不调用 OCR。
+    if doc is not None:
+        stage('local-pdf')
+        candidate = (_local_pdf_extract(image_path, doc, doc_type)
+                     if local is _EXTRACT_LOCAL else local)
+        if candidate is not None:
+            # 判断本地提取是否"足够完整"：
+            #  - 必须有发票号码或发票代码（唯一标识）
+            #  - 必须有价税合计（金额是核心字段）
+            #  - 必须有买卖双方名称或至少一个（VAT/医疗都应有）
+            # 不满足任一条件 → 视为提取不完整，回退 OCR。
+            has_content = bool(
+                (candidate.invoice_code or candidate.invoice_number)
+                and candidate.amount_in_figures
+                and (candidate.buyer_name or candidate.seller_name)
+            )
+            if has_content or (allow_partial and candidate.items):
+                from core.extractors.to_formatted import parsed_to_formatted
+                formatted_data = parsed_to_formatted(candidate)
+                source = 'local-pdf'
+                current_app.logger.info(
+                    f"本地 pdfplumber 提取成功 (doc_type={doc_type}, page={page_number}"
+                    f"{'' if has_content else ', 续页'})"
+                )
+            else:
+                current_app.logger.info(
+                    "本地 pdfplumber 提取不完整, 回退到 OCR"
+                )
+
+    # --- 第二步: 回退到所选 OCR 后端（仅当本地提取没成功） ---
+    if formatted_data is None and backend in ('vllm', 'tencent'):
+        if defer_ocr and backend == 'vllm':
+            return None, None, None
+        stage('ocr')
+        if backend == 'vllm':
+            # --- vllm 后端 (VLM OCR) ---
+            from core.extractors.local.vllm import get_vllm_backend
+            extractor = get_vllm_backend()
+            if extractor is None or not extractor.is_available():
+                raise RuntimeError(
+                    f"后端 'vllm' 不可用。请检查 VLLM_OCR_ENDPOINT / VLLM_OCR_API_KEY 配置。"
+                )
+            with backend_slot('vllm'):
+                parsed = extractor.extract(image_path, doc_type, doc=doc)
+            from core.extractors.to_formatted import parsed_to_formatted
+            formatted_data = parsed_to_formatted(parsed)
+        else:
+            # --- 原 Tencent 路径 ---
+            # 获取OCR API客户端（进程内复用，系统设置保存后自动重建）
+            ocr_api = get_ocr_client()
+
+            # 调用OCR API识别发票（按 doc_type 路由到对应端点，按页码识别）
+            # 按后端限流（腾讯云 QPS），批量并行时超出的请求在此排队。
+            # 响应字节直接解码为 dict，交给 DocType 格式化，中间不转字符串。
+            with backend_slot('tencent'):
+                response = ocr_api.recognize_response(
+                    image_path=image_path, doc_type=doc_type,
+                    page_number=page_number,
+                )
+
+            # 格式化发票数据（按 doc_type 路由到对应 DocType）
+            formatted_data = InvoiceFormatter.format_invoice_data(
+                response=response, doc_type=doc_type,
+            )
+
+    return formatted_data, source, _cache_result(formatted_data, cache, cache_key)
+
+
+def _cache_result(formatted_data, cache, cache_key):
+    """写入 OCR 缓存，返回编码后的 JSON 文本（未写入时为 None）
+
+    只缓存识别出发票号码的结果 —— 失败结果不缓存，重试时仍会调用后端。
+    编码一次：同一份 JSON 文本既写入缓存，也作为发票的 json_data。
+    """
+    if (formatted_data is None or cache is None or not cache_key
+            or not formatted_data.get('基本信息', {}).get('发票号码')):
+        return None
+    payload = dumps(formatted_data)
+    cache.put(cache_key, payload)
+    return payload
+
+
+def _recognize_pages(image_path, doc, doc_type, backend, cache=None, digest=None,
+                     local_pages=None):
+    """
+    多页PDF：把每一页作为独立单元并行识别，返回按页序排列的 [(formatted_data, source)]
+
+    并行宽度由 MULTIPAGE_MAX_WORKERS 决定，每个后端的实际并发再受
+    OCR_CONCURRENCY 限制。每页单独缓存（键带页码），重试时已完成的页
+    直接命中缓存。单页失败不影响其他页，记为 (None, backend)。
+    local_pages 为 _local_pages 已得到的各页本地解析结果，各页直接复用。
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    app = current_app._get_current_object()
+    page_count = doc.page_count
+
+    def work(index):
+        with app.app_context():
+            page_number = index + 1
+            cache_key = make_key(digest, doc_type, backend, page=page_number) if digest else None
+            try:
+                data, source, _ = _recognize(
+                    image_path, doc.page_view(index), doc_type, backend,
+                    cache=cache, cache_key=cache_key, page_number=page_number,
+                    allow_partial=True,
+                    local=local_pages[index] if local_pages is not None else _EXTRACT_LOCAL,
+                )
+                # 各页结果还要按发票分组合并，单页的 JSON 文本用不上
+                return data, source
+            except Exception as e:
+                app.logger.warning(f"第 {page_number} 页识别失败: {e}")
+                return None, backend
+
+    workers = max(1, min(app.config.get('MULTIPAGE_MAX_WORKERS', 4), page_count))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pdf-page') as pool:
+        return list(pool.map(work, range(page_count)))
+
+
+def _save_failed_copy(image_path):
+    """保存识别失败文件的副本用于后续分析"""
+    basename = os.path.basename(image_path)
+    if basename.startswith('failed_'):
+        return
+    try:
+        import shutil
+        failed_copy = os.path.join(os.path.dirname(image_path), f"failed_{basename}")
+        shutil.copy2(image_path, failed_copy)
+        current_app.logger.info(f"已保存识别失败文件副本: {failed_copy}")
+    except Exception as e:
+        current_app.logger.error(f"保存识别失败文件副本时出错: {str(e)}")
+
+
+def _write_pdf_pages(src_path, dst_path, pages):
+    """把 PDF 的指定页（从 1 开始）写成一个新文件"""
+    from PyPDF2 import PdfReader, PdfWriter
+
+    reader = PdfReader(src_path)
+    writer = PdfWriter()
+    for page_number in pages:
+        writer.add_page(reader.pages[page_number - 1])
+    with open(dst_path, 'wb') as f:
+        writer.write(f)
+
+
+def _save_invoice(formatted_data, image_path, project_id, doc_type, pages=None, payload=None):
+    """
+    把一张发票的识别结果写入数据库，并以"代码+号码"为名保存文件副本
+
+    pages: 该发票所在的页码（从 1 开始）。给出时只把这些页拆分保存，
+    用于一个PDF包含多张发票的情况。
+    payload: formatted_data 已编码的 JSON 文本（来自 OCR 缓存），
+    给出时直接作为 json_data，不再重复编码。
+
+    返回 {'success', 'message', 'invoice_id'}；发票已存在时返回已有记录。
+    不删除 image_path —— 一个文件可能包含多张发票，由调用方统一清理。
+    """
+    basic_info = formatted_data.get('基本信息', {})
+
+    # 检查是否已存在相同代码和号码的发票
+    invoice_code = basic_info.get('发票代码', '')
+    invoice_number = basic_info.get('发票号码', '')
+    
+    # 查重：优先用 (代码, 号码)；数电发票没有代码时只用号码查重。
+    existing_invoice = None
+    if invoice_code:
+        existing_invoice = Invoice.query.filter_by(
+            invoice_code=invoice_code,
+            invoice_number=invoice_number
+        ).first()
+    else:
+        existing_invoice = Invoice.query.filter_by(
+            invoice_number=invoice_number
+        ).first()
+    
+    if existing_invoice:
+        current_app.logger.info(f"发票已存在: ID={existing_invoice.id}, 号码={invoice_number}")
+        return {
+            'success': True,
+            'message': f'发票已存在 (ID: {existing_invoice.id})',
+            'invoice_id': existing_invoice.id,
+        }
+
+    # 使用发票代码和号码创建新的文件名（数电发票无代码则只用号码）
+    filename = secure_filename(os.path.basename(image_path))
+
+    # 确保文件名不带temp_前缀
+    if filename.startswith('temp_'):
+        filename = filename[5:]  # 移除temp_前缀
+
+    # 获取原始文件的扩展名，确保保留
+    file_ext = os.path.splitext(filename)[1].lower()
+
+    # 如果没有扩展名，根据文件内容推断
+    if not file_ext:
+        # 检查是否是PDF文件
+        try:
+            with open(image_path, 'rb') as f:
+                header = f.read(4)
+                if header == b'%PDF':
+                    file_ext = '.pdf'
+                else:
+                    file_ext = '.jpg'  # 默认为jpg
+        except Exception:
+            file_ext = '.jpg'  # 失败时默认为jpg
+
+    if invoice_code:
+        new_filename = f"{invoice_code}{invoice_number}{file_ext}"
+    else:
+        new_filename = f"{invoice_number}{file_ext}"
+    current_app.logger.info(f"生成新文件名: {new_filename}")
+
+    # 最终文件路径
+    upload_folder = os.path.join(current_app.root_path, 'static', 'uploads')
+    final_file_path = os.path.join(upload_folder, new_filename)
+    
+    import shutil
+    copied = False
+    if pages and file_ext == '.pdf':
+        # 一个PDF包含多张发票：每张发票只保存自己的页
+        try:
+            _write_pdf_pages(image_path, final_file_path, pages)
+            copied = True
+            current_app.logger.info(f"拆分PDF第 {pages} 页: {image_path} -> {final_file_path}")
+        except Exception as e:
+            current_app.logger.warning(f"拆分PDF失败, 保存完整文件: {e}")
+    if not copied:
+        shutil.copy2(image_path, final_file_path)
+        current_app.logger.info(f"复制文件: {image_path} -> {final_file_path}")
+    
+    # 创建新发票记录
+    # 对于非VAT类型，部分字段（如医疗的"收款单位"、火车的"车次"）不
+    # 映射到现有的列。把不属于已知列的 type-specific sections 序列化
+    # 到 extra_data 列，详情页模板可以从那里读取并渲染。
+    # extra_sections() 由 DocType 声明（extra_section_keys），不再硬编码。
+    # 带 schema version 包裹：{"v": N, "sections": {...}}，消费方据此
+    # 判断形状是否变化。medical/train 是新增类型，无历史数据，不
+    # 兼容旧格式（始终写入 {"v": N, "sections": {...}}）。
+    _dt = _get_doc_type(doc_type)
+    extra_sections = _dt.extra_sections(formatted_data) if _dt else {}
+    if extra_sections:
+        extra_sections = {
+            "v": _dt.extra_schema_version,
+            "sections": extra_sections,
+        }
+
+    # 直接由 formatted_data 构建记录；完整 JSON 只编码一次
+    invoice = Invoice.from_formatted_data(
+        formatted_data,
+        image_path=new_filename,  # 直接使用文件名，不要添加uploads/前缀
+        json_data=payload,
+        project_id=project_id,
+        doc_type=doc_type,
+        extra_data=dumps(extra_sections) if extra_sections else None,
+    )
+
+    # 发票与商品明细在同一个事务内写入（明细批量插入），只提交一次
+    rows = item_rows(formatted_data.get('商品信息', []))
+    save_invoice(invoice, rows)
+    current_app.logger.info(f"保存发票记录: ID={invoice.id}, 代码={invoice_code}, 号码={invoice_number}, "
+                            f"商品项目{len(rows)}个")
+
+    return {
+        'success': True,
+        'message': '发票识别并保存成功',
+        'invoice_id': invoice.id,
+    }
+
+
+def _resolve_doc_type(image_path, doc):
+    """doc_type='auto' 时在任何 OCR 调用之前本地判断文档类型
+
+    按首页文本关键词打分（core/doc_types/classify.py）。置信度低于
+    DOC_TYPE_AUTO_MIN_CONFIDENCE、或没有文本层（图片/扫描件）时使用
+    DOC_TYPE_AUTO_FALLBACK。返回 (doc_type, confidence)，未能判断时
+    confidence 为 None。
+    """
+    from core.doc_types.classify import classify_file
+
+    fallback = current_app.config.get('DOC_TYPE_AUTO_FALLBACK', 'vat')
+    if _get_doc_type(fallback) is None:
+        fallback = 'vat'
+    result = classify_file(image_path, doc=doc)
+    if result is None:
+        current_app.logger.info(f"自动识别文档类型: 无可用文本, 使用 {fallback}")
+        return fallback, None
+    threshold = current_app.config.get('DOC_TYPE_AUTO_MIN_CONFIDENCE', 0.5)
+    if result.confidence < threshold:
+        current_app.logger.info(
+            f"自动识别文档类型: {result.doc_type} 置信度 {result.confidence:.2f} "
+            f"低于 {threshold}, 使用 {fallback} (得分 {result.scores})"
+        )
+        return fallback, result.confidence
+    current_app.logger.info(
+        f"自动识别文档类型: {result.doc_type} (置信度 {result.confidence:.2f}, "
+        f"端点 {result.ocr_action})"
+    )
+    return result.doc_type, result.confidence
+
+
+def process_invoice_image(image_path, project_id=None, doc_type='vat', backend='tencent',
+                          on_stage=None):
     """
     处理发票文件，识别并保存发票数据
 
@@ -63,380 +464,394 @@ def process_invoice_image(image_path, project_id=None, doc_type='vat', backend='
         doc_type: 文档类型 id（'vat' / 'medical' / 'train' / …），决定
             调用哪个 OCR 端点以及使用哪个 DocType 格式化。
             默认为 'vat' 保持向后兼容。
+            'auto' 表示在 OCR 之前按首页文本本地判断，见 _resolve_doc_type。
         backend: OCR 后端（'tencent' / 'vllm'）。当上传的是电子PDF
             （可提取文本）时，系统会**自动**先用 pdfplumber 本地提取
             （免费、快、无损），提取失败才回退到所选 OCR 后端。
             - 'tencent': 腾讯云 OCR（默认，向后兼容）
             - 'vllm': 通用 VLM OCR（OpenAI-compatible 接口，默认 SiliconFlow
               DeepSeek-OCR；可用 VLLM_OCR_ENDPOINT 指向 Ollama / 本地 vLLM 等）
+        on_stage: 可选回调 ``on_stage(stage)``，在进入各阶段时调用
+            （'cache' / 'local-pdf' / 'ocr' / 'saving'），供异步任务上报进度。
+
+    多页PDF（MULTIPAGE_ENABLED）逐页识别：每张发票保存为一条记录，
+    续页（销货清单 / 跨页明细）的商品合并到所属发票，见 core/multipage.py。
 
     返回:
-        包含success标志和结果的字典
+        包含success标志和结果的字典。``source`` 标明结果来源：
+        'cache'（命中 OCR 缓存）/ 'local-pdf' / 所选后端名（多页来源不一
+        时为 'mixed'）。``invoice_ids`` 列出本次涉及的所有发票，
+        ``invoice_id`` 为其中第一张。``doc_type`` 为实际使用的类型，
+        自动识别时另有 ``doc_type_confidence``。
     """
+    def _stage(stage):
+        if on_stage is not None:
+            try:
+                on_stage(stage)
+            except Exception as e:
+                current_app.logger.warning(f"上报处理阶段失败: {e}")
+
+    # PDF 只解析一次：本地提取、OCR 渲染、文本校验共用同一个 PdfDocument
+    from core.extractors.local.document import open_document
+    doc = open_document(image_path)
+
     try:
-        # 记录开始处理的文件
-        current_app.logger.info(
-            f"开始处理文件: {image_path} (doc_type={doc_type}, backend={backend})"
-        )
+        state = _begin_ingest(image_path, doc, doc_type, backend, _stage)
+        return _finish_ingest(state, project_id, _stage)
+    except Exception as e:
+        return _ingest_failed(image_path, e)
+    finally:
+        if doc is not None:
+            doc.close()
 
-        # --- 第一步: 自动尝试本地 pdfplumber 文本提取（仅PDF） ---
-        # 机器生成的电子发票是文本型PDF，pdfplumber 可无损提取（免费、ms级）。
-        # 但 pdfplumber 只是"读文本"，不理解版面 —— 某些布局（如京东发票的
-        # 竖排"名 称"）会漏字段。所以只有提取到**完整核心字段**才用本地结果，
-        # 否则回退到 OCR 后端。
-        formatted_data = None
-        if image_path.lower().endswith('.pdf'):
-            from core.extractors import get_backend
-            local_pdf = get_backend('local-pdf')
-            if local_pdf is not None and local_pdf.is_available():
-                try:
-                    candidate = local_pdf.extract(image_path, doc_type)
-                    # 判断本地提取是否"足够完整"：
-                    #  - 必须有发票号码或发票代码（唯一标识）
-                    #  - 必须有价税合计（金额是核心字段）
-                    #  - 必须有买卖双方名称或至少一个（VAT/医疗都应有）
-                    # 不满足任一条件 → 视为提取不完整，回退 OCR。
-                    has_content = bool(
-                        (candidate.invoice_code or candidate.invoice_number)
-                        and candidate.amount_in_figures
-                        and (candidate.buyer_name or candidate.seller_name)
-                    )
-                    if has_content:
-                        from core.extractors.to_formatted import parsed_to_formatted
-                        formatted_data = parsed_to_formatted(candidate)
-                        current_app.logger.info(
-                            f"本地 pdfplumber 提取成功 (doc_type={doc_type})"
-                        )
-                    else:
-                        current_app.logger.info(
-                            "本地 pdfplumber 提取不完整, 回退到 OCR"
-                        )
-                except Exception as e:
-                    current_app.logger.warning(
-                        f"本地 pdfplumber 提取失败, 回退到 OCR: {e}"
-                    )
-
-        # --- 第二步: 回退到所选 OCR 后端（仅当本地提取没成功） ---
-        if formatted_data is None and backend in ('vllm', 'tencent'):
-            if backend == 'vllm':
-                # --- vllm 后端 (VLM OCR) ---
-                from core.extractors import get_backend
-                extractor = get_backend('vllm')
-                if extractor is None or not extractor.is_available():
-                    raise RuntimeError(
-                        f"后端 'vllm' 不可用。请检查 VLLM_OCR_ENDPOINT / VLLM_OCR_API_KEY 配置。"
-                    )
-                parsed = extractor.extract(image_path, doc_type)
-                from core.extractors.to_formatted import parsed_to_formatted
-                formatted_data = parsed_to_formatted(parsed)
-            else:
-                # --- 原 Tencent 路径 ---
-                # 创建OCR API客户端
-                ocr_api = OCRClient()
 
-                # 调用OCR API识别发票（按 doc_type 路由到对应端点）
-                response_json = ocr_api.recognize(
-                    image_path=image_path, doc_type=doc_type,
-                )
+def _ingest_failed(image_path, error):
+    current_app.logger.error(f"处理发票文件时出错: {str(error)}")
+    # 保存失败文件的副本用于后续分析
+    _save_failed_copy(image_path)
+    return {
+        'success': False,
+        'message': f'处理发票文件时出错: {str(error)}'
+    }
 
-                # 格式化发票数据（按 doc_type 路由到对应 DocType）
-                formatted_data = InvoiceFormatter.format_invoice_data(
-                    json_string=response_json, doc_type=doc_type,
-                )
 
-        if formatted_data is None:
+def _begin_ingest(image_path, doc, doc_type, backend, stage, defer_ocr=False):
+    """
+    识别阶段（查缓存 → 本地PDF → OCR），返回交给 _finish_ingest 的状态 dict
+
+    defer_ocr 为 True 时单个识别单元需要 vllm OCR 的文件不在此识别，
+    返回的状态 'pending' 为 True，由 process_invoice_batch 经 extract_many
+    识别后调用 _complete_ocr。
+    """
+    doc_type_confidence = None
+    if doc_type == 'auto':
+        doc_type, doc_type_confidence = _resolve_doc_type(image_path, doc)
+
+    # 记录开始处理的文件
+    current_app.logger.info(
+        f"开始处理文件: {image_path} (doc_type={doc_type}, backend={backend})"
+    )
+
+    cache = get_app_ocr_cache()
+    digest = None
+    if cache is not None:
+        try:
+            digest = file_digest(image_path)
+        except OSError as e:
+            current_app.logger.warning(f"计算文件哈希失败, 跳过缓存: {e}")
+
+    page_count = 1
+    if doc is not None and current_app.config.get('MULTIPAGE_ENABLED', True):
+        try:
+            page_count = doc.page_count
+        except Exception as e:
+            current_app.logger.warning(f"读取PDF页数失败, 按单页处理: {e}")
+
+    state = {
+        'image_path': image_path, 'doc': doc, 'doc_type': doc_type, 'backend': backend,
+        'doc_type_confidence': doc_type_confidence, 'page_count': page_count,
+        'cache': cache, 'cache_key': None, 'source': backend,
+        'groups': [], 'orphans': [], 'pending': False,
+    }
+
+    per_page = page_count > 1
+    local_pages = None
+    if per_page:
+        # 先本地解析：文本型PDF的各页只出现一个发票号码（一张发票带
+        # 续页 / 销货清单）时整份解析，不拆页、不调用 OCR
+        local_pages = _local_pages(image_path, doc, doc_type)
+        if local_pages is not None and len(_invoice_numbers(local_pages)) <= 1:
+            current_app.logger.info(f"多页PDF: 共 {page_count} 页, 只含一张发票, 整份本地解析")
+            per_page = False
+
+    if per_page:
+        # --- 多页PDF: 逐页并行识别，再按发票号码分组 ---
+        current_app.logger.info(f"多页PDF: 共 {page_count} 页, 逐页识别")
+        stage('ocr')
+        page_results = _recognize_pages(
+            image_path, doc, doc_type, backend, cache=cache, digest=digest,
+            local_pages=local_pages,
+        )
+        from core.multipage import group_pages
+        groups, orphans = group_pages([data for data, _ in page_results])
+        sources = {src for data, src in page_results if data is not None}
+        state['source'] = sources.pop() if len(sources) == 1 else ('mixed' if sources else backend)
+        if not any(data is not None for data, _ in page_results):
             raise RuntimeError(
                 "未能提取发票内容。请确认文件是电子PDF（文本型）或选择可用的OCR后端。"
             )
+        if orphans:
+            current_app.logger.warning(f"以下页面未能归属到任何发票: {orphans}")
+        state['groups'], state['orphans'] = groups, orphans
+        return state
 
-        # 提取关键信息用于返回
-        invoice_data = {
-            'invoice_code': formatted_data.get('基本信息', {}).get('发票代码', ''),
-            'invoice_number': formatted_data.get('基本信息', {}).get('发票号码', ''),
-            'invoice_type': formatted_data.get('基本信息', {}).get('发票类型', ''),
-            'seller_name': formatted_data.get('销售方信息', {}).get('名称', ''),
-            'seller_tax_id': formatted_data.get('销售方信息', {}).get('识别号', ''),
-            'seller_address': formatted_data.get('销售方信息', {}).get('地址电话', ''),
-            'seller_bank_info': formatted_data.get('销售方信息', {}).get('开户行及账号', ''),
-            'buyer_name': formatted_data.get('购买方信息', {}).get('名称', ''),
-            'buyer_tax_id': formatted_data.get('购买方信息', {}).get('识别号', ''),
-            'buyer_address': formatted_data.get('购买方信息', {}).get('地址电话', ''),
-            'buyer_bank_info': formatted_data.get('购买方信息', {}).get('开户行及账号', ''),
-            'total_amount': formatted_data.get('金额信息', {}).get('合计金额', ''),
-            'total_tax': formatted_data.get('金额信息', {}).get('合计税额', ''),
-            'amount_in_words': formatted_data.get('金额信息', {}).get('价税合计(大写)', ''),
-            'amount_in_figures': formatted_data.get('金额信息', {}).get('价税合计(小写)', ''),
-            'invoice_date': None,
-            'json_data': formatted_data  # 保存完整的格式化数据
-        }
-        
-        # 处理日期
-        invoice_date_raw = formatted_data.get('基本信息', {}).get('开票日期', '')
-        invoice_date_std = formatted_data.get('基本信息', {}).get('开票日期标准格式', '')
-        if invoice_date_std:
-            try:
-                invoice_data['invoice_date'] = datetime.strptime(invoice_date_std, '%Y-%m-%d').date()
-            except ValueError:
-                pass
-        
-        # 检查是否已存在相同代码和号码的发票
-        invoice_code = invoice_data.get('invoice_code')
-        invoice_number = invoice_data.get('invoice_number')
-        
-        from app.models import Invoice, InvoiceItem, db
-        
-        # 检查是否成功识别出发票号码。
-        # 注意：数电发票（全电发票）和铁路电子客票没有"发票代码"字段，
-        # 只有 20 位发票号码。传统增值税发票才有 代码+号码。所以这里
-        # 只要求发票号码非空即可保存（见 issue #11）。
-        if not invoice_number:
-            current_app.logger.warning(f"识别失败: 文件 {image_path} 未能识别出发票号码")
-            # 保存失败文件的副本用于后续分析
-            basename = os.path.basename(image_path)
-            if not basename.startswith('failed_'):
-                failed_copy = os.path.join(os.path.dirname(image_path), f"failed_{basename}")
-                try:
-                    import shutil
-                    shutil.copy2(image_path, failed_copy)
-                    current_app.logger.info(f"已保存识别失败文件副本: {failed_copy}")
-                except Exception as e:
-                    current_app.logger.error(f"保存识别失败文件副本时出错: {str(e)}")
-            
-            return {
-                'success': False,
-                'message': '未能识别出发票号码，请检查文件清晰度或文件内容是否为有效发票'
-            }
-        
-        # 查重：优先用 (代码, 号码)；数电发票没有代码时只用号码查重。
-        existing_invoice = None
-        if invoice_code:
-            existing_invoice = Invoice.query.filter_by(
-                invoice_code=invoice_code,
-                invoice_number=invoice_number
-            ).first()
-        else:
-            existing_invoice = Invoice.query.filter_by(
-                invoice_number=invoice_number
-            ).first()
-        
-        if existing_invoice:
-            # 如果发票已存在，也应该删除临时文件
-            try:
-                os.remove(image_path)
-                current_app.logger.info(f"发票已存在，删除临时文件: {image_path}")
-            except Exception as e:
-                current_app.logger.warning(f"发票已存在，但无法删除临时文件: {image_path}, 错误: {str(e)}")
+    state['cache_key'] = make_key(digest, doc_type, backend) if digest else None
+    formatted_data, source, payload = _recognize(
+        image_path, doc, doc_type, backend,
+        cache=cache, cache_key=state['cache_key'], stage=stage, defer_ocr=defer_ocr,
+    )
+    if source is None:
+        state['pending'] = True
+        return state
+    state['source'] = source
+    _set_single_result(state, formatted_data, payload)
+    return state
 
-            return {
-                'success': True,
-                'message': f'发票已存在 (ID: {existing_invoice.id})',
-                'invoice_id': existing_invoice.id
-            }
 
-        # 使用发票代码和号码创建新的文件名（数电发票无代码则只用号码）
-        filename = secure_filename(os.path.basename(image_path))
+def _set_single_result(state, formatted_data, payload):
+    if formatted_data is None:
+        raise RuntimeError(
+            "未能提取发票内容。请确认文件是电子PDF（文本型）或选择可用的OCR后端。"
+        )
+    if formatted_data.get('基本信息', {}).get('发票号码'):
+        state['groups'] = [{'formatted_data': formatted_data, 'pages': [1], 'payload': payload}]
 
-        # 确保文件名不带temp_前缀
-        if filename.startswith('temp_'):
-            filename = filename[5:]  # 移除temp_前缀
 
-        # 获取原始文件的扩展名，确保保留
-        file_ext = os.path.splitext(filename)[1].lower()
+def _complete_ocr(state, parsed):
+    """把 extract_many 返回的 VLM 识别结果（或异常）填入延后识别的状态"""
+    if isinstance(parsed, Exception):
+        raise parsed
+    from core.extractors.to_formatted import parsed_to_formatted
+    formatted_data = parsed_to_formatted(parsed)
+    state['pending'] = False
+    _set_single_result(state, formatted_data,
+                       _cache_result(formatted_data, state['cache'], state['cache_key']))
 
-        # 如果没有扩展名，根据文件内容推断
-        if not file_ext:
-            # 检查是否是PDF文件
-            try:
-                with open(image_path, 'rb') as f:
-                    header = f.read(4)
-                    if header == b'%PDF':
-                        file_ext = '.pdf'
-                    else:
-                        file_ext = '.jpg'  # 默认为jpg
-            except Exception:
-                file_ext = '.jpg'  # 失败时默认为jpg
-
-        if invoice_code:
-            new_filename = f"{invoice_code}{invoice_number}{file_ext}"
-        else:
-            new_filename = f"{invoice_number}{file_ext}"
-        current_app.logger.info(f"生成新文件名: {new_filename}")
 
-        # 最终文件路径
-        upload_folder = os.path.join(current_app.root_path, 'static', 'uploads')
-        final_file_path = os.path.join(upload_folder, new_filename)
-        
-        # 移动文件
-        import shutil
-        shutil.copy2(image_path, final_file_path)
-        current_app.logger.info(f"复制文件: {image_path} -> {final_file_path}")
-        
-        # 删除原始临时文件
-        try:
-            os.remove(image_path)
-            current_app.logger.info(f"删除临时文件: {image_path}")
-        except Exception as e:
-            current_app.logger.warning(f"无法删除临时文件: {image_path}, 错误: {str(e)}")
-        
-        # 创建新发票记录
-        # 对于非VAT类型，部分字段（如医疗的"收款单位"、火车的"车次"）不
-        # 映射到现有的列。把不属于已知列的 type-specific sections 序列化
-        # 到 extra_data 列，详情页模板可以从那里读取并渲染。
-        # extra_sections() 由 DocType 声明（extra_section_keys），不再硬编码。
-        # 带 schema version 包裹：{"v": N, "sections": {...}}，消费方据此
-        # 判断形状是否变化。medical/train 是新增类型，无历史数据，不
-        # 兼容旧格式（始终写入 {"v": N, "sections": {...}}）。
-        _dt = _get_doc_type(doc_type)
-        extra_sections = _dt.extra_sections(formatted_data) if _dt else {}
-        if extra_sections:
-            extra_sections = {
-                "v": _dt.extra_schema_version,
-                "sections": extra_sections,
-            }
-
-        invoice = Invoice(
-            invoice_code=invoice_data.get('invoice_code', ''),
-            invoice_number=invoice_data.get('invoice_number', ''),
-            invoice_type=invoice_data.get('invoice_type', ''),
-            invoice_date=invoice_data.get('invoice_date'),
-            seller_name=invoice_data.get('seller_name', ''),
-            seller_tax_id=invoice_data.get('seller_tax_id', ''),
-            seller_address=invoice_data.get('seller_address', ''),
-            seller_bank_info=invoice_data.get('seller_bank_info', ''),
-            buyer_name=invoice_data.get('buyer_name', ''),
-            buyer_tax_id=invoice_data.get('buyer_tax_id', ''),
-            buyer_address=invoice_data.get('buyer_address', ''),
-            buyer_bank_info=invoice_data.get('buyer_bank_info', ''),
-            total_amount=invoice_data.get('total_amount', ''),
-            total_tax=invoice_data.get('total_tax', ''),
-            amount_in_words=invoice_data.get('amount_in_words', ''),
-            amount_in_figures=invoice_data.get('amount_in_figures', ''),
-            image_path=new_filename,  # 直接使用文件名，不要添加uploads/前缀
-            project_id=project_id,
-            doc_type=doc_type,
-            extra_data=json.dumps(extra_sections, ensure_ascii=False) if extra_sections else None,
-        )
-        
-        db.session.add(invoice)
-        db.session.commit()
-        current_app.logger.info(f"保存发票记录: ID={invoice.id}, 代码={invoice_code}, 号码={invoice_number}")
-        
-        # 创建发票项目关联
-        if 'json_data' in invoice_data and invoice_data['json_data']:
-            formatted_data = invoice_data['json_data']
-            # 处理商品项目
-            items_data = formatted_data.get('商品信息', [])
-            for item_data in items_data:
-                item = InvoiceItem.from_item_data(invoice.id, item_data)
-                db.session.add(item)
-            
-            # 保存完整JSON数据
-            invoice.json_data = json.dumps(formatted_data, ensure_ascii=False)
-            db.session.commit()
-            current_app.logger.info(f"为发票ID={invoice.id}保存了{len(items_data)}个商品项目")
-        
+def _finish_ingest(state, project_id, stage):
+    """保存阶段：按识别出的发票分组保存，删除临时文件，返回结果 dict"""
+    image_path = state['image_path']
+    source = state['source']
+    groups, orphans = state['groups'], state['orphans']
+
+    # 后续只需要文件本身（复制/删除），先释放 PDF 句柄
+    if state['doc'] is not None:
+        state['doc'].close()
+
+    stage('saving')
+
+    # 检查是否成功识别出发票号码。
+    # 注意：数电发票（全电发票）和铁路电子客票没有"发票代码"字段，
+    # 只有 20 位发票号码。传统增值税发票才有 代码+号码。所以这里
+    # 只要求发票号码非空即可保存（见 issue #11）。
+    if not groups:
+        current_app.logger.warning(f"识别失败: 文件 {image_path} 未能识别出发票号码")
+        _save_failed_copy(image_path)
         return {
-            'success': True,
-            'message': '发票识别并保存成功',
-            'invoice_id': invoice.id
+            'success': False,
+            'message': '未能识别出发票号码，请检查文件清晰度或文件内容是否为有效发票',
+            'source': source,
         }
-        
+
+    # 多张发票时按页拆分保存；单张发票保留完整文件（含封面等未归属页）
+    doc_type = state['doc_type']
+    split = len(groups) > 1
+    results = [
+        _save_invoice(group['formatted_data'], image_path, project_id, doc_type,
+                      pages=group['pages'] if split else None,
+                      payload=group.get('payload'))
+        for group in groups
+    ]
+
+    # 删除原始临时文件
+    try:
+        os.remove(image_path)
+        current_app.logger.info(f"删除临时文件: {image_path}")
     except Exception as e:
-        current_app.logger.error(f"处理发票文件时出错: {str(e)}")
-        # 保存失败文件的副本用于后续分析
-        try:
-            basename = os.path.basename(image_path)
-            if not basename.startswith('failed_'):
-                failed_copy = os.path.join(os.path.dirname(image_path), f"failed_{basename}")
-                import shutil
-                shutil.copy2(image_path, failed_copy)
-                current_app.logger.info(f"已保存识别失败文件副本: {failed_copy}")
-        except Exception as copy_error:
-            current_app.logger.error(f"保存识别失败文件副本时出错: {str(copy_error)}")
-        
-        return {
-            'success': False,
-            'message': f'处理发票文件时出错: {str(e)}'
+        current_app.logger.warning(f"无法删除临时文件: {image_path}, 错误: {str(e)}")
+
+    invoice_ids = [r['invoice_id'] for r in results]
+    if len(results) == 1:
+        result = dict(results[0])
+    else:
+        created = sum(1 for r in results if not r['message'].startswith('发票已存在'))
+        result = {
+            'success': True,
+            'message': f'识别出 {len(results)} 张发票（新增 {created} 张，共 {state["page_count"]} 页）',
+            'invoice_id': invoice_ids[0],
         }
+    result['invoice_ids'] = invoice_ids
+    result['source'] = source
+    result['doc_type'] = doc_type
+    if state['doc_type_confidence'] is not None:
+        result['doc_type_confidence'] = state['doc_type_confidence']
+    if orphans:
+        result['unassigned_pages'] = orphans
+    return result
 
 
-def get_invoice_statistics(invoices):
-    """获取发票统计数据"""
-    from decimal import Decimal
-    import re
-    from datetime import datetime
-    
-    # 总发票数
-    invoice_count = len(invoices)
-    
-    # 价税总额 - 从价税合计(小写)提取数字部分
-    total_amount = 0
-    for invoice in invoices:
-        if invoice.amount_in_figures:
+def process_invoice_batch(image_paths, project_id=None, doc_type='vat', backend='tencent',
+                          max_workers=4):
+    """
+    批量处理多个文件，按完成先后逐个 yield (序号, 结果)；结果同 process_invoice_image
+
+    - 非 vllm 后端：最多 max_workers 个文件并行调用 process_invoice_image。
+    - vllm 后端分三步：先并行查缓存、本地解析PDF（能出结果的文件直接
+      保存返回，多页PDF的逐页识别也在这一步）；剩下需要 VLM OCR 的文件
+      一起交给 ``Backend.extract_many``，在途请求数由 OCR_CONCURRENCY 的
+      vllm 槽位决定（auto 时随延迟调整）；每个文件识别完成后立即写缓存、
+      保存并 yield，不等整批结束。
+
+    生成器中途被关闭（如客户端断开）时，已开始的处理仍在后台完成，
+    上传的文件不会丢。
+    """
+    import queue
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    app = current_app._get_current_object()
+    paths = list(image_paths)
+    done = queue.Queue()
+    options = {'project_id': project_id, 'doc_type': doc_type, 'backend': backend}
+    workers = max(1, min(max_workers, len(paths) or 1))
+
+    def process(index, path):
+        with app.app_context():
             try:
-                # 清理金额字符串，只保留数字和小数点
-                amount_str = re.sub(r'[^\d.]', '', invoice.amount_in_figures)
-                total_amount += float(amount_str) if amount_str else 0
-            except (ValueError, TypeError):
-                pass
-    
+                done.put((index, process_invoice_image(path, **options)))
+            except Exception as e:  # process_invoice_image 自己会兜底，这里只防意外
+                done.put((index, {'success': False, 'message': str(e)}))
+
+    def prepare(index, path, pending):
+        from core.extractors.local.document import open_document
+        with app.app_context():
+            doc = None
+            try:
+                doc = open_document(path)
+                state = _begin_ingest(path, doc, doc_type, backend,
+                                      stage=lambda s: None, defer_ocr=True)
+                if state['pending']:
+                    # vllm 后端自行打开文件渲染，这里先释放 PDF 句柄
+                    if doc is not None:
+                        doc.close()
+                    pending.append((index, state))
+                    return
+                result = _finish_ingest(state, project_id, lambda s: None)
+            except Exception as e:
+                result = _ingest_failed(path, e)
+            finally:
+                if doc is not None:
+                    doc.close()
+            done.put((index, result))
+
+    def finish(state, parsed):
+        with app.app_context():
+            try:
+                _complete_ocr(state, parsed)
+                return _finish_ingest(state, project_id, lambda s: None)
+            except Exception as e:
+                return _ingest_failed(state['image_path'], e)
+
+    def run():
+        try:
+            dispatch_all()
+        except Exception as e:
+            app.logger.exception(f"批量处理出错: {e}")
+        finally:
+            done.put(None)
+
+    def dispatch_all():
+        if backend != 'vllm':
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch-ocr') as pool:
+                for index, path in enumerate(paths):
+                    pool.submit(process, index, path)
+            return
+
+        pending = []
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch-prepare') as pool:
+            for index, path in enumerate(paths):
+                pool.submit(prepare, index, path, pending)
+        if not pending:
+            return
+        with app.app_context():
+            from core.extractors.local.vllm import get_vllm_backend
+            extractor = get_vllm_backend()
+            if extractor is None or not extractor.is_available():
+                error = RuntimeError(
+                    "后端 'vllm' 不可用。请检查 VLLM_OCR_ENDPOINT / VLLM_OCR_API_KEY 配置。"
+                )
+                for index, state in pending:
+                    done.put((index, finish(state, error)))
+                return
+            # 同一批文件的 doc_type 可能不同（auto），按类型分组识别
+            by_type = {}
+            for index, state in pending:
+                by_type.setdefault(state['doc_type'], []).append((index, state))
+            for unit_type, units in by_type.items():
+                def on_result(position, parsed, units=units):
+                    index, state = units[position]
+                    done.put((index, finish(state, parsed)))
+                extractor.extract_many([state['image_path'] for _, state in units],
+                                       unit_type, on_result=on_result)
+
+    worker = threading.Thread(target=run, name='batch-ingest', daemon=True)
+    worker.start()
+    reported = set()
+    while True:
+        item = done.get()
+        if item is None:
+            break
+        reported.add(item[0])
+        yield item
+    worker.join()
+    for index in range(len(paths)):
+        if index not in reported:
+            yield index, {'success': False, 'message': '处理发票文件时出错: 批量处理中断'}
+
+
+def get_invoice_statistics(query=None):
+    """获取发票统计数据
+
+    query 为已按项目等条件过滤的 Invoice 查询（默认全部发票）。计数与
+    金额汇总都在 SQL 中按 amount_in_figures_cents 完成，不再把每张发票
+    载入内存逐条解析金额字符串。
+    """
+    from sqlalchemy import extract, func
+    from core.money import from_cents, yuan
+
+    query = (Invoice.query if query is None else query).order_by(None)
+
+    # 总发票数与价税总额（价税合计(小写)的整数分）
+    invoice_count, total_cents = query.with_entities(
+        func.count(Invoice.id), func.sum(Invoice.amount_in_figures_cents)
+    ).one()
+
     # 格式化总金额，保留两位小数
-    total_amount_formatted = "{:,.2f}".format(total_amount)
-    
+    total_amount_formatted = "{:,.2f}".format(from_cents(total_cents))
+
     # 按月统计数据
+    year = extract('year', Invoice.invoice_date)
+    month = extract('month', Invoice.invoice_date)
+    monthly_rows = query.with_entities(
+        year, month, func.count(Invoice.id), func.sum(Invoice.amount_in_figures_cents)
+    ).filter(Invoice.invoice_date.isnot(None)).group_by(year, month).order_by(year, month).all()
+
     monthly_data = {'labels': [], 'counts': [], 'amounts': []}
     month_stats = {}
-    
-    # 统计每月的发票数量和金额
-    for invoice in invoices:
-        if invoice.invoice_date:
-            month_str = invoice.invoice_date.strftime('%Y-%m')
-            
-            if month_str not in month_stats:
-                month_stats[month_str] = {'count': 0, 'amount': 0}
-            
-            month_stats[month_str]['count'] += 1
-            
-            # 累加金额
-            if invoice.amount_in_figures:
-                try:
-                    amount_str = re.sub(r'[^\d.]', '', invoice.amount_in_figures)
-                    month_stats[month_str]['amount'] += float(amount_str) if amount_str else 0
-                except (ValueError, TypeError):
-                    pass
-    
-    # 按月份排序
-    sorted_months = sorted(month_stats.keys())
-    
-    # 填充月度数据
-    for month in sorted_months:
-        monthly_data['labels'].append(month)
-        monthly_data['counts'].append(month_stats[month]['count'])
-        monthly_data['amounts'].append(month_stats[month]['amount'])
-    
-    # 发票类型统计
-    type_data = {'labels': [], 'counts': []}
-    type_stats = {}
-    
-    for invoice in invoices:
-        if invoice.invoice_type:
-            if invoice.invoice_type not in type_stats:
-                type_stats[invoice.invoice_type] = 0
-            type_stats[invoice.invoice_type] += 1
-    
-    # 填充类型数据
-    for invoice_type, count in type_stats.items():
-        type_data['labels'].append(invoice_type)
-        type_data['counts'].append(count)
-    
+    for y, m, count, cents in monthly_rows:
+        month_str = f'{int(y):04d}-{int(m):02d}'
+        month_stats[month_str] = {'count': count, 'amount': yuan(cents)}
+        monthly_data['labels'].append(month_str)
+        monthly_data['counts'].append(count)
+        monthly_data['amounts'].append(yuan(cents))
+
+    # 发票类型统计（按首次出现的顺序）
+    type_rows = query.with_entities(Invoice.invoice_type, func.count(Invoice.id)) \
+        .filter(Invoice.invoice_type.isnot(None), Invoice.invoice_type != '') \
+        .group_by(Invoice.invoice_type).order_by(func.min(Invoice.id)).all()
+    type_data = {
+        'labels': [invoice_type for invoice_type, _ in type_rows],
+        'counts': [count for _, count in type_rows],
+    }
+
     # 统计当月数据
     current_month = {'month': '本月', 'count': 0, 'amount': 0}
     current_month_str = datetime.now().strftime('%Y-%m')
-    
+
     if current_month_str in month_stats:
         current_month['count'] = month_stats[current_month_str]['count']
         current_month['amount'] = month_stats[current_month_str]['amount']
-    
+
     # 返回统计结果
     return {
         'invoice_count': invoice_count,
@@ -482,6 +897,49 @@ def export_invoice(invoice_id, format, auto_delete=False):
     return file_path
 
 
+def project_export_stats(project_id):
+    """项目导出用的金额汇总，结构同 InvoiceExporter.project_stats
+
+    全部在 SQL 中按整数分列聚合（core/money.py），金额单位为元。
+    """
+    from sqlalchemy import extract, func
+    from core.money import yuan
+
+    query = Invoice.query.filter_by(project_id=project_id).order_by(None)
+    amount = func.sum(Invoice.amount_in_figures_cents)
+
+    total_amount, total_tax, total = query.with_entities(
+        func.sum(Invoice.total_amount_cents), func.sum(Invoice.total_tax_cents), amount
+    ).one()
+    item_amount, item_tax = db.session.query(
+        func.sum(InvoiceItem.amount_cents), func.sum(InvoiceItem.tax_cents)
+    ).join(Invoice, InvoiceItem.invoice_id == Invoice.id) \
+        .filter(Invoice.project_id == project_id).one()
+
+    def grouped(column):
+        # 按首次出现的顺序，空值不统计
+        rows = query.with_entities(column, func.count(Invoice.id), amount) \
+            .filter(column.isnot(None), column != '') \
+            .group_by(column).order_by(func.min(Invoice.id)).all()
+        return {key: {'count': count, 'amount': yuan(cents)} for key, count, cents in rows}
+
+    year = extract('year', Invoice.invoice_date)
+    month = extract('month', Invoice.invoice_date)
+    monthly_rows = query.with_entities(year, month, func.count(Invoice.id), amount) \
+        .filter(Invoice.invoice_date.isnot(None)).group_by(year, month).all()
+
+    return {
+        'total': yuan(total),
+        'invoice_totals': {'金额': yuan(total_amount), '税额': yuan(total_tax), '价税合计': yuan(total)},
+        'item_totals': {'金额': yuan(item_amount), '税额': yuan(item_tax)},
+        'monthly': {f'{int(y):04d}-{int(m):02d}': {'count': count, 'amount': yuan(cents)}
+                    for y, m, count, cents in monthly_rows},
+        'types': grouped(Invoice.invoice_type),
+        'sellers': grouped(Invoice.seller_name),
+        'buyers': grouped(Invoice.buyer_name),
+    }
+
+
 def export_project(project_id, auto_delete=False):
     """
     导出项目数据为Excel格式
@@ -498,16 +956,11 @@ def export_project(project_id, auto_delete=False):
     # 查询项目对象
     project = Project.query.get_or_404(project_id)
     
-    # 查询项目下的所有发票
-    invoices = Invoice.query.filter_by(project_id=project_id).all()
+    # 查询项目下的所有发票，明细项一次性批量加载
+    invoices = Invoice.query.options(selectinload(Invoice.items)) \
+        .filter_by(project_id=project_id).all()
     
-    # 为每个发票查询其明细项
     for invoice in invoices:
-        # 查询发票明细项
-        items = InvoiceItem.query.filter_by(invoice_id=invoice.id).all()
-        # 将明细项附加到发票对象
-        invoice.items = items
-        
         # 尝试解析JSON数据以获取更多详情
         if invoice.json_data:
             try:
@@ -523,8 +976,9 @@ def export_project(project_id, auto_delete=False):
         'updated_at': project.updated_at
     }
     
-    # 导出为Excel格式
-    file_path = export_project_to_excel(project_data, invoices)
+    # 导出为Excel格式（金额汇总在数据库中完成）
+    file_path = export_project_to_excel(project_data, invoices,
+                                        stats=project_export_stats(project_id))
     
     # 如果开启自动删除，在session中记录该文件路径用于后续删除
     if auto_delete and file_path:
@@ -640,9 +1094,6 @@ def update_invoice_from_json(invoice_id):
         invoice.reviewer = other_info.get('复核', invoice.reviewer)
         invoice.issuer = other_info.get('开票人', invoice.issuer)
         
-        # 提交更新
-        db.session.commit()
-        
         # 更新发票明细项
         items_data = formatted_data.get('商品信息', [])
         
@@ -650,14 +1101,8 @@ def update_invoice_from_json(invoice_id):
         if not items_data and isinstance(formatted_data.get('Response', {}).get('Items', []), list):
             items_data = formatted_data.get('Response', {}).get('Items', [])
         
-        # 先删除原有的明细项
-        InvoiceItem.query.filter_by(invoice_id=invoice_id).delete()
-        
-        # 添加新的明细项
-        for item_data in items_data:
-            item = InvoiceItem.from_item_data(invoice.id, item_data)
-            db.session.add(item)
-            
+        # 按内容比对明细，与发票字段一起提交
+        sync_items(invoice.id, item_rows(items_data))
         db.session.commit()
         
         return True
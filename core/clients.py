@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Process-wide registry of ready-to-use OCR backend clients (客户端复用).
+
+Building a backend client is not free: ``OCRClient()`` reads the API
+keys (two Settings queries), imports the tencentcloud SDK factories and
+builds credential/profile objects; the vLLM backend reads three more
+Settings rows. Doing that per invoice is wasted work, since the
+configuration changes only when someone saves the Settings page.
+
+``get(name, load_config, build)`` returns the cached client for `name`.
+``load_config()`` and ``build(config)`` only run after an invalidation:
+the config is reloaded, and the client is rebuilt only if the config
+actually differs from the one it was built with (entries are keyed by
+configuration). Steady-state calls do no config queries and no
+construction — one ``stat()`` of the stamp file, nothing else.
+
+``invalidate()`` is called by ``Settings.set_value``. It bumps an
+in-process generation and touches a stamp file; other worker processes
+notice the stamp's mtime change on their next ``get()``.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+
+@dataclass
+class _Entry:
+    config: Any
+    client: Any
+    generation: int
+
+
+_lock = threading.Lock()
+_entries: Dict[str, _Entry] = {}
+_generation = 0
+_stamp_path: Optional[str] = None
+_stamp_seen: Optional[int] = None
+_stats = {"hits": 0, "config_loads": 0, "builds": 0}
+
+
+def configure(stamp_path: Optional[str]) -> None:
+    """Set the stamp file shared by all processes (None = in-process only)."""
+    global _stamp_path, _stamp_seen
+    with _lock:
+        _stamp_path = stamp_path
+        _stamp_seen = _read_stamp()
+
+
+def _read_stamp() -> Optional[int]:
+    if not _stamp_path:
+        return None
+    try:
+        return os.stat(_stamp_path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _sync_stamp() -> None:
+    """Treat a stamp change by another process as a local invalidation."""
+    global _generation, _stamp_seen
+    stamp = _read_stamp()
+    if stamp != _stamp_seen:
+        _stamp_seen = stamp
+        _generation += 1
+
+
+def invalidate() -> None:
+    """Mark every cached client stale, in this and every other process."""
+    global _generation, _stamp_seen
+    with _lock:
+        _generation += 1
+        if _stamp_path:
+            os.makedirs(os.path.dirname(os.path.abspath(_stamp_path)), exist_ok=True)
+            with open(_stamp_path, "w") as f:
+                f.write(str(time.time_ns()))
+            _stamp_seen = _read_stamp()
+
+
+def get(name: str, load_config: Callable[[], Any], build: Callable[[Any], Any]) -> Any:
+    """The cached client for `name`, rebuilt when its configuration changed.
+
+    Exceptions from ``load_config`` / ``build`` propagate and nothing is
+    cached, so a missing API key is reported on every call until fixed.
+    """
+    with _lock:
+        _sync_stamp()
+        entry = _entries.get(name)
+        if entry is not None and entry.generation == _generation:
+            _stats["hits"] += 1
+            return entry.client
+        generation = _generation
+        _stats["config_loads"] += 1
+
+    config = load_config()
+    with _lock:
+        entry = _entries.get(name)
+        if entry is not None and entry.config == config:
+            entry.generation = max(entry.generation, generation)
+            return entry.client
+
+    client = build(config)
+    with _lock:
+        _stats["builds"] += 1
+        _entries[name] = _Entry(config, client, generation)
+    return client
+
+
+def clear() -> None:
+    """Drop every cached client (tests, shutdown)."""
+    with _lock:
+        _entries.clear()
+
+
+def stats() -> Dict[str, int]:
+    with _lock:
+        return dict(_stats, clients=len(_entries))
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Per-backend concurrency caps (OCR 并发上限).
+
+Each OCR backend has its own capacity: Tencent enforces a QPS quota per
+account, a local vLLM server has a fixed number of batch slots, and
+pdfplumber is CPU-bound. Anything that fans files out in parallel (the
+batch upload endpoint, the ingest job workers) acquires a slot for the
+backend it is about to call, so the fan-out width never exceeds what
+the backend can serve — excess callers simply wait their turn.
+
+Limits come from a spec string such as ``"tencent=5,vllm=2,local-pdf=4"``
+(``OCR_CONCURRENCY`` in app config). Backends not listed use
+``default``. Slots are per process.
+
+A backend can instead be given ``auto`` (``"vllm=auto"``, or
+``"vllm=auto:16"`` to cap it at 16): its limit then follows observed
+latency (``AdaptiveLimit``). A vLLM / Ollama server batches concurrent
+requests, so more calls in flight means more throughput — until its
+slots are full and extra requests just queue on the server, which shows
+up as rising latency. The limit grows while latency stays near its
+long-run average and shrinks when it climbs.
+
+The latency it learns from is the call's service time only. Time the
+call spends queued in ``core.ratelimit.provider_slot`` (the cross-process
+``max_in_flight`` cap in ``OCR_RATE_LIMITS``) is reported back through
+``exclude_wait()`` and subtracted, so waiting on other processes is not
+mistaken for the server slowing down. Actual concurrency is the smaller
+of the two caps: with the default ``vllm=0:0:2`` an ``auto`` limit can
+rise past 2 but the extra calls only queue for the provider slot — set
+``max_in_flight`` to 0 (or the server's real slot count) to let ``auto``
+find the capacity.
+
+``dispatch()`` fans a list of calls out over a backend's slots and
+returns the results in input order (``Backend.extract_many`` uses it).
+"""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional
+
+DEFAULT_LIMIT = 4
+#: Ceiling for ``auto`` backends without an explicit one.
+DEFAULT_AUTO_MAX = 16
+
+
+@dataclass(frozen=True)
+class AutoLimit:
+    """``name=auto[:max]`` in the spec string."""
+    max_limit: int = DEFAULT_AUTO_MAX
+    initial: int = 2
+
+
+class AdaptiveLimit:
+    """Concurrency limit driven by latency (gradient method).
+
+    Each completed call reports its latency. Its EWMA (`short`) is
+    compared with the lowest EWMA of the last `window` calls (`long`,
+    the unqueued baseline): while ``short <= tolerance * long`` the
+    limit grows by about ``sqrt(limit)`` per sample; beyond that it is
+    scaled down by ``tolerance * long / short`` (at most halved). It
+    only grows while at least half the slots are in use — an idle
+    backend tells us nothing about its capacity. Once per window the
+    limit is halved for a moment, so the baseline is re-measured
+    instead of creeping up with the server's own queue.
+    """
+
+    def __init__(self, max_limit: int = DEFAULT_AUTO_MAX, initial: int = 2,
+                 min_limit: int = 1, tolerance: float = 1.5, smoothing: float = 0.2,
+                 window: int = 100):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self._limit = float(min(self.max_limit, max(self.min_limit, initial)))
+        self.short: Optional[float] = None
+        self.long: Optional[float] = None
+        self.samples = 0
+        self._recent: Deque[float] = deque(maxlen=window)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def observe(self, latency: float, in_flight: int) -> int:
+        """Record one call's latency (`in_flight` counted when it started)."""
+        latency = max(latency, 1e-6)
+        if self.short is None:
+            self.short = latency
+        else:
+            self.short += 0.3 * (latency - self.short)
+        self._recent.append(self.short)
+        self.long = min(self._recent)
+        self.samples += 1
+        if self.samples % self._recent.maxlen == 0:
+            # Probe: halve the limit so the next calls see a less queued
+            # server and refresh the baseline; it regrows within a few calls.
+            self._limit = max(float(self.min_limit), self._limit / 2)
+            return self.limit
+
+        gradient = max(0.5, min(1.0, self.tolerance * self.long / self.short))
+        if gradient >= 1.0 and in_flight * 2 < self._limit:
+            return self.limit
+        target = self._limit * gradient + (math.sqrt(self._limit) if gradient >= 1.0 else 0.0)
+        self._limit += self.smoothing * (target - self._limit)
+        self._limit = min(float(self.max_limit), max(float(self.min_limit), self._limit))
+        return self.limit
+
+
+class _Gate:
+    """Counting semaphore whose limit may change while slots are held."""
+
+    def __init__(self, limit: int | AdaptiveLimit):
+        self.adaptive = limit if isinstance(limit, AdaptiveLimit) else None
+        self.fixed = limit if isinstance(limit, int) else 0
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return self.adaptive.limit if self.adaptive is not None else self.fixed
+
+    @property
+    def max_limit(self) -> int:
+        return self.adaptive.max_limit if self.adaptive is not None else self.fixed
+
+    def acquire(self) -> int:
+        """Take a slot; returns the in-flight count including this call."""
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+            return self.in_flight
+
+    def release(self, latency: float, in_flight: int) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            if self.adaptive is not None:
+                self.adaptive.observe(latency, in_flight)
+            self._cond.notify_all()
+
+
+_lock = threading.Lock()
+_limits: Dict[str, int | AutoLimit] = {}
+_default_limit = DEFAULT_LIMIT
+_gates: Dict[str, _Gate] = {}
+# Per-thread stack of open backend_slot()s: excluded seconds for each.
+_held = threading.local()
+
+
+def parse_limits(spec: str) -> Dict[str, int | AutoLimit]:
+    """Parse ``"tencent=5,vllm=auto:8"`` into ``{"tencent": 5, "vllm": AutoLimit(8)}``."""
+    limits: Dict[str, int | AutoLimit] = {}
+    for part in (spec or "").split(","):
+        name, sep, value = part.partition("=")
+        name = name.strip().lower()
+        if not sep or not name:
+            continue
+        kind, _, ceiling = value.strip().lower().partition(":")
+        try:
+            if kind == "auto":
+                limits[name] = AutoLimit(max(1, int(ceiling)) if ceiling else DEFAULT_AUTO_MAX)
+            else:
+                limits[name] = max(1, int(value))
+        except ValueError:
+            continue
+    return limits
+
+
+def configure(limits: Dict[str, int | AutoLimit] | str, default: Optional[int] = None) -> None:
+    """Set per-backend limits. Gates whose limit changed are rebuilt.
+
+    Callers already holding a slot keep it; the new limit applies to
+    subsequent acquisitions.
+    """
+    global _default_limit
+    if isinstance(limits, str):
+        limits = parse_limits(limits)
+    with _lock:
+        if default is not None:
+            _default_limit = max(1, int(default))
+        for name in list(_gates):
+            if limits.get(name, _default_limit) != _limits.get(name, _default_limit):
+                del _gates[name]
+        _limits.clear()
+        _limits.update(limits)
+
+
+def _gate(backend: str) -> _Gate:
+    with _lock:
+        gate = _gates.get(backend)
+        if gate is None:
+            limit = _limits.get(backend, _default_limit)
+            if isinstance(limit, AutoLimit):
+                limit = AdaptiveLimit(limit.max_limit, limit.initial)
+            gate = _gates[backend] = _Gate(limit)
+        return gate
+
+
+def limit_for(backend: str) -> int:
+    """Current limit (for ``auto`` backends it moves with latency)."""
+    return _gate(backend).limit
+
+
+def max_limit_for(backend: str) -> int:
+    """Largest limit `backend` can reach — size connection pools by this."""
+    return _gate(backend).max_limit
+
+
+@contextmanager
+def backend_slot(backend: str) -> Iterator[float]:
+    """Hold one concurrency slot for `backend`; yields seconds spent waiting."""
+    gate = _gate(backend)
+    start = time.monotonic()
+    in_flight = gate.acquire()
+    acquired = time.monotonic()
+    stack = _held.__dict__.setdefault("stack", [])
+    stack.append(0.0)
+    try:
+        yield acquired - start
+    finally:
+        excluded = stack.pop()
+        gate.release(max(0.0, time.monotonic() - acquired - excluded), in_flight)
+
+
+def exclude_wait(seconds: float) -> None:
+    """Don't count `seconds` of queueing in the innermost open slot's latency.
+
+    Called by ``provider_slot`` so an ``auto`` limit learns from service
+    time, not from time spent waiting for another process's call.
+    """
+    stack: List[float] = getattr(_held, "stack", None) or []
+    if stack and seconds > 0:
+        stack[-1] += seconds
+
+
+def dispatch(backend: str, fn: Callable[[Any], Any], items: Iterable[Any],
+             max_in_flight: Optional[int] = None,
+             on_result: Optional[Callable[[int, Any], None]] = None) -> List[Any]:
+    """``[fn(item) for item in items]`` with up to the backend's limit in flight.
+
+    Every call holds a ``backend_slot``, so other callers (batch upload,
+    job workers) share the same budget. `max_in_flight` can only lower
+    it. Results keep the input order; an item whose call raised gets
+    the exception object in its place instead of failing the batch.
+    `on_result(index, result)`, if given, is called from the worker
+    thread as each call finishes (after its slot is released), so a
+    caller can stream results before the whole batch is done.
+    """
+    items = list(items)
+    if not items:
+        return []
+    workers = min(len(items), max_in_flight or max_limit_for(backend))
+
+    def call(indexed):
+        index, item = indexed
+        with backend_slot(backend):
+            try:
+                result = fn(item)
+            except Exception as e:
+                result = e
+        if on_result is not None:
+            on_result(index, result)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, workers),
+                            thread_name_prefix=f"{backend}-dispatch") as pool:
+        return list(pool.map(call, enumerate(items)))
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    """Current limit and in-flight count for every backend seen so far."""
+    with _lock:
+        names = set(_limits) | set(_gates)
+        gates = dict(_gates)
+    result = {}
+    for name in sorted(names):
+        gate = gates.get(name)
+        if gate is None:
+            limit = _limits.get(name, _default_limit)
+            result[name] = {
+                "limit": limit.initial if isinstance(limit, AutoLimit) else limit,
+                "in_flight": 0,
+            }
+            continue
+        result[name] = {"limit": gate.limit, "in_flight": gate.in_flight}
+        if gate.adaptive is not None:
+            a = gate.adaptive
+            result[name].update(
+                max_limit=a.max_limit,
+                latency_s=round(a.short, 3) if a.short is not None else None,
+                baseline_s=round(a.long, 3) if a.long is not None else None,
+            )
+    return result
@@ -53,6 +53,13 @@ class DocType(ABC):
 
     # --- Detection -----------------------------------------------------------
 
+    #: Words from the printed title, for the local pre-OCR classifier
+    #: (core/doc_types/classify.py). Matched with whitespace removed.
+    title_keywords: tuple[str, ...] = ()
+
+    #: Field labels only this layout prints — weaker classifier evidence.
+    layout_keywords: tuple[str, ...] = ()
+
     @abstractmethod
     def detect_response(self, response_json: dict) -> bool:
         """Return True if `response_json` looks like this doc type.
@@ -124,13 +131,14 @@ class DocType(ABC):
 
     # --- OCR request extras --------------------------------------------------
 
-    def ocr_request_extras(self) -> dict[str, Any]:
+    def ocr_request_extras(self, page_number: int = 1) -> dict[str, Any]:
         """Extra fields merged into the OCR request payload.
 
-        Default: enable PDF page-1 recognition. Override to add e.g.
-        `PdfPageNumber` or type-specific flags.
+        Default: enable PDF recognition of `page_number` (1-based, as
+        Tencent's ``PdfPageNumber``). Multi-page PDFs are recognised one
+        page per request. Override to add type-specific flags.
         """
-        return {"IsPdf": True, "PdfPageNumber": 1}
+        return {"IsPdf": True, "PdfPageNumber": page_number}
 
     # --- Type-specific sections (extra_data contract) -----------------------
 
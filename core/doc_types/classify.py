@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Local doc-type classifier (文档类型自动识别).
+
+``detect()`` in the registry only works *after* an OCR call, and the OCR
+endpoint is chosen by doc_type — so a wrong pick in the upload form costs a
+wasted (billed) call on the wrong endpoint. ``classify_file`` decides the
+type before any remote call, from the first page's pdfplumber text:
+
+  * ``DocType.title_keywords``   words from the printed title (医疗收费票据,
+    电子客票, 普通发票 …), weighted ``TITLE_WEIGHT``; another
+    ``TOP_BONUS`` when they sit in the first ``TOP_LINES`` lines, where
+    the title is printed
+  * ``DocType.layout_keywords``  labels only that layout prints (交款人,
+    二等座, 价税合计 …), weighted 1 each
+
+Each distinct keyword counts once. The confidence is the winner's margin
+over the runner-up scaled by how much evidence there is, in [0, 1]:
+a title plus a couple of labels with no competition gives 1.0, a tie 0.0.
+
+Images and scanned PDFs have no local text, so ``classify_file`` returns
+None for them and the caller keeps its fallback type.
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from typing import Optional
+
+from . import all_types, get
+
+logger = logging.getLogger(__name__)
+
+TITLE_WEIGHT = 3.0
+TOP_BONUS = 2.0
+TOP_LINES = 3
+#: Score at which the evidence counts as complete (title in the top lines
+#: plus one label); less evidence lowers the confidence proportionally.
+FULL_EVIDENCE = TITLE_WEIGHT + TOP_BONUS + 1.0
+
+
+@dataclass
+class Classification:
+    doc_type: str
+    confidence: float
+    scores: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def ocr_action(self) -> str:
+        """The OCR endpoint the classified type routes to."""
+        dt = get(self.doc_type)
+        return dt.ocr_action if dt else ""
+
+
+def _compact(text: str) -> str:
+    # pdfplumber splits wide-spaced titles ("电 子 发 票") into words
+    return "".join(text.split())
+
+
+def score_text(text: str) -> dict[str, float]:
+    """Keyword score of `text` for every registered doc type."""
+    lines = [_compact(line) for line in text.splitlines() if line.strip()]
+    top = "".join(lines[:TOP_LINES])
+    body = "".join(lines)
+    scores = {}
+    for dt in all_types():
+        score = 0.0
+        for keyword in dt.title_keywords:
+            if keyword in body:
+                score += TITLE_WEIGHT + (TOP_BONUS if keyword in top else 0.0)
+        score += sum(1.0 for keyword in dt.layout_keywords if keyword in body)
+        scores[dt.type_id] = score
+    return scores
+
+
+def classify_text(text: str) -> Optional[Classification]:
+    """Best doc type for `text`; None when no keyword matches at all."""
+    scores = score_text(text)
+    ranked = sorted(scores.values(), reverse=True)
+    if not ranked or ranked[0] <= 0:
+        return None
+    best = ranked[0]
+    runner_up = ranked[1] if len(ranked) > 1 else 0.0
+    doc_type = max(scores, key=scores.get)
+    confidence = (best - runner_up) / best * min(1.0, best / FULL_EVIDENCE)
+    return Classification(doc_type, round(confidence, 3), scores)
+
+
+def classify_file(file_path: str, doc=None) -> Optional[Classification]:
+    """Classify a PDF by its first page's text layer.
+
+    `doc` is an open PdfDocument to reuse (its page text is memoized, so the
+    local-extraction stage that follows does not re-read it). Returns None
+    for images, scanned PDFs and unreadable files.
+    """
+    from core.extractors.local.document import open_document
+
+    owned = doc is None
+    try:
+        doc = open_document(file_path, doc)
+        if doc is None:
+            return None
+        text = doc.page_text(0)
+    except Exception as e:
+        logger.warning(f"读取首页文本失败, 跳过文档类型识别: {e}")
+        return None
+    finally:
+        if owned and doc is not None:
+            doc.close()
+    return classify_text(text)
@@ -58,6 +58,10 @@ class MedicalInvoice(DocType):
     display_name = "医疗票据"
     ocr_action = "RecognizeMedicalInvoiceOCR"
 
+    title_keywords = ("医疗收费票据", "收费票据", "医疗门诊", "医疗住院")
+    layout_keywords = ("票据代码", "票据号码", "交款人", "收款单位", "医疗机构类型",
+                       "医保类型", "个人自付")
+
     # extra_data contract: the 医保信息 section is medical-only.
     extra_section_keys = ("医保信息",)
 
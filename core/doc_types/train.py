@@ -57,6 +57,10 @@ class TrainTicket(DocType):
     display_name = "铁路电子客票"
     ocr_action = "TrainTicketOCR"
 
+    # 标题印章会把"铁路电子客票"的字打散，"电子客票"通常仍连在一起
+    title_keywords = ("铁路电子客票", "电子客票")
+    layout_keywords = ("电子客票号", "二等座", "一等座", "商务座", "12306", "中国铁路")
+
     # extra_data contract: the 乘车信息 section is train-only.
     extra_section_keys = ("乘车信息",)
 
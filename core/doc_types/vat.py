@@ -26,6 +26,10 @@ class VatInvoice(DocType):
     display_name = "增值税发票"
     ocr_action = "VatInvoiceOCR"
 
+    # 数电票标题只有"电子发票（普通发票）"，"电子发票"本身铁路客票也有
+    title_keywords = ("增值税", "普通发票", "专用发票")
+    layout_keywords = ("价税合计", "税率", "税额", "开票人", "纳税人识别号", "项目名称")
+
     # --- Detection -----------------------------------------------------------
 
     def detect_response(self, response_json: dict) -> bool:
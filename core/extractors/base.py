@@ -107,6 +107,9 @@ class ParsedInvoice:
     post_processed: bool = False            # True if pdfplumber corrected something
     corrections: list = field(default_factory=list)  # list of (field, old, new)
 
+    # Stage wall times in seconds ("ocr", "layout", "parse", "post:<name>")
+    timings: dict = field(default_factory=dict)
+
 
 # ---------------------------------------------------------------------------
 # Backend ABC + registry
@@ -128,7 +131,7 @@ class Backend(ABC):
     display_name: str = ""
 
     @abstractmethod
-    def extract(self, file_path: str, doc_type: str = "") -> ParsedInvoice:
+    def extract(self, file_path: str, doc_type: str = "", doc=None) -> ParsedInvoice:
         """Extract structured data from `file_path`.
 
         Parameters
@@ -139,6 +142,10 @@ class Backend(ABC):
             Document type id ('vat' | 'medical' | 'train' | '').
             For cloud backends this is informational.
             For local backends this selects which Parser to dispatch to.
+        doc : PdfDocument, optional
+            Already-open view of `file_path` (local/document.py) shared
+            with other stages of the same ingest, so the PDF is parsed
+            once. Backends that don't read the file themselves ignore it.
         """
 
     @abstractmethod
@@ -148,6 +155,41 @@ class Backend(ABC):
         Used to hide disabled backends from the upload form picker.
         """
 
+    def extract_many(
+        self,
+        file_paths: list[str],
+        doc_type: str = "",
+        max_in_flight: Optional[int] = None,
+        on_result=None,
+    ) -> list:
+        """``extract()`` every file, keeping several calls in flight.
+
+        Width is the backend's OCR_CONCURRENCY slot count — for
+        ``auto`` backends it follows observed latency (core/concurrency.py)
+        — and `max_in_flight` can lower it. Results are in input order;
+        a file that failed gets its exception in place of a
+        ParsedInvoice. `on_result(index, result)` is called as each file
+        finishes (see ``concurrency.dispatch``). The caller's Flask app
+        context, if any, is pushed in each worker thread so
+        Settings-backed configuration resolves.
+        """
+        from core.concurrency import dispatch
+
+        try:
+            from flask import current_app, has_app_context
+            app = current_app._get_current_object() if has_app_context() else None
+        except ImportError:
+            app = None
+
+        def one(path):
+            if app is None:
+                return self.extract(path, doc_type)
+            with app.app_context():
+                return self.extract(path, doc_type)
+
+        return dispatch(self.name, one, file_paths, max_in_flight=max_in_flight,
+                        on_result=on_result)
+
 
 # ---------------------------------------------------------------------------
 # Registry
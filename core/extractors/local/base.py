@@ -3,22 +3,34 @@
 Subclasses (SiliconFlow DeepSeek-OCR, future self-hosted vLLM, etc.)
 only need to implement `_call_ocr()` which returns a list of TextBlock.
 The base class handles:
+  - Opening the file once as a PdfDocument (local/document.py) shared by
+    OCR, parsing and post-processing
+  - Grouping the OCR blocks into lines once (local/layout.py) for the
+    parser and post-processors
   - Routing to the right Parser by doc_type
-  - Running post-processing if the file is a text-based PDF (pdfplumber can help)
+  - Running the post-processing pipeline (local/postprocess/pipeline.py)
+    on PDFs; each step declares whether it needs a text layer
+  - Timing every stage into ParsedInvoice.timings
   - The extract() / is_available() interface
 
 To add a new local backend:
   1. Subclass LocalBackend
-  2. Implement _call_ocr(file_path) -> list[TextBlock]
+  2. Implement _call_ocr(file_path, doc=None, doc_type="") -> list[TextBlock]
   3. Set name + display_name class attributes
   4. Add register_backend(YourBackend()) at the bottom of the module
 """
 from __future__ import annotations
 
+import logging
+import time
 from abc import abstractmethod
 from typing import Optional
 
 from ..base import Backend, ParsedInvoice, TextBlock, register_backend
+from .document import PdfDocument, open_document
+from .layout import Layout
+
+logger = logging.getLogger(__name__)
 
 
 class LocalBackend(Backend):
@@ -33,31 +45,72 @@ class LocalBackend(Backend):
     #: need to customize parsing per backend.
     parsers_module = "core.extractors.local.parsers"
 
-    def extract(self, file_path: str, doc_type: str = "") -> ParsedInvoice:
+    def extract(self, file_path: str, doc_type: str = "", doc=None) -> ParsedInvoice:
         """Run OCR on `file_path`, parse to ParsedInvoice, optionally post-process."""
-        # 1. Call OCR → text+bbox
-        blocks = self._call_ocr(file_path)
-        # 2. Parse via per-doc-type parser
-        parsed = self._parse(blocks, doc_type, file_path)
-        # 3. Post-process if applicable (text-based PDF only)
-        if self._should_post_process(file_path):
-            parsed = self._post_process(parsed, file_path)
-        return parsed
+        # 0. Open the PDF once for every stage below (unless the caller did)
+        owned = doc is None
+        doc = open_document(file_path, doc)
+        timings = {}
+        try:
+            # 1. Call OCR → text+bbox
+            start = time.monotonic()
+            blocks = self._call_ocr(file_path, doc=doc, doc_type=doc_type)
+            timings["ocr"] = time.monotonic() - start
+            # 2. Group blocks into lines once; every later stage reads it
+            start = time.monotonic()
+            layout = self._layout(blocks, doc)
+            timings["layout"] = time.monotonic() - start
+            # 3. Parse via per-doc-type parser
+            start = time.monotonic()
+            parsed = self._parse(blocks, doc_type, file_path, doc=doc, layout=layout)
+            timings["parse"] = time.monotonic() - start
+            parsed.timings.update(timings)
+            # 4. Post-process if applicable (PDFs; steps skip what they can't help)
+            if self._should_post_process(file_path, doc=doc):
+                parsed = self._post_process(parsed, file_path, doc=doc, layout=layout,
+                                            doc_type=doc_type)
+            logger.info(
+                f"{self.name} {doc_type or '-'}: "
+                + " ".join(f"{k}={v * 1000:.0f}ms" for k, v in parsed.timings.items())
+            )
+            return parsed
+        finally:
+            if owned and doc is not None:
+                doc.close()
 
     @abstractmethod
-    def _call_ocr(self, file_path: str) -> list[TextBlock]:
+    def _call_ocr(
+        self,
+        file_path: str,
+        doc: Optional[PdfDocument] = None,
+        doc_type: str = "",
+    ) -> list[TextBlock]:
         """Hit the OCR service and return text+bbox blocks.
 
         Subclasses implement this — it's the only OCR-specific code.
         Should return blocks in reading order (top→bottom, left→right)
-        with bounding boxes in PDF-point coordinates.
+        with bounding boxes in PDF-point coordinates. `doc` is the
+        shared PdfDocument for PDFs (None for images). `doc_type` is the
+        target type, for backends that size or stop requests by it.
         """
 
     # ------------------------------------------------------------------
     # Internals — subclasses usually don't override these
     # ------------------------------------------------------------------
 
-    def _parse(self, blocks: list[TextBlock], doc_type: str, file_path: str) -> ParsedInvoice:
+    def _layout(self, blocks: list[TextBlock], doc: Optional[PdfDocument] = None) -> Layout:
+        """Group `blocks` into lines. Backends whose blocks come from `doc`
+        return its memoized Layout instead."""
+        return Layout(blocks)
+
+    def _parse(
+        self,
+        blocks: list[TextBlock],
+        doc_type: str,
+        file_path: str,
+        doc: Optional[PdfDocument] = None,
+        layout: Optional[Layout] = None,
+    ) -> ParsedInvoice:
         """Route to the right parser for `doc_type`."""
         # Lazy import to avoid circular dependencies
         from .parsers import get_parser
@@ -75,70 +128,50 @@ class LocalBackend(Backend):
                     "remark": "",
                 })
             return parsed
-        return parser.parse(blocks, file_path=file_path)
+        return parser.parse(blocks, file_path=file_path, doc=doc, layout=layout)
 
-    def _should_post_process(self, file_path: str) -> bool:
-        """True if we have a text-based PDF where pdfplumber can help.
+    def _should_post_process(self, file_path: str, doc: Optional[PdfDocument] = None) -> bool:
+        """True for PDFs, where post-processors may have text to check against.
 
-        Paper scans (image PDFs) get skipped because pdfplumber can't
-        extract text from them.
+        Paper scans (image PDFs) reach the pipeline too: steps declaring
+        ``needs_text_layer`` probe the (memoized) page-1 text and skip
+        themselves. Backends whose output IS the text layer return False.
         """
-        if not file_path.lower().endswith(".pdf"):
-            return False
-        try:
-            # Probe: if pdfplumber extracts >50 chars in the first page,
-            # it's a text-based PDF.
-            import pdfplumber
-            with pdfplumber.open(file_path) as pdf:
-                first_page = pdf.pages[0]
-                text = first_page.extract_text() or ""
-            return len(text.strip()) > 50
-        except Exception:
-            return False
-
-    def _post_process(self, parsed: ParsedInvoice, file_path: str) -> ParsedInvoice:
-        """Run post-processing on text-based PDFs to verify/correct OCR output."""
+        return file_path.lower().endswith(".pdf")
+
+    def _post_process(
+        self,
+        parsed: ParsedInvoice,
+        file_path: str,
+        doc: Optional[PdfDocument] = None,
+        layout: Optional[Layout] = None,
+        doc_type: str = "",
+    ) -> ParsedInvoice:
+        """Run the post-processing pipeline to verify/correct OCR output."""
         # Lazy import — pdfplumber is only needed at post-process time
         try:
-            from .postprocess import get_post_processors
+            from .postprocess import run_pipeline
         except ImportError:
             return parsed
-        for pp in get_post_processors():
-            try:
-                parsed = pp.run(parsed, file_path)
-            except Exception as e:
-                # Don't blow up the whole extraction if post-processing fails
-                import logging
-                logging.getLogger(__name__).warning(
-                    f"PostProcessor {pp.__class__.__name__} failed: {e}"
-                )
-        return parsed
+        return run_pipeline(parsed, file_path, doc_type=doc_type, doc=doc, layout=layout)
 
 
 # ---------------------------------------------------------------------------
 # Helper for subclasses
 # ---------------------------------------------------------------------------
 
-def pdf_to_blocks(pdf_path: str, min_text_len: int = 1) -> list[TextBlock]:
+def pdf_to_blocks(
+    pdf_path: str,
+    min_text_len: int = 1,
+    doc: Optional[PdfDocument] = None,
+) -> list[TextBlock]:
     """Read a PDF via pdfplumber and return its words as TextBlocks.
 
-    Used by `local/pdfplumber.py` (text-based PDF backend) and by
-    `postprocess/pdf_text_verify.py` (cross-validation).
+    Used by `local/pdfplumber.py` (text-based PDF backend). Pass `doc` to
+    reuse an already-open PdfDocument; otherwise the file is opened and
+    closed here.
     """
-    import pdfplumber
-    blocks = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for page_idx, page in enumerate(pdf.pages):
-            for word in page.extract_words(
-                use_text_flow=False, keep_blank_chars=False
-            ):
-                txt = word.get("text", "").strip()
-                if len(txt) < min_text_len:
-                    continue
-                blocks.append(TextBlock(
-                    text=txt,
-                    bbox=(word["x0"], word["top"], word["x1"], word["bottom"]),
-                    confidence=1.0,  # pdfplumber text is lossless
-                    page=page_idx,
-                ))
-    return blocks
+    if doc is not None:
+        return doc.blocks(min_text_len)
+    with PdfDocument(pdf_path) as own:
+        return own.blocks(min_text_len)
@@ -0,0 +1,180 @@
+"""BlockArray: columnar TextBlock storage for large documents (紧凑块存储).
+
+``pdf_to_blocks`` used to build one ``TextBlock`` per word — a dataclass
+instance with its own ``__dict__`` plus a tuple of four float objects.
+A multi-page inpatient receipt or a long 销货清单 holds thousands of
+words, and every layout pass walked those objects one attribute at a
+time.
+
+``BlockArray`` keeps the same data in columns: texts and block ids in
+lists, bbox / page / confidence in NumPy arrays. It is a read-only
+``Sequence``: indexing yields a ``BlockView`` — a slotted row view with
+the ``TextBlock`` attributes — created on first access and reused after,
+so identity checks (``b is block``) keep working in parsers. Layout and
+BlockIndex read the columns directly (``columns()``) to cluster lines
+and bucket rows with array operations instead of per-block Python.
+
+PdfDocument returns BlockArrays; OCR backends may keep returning plain
+lists of TextBlock — every consumer accepts both.
+"""
+from __future__ import annotations
+
+from collections.abc import Sequence
+from typing import Iterable, Optional
+
+import numpy as np
+
+from ..base import TextBlock
+
+
+class BlockView:
+    """Row `i` of a BlockArray, read through the TextBlock attributes."""
+
+    # `text` is read far more often than the rest; keep the reference.
+    __slots__ = ("_array", "_i", "text")
+
+    def __init__(self, array: "BlockArray", i: int):
+        self._array = array
+        self._i = i
+        self.text = array.texts[i]
+
+    @property
+    def bbox(self) -> tuple[float, float, float, float]:
+        return tuple(self._array.bbox[self._i].tolist())
+
+    @property
+    def confidence(self) -> float:
+        return float(self._array.confidence[self._i])
+
+    @property
+    def page(self) -> int:
+        return int(self._array.page[self._i])
+
+    @property
+    def block_id(self) -> Optional[str]:
+        ids = self._array.block_ids
+        return ids[self._i] if ids is not None else None
+
+    def to_block(self) -> TextBlock:
+        return TextBlock(self.text, self.bbox, self.confidence, self.page, self.block_id)
+
+    def _key(self) -> tuple:
+        return (self.text, self.bbox, self.confidence, self.page, self.block_id)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (BlockView, TextBlock)):
+            return self._key() == (other.text, tuple(other.bbox), other.confidence,
+                                   other.page, other.block_id)
+        return NotImplemented
+
+    __hash__ = None  # like TextBlock: equal by value, so not hashable
+
+    def __repr__(self):
+        return f"TextBlock({self.text!r}, bbox={self.bbox}, conf={self.confidence:.2f})"
+
+
+class BlockArray(Sequence):
+    """TextBlocks stored column-wise; iterates as BlockViews."""
+
+    def __init__(
+        self,
+        texts: list[str],
+        bbox: np.ndarray,
+        page: Optional[np.ndarray] = None,
+        confidence: Optional[np.ndarray] = None,
+        block_ids: Optional[list[Optional[str]]] = None,
+    ):
+        n = len(texts)
+        self.texts = texts
+        self.bbox = np.asarray(bbox, dtype=np.float64).reshape(n, 4)
+        self.page = (np.zeros(n, dtype=np.int32) if page is None
+                     else np.asarray(page, dtype=np.int32))
+        self.confidence = (np.ones(n, dtype=np.float64) if confidence is None
+                           else np.asarray(confidence, dtype=np.float64))
+        self.block_ids = block_ids
+        self._views: list[Optional[BlockView]] = [None] * n
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def from_blocks(cls, blocks: Iterable[TextBlock]) -> "BlockArray":
+        blocks = list(blocks)
+        ids = [b.block_id for b in blocks]
+        return cls(
+            [b.text for b in blocks],
+            np.array([b.bbox for b in blocks], dtype=np.float64).reshape(len(blocks), 4),
+            np.fromiter((b.page for b in blocks), dtype=np.int32, count=len(blocks)),
+            np.fromiter((b.confidence for b in blocks), dtype=np.float64, count=len(blocks)),
+            ids if any(i is not None for i in ids) else None,
+        )
+
+    @classmethod
+    def from_words(cls, words: list[dict], page: int = 0, min_text_len: int = 1) -> "BlockArray":
+        """pdfplumber extract_words() output → BlockArray (confidence 1.0)."""
+        texts = []
+        coords = []
+        for word in words:
+            txt = word.get("text", "").strip()
+            if len(txt) < min_text_len:
+                continue
+            texts.append(txt)
+            coords.append((word["x0"], word["top"], word["x1"], word["bottom"]))
+        bbox = np.array(coords, dtype=np.float64).reshape(len(texts), 4)
+        return cls(texts, bbox, np.full(len(texts), page, dtype=np.int32))
+
+    @classmethod
+    def concat(cls, arrays: list["BlockArray"]) -> "BlockArray":
+        if not arrays:
+            return cls([], np.empty((0, 4)))
+        ids = None
+        if any(a.block_ids is not None for a in arrays):
+            ids = [i for a in arrays for i in (a.block_ids or [None] * len(a))]
+        return cls(
+            [t for a in arrays for t in a.texts],
+            np.concatenate([a.bbox for a in arrays]),
+            np.concatenate([a.page for a in arrays]),
+            np.concatenate([a.confidence for a in arrays]),
+            ids,
+        )
+
+    # ------------------------------------------------------------------
+    # Sequence
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, i):
+        if type(i) is slice:
+            return [self[j] for j in range(*i.indices(len(self.texts)))]
+        view = self._views[i]                  # IndexError when out of range
+        if view is None:
+            i = i if i >= 0 else i + len(self.texts)
+            view = self._views[i] = BlockView(self, i)
+        return view
+
+    def __iter__(self):
+        views = self._views
+        if None in views:
+            for i, view in enumerate(views):
+                if view is None:
+                    views[i] = BlockView(self, i)
+        return iter(views)
+
+    def to_blocks(self) -> list[TextBlock]:
+        return [view.to_block() for view in self]
+
+    def __repr__(self):
+        return f"BlockArray({len(self)} blocks)"
+
+
+def columns(blocks: Sequence) -> tuple[np.ndarray, np.ndarray]:
+    """(bbox (n, 4) float64, page (n,) int) for a BlockArray or list of blocks."""
+    if isinstance(blocks, BlockArray):
+        return blocks.bbox, blocks.page
+    n = len(blocks)
+    bbox = np.array([b.bbox for b in blocks], dtype=np.float64).reshape(n, 4)
+    page = np.fromiter((b.page for b in blocks), dtype=np.int64, count=n)
+    return bbox, page
@@ -0,0 +1,255 @@
+"""PdfDocument: one parsed PDF shared by every stage of an ingest.
+
+A single upload used to open the same file up to four times:
+LocalPdfBackend (pdf_to_blocks), LocalBackend._should_post_process
+(page-1 probe), PdfTextVerify (every page's text) and VLLMOCRBackend
+(fitz render of page 1). PdfDocument opens the file once, lazily, and
+memoizes everything those stages ask for:
+
+  - words(page) / page_blocks(page) / blocks()
+                              pdfplumber extract_words → BlockArray
+                              (columnar TextBlocks, local/blocks.py)
+  - page_layout(page) / layout()  Layout (lines, text) of those blocks
+  - page_text(page) / full_text   pdfplumber extract_text
+  - has_text_layer            the >50-char page-1 probe
+  - render_png(page, zoom)    PyMuPDF pixmap bytes
+
+It is created by the caller (app/utils.py process_invoice_image, or
+LocalBackend.extract when none is passed) and threaded through
+Backend.extract → Parser.parse → PostProcessor.run as ``doc=``.
+
+``page_view(i)`` returns a PdfPage: the same interface restricted to one
+page (page 0 of the view is page i of the file), backed by the parent's
+memoized data. Passing a PdfPage as ``doc=`` makes every stage work on
+that page alone — that is how multi-page PDFs are split into per-page
+recognition units without a page argument on every method.
+
+Access is serialized with a lock — pdfplumber and PyMuPDF objects are
+not thread-safe, and later stages may recognise pages concurrently.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any, Optional
+
+from .blocks import BlockArray
+from .layout import Layout
+
+#: has_text_layer threshold — same probe LocalBackend always used.
+TEXT_LAYER_MIN_CHARS = 50
+
+
+class PdfDocument:
+    """Lazily-opened, memoized view of one PDF file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._pdf: Any = None          # pdfplumber.PDF
+        self._fitz: Any = None         # fitz.Document
+        self._words: dict[int, list[dict]] = {}
+        self._text: dict[int, str] = {}
+        self._blocks: dict[tuple[int, int], BlockArray] = {}
+        self._layouts: dict[tuple[int, int], Layout] = {}
+        self._png: dict[tuple[int, float], bytes] = {}
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def __enter__(self) -> "PdfDocument":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Release file handles. Memoized results stay readable."""
+        with self._lock:
+            if self._pdf is not None:
+                self._pdf.close()
+                self._pdf = None
+            if self._fitz is not None:
+                self._fitz.close()
+                self._fitz = None
+
+    def _plumber(self):
+        if self._pdf is None:
+            import pdfplumber
+            self._pdf = pdfplumber.open(self.path)
+        return self._pdf
+
+    # ------------------------------------------------------------------
+    # pdfplumber views
+    # ------------------------------------------------------------------
+
+    @property
+    def page_count(self) -> int:
+        with self._lock:
+            return len(self._plumber().pages)
+
+    def words(self, page: int) -> list[dict]:
+        """extract_words() for one page (0-indexed)."""
+        with self._lock:
+            if page not in self._words:
+                self._words[page] = self._plumber().pages[page].extract_words(
+                    use_text_flow=False, keep_blank_chars=False
+                )
+            return self._words[page]
+
+    def page_blocks(self, page: int, min_text_len: int = 1) -> BlockArray:
+        """One page's words as TextBlock rows (a columnar BlockArray)."""
+        with self._lock:
+            key = (page, min_text_len)
+            if key not in self._blocks:
+                # pdfplumber text is lossless — confidence stays 1.0
+                self._blocks[key] = BlockArray.from_words(self.words(page), page, min_text_len)
+            return self._blocks[key]
+
+    def blocks(self, min_text_len: int = 1) -> BlockArray:
+        """Every page's words as TextBlock rows, in page order."""
+        with self._lock:
+            key = (-1, min_text_len)
+            if key not in self._blocks:
+                self._blocks[key] = BlockArray.concat([
+                    self.page_blocks(page, min_text_len) for page in range(self.page_count)
+                ])
+            return self._blocks[key]
+
+    def page_layout(self, page: int, min_text_len: int = 1) -> Layout:
+        """Layout of page_blocks(page)."""
+        with self._lock:
+            key = (page, min_text_len)
+            if key not in self._layouts:
+                self._layouts[key] = Layout(self.page_blocks(page, min_text_len))
+            return self._layouts[key]
+
+    def layout(self, min_text_len: int = 1) -> Layout:
+        """Layout of blocks() — every page, lines clustered per page."""
+        with self._lock:
+            key = (-1, min_text_len)
+            if key not in self._layouts:
+                self._layouts[key] = Layout(self.blocks(min_text_len))
+            return self._layouts[key]
+
+    def page_text(self, page: int) -> str:
+        """extract_text() for one page ("" when the page has no text layer)."""
+        with self._lock:
+            if page not in self._text:
+                self._text[page] = self._plumber().pages[page].extract_text() or ""
+            return self._text[page]
+
+    @property
+    def full_text(self) -> str:
+        with self._lock:
+            return "\n".join(self.page_text(i) for i in range(self.page_count))
+
+    @property
+    def has_text_layer(self) -> bool:
+        """True for machine-generated PDFs (page 1 has real embedded text)."""
+        try:
+            return len(self.page_text(0).strip()) > TEXT_LAYER_MIN_CHARS
+        except Exception:
+            return False
+
+    def page_view(self, page: int) -> "PdfPage":
+        return PdfPage(self, page)
+
+    # ------------------------------------------------------------------
+    # Rendering (PyMuPDF)
+    # ------------------------------------------------------------------
+
+    def render_png(self, page: int = 0, zoom: float = 2.0) -> bytes:
+        """PNG bytes of one page. Raises ImportError if PyMuPDF is missing."""
+        with self._lock:
+            key = (page, zoom)
+            if key not in self._png:
+                if self._fitz is None:
+                    import fitz  # PyMuPDF
+                    self._fitz = fitz.open(self.path)
+                import fitz
+                pix = self._fitz[page].get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+                self._png[key] = pix.tobytes("png")
+            return self._png[key]
+
+
+class PdfPage:
+    """One page of a PdfDocument, exposed through the PdfDocument interface.
+
+    Blocks keep their original ``page`` index so parsers and audit data
+    still know where a word came from. Closing a view is a no-op — the
+    parent document owns the file handles.
+    """
+
+    def __init__(self, parent: PdfDocument, page: int):
+        self.parent = parent
+        self.path = parent.path
+        self.page_index = page
+
+    def __enter__(self) -> "PdfPage":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    @property
+    def page_count(self) -> int:
+        return 1
+
+    def words(self, page: int = 0) -> list[dict]:
+        self._check(page)
+        return self.parent.words(self.page_index)
+
+    def page_blocks(self, page: int = 0, min_text_len: int = 1) -> BlockArray:
+        self._check(page)
+        return self.parent.page_blocks(self.page_index, min_text_len)
+
+    def blocks(self, min_text_len: int = 1) -> BlockArray:
+        return self.parent.page_blocks(self.page_index, min_text_len)
+
+    def page_layout(self, page: int = 0, min_text_len: int = 1) -> Layout:
+        self._check(page)
+        return self.parent.page_layout(self.page_index, min_text_len)
+
+    def layout(self, min_text_len: int = 1) -> Layout:
+        return self.parent.page_layout(self.page_index, min_text_len)
+
+    def page_text(self, page: int = 0) -> str:
+        self._check(page)
+        return self.parent.page_text(self.page_index)
+
+    @property
+    def full_text(self) -> str:
+        return self.page_text(0)
+
+    @property
+    def has_text_layer(self) -> bool:
+        try:
+            return len(self.page_text(0).strip()) > TEXT_LAYER_MIN_CHARS
+        except Exception:
+            return False
+
+    def page_view(self, page: int) -> "PdfPage":
+        self._check(page)
+        return self
+
+    def render_png(self, page: int = 0, zoom: float = 2.0) -> bytes:
+        self._check(page)
+        return self.parent.render_png(self.page_index, zoom)
+
+    @staticmethod
+    def _check(page: int) -> None:
+        if page != 0:
+            raise IndexError(f"PdfPage has a single page (got page={page})")
+
+
+def open_document(file_path: str, doc: Optional[PdfDocument] = None) -> Optional[PdfDocument]:
+    """Return `doc` if given, else a new PdfDocument for PDFs (None otherwise)."""
+    if doc is not None:
+        return doc
+    if file_path.lower().endswith(".pdf"):
+        return PdfDocument(file_path)
+    return None
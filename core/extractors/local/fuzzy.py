@@ -0,0 +1,149 @@
+"""Approximate substring search for text verification (模糊匹配).
+
+``PdfTextVerify._find_similar`` falls back to this when a field's label is
+missing from the PDF text: it needs the first window of ``len(value)``
+(then ``len(value) + 1``) characters with the smallest edit distance to
+the OCR value, at most ``max_dist``. The original code ran a pure-Python
+O(m²) Levenshtein at every text position, twice.
+
+``FuzzyText`` gives the same answer while checking far fewer windows:
+
+  1. Candidate filter (pigeonhole): split the value into ``max_dist + 1``
+     pieces. ``max_dist`` edits can touch at most ``max_dist`` pieces, so
+     any window that matches has at least one piece verbatim, shifted at
+     most ``max_dist`` from its place in the value. Piece positions come
+     from ``str.find`` and are cached per text (``occurrences``), so the
+     fields verified against one document share them.
+  2. Dense pieces (a one-digit piece in a page of digits) would yield most
+     positions as candidates. For those values, one bit-parallel Myers
+     k-difference scan of the text replaces the filter: it gives, per end
+     position, the smallest distance of any substring ending there, which
+     is a lower bound for the window that ends there.
+  3. Each remaining window is scored exactly with Myers' bit-parallel edit
+     distance (``distance``), one word operation per character.
+
+The first window with the smallest distance wins, like the old scan, so
+the results are identical.
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+
+def _peq(value: str) -> dict[str, int]:
+    """Myers' pattern bitmasks: bit i of peq[c] is set where value[i] == c."""
+    peq: dict[str, int] = {}
+    for i, c in enumerate(value):
+        peq[c] = peq.get(c, 0) | (1 << i)
+    return peq
+
+
+def _myers(peq: dict[str, int], m: int, text: str, start: int, end: int,
+           anchored: bool) -> list[int]:
+    """Scores after each character of text[start:end].
+
+    anchored=True computes the edit distance of the pattern to the prefix
+    text[start:j]; anchored=False the smallest distance to any substring
+    ending at j (k-difference search).
+    """
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+    carry = 1 if anchored else 0
+    pv, mv, score = mask, 0, m
+    scores = []
+    for j in range(start, end):
+        eq = peq.get(text[j], 0)
+        xv = eq | mv
+        xh = ((((eq & pv) + pv) & mask) ^ pv) | eq
+        ph = (mv | ~(xh | pv)) & mask
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        ph = (ph << 1) | carry
+        mh <<= 1
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv
+        scores.append(score)
+    return scores
+
+
+def distance(a: str, b: str) -> int:
+    """Levenshtein distance of `a` and `b` (bit-parallel)."""
+    if not a or not b:
+        return len(a) or len(b)
+    return _myers(_peq(a), len(a), b, 0, len(b), anchored=True)[-1]
+
+
+class FuzzyText:
+    """One text, searched for approximate windows of several values."""
+
+    #: Use the k-difference scan instead of the piece filter once the
+    #: candidates exceed this fraction of all window positions.
+    DENSE_FRACTION = 0.25
+
+    def __init__(self, text: str):
+        self.text = text
+        self._occurrences: dict[str, list[int]] = {}
+
+    def occurrences(self, piece: str) -> list[int]:
+        """Every (overlapping) start position of `piece`, cached."""
+        found = self._occurrences.get(piece)
+        if found is None:
+            found = []
+            find = self.text.find
+            pos = find(piece)
+            while pos >= 0:
+                found.append(pos)
+                pos = find(piece, pos + 1)
+            self._occurrences[piece] = found
+        return found
+
+    def _candidates(self, value: str, size: int, max_dist: int, peq: dict[str, int]) -> list[int]:
+        """Window starts that may hold a match; a superset of the real ones."""
+        text, m = self.text, len(value)
+        last = len(text) - size
+        if m > max_dist:
+            pieces = max_dist + 1
+            starts: set[int] = set()
+            for i in range(pieces):
+                lo, hi = i * m // pieces, (i + 1) * m // pieces
+                for pos in self.occurrences(value[lo:hi]):
+                    base = pos - lo
+                    starts.update(range(max(0, base - max_dist), min(last, base + max_dist) + 1))
+            if len(starts) <= self.DENSE_FRACTION * (last + 1):
+                return sorted(starts)
+        # Window [pos, pos+size) is no closer than the best substring
+        # ending at pos+size.
+        ends = _myers(peq, m, text, 0, len(text), anchored=False)
+        return [pos for pos in range(last + 1) if ends[pos + size - 1] <= max_dist]
+
+    def best_window(self, value: str, max_dist: int, extra: int = 0) -> Optional[tuple[int, int]]:
+        """(start, distance) of the first closest window of
+        ``len(value) + extra`` characters, or None if none is within
+        `max_dist` edits."""
+        m = len(value)
+        size = m + extra
+        if not value or size > len(self.text) or extra > max_dist:
+            return None
+        peq = _peq(value)
+        best = None
+        best_dist = max_dist + 1
+        for pos in self._candidates(value, size, max_dist, peq):
+            d = _myers(peq, m, self.text, pos, pos + size, anchored=True)[-1]
+            if d < best_dist:
+                best, best_dist = pos, d
+                if d == 0:
+                    break
+        return None if best is None else (best, best_dist)
+
+    def find(self, value: str, max_dist: int) -> Optional[str]:
+        """Closest window of len(value), else of len(value)+1, as
+        ``_find_similar`` has always scanned them."""
+        for extra in (0, 1):
+            found = self.best_window(value, max_dist, extra)
+            if found is not None:
+                pos = found[0]
+                return self.text[pos:pos + len(value) + extra]
+        return None
@@ -0,0 +1,143 @@
+"""Single-pass label scanner for field extraction (字段标签扫描).
+
+Parsers used to run a dozen independent ``re.search`` calls over the
+same text — each one a full scan, most of them for labels the document
+does not even contain — and ``_med_field`` did one ``str.find`` per
+other label for every medical field, O(labels² × text).
+
+``LabelScanner`` compiles every label into one overlapping-lookahead
+alternation (longest label first) and ``scan(text)`` records each
+label's positions in a single pass. The returned ``LabelHits`` then
+answers the extraction questions from those positions:
+
+  - ``search(regex, *labels)``  the first match of a label-anchored
+    pattern, tried only where one of `labels` occurs (same result as
+    ``regex.search(text)`` when the pattern starts with a label)
+  - ``findall(regex, *labels)``  likewise for ``regex.findall``
+  - ``value(label, stops)``  the text after ``label:`` up to the next
+    label in `stops` or the end of the line (dense medical info lines)
+
+``FIELD_SCANNER`` covers the labels of every layout parser and of
+PdfTextVerify. ``Layout.labels`` memoizes its scan of the layout text,
+so the parser and post-processors reading one Layout share one scan.
+"""
+from __future__ import annotations
+
+import bisect
+import re
+from typing import Iterable, Optional
+
+_SEP = re.compile(r"\s*[:：]?\s*")
+
+
+class LabelHits:
+    """Label positions in one text, from one LabelScanner.scan()."""
+
+    def __init__(self, text: str, hits: list[tuple[int, str]]):
+        self.text = text
+        self.hits = hits                       # (position, label), by position
+        self._starts = [pos for pos, _ in hits]
+        self.positions: dict[str, list[int]] = {}
+        for pos, label in hits:
+            self.positions.setdefault(label, []).append(pos)
+
+    def __contains__(self, label: str) -> bool:
+        return label in self.positions
+
+    def first(self, label: str) -> Optional[int]:
+        found = self.positions.get(label)
+        return found[0] if found else None
+
+    def _at(self, labels: tuple[str, ...]) -> list[int]:
+        if len(labels) == 1:
+            return self.positions.get(labels[0], [])
+        return sorted({pos for label in labels for pos in self.positions.get(label, ())})
+
+    def search(self, regex: re.Pattern, *labels: str) -> Optional[re.Match]:
+        """First match of `regex` starting where one of `labels` occurs."""
+        for pos in self._at(labels):
+            m = regex.match(self.text, pos)
+            if m:
+                return m
+        return None
+
+    def findall(self, regex: re.Pattern, *labels: str) -> list:
+        """Non-overlapping matches of `regex` anchored on `labels` (findall shape)."""
+        out = []
+        end = 0
+        for pos in self._at(labels):
+            if pos < end:
+                continue
+            m = regex.match(self.text, pos)
+            if m:
+                groups = m.groups()
+                out.append(m.group(0) if not groups else groups[0] if len(groups) == 1 else groups)
+                end = max(m.end(), pos + 1)
+        return out
+
+    def value(self, label: str, stops: Iterable[str]) -> str:
+        """Text after the first `label` (and its colon) up to the next
+        other label in `stops` or the end of the line."""
+        pos = self.first(label)
+        if pos is None:
+            return ""
+        text = self.text
+        start = _SEP.match(text, pos + len(label)).end()
+        end = text.find("\n", start)
+        if end < 0:
+            end = len(text)
+        stops = set(stops)
+        for i in range(bisect.bisect_left(self._starts, start), len(self.hits)):
+            hit_pos, hit_label = self.hits[i]
+            if hit_pos >= end:
+                break
+            if hit_label != label and hit_label in stops:
+                end = hit_pos
+                break
+        return text[start:end]
+
+
+class LabelScanner:
+    """Every occurrence of a fixed set of labels, found in one regex pass."""
+
+    def __init__(self, labels: Iterable[str]):
+        self.labels = tuple(dict.fromkeys(labels))
+        longest_first = sorted(self.labels, key=len, reverse=True)
+        # Lookahead so matches may overlap ("统一社会信用代码" inside
+        # "交款人统一社会信用代码"); at one position the longest label wins
+        # and its prefixes are added back from _prefixes.
+        self._regex = re.compile(
+            "(?=(" + "|".join(re.escape(label) for label in longest_first) + "))"
+        )
+        self._prefixes = {
+            label: [other for other in longest_first
+                    if other != label and label.startswith(other)]
+            for label in self.labels
+        }
+
+    def scan(self, text: str) -> LabelHits:
+        hits = []
+        for m in self._regex.finditer(text):
+            label = m.group(1)
+            hits.append((m.start(), label))
+            hits.extend((m.start(), other) for other in self._prefixes[label])
+        return LabelHits(text, hits)
+
+
+#: Labels used by the layout parsers and PdfTextVerify.
+FIELD_LABELS = (
+    # shared
+    "发票号码", "开票日期", "校验码",
+    # VAT
+    "电子发票", "发票代码", "机器编号", "统一社会信用代码/纳税人识别号",
+    "纳税人识别号", "开票人", "价税合计",
+    # medical
+    "票据代码", "票据号码", "交款人统一社会信用代码", "交款人", "收款单位",
+    "金额合计", "医疗机构类型", "医保类型", "医保编号", "性别",
+    "医保统筹基金支付", "其他支付", "个人账户支付", "个人现金支付",
+    "个人自付", "个人自费",
+    # train
+    "电子客票号", "购买方名称", "统一社会信用代码",
+)
+
+FIELD_SCANNER = LabelScanner(FIELD_LABELS)
@@ -0,0 +1,184 @@
+"""Layout: one document's blocks grouped into lines, built once (版面模型).
+
+Every layout parser used to rebuild the same picture of the page from
+the raw blocks: its own copy of ``_blocks_to_text`` sorted and clustered
+them into lines, and item extraction grouped them again into integer Y
+bins. ``Layout`` does that work once per block list and every consumer
+reads from it:
+
+  - ``lines`` / ``page_lines(page)``  blocks clustered into visual lines
+    (per page; a block joins a line when its top is within
+    ``line_tolerance`` of the line's first block), each sorted by x0
+  - ``text``  reading-order text, one line per ``\\n``; a space marks a
+    column break (horizontal gap wider than ``column_gap``)
+  - ``block_at(offset)`` / ``span(block)``  map between ``text`` offsets
+    and blocks, so a regex hit can be traced back to its bbox
+  - ``index``  the BlockIndex (spatial.py) over the same blocks
+  - ``labels``  field-label positions in ``text`` (labels.py)
+
+Clustering runs on the bbox/page columns (blocks.py ``columns()``): one
+sort for the whole document and a bisect per line, instead of per-block
+comparisons.
+
+``LocalBackend.extract`` builds it once and passes ``layout=`` to the
+parser and post-processors; ``PdfDocument.layout()`` memoizes the one
+for pdfplumber's words, so repeated parses of the same PDF share it.
+"""
+from __future__ import annotations
+
+import bisect
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Optional, Sequence
+
+import numpy as np
+
+from ..base import TextBlock
+from .blocks import BlockArray, BlockView, columns
+from .labels import FIELD_SCANNER, LabelHits
+from .spatial import BlockIndex
+
+#: Max top-edge difference (pt) for two blocks to share a line.
+LINE_TOLERANCE = 4.0
+#: Horizontal gap (pt) that counts as a column break in ``text``.
+COLUMN_GAP = 30.0
+
+
+@dataclass
+class Line:
+    """One visual line: its blocks left to right and their joined text."""
+    page: int
+    blocks: list[TextBlock]
+    text: str = ""
+    offset: int = 0                                       # start in Layout.text
+    block_offsets: list[int] = field(default_factory=list)  # start of each block in `text`
+    column_breaks: list[float] = field(default_factory=list)  # X of each gap > column_gap
+
+    @property
+    def top(self) -> float:
+        return self.blocks[0].bbox[1]
+
+
+class Layout:
+    """Lines, reading-order text and offsets for one list of blocks."""
+
+    def __init__(self, blocks: Sequence[TextBlock], line_tolerance: float = LINE_TOLERANCE,
+                 column_gap: float = COLUMN_GAP):
+        self.blocks = blocks
+        self.line_tolerance = line_tolerance
+        self.column_gap = column_gap
+        self._starts: list[int] = []         # text offset of every placed block
+        self._placed: list[TextBlock] = []
+        self._span: dict[int, tuple[int, int]] = {}
+        self.lines: list[Line] = self._cluster()
+        self.text = "\n".join(line.text for line in self.lines)
+
+    def _cluster(self) -> list[Line]:
+        # Columns (bbox, page) come straight from a BlockArray, or are
+        # gathered once from a list of TextBlocks.
+        bbox, pages = columns(self.blocks)
+        x0, top, x1 = bbox[:, 0], bbox[:, 1], bbox[:, 2]
+        n = len(x0)
+        # Page, then top, then x0; lexsort is stable, so ties keep the
+        # original block order (as the old sorted() did).
+        order = np.lexsort((x0, top, pages))
+        tops = top[order].tolist()
+        page_of = pages[order].tolist()
+        starts = []
+        i = 0
+        while i < n:
+            # A line is every block whose top is within line_tolerance of
+            # the line's first block; tops are sorted within a page, so
+            # bisect for the end and confirm it with the exact comparison.
+            anchor = tops[i]
+            end = bisect.bisect_right(page_of, page_of[i], i, n)
+            j = bisect.bisect_right(tops, anchor + self.line_tolerance, i, end)
+            while j < end and tops[j] - anchor <= self.line_tolerance:
+                j += 1
+            while j > i + 1 and tops[j - 1] - anchor > self.line_tolerance:
+                j -= 1
+            starts.append(i)
+            i = j
+        ends = starts[1:] + [n]
+        line_of = np.repeat(np.arange(len(starts)), np.subtract(ends, starts))
+        # Left to right within each line (stable: x0 ties keep top order)
+        final = order[np.lexsort((x0[order], line_of))] if n else order
+        # Column break before position k: same line, gap > column_gap
+        gaps = x0[final][1:] - x1[final][:-1]
+        breaks = (gaps > self.column_gap) & (line_of[1:] == line_of[:-1])
+        is_break = [False] + breaks.tolist()
+        mids = [0.0] + ((x1[final][:-1] + x0[final][1:]) / 2).tolist()
+        if isinstance(self.blocks, BlockArray):
+            texts = self.blocks.texts
+        else:
+            texts = [b.text for b in self.blocks]
+        final = final.tolist()
+        items = list(self.blocks)
+
+        lines = []
+        offset = 0
+        for lo, hi in zip(starts, ends):
+            line = Line(page_of[lo], [items[k] for k in final[lo:hi]], offset=offset)
+            parts = []
+            length = 0
+            for k in range(lo, hi):
+                if k > lo and is_break[k]:
+                    parts.append(" ")
+                    length += 1
+                    line.column_breaks.append(mids[k])
+                text = texts[final[k]]
+                line.block_offsets.append(length)
+                self._starts.append(offset + length)
+                parts.append(text)
+                length += len(text)
+            for blk, start in zip(line.blocks, line.block_offsets):
+                self._placed.append(blk)
+                self._span[id(blk)] = (offset + start, offset + start + len(blk.text))
+            line.text = "".join(parts)
+            lines.append(line)
+            offset += length + 1
+        return lines
+
+    # ------------------------------------------------------------------
+    # Views
+    # ------------------------------------------------------------------
+
+    def page_lines(self, page: int) -> list[Line]:
+        return [line for line in self.lines if line.page == page]
+
+    @cached_property
+    def index(self) -> BlockIndex:
+        return BlockIndex(self.blocks)
+
+    @cached_property
+    def labels(self) -> LabelHits:
+        """Field-label positions in ``text`` (labels.py FIELD_SCANNER)."""
+        return FIELD_SCANNER.scan(self.text)
+
+    @cached_property
+    def _positions(self) -> dict[int, int]:
+        return {id(b): i for i, b in enumerate(self.blocks)}
+
+    def position(self, block: TextBlock) -> int:
+        """Index of `block` in the original block list."""
+        if isinstance(block, BlockView) and block._array is self.blocks:
+            return block._i
+        return self._positions[id(block)]
+
+    def block_at(self, offset: int) -> Optional[TextBlock]:
+        """The block whose text covers `offset` in ``text`` (None for separators)."""
+        i = bisect.bisect_right(self._starts, offset) - 1
+        if i < 0:
+            return None
+        b = self._placed[i]
+        start, end = self._span[id(b)]
+        return b if start <= offset < end else None
+
+    def span(self, block: TextBlock) -> tuple[int, int]:
+        """(start, end) of `block` in ``text``."""
+        return self._span[id(block)]
+
+    def find_block(self, needle: str) -> Optional[TextBlock]:
+        """Block holding the first occurrence of `needle` in ``text``."""
+        pos = self.text.find(needle)
+        return self.block_at(pos) if pos >= 0 else None
@@ -109,20 +109,72 @@ def _parse_plain_text(content: str) -> list[TextBlock]:
 
 FormatParser = Callable[[str], list[TextBlock]]
 
-_FORMAT_REGISTRY: list[tuple[str, FormatParser]] = []
+_FORMAT_REGISTRY: list[tuple[str, FormatParser, str]] = []
 
 
-def register_format(model_glob: str, parser: FormatParser) -> None:
-    """Register a parser for models matching `model_glob` (fnmatch)."""
-    _FORMAT_REGISTRY.append((model_glob, parser))
+def register_format(model_glob: str, parser: FormatParser, boundary: str = "\n") -> None:
+    """Register a parser for models matching `model_glob` (fnmatch).
+
+    `boundary` is the string that ends one complete region in the
+    model's output; streaming only parses text up to the last boundary.
+    """
+    _FORMAT_REGISTRY.append((model_glob, parser, boundary))
+
+
+def _lookup(model: str) -> tuple[FormatParser, str]:
+    for glob, parser, boundary in _FORMAT_REGISTRY:
+        if fnmatch.fnmatch(model.lower(), glob.lower()):
+            return parser, boundary
+    return _parse_plain_text, "\n"
 
 
 def get_format_parser(model: str) -> FormatParser:
     """Find the parser for `model`. Falls back to plain-text."""
-    for glob, parser in _FORMAT_REGISTRY:
-        if fnmatch.fnmatch(model.lower(), glob.lower()):
-            return parser
-    return _parse_plain_text
+    return _lookup(model)[0]
+
+
+class StreamParser:
+    """Incremental front-end for a FormatParser (streamed responses).
+
+    ``feed(chunk)`` returns the TextBlocks completed by that chunk;
+    ``close()`` returns whatever the final, boundary-less tail adds.
+    Only text up to the last boundary is parsed, so a region cut off
+    mid-token is never emitted half-done. The complete prefix is
+    re-parsed rather than just the new text: formats whose output
+    depends on position (plain text's synthetic Y) then produce exactly
+    the blocks the one-shot parse would.
+    """
+
+    def __init__(self, parser: FormatParser, boundary: str = "\n"):
+        self.parser = parser
+        self.boundary = boundary
+        self.text = ""
+        self._parsed_upto = 0
+        self._emitted = 0
+
+    def feed(self, chunk: str) -> list[TextBlock]:
+        # A new boundary can only end inside this chunk.
+        start = max(self._parsed_upto, len(self.text) - len(self.boundary) + 1)
+        self.text += chunk
+        cut = self.text.rfind(self.boundary, start)
+        if cut < 0:
+            return []
+        self._parsed_upto = cut + len(self.boundary)
+        return self._emit(self.parser(self.text[:self._parsed_upto]))
+
+    def close(self) -> list[TextBlock]:
+        return self._emit(self.parser(self.text))
+
+    def _emit(self, blocks: list[TextBlock]) -> list[TextBlock]:
+        new = blocks[self._emitted:]
+        self._emitted = len(blocks)
+        return new
+
+
+def get_stream_parser(model: str) -> StreamParser:
+    """A fresh StreamParser for `model`'s output format."""
+    parser, boundary = _lookup(model)
+    return StreamParser(parser, boundary)
 
 
 # --- Built-in registrations ----------------------------------------------
@@ -136,7 +188,7 @@ def get_format_parser(model: str) -> FormatParser:
 # ('label [bbox]content'). So:
 #   - 'baidu/Unlimited-OCR'        (no tag)  → _parse_deepseek (grounding)
 #   - 'frob/unlimited-ocr:q8_0'    (has tag) → _parse_unlimited (community GGUF)
-register_format("deepseek*", _parse_deepseek)
-register_format("*unlimited-ocr", _parse_deepseek)   # official, no :tag
+register_format("deepseek*", _parse_deepseek, boundary="<|/det|>")
+register_format("*unlimited-ocr", _parse_deepseek, boundary="<|/det|>")   # official, no :tag
 register_format("*unlimited-ocr:*", _parse_unlimited)  # community GGUF with :tag
 # Plain-text fallback is the default for everything else (Qwen3-VL, GLM-4.5V, ...)
@@ -23,16 +23,43 @@ class Parser(ABC):
 
     #: Stable id used in registry (matches DocType.type_id)
     name: str = ""
+    #: Bump when parse output changes for the same input — part of the
+    #: OCR cache key (core/ocr_cache.py), so stale results get re-parsed.
+    version: str = "1"
+    #: Fields that must be filled before a streaming OCR call may stop
+    #: early (VLLMOCRBackend with VLLM_OCR_STREAM). ParsedInvoice
+    #: attribute names; "travel_info.车次" reaches into a dict field.
+    #: Empty = never stop early.
+    required_fields: tuple[str, ...] = ()
+    #: Completion-token budget for one VLM OCR response of this type.
+    max_output_tokens: int = 4096
 
     @abstractmethod
-    def parse(self, blocks: list[TextBlock], file_path: str = "") -> ParsedInvoice:
+    def parse(self, blocks: list[TextBlock], file_path: str = "", doc=None,
+              layout=None) -> ParsedInvoice:
         """Parse blocks → ParsedInvoice.
 
-        `file_path` is provided in case the parser needs to do
+        `file_path` / `doc` are provided in case the parser needs to do
         PDF-level inspection (e.g. to detect multi-page structures).
-        Most parsers don't need it.
+        `doc` is the ingest's shared PdfDocument (None for images) — use
+        it instead of reopening the file. Most parsers need neither.
+        `layout` is the Layout (local/layout.py) of `blocks` when the
+        caller already built one; build it from `blocks` otherwise.
         """
 
+    def is_complete(self, parsed: ParsedInvoice) -> bool:
+        """True once every ``required_fields`` entry has a value."""
+        if not self.required_fields:
+            return False
+        for path in self.required_fields:
+            attr, _, key = path.partition(".")
+            value = getattr(parsed, attr, None)
+            if key:
+                value = value.get(key) if isinstance(value, dict) else None
+            if not value:
+                return False
+        return True
+
 
 # ---------------------------------------------------------------------------
 # Registry
@@ -33,6 +33,8 @@ import re
 from typing import Optional
 
 from ...base import ParsedInvoice, TextBlock
+from ..labels import LabelHits
+from ..layout import Layout
 from .base import Parser, register_parser
 
 logger = logging.getLogger(__name__)
@@ -44,6 +46,9 @@ _RE_INVOICE_NUMBER = re.compile(r"票据号码[:：]\s*(\d+)")
 _RE_TAX_ID = re.compile(r"交款人统一社会信用代码[:：]\s*([\d\*]+)")
 _RE_CHECK_CODE = re.compile(r"校验码[:：]\s*([A-Za-z0-9]+)")
 _RE_PAYER_NAME_DATE = re.compile(r"交款人[:：]\s*(\S+?)\s*开票日期[:：]\s*(.+)")
+_RE_PAYER_NAME = re.compile(r"交款人[:：]\s*(\S+)")
+_RE_SELLER = re.compile(r"收款单位\s*[（(]章[）)]\s*[:：]?\s*([\u4e00-\u9fff·（）()]+)")
+_RE_DATE_LABEL = re.compile(r"开票日期[:：]\s*(\d{4}[年-]\d{1,2}[月-]\d{1,2}日?)")
 
 # Parentheses can be full-width （） or half-width () depending on OCR
 _P = r"[（(]"   # open paren (either width)
@@ -69,27 +74,15 @@ _MED_LABELS = [
 ]
 
 
-def _med_field(text: str, label: str) -> str:
+def _med_field(labels: LabelHits, label: str) -> str:
     """Extract the value for `label` from a dense medical-info block.
 
     The value runs from after `label:` until the next known label (or
     end of line/block). This handles lines like
-    '医疗机构类型：综合医院医保类型：普通' correctly.
+    '医疗机构类型：综合医院医保类型：普通' correctly. `labels` is the
+    text's label scan, so finding the next label is a lookup.
     """
-    import re as _re
-    start = text.find(label)
-    if start < 0:
-        return ""
-    rest = text[start + len(label):]
-    rest = _re.sub(r"^\s*[:：]?\s*", "", rest)
-    # Find the earliest next label OR end of line
-    stops = [rest.find(nl) for nl in _MED_LABELS if nl != label and rest.find(nl) >= 0]
-    stops = [s for s in stops if s >= 0]
-    newline_pos = rest.find("\n")
-    if newline_pos >= 0:
-        stops.append(newline_pos)
-    if stops:
-        rest = rest[:min(stops)]
+    rest = labels.value(label, _MED_LABELS)
     # Clean whitespace/newlines and stray box chars (他/信/息 are the
     # vertical-text padding characters on some receipts)
     rest = rest.replace("他", "").replace("信", "").replace("息", "").strip()
@@ -117,39 +110,45 @@ _RE_AMOUNT = re.compile(r"([\d,]+\.\d{2})")
 
 class MedicalParser(Parser):
     name = "medical"
+    required_fields = ("invoice_number", "invoice_date", "seller_name", "amount_in_figures")
+    max_output_tokens = 4096
 
-    def parse(self, blocks: list[TextBlock], file_path: str = "") -> ParsedInvoice:
+    def parse(self, blocks: list[TextBlock], file_path: str = "", doc=None,
+              layout: Optional[Layout] = None) -> ParsedInvoice:
         parsed = ParsedInvoice(
             source="local:medical",  # rewritten by backend on return
             invoice_type="中央医疗收费票据",
         )
 
-        # Reconstruct text from blocks for regex matching. Block-level
-        # scanning catches field labels that span across word boundaries.
-        text = self._blocks_to_text(blocks)
+        # Reading-order text for regex matching (lines clustered per page,
+        # so rows at the same Y on different pages never merge). Line-level
+        # matching catches field labels that span across word boundaries.
+        # Patterns are only tried where their label occurs (layout.labels).
+        layout = layout or Layout(blocks)
+        labels = layout.labels
 
         # Top-level identifiers
-        for attr, regex in [
-            ("invoice_code", _RE_INVOICE_CODE),
-            ("invoice_number", _RE_INVOICE_NUMBER),
-            ("buyer_tax_id", _RE_TAX_ID),
-            ("check_code", _RE_CHECK_CODE),
+        for attr, regex, label in [
+            ("invoice_code", _RE_INVOICE_CODE, "票据代码"),
+            ("invoice_number", _RE_INVOICE_NUMBER, "票据号码"),
+            ("buyer_tax_id", _RE_TAX_ID, "交款人统一社会信用代码"),
+            ("check_code", _RE_CHECK_CODE, "校验码"),
         ]:
             if not getattr(parsed, attr):
-                m = regex.search(text)
+                m = labels.search(regex, label)
                 if m:
                     setattr(parsed, attr, m.group(1).strip())
 
         # Payer name + date (may be on separate lines if PDF word-breaks)
         if not parsed.buyer_name:
-            m = _RE_PAYER_NAME_DATE.search(text)
+            m = labels.search(_RE_PAYER_NAME_DATE, "交款人")
             if m:
                 parsed.buyer_name = m.group(1).strip()
                 parsed.invoice_date_raw = m.group(2).strip()
         # Standalone buyer_name fallback (Qwen/clean OCR output puts
         # 交款人 and 开票日期 on separate lines).
         if not parsed.buyer_name:
-            m = re.search(r"交款人[:：]\s*(\S+)", text)
+            m = labels.search(_RE_PAYER_NAME, "交款人")
             if m:
                 parsed.buyer_name = m.group(1).strip()
         # Seller = the hospital. Two label variants:
@@ -157,28 +156,23 @@ class MedicalParser(Parser):
         #   ...某医院                       (Qwen/clean OCR, bare name
         #   near the 医保交易流水号 footer)
         if not parsed.seller_name:
-            m = re.search(
-                r"收款单位\s*[（(]章[）)]\s*[:：]?\s*([\u4e00-\u9fff·（）()]+)",
-                text,
-            )
+            m = labels.search(_RE_SELLER, "收款单位")
             if m:
                 parsed.seller_name = m.group(1).strip()
         if not parsed.invoice_date_raw:
             # Try standalone date
-            m_date = re.search(
-                r"开票日期[:：]\s*(\d{4}[年-]\d{1,2}[月-]\d{1,2}日?)", text
-            )
+            m_date = labels.search(_RE_DATE_LABEL, "开票日期")
             if m_date:
                 parsed.invoice_date_raw = m_date.group(1).strip()
 
         # Total amount — try same-line first, then split-line variant
         if not parsed.amount_in_figures:
-            m = _RE_TOTAL_LINE.search(text)
+            m = labels.search(_RE_TOTAL_LINE, "金额合计")
             if m:
                 parsed.amount_in_words = m.group(1).strip()
                 parsed.amount_in_figures = self._format_amount(m.group(2))
             else:
-                m = _RE_TOTAL_LINE_SPLIT.search(text)
+                m = labels.search(_RE_TOTAL_LINE_SPLIT, "金额合计")
                 if m:
                     parsed.amount_in_words = m.group(1).strip()
                     parsed.amount_in_figures = self._format_amount(m.group(2))
@@ -198,12 +192,12 @@ class MedicalParser(Parser):
             ("个人自费", "个人自费"),
         ]:
             if label not in med:
-                val = _med_field(text, label)
+                val = _med_field(labels, label)
                 if val:
                     med[target] = val
 
         # Items — best-effort extraction from blocks between header and 合计
-        parsed.items = self._extract_items(blocks)
+        parsed.items = self._extract_items(layout)
 
         # Post-processing (date normalization)
         parsed.invoice_date = self._normalize_date(parsed.invoice_date_raw)
@@ -215,53 +209,7 @@ class MedicalParser(Parser):
     # ------------------------------------------------------------------
 
     @staticmethod
-    def _blocks_to_text(blocks: list[TextBlock]) -> str:
-        """Reconstruct text from blocks, preserving Y-position grouping.
-
-        Uses proper Y-clustering (not integer binning) so blocks whose
-        Y values straddle a bin boundary stay on the same line.
-        Blocks are clustered WITHIN each page — never across pages,
-        otherwise rows at the same Y on different pages merge.
-        """
-        if not blocks:
-            return ""
-        # Group by page first, then cluster by Y within each page
-        pages: dict[int, list] = {}
-        for b in blocks:
-            pages.setdefault(b.page, []).append(b)
-
-        out_lines = []
-        for page_idx in sorted(pages.keys()):
-            page_blocks = pages[page_idx]
-            sorted_blocks = sorted(page_blocks, key=lambda b: (b.bbox[1], b.bbox[0]))
-            bins: list[list] = []
-            cur_line: list = []
-            cur_y: Optional[float] = None
-            for b in sorted_blocks:
-                if cur_y is None or abs(b.bbox[1] - cur_y) <= 4.0:
-                    cur_line.append(b)
-                    cur_y = b.bbox[1] if cur_y is None else cur_y
-                else:
-                    if cur_line:
-                        bins.append(sorted(cur_line, key=lambda x: x.bbox[0]))
-                    cur_line = [b]
-                    cur_y = b.bbox[1]
-            if cur_line:
-                bins.append(sorted(cur_line, key=lambda x: x.bbox[0]))
-
-            for ws in bins:
-                parts = []
-                prev_x1 = None
-                for i, w in enumerate(ws):
-                    if i > 0 and prev_x1 is not None and w.bbox[0] - prev_x1 > 30:
-                        parts.append(" ")
-                    parts.append(w.text)
-                    prev_x1 = w.bbox[2]
-                out_lines.append("".join(parts))
-        return "\n".join(out_lines)
-
-    @staticmethod
-    def _extract_items(blocks: list[TextBlock]) -> list[dict]:
+    def _extract_items(layout: Layout) -> list[dict]:
         """Extract line items from the receipt table.
 
         Strategy:
@@ -273,6 +221,7 @@ class MedicalParser(Parser):
         This is best-effort — multi-column items may merge. Post-processing
         cross-validation helps catch OCR errors.
         """
+        blocks = layout.blocks
         # Find start (header has 项目名称) and end (金额合计 total row).
         # The full-width DETAIL table has a 数量/单位 header (quantity
         # column). Page 0 may contain a narrower 3-column SUMMARY table
@@ -281,9 +230,11 @@ class MedicalParser(Parser):
         start_idx = None
         end_idx = None
         header_y = None
-        for i, b in enumerate(blocks):
+        header_anchor = None
+        for b in blocks:
             if b.text == "数量/单位":
                 # This header only exists in the full-width detail table.
+                header_anchor = b
                 header_y = b.bbox[1]
                 break
         for i, b in enumerate(blocks):
@@ -311,30 +262,24 @@ class MedicalParser(Parser):
 
         # Group by (page, y-bin): the same Y on different pages must NOT
         # merge (multi-page receipts repeat the table layout per page).
-        lines: dict[tuple[int, int], list] = {}
-        for b in item_blocks:
-            y = int(b.bbox[1] / 4.0)
-            lines.setdefault((b.page, y), []).append(b)
+        lines = [
+            (key, [b for b in ws if start_idx < layout.position(b) < end_idx])
+            for key, ws in layout.index.rows()
+        ]
 
         # Detect column split from the DETAIL table's own header row only.
         # (The page-0 3-column SUMMARY table has its own headers that
         # would pollute the X analysis — exclude it by anchoring on the
         # header row that contains 数量/单位.)
         mid_x = None
-        if header_y is not None:
-            # Restrict to the SAME page as header_y — multi-page receipts
+        if header_anchor is not None:
+            # Restrict to the SAME page as the header — multi-page receipts
             # repeat the header row on each page and cross-page blocks
-            # would inflate the count and produce a bogus mid_x.
-            header_page = None
-            for b in blocks:
-                if b.text == "数量/单位" and abs(b.bbox[1] - header_y) <= 4.0:
-                    header_page = b.page
-                    break
+            # would inflate the count and produce a bogus mid_x. The
+            # index only answers within one page.
             header_blocks = [
-                b for b in blocks
+                b for b in [header_anchor] + layout.index.row(header_anchor, 4.0)
                 if b.text in ("项目名称", "数量/单位", "金额（元）", "备注")
-                and abs(b.bbox[1] - header_y) <= 4.0
-                and (header_page is None or b.page == header_page)
             ]
             if len(header_blocks) >= 8:
                 hxs = sorted(b.bbox[0] for b in header_blocks)
@@ -356,8 +301,7 @@ class MedicalParser(Parser):
             return groups
 
         items = []
-        for key in sorted(lines.keys()):
-            ws = sorted(lines[key], key=lambda b: b.bbox[0])
+        for _, ws in lines:
             for _, group in _split_row(ws):
                 text = "".join(w.text for w in group)
                 # Skip total rows: 合计 / 金额合计 (the detail-table total
@@ -27,6 +27,8 @@ import re
 from typing import Optional
 
 from ...base import ParsedInvoice, TextBlock
+from ..labels import FIELD_SCANNER
+from ..layout import Layout
 from .base import Parser, register_parser
 
 logger = logging.getLogger(__name__)
@@ -57,28 +59,45 @@ _RE_BUYER = re.compile(r"购买方名称[:：]\s*([^\s]+)")
 _RE_TAX_ID = re.compile(r"统一社会信用代码[:：]\s*(\d{18}|[A-Z0-9]{18})")
 
 
+def _find_block(blocks: list[TextBlock], needle: str) -> Optional[TextBlock]:
+    """First block whose normalized text contains `needle`."""
+    for b in blocks:
+        if needle in _norm(b.text):
+            return b
+    return None
+
+
 class TrainParser(Parser):
     name = "train"
-
-    def parse(self, blocks: list[TextBlock], file_path: str = "") -> ParsedInvoice:
+    required_fields = (
+        "invoice_number", "invoice_date", "buyer_name", "amount_in_figures",
+        "travel_info.车次", "travel_info.出发站", "travel_info.到达站",
+    )
+    max_output_tokens = 1536
+
+    def parse(self, blocks: list[TextBlock], file_path: str = "", doc=None,
+              layout: Optional[Layout] = None) -> ParsedInvoice:
         parsed = ParsedInvoice(
             source="local:train",
             invoice_type="铁路电子客票",
         )
 
-        # Reconstruct text (same Y-clustering as other parsers)
-        text = self._blocks_to_text(blocks)
+        # Reading-order text (shared Layout, same Y-clustering as other parsers)
+        layout = layout or Layout(blocks)
+        text = layout.text
 
-        # Normalize full-width → half-width for digit fields
+        # Normalize full-width → half-width for digit fields. _norm drops
+        # spaces, so the normalized text gets its own label scan.
         norm_text = _norm(text)
+        norm_labels = FIELD_SCANNER.scan(norm_text)
 
         # 发票号码
-        m = _RE_INVOICE_NUMBER.search(norm_text)
+        m = norm_labels.search(_RE_INVOICE_NUMBER, "发票号码")
         if m:
             parsed.invoice_number = m.group(1)
 
         # 开票日期
-        m = _RE_DATE.search(norm_text)
+        m = norm_labels.search(_RE_DATE, "开票日期")
         if m:
             parsed.invoice_date_raw = f"{m.group(1)}年{m.group(2)}月{m.group(3)}日"
             parsed.invoice_date = f"{m.group(1)}-{int(m.group(2)):02d}-{int(m.group(3)):02d}"
@@ -87,25 +106,27 @@ class TrainParser(Parser):
         m = _RE_PRICE.search(norm_text)
         if m:
             parsed.amount_in_figures = f"¥{m.group(1) or m.group(2)}"
+        index = layout.index
+
         # 出发/到达站 + 车次 — 站名之间夹着车次 (e.g. "婺源 G9871 厦门")
-        # 找包含车次的那一行，取车次前后的中文为出发站/到达站
+        # 找车次所在的块，取同一行车次左右两侧的中文为出发站/到达站
         m = re.search(r"[GDCZK]\d{1,4}", norm_text)
         if m:
             parsed.travel_info["车次"] = m.group(0)
-            # 在原始文本中定位车次所在行
             train_no = m.group(0)
-            for line in text.split("\n"):
-                if train_no in line:
-                    # 车次前的中文 = 出发站，车次后的中文 = 到达站
-                    parts = line.split(train_no)
-                    if len(parts) == 2:
-                        dep = re.search(r"([\u4e00-\u9fff]{2,4})", parts[0])
-                        arr = re.search(r"([\u4e00-\u9fff]{2,4})", parts[1])
-                        if dep:
-                            parsed.travel_info["出发站"] = dep.group(1)
-                        if arr:
-                            parsed.travel_info["到达站"] = arr.group(1)
-                    break
+            anchor = _find_block(blocks, train_no)
+            if anchor is not None:
+                row = sorted(index.row(anchor, 4.0), key=lambda b: b.bbox[0])
+                before = "".join(b.text for b in row if b.bbox[0] < anchor.bbox[0])
+                after = "".join(b.text for b in row if b.bbox[0] >= anchor.bbox[0])
+                parts = _norm(anchor.text).split(train_no, 1)
+                before, after = before + parts[0], parts[-1] + after
+                dep = re.search(r"([\u4e00-\u9fff]{2,4})", before)
+                arr = re.search(r"([\u4e00-\u9fff]{2,4})", after)
+                if dep:
+                    parsed.travel_info["出发站"] = dep.group(1)
+                if arr:
+                    parsed.travel_info["到达站"] = arr.group(1)
 
         # 出发时间 (date + HH:MM开)
         m = _RE_DEPART.search(norm_text)
@@ -124,43 +145,42 @@ class TrainParser(Parser):
             parsed.travel_info["席别"] = m.group(1)
 
         # 电子客票号
-        m = _RE_TICKET_NO.search(norm_text)
+        m = norm_labels.search(_RE_TICKET_NO, "电子客票号")
         if m:
             parsed.travel_info["电子客票号"] = m.group(1)
 
-        # 姓名 + 身份证号 — OCR may emit them on the same line
-        # (0436910661****3385 张乘客) or on separate adjacent lines.
-        lines = text.split("\n")
-        for i, line in enumerate(lines):
-            norm_line = _norm(line)
-            id_match = _RE_ID.search(norm_line)
-            if id_match:
-                parsed.buyer_tax_id = id_match.group(1)
-                # Name after the ID on the same line
-                after = norm_line[id_match.end():]
-                name_match = re.search(r"([\u4e00-\u9fff]{2,4})", after)
-                if not name_match:
-                    # Name on an adjacent line (before or after)
-                    for j in (i - 1, i + 1):
-                        if 0 <= j < len(lines):
-                            nm = re.search(
-                                r"([\u4e00-\u9fff]{2,4})", lines[j]
-                            )
-                            if nm:
-                                name_match = nm
-                                break
-                if name_match:
-                    parsed.buyer_name = name_match.group(1)
-                    parsed.travel_info["乘车人"] = name_match.group(1)
-                break
+        # 姓名 + 身份证号 — OCR may emit them on the same row
+        # (0436910661****3385 张乘客) or on separate adjacent rows.
+        for b in blocks:
+            norm_block = _norm(b.text)
+            id_match = _RE_ID.search(norm_block)
+            if not id_match:
+                continue
+            parsed.buyer_tax_id = id_match.group(1)
+            # Name after the ID in the same block, else to its right on the row
+            after = norm_block[id_match.end():] + "".join(
+                nb.text for nb in sorted(index.right_of(b, 4.0), key=lambda nb: nb.bbox[0])
+            )
+            name_match = re.search(r"([\u4e00-\u9fff]{2,4})", after)
+            if not name_match:
+                # Name on an adjacent row (above, then below)
+                for nb in (index.above(b, min_dy=4.0), index.below(b, min_dy=4.0)):
+                    nm = re.search(r"([\u4e00-\u9fff]{2,4})", nb.text) if nb else None
+                    if nm:
+                        name_match = nm
+                        break
+            if name_match:
+                parsed.buyer_name = name_match.group(1)
+                parsed.travel_info["乘车人"] = name_match.group(1)
+            break
 
         # 购买方 (company 抬头) + 信用代码 — the entity the ticket is
         # issued to (e.g. 某某通信有限公司北京市分公司). The
         # PASSENGER (张乘客) is the traveler, not the buyer.
-        m = _RE_BUYER.search(text)
+        m = layout.labels.search(_RE_BUYER, "购买方名称")
         if m:
             parsed.buyer_name = m.group(1)
-        m = _RE_TAX_ID.search(text)
+        m = layout.labels.search(_RE_TAX_ID, "统一社会信用代码")
         if m:
             parsed.buyer_tax_id = m.group(1)
 
@@ -173,42 +193,6 @@ class TrainParser(Parser):
     # Helpers
     # ------------------------------------------------------------------
 
-    @staticmethod
-    def _blocks_to_text(blocks: list[TextBlock]) -> str:
-        if not blocks:
-            return ""
-        pages: dict[int, list] = {}
-        for b in blocks:
-            pages.setdefault(b.page, []).append(b)
-        out_lines = []
-        for page_idx in sorted(pages.keys()):
-            page_blocks = pages[page_idx]
-            sorted_blocks = sorted(page_blocks, key=lambda b: (b.bbox[1], b.bbox[0]))
-            bins: list[list] = []
-            cur_line: list = []
-            cur_y = None
-            for b in sorted_blocks:
-                if cur_y is None or abs(b.bbox[1] - cur_y) <= 4.0:
-                    cur_line.append(b)
-                    cur_y = b.bbox[1] if cur_y is None else cur_y
-                else:
-                    if cur_line:
-                        bins.append(sorted(cur_line, key=lambda x: x.bbox[0]))
-                    cur_line = [b]
-                    cur_y = b.bbox[1]
-            if cur_line:
-                bins.append(sorted(cur_line, key=lambda x: x.bbox[0]))
-            for ws in bins:
-                parts = []
-                prev_x1 = None
-                for i, w in enumerate(ws):
-                    if i > 0 and prev_x1 is not None and w.bbox[0] - prev_x1 > 30:
-                        parts.append(" ")
-                    parts.append(w.text)
-                    prev_x1 = w.bbox[2]
-                out_lines.append("".join(parts))
-        return "\n".join(out_lines)
-
 
 # Register on import
 register_parser(TrainParser())
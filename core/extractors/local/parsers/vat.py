@@ -19,6 +19,7 @@ import re
 from typing import Optional
 
 from ...base import ParsedInvoice, TextBlock
+from ..layout import Layout
 from .base import Parser, register_parser
 
 logger = logging.getLogger(__name__)
@@ -54,48 +55,72 @@ _RE_AMOUNT = re.compile(r"(-?[\d,]+\.\d{2})")
 _NAME_VALUE_MAX_X_DIST = 200.0
 
 
+def _is_name_value(block: TextBlock) -> bool:
+    """False for blocks that can't be a party name (labels, 称 partner, ...)."""
+    t = block.text.strip()
+    if not t:
+        return False
+    if t.startswith("统一") or t.startswith("名称"):
+        return False
+    if "方" in block.text and len(block.text) <= 2:
+        return False
+    if t in ("名", "称"):
+        return False
+    if t.startswith("称") and len(t) <= 3:
+        return False  # skip 称/:名-partner block
+    return True
+
+
 class VatParser(Parser):
     name = "vat"
-
-    def parse(self, blocks: list[TextBlock], file_path: str = "") -> ParsedInvoice:
+    required_fields = (
+        "invoice_number", "invoice_date", "buyer_name",
+        "seller_name", "seller_tax_id", "amount_in_figures",
+    )
+    max_output_tokens = 6144
+
+    def parse(self, blocks: list[TextBlock], file_path: str = "", doc=None,
+              layout: Optional[Layout] = None) -> ParsedInvoice:
         parsed = ParsedInvoice(
             source="local:vat",
             invoice_type="增值税电子普通发票",
         )
 
-        # Reconstruct text + bbox-grouped blocks for parsing
-        text = self._blocks_to_text(blocks)
+        # Lines + reading-order text, shared with the backend's other stages.
+        # Label-anchored patterns are only tried where the label occurs.
+        layout = layout or Layout(blocks)
+        labels = layout.labels
 
         # Title detection
-        if _RE_TITLE.search(text):
+        if labels.search(_RE_TITLE, "电子发票"):
             parsed.invoice_type = "增值税电子普通发票"
 
         # Invoice number — search for label + digit
         if not parsed.invoice_number:
-            m = _RE_INVOICE_NUMBER.search(text)
+            m = labels.search(_RE_INVOICE_NUMBER, "发票号码")
             if m:
                 parsed.invoice_number = m.group(1)
 
         # Invoice code (traditional 普票 has 发票代码; 数电发票 doesn't)
         if not parsed.invoice_code:
-            m = _RE_INVOICE_CODE.search(text)
+            m = labels.search(_RE_INVOICE_CODE, "发票代码")
             if m:
                 parsed.invoice_code = m.group(1)
 
         # Check code + machine number (traditional layout)
         if not parsed.check_code:
-            m = _RE_CHECK_CODE.search(text)
+            m = labels.search(_RE_CHECK_CODE, "校验码")
             if m:
                 # Old-style check codes have spaces: "58136 09516 34677 86085"
                 parsed.check_code = m.group(1).replace(" ", "").strip()
         if not parsed.machine_number:
-            m = _RE_MACHINE_NUMBER.search(text)
+            m = labels.search(_RE_MACHINE_NUMBER, "机器编号")
             if m:
                 parsed.machine_number = m.group(1)
 
         # Date
         if not parsed.invoice_date_raw:
-            m = _RE_INVOICE_DATE.search(text)
+            m = labels.search(_RE_INVOICE_DATE, "开票日期")
             if m:
                 # Handle "2023 年 11 月15日" (old layout spaces)
                 parsed.invoice_date_raw = (
@@ -104,23 +129,23 @@ class VatParser(Parser):
         parsed.invoice_date = self._normalize_date(parsed.invoice_date_raw)
 
         # Parties (buyer on left, seller on right at top of invoice)
-        self._extract_parties(blocks, parsed)
+        self._extract_parties(layout, parsed)
 
         # Total amount
         if not parsed.amount_in_figures:
-            m = _RE_TOTAL.search(text)
+            m = labels.search(_RE_TOTAL, "价税合计")
             if m:
                 parsed.amount_in_words = m.group(1).strip()
                 parsed.amount_in_figures = self._format_amount(m.group(2))
 
         # Issuer
         if not parsed.issuer:
-            m = _RE_ISSUER.search(text)
+            m = labels.search(_RE_ISSUER, "开票人")
             if m:
                 parsed.issuer = m.group(1)
 
         # Items (best-effort)
-        parsed.items = self._extract_items(blocks)
+        parsed.items = self._extract_items(layout)
 
         return parsed
 
@@ -129,14 +154,19 @@ class VatParser(Parser):
     # ------------------------------------------------------------------
 
     @staticmethod
-    def _extract_parties(blocks: list[TextBlock], parsed: ParsedInvoice) -> None:
+    def _extract_parties(layout: Layout, parsed: ParsedInvoice) -> None:
         """Extract buyer/seller names + tax IDs.
 
         Three VAT layout shapes are handled:
           1. Merged: '名称：中国联合网络通信有限公司北京市分公司' (whole text in one block)
           2. Old-style: '名' + '称:'  label pairs (split blocks, colon in 称)
           3. Number-of-purchases: '名' + '称'  (split blocks, NO colon — JD)
+
+        Neighbour lookups go through the layout's BlockIndex
+        (spatial.py), so each label only looks at the blocks on its row.
         """
+        blocks = layout.blocks
+        index = layout.index
         # Names: blocks containing 名称 label (forms the merged case)
         name_blocks = []  # list of (block, value_or_empty)
         for b in blocks:
@@ -154,19 +184,15 @@ class VatParser(Parser):
         # block to the right. We accept both with-colon (e.g. 出行 old-style) and
         # no-colon (JD 数电发票 space-split) variants.
         if not name_blocks:
-            for i, b in enumerate(blocks):
+            for b in blocks:
                 if b.text.strip() != "名":
                     continue
                 # Find 称 nearby (same row). Accept either form (with or without colon).
-                for nb in blocks:
-                    if nb is b or not nb.text.strip().startswith("称"):
-                        continue
-                    if abs(nb.bbox[1] - b.bbox[1]) <= 5.0:
-                        # Use the 名 block as the label anchor (it's the
-                        # visually canonical label). The value is in a block
-                        # to the right of 称, at a similar Y.
-                        name_blocks.append((b, ""))
-                        break
+                if any(nb.text.strip().startswith("称") for nb in index.row(b, 5.0)):
+                    # Use the 名 block as the label anchor (it's the
+                    # visually canonical label). The value is in a block
+                    # to the right of 称, at a similar Y.
+                    name_blocks.append((b, ""))
 
         # Sort by X — leftmost = buyer, rightmost = seller.
         # If only one label block (e.g. JD has no buyer name), sort by page
@@ -198,44 +224,20 @@ class VatParser(Parser):
                 continue
             best = None
             best_dist = 999
-            for nb in blocks:
-                if nb is b or not nb.text.strip():
-                    continue
-                if nb.text.strip().startswith("统一"):
+            for nb in index.right_of(b, 8.0, max_dx=_NAME_VALUE_MAX_X_DIST):
+                if not _is_name_value(nb):
                     continue
-                if nb.text.strip().startswith("名称"):
-                    continue
-                if "方" in nb.text and len(nb.text) <= 2:
-                    continue
-                if nb.text.strip() in ("名", "称"):
-                    continue
-                if nb.text.strip().startswith("称") and len(nb.text.strip()) <= 3:
-                    continue  # skip 称/:名-partner block
                 dy = abs(nb.bbox[1] - b.bbox[1])
-                dx = nb.bbox[0] - b.bbox[0]
-                if dy <= 8.0 and 0 < dx <= _NAME_VALUE_MAX_X_DIST:
-                    if dy < best_dist:
-                        best = nb
-                        best_dist = dy
+                if dy < best_dist:
+                    best = nb
+                    best_dist = dy
             if best is None:
                 # Fallback: relax Y to 10pt, still X-capped
-                for nb in blocks:
-                    if nb is b or not nb.text.strip():
-                        continue
-                    if nb.text.strip().startswith("统一"):
-                        continue
-                    if nb.text.strip().startswith("名称"):
-                        continue
-                    if "方" in nb.text and len(nb.text) <= 2:
-                        continue
-                    if nb.text.strip() in ("名", "称"):
-                        continue
-                    if nb.text.strip().startswith("称") and len(nb.text.strip()) <= 3:
-                        continue
-                    dx = nb.bbox[0] - b.bbox[0]
-                    if 0 < dx <= _NAME_VALUE_MAX_X_DIST and abs(nb.bbox[1] - b.bbox[1]) <= 10.0:
-                        best = nb
-                        break
+                best = next(
+                    (nb for nb in index.right_of(b, 10.0, max_dx=_NAME_VALUE_MAX_X_DIST)
+                     if _is_name_value(nb)),
+                    None,
+                )
             if best is None:
                 continue
             val = best.text.strip()
@@ -272,12 +274,8 @@ class VatParser(Parser):
                 tax_pairs.append((b.bbox[0], m.group(1)))
             # 2. Value on a nearby block at similar Y
             if not m or not m.group(1):
-                for nb in blocks:
-                    if nb is b or not nb.text.strip():
-                        continue
-                    if abs(nb.bbox[1] - b.bbox[1]) > 4.0:
-                        continue
-                    if nb.bbox[0] < b.bbox[0]:
+                for nb in index.right_of(b, 4.0, inclusive=True):
+                    if not nb.text.strip():
                         continue
                     vm = re.match(r"^\s*([0-9A-Z\*]{15,20})\s*$", nb.text)
                     if vm:
@@ -311,7 +309,7 @@ class VatParser(Parser):
     # ------------------------------------------------------------------
 
     @staticmethod
-    def _extract_items(blocks: list[TextBlock]) -> list[dict]:
+    def _extract_items(layout: Layout) -> list[dict]:
         """Extract line items from the item table.
 
         A VAT item row is: 名称 ... 金额 税率% 税额.
@@ -320,14 +318,8 @@ class VatParser(Parser):
           - amount:   decimal just LEFT of the % word
           - tax:      first decimal RIGHT of the % word
         """
-        lines: dict[int, list] = {}
-        for b in blocks:
-            y = int(b.bbox[1] / 4.0)
-            lines.setdefault(y, []).append(b)
-
         items = []
-        for y in sorted(lines.keys()):
-            ws = sorted(lines[y], key=lambda b: b.bbox[0])
+        for _, ws in layout.index.rows():
             text = "".join(w.text for w in ws)
             if "项目名称" in text and "金额" in text:
                 continue
@@ -377,38 +369,6 @@ class VatParser(Parser):
     # Helpers
     # ------------------------------------------------------------------
 
-    @staticmethod
-    def _blocks_to_text(blocks: list[TextBlock]) -> str:
-        if not blocks:
-            return ""
-        sorted_blocks = sorted(blocks, key=lambda b: (b.bbox[1], b.bbox[0]))
-        bins: list[list] = []
-        cur_line: list = []
-        cur_y = None
-        for b in sorted_blocks:
-            if cur_y is None or abs(b.bbox[1] - cur_y) <= 4.0:
-                cur_line.append(b)
-                cur_y = b.bbox[1] if cur_y is None else cur_y
-            else:
-                if cur_line:
-                    bins.append(sorted(cur_line, key=lambda x: x.bbox[0]))
-                cur_line = [b]
-                cur_y = b.bbox[1]
-        if cur_line:
-            bins.append(sorted(cur_line, key=lambda x: x.bbox[0]))
-
-        out_lines = []
-        for ws in bins:
-            parts = []
-            prev_x1 = None
-            for i, w in enumerate(ws):
-                if i > 0 and prev_x1 is not None and w.bbox[0] - prev_x1 > 30:
-                    parts.append(" ")
-                parts.append(w.text)
-                prev_x1 = w.bbox[2]
-            out_lines.append("".join(parts))
-        return "\n".join(out_lines)
-
     @staticmethod
     def _normalize_date(raw: str) -> str:
         if not raw:
@@ -44,11 +44,17 @@ class LocalPdfBackend(LocalBackend):
         except ImportError:
             return False
 
-    def _call_ocr(self, file_path: str):
+    def _call_ocr(self, file_path: str, doc=None, doc_type: str = ""):
         """pdfplumber isn't OCR — extract text+bbox blocks directly."""
-        return pdf_to_blocks(file_path)
+        return pdf_to_blocks(file_path, doc=doc)
 
-    def _should_post_process(self, file_path: str) -> bool:
+    def _layout(self, blocks, doc=None):
+        # Blocks are the document's own words — reuse its memoized Layout.
+        if doc is not None and blocks is doc.blocks():
+            return doc.layout()
+        return super()._layout(blocks, doc)
+
+    def _should_post_process(self, file_path: str, doc=None) -> bool:
         # pdfplumber IS the ground truth; nothing to cross-validate.
         return False
 
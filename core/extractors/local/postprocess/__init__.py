@@ -7,10 +7,15 @@ discrepancies. This is the safety net for OCR hallucination.
 Currently implements:
   - pdf_text_verify:    per-field verification against pdfplumber text
 
+Steps run through run_pipeline() (pipeline.py): declared doc_types /
+text-layer needs / can_change() decide skips, each step gets a wall-clock
+budget, and its duration lands in ParsedInvoice.timings.
+
 Adding a new post-processor:
-  1. Subclass PostProcessor
-  2. Implement run(parsed, file_path) -> ParsedInvoice
+  1. Subclass PostProcessor; declare fields, doc_types, needs_text_layer, budget
+  2. Implement run(parsed, file_path, doc=None, layout=None, deadline=None) -> ParsedInvoice
   3. Add register_post_processor(YourPostProcessor()) at the bottom
 """
 from .base import PostProcessor, register_post_processor, get_post_processors  # noqa: F401
+from .pipeline import configure, run_pipeline  # noqa: F401
 from . import pdf_text_verify  # noqa: F401  -- registers the default post-processor
@@ -1,8 +1,16 @@
 """PostProcessor ABC + registry.
 
-Each post-processor takes a ParsedInvoice + the original file path,
+Each post-processor takes a ParsedInvoice + the original file path
+(and the ingest's shared PdfDocument, when there is one),
 runs a verification/correction step, and returns the (possibly updated)
-ParsedInvoice. Multiple post-processors can be chained.
+ParsedInvoice. Multiple post-processors are chained by run_pipeline()
+(pipeline.py), which reads each step's declarations:
+
+  - ``fields``            ParsedInvoice fields the step verifies/corrects
+  - ``doc_types``         doc_type ids it applies to (empty = all)
+  - ``needs_text_layer``  skipped for images and scanned PDFs
+  - ``budget``            wall-clock seconds; run() gets the deadline
+  - ``can_change()``      False when running could not change anything
 
 Why this lives under local/ and not at top level:
   - Cloud OCR backends (Tencent, Baidu) return structured data without
@@ -13,6 +21,7 @@ Why this lives under local/ and not at top level:
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
+from typing import Optional
 
 from ...base import ParsedInvoice
 
@@ -23,9 +32,62 @@ class PostProcessor(ABC):
     #: Human-readable name for logging
     name: str = ""
 
+    #: ParsedInvoice fields this step verifies/corrects.
+    fields: tuple[str, ...] = ()
+
+    #: doc_type ids this step applies to; empty = every type.
+    doc_types: tuple[str, ...] = ()
+
+    #: Skip when the file has no text layer (images, paper scans).
+    needs_text_layer: bool = False
+
+    #: Wall-clock budget in seconds (overridable via pipeline.configure()).
+    #: Steps are not interrupted: run() receives the deadline and should
+    #: stop starting new work past it; overruns are logged.
+    budget: float = 1.0
+
     @abstractmethod
-    def run(self, parsed: ParsedInvoice, file_path: str) -> ParsedInvoice:
-        """Verify/correct the parsed invoice. Return (possibly updated) parse."""
+    def run(self, parsed: ParsedInvoice, file_path: str, doc=None, layout=None,
+            deadline: Optional[float] = None) -> ParsedInvoice:
+        """Verify/correct the parsed invoice. Return (possibly updated) parse.
+
+        `doc` is the shared PdfDocument for `file_path` (may be None) —
+        read text from it rather than reopening the file. `layout` is
+        the Layout (local/layout.py) of the OCR blocks the parser saw.
+        `deadline` is a time.monotonic() value, or None for no limit.
+        """
+
+    def can_change(self, parsed: ParsedInvoice, file_path: str, doc=None) -> bool:
+        """False when running on `parsed` could not change anything.
+
+        Checked after the other declarations; `doc` is the shared
+        PdfDocument when there is one.
+        """
+        return True
+
+    def skip_reason(self, parsed: ParsedInvoice, file_path: str, doc_type: str = "",
+                    doc=None) -> Optional[str]:
+        """Why the pipeline should skip this step for `parsed`, or None."""
+        if self.doc_types and doc_type not in self.doc_types:
+            return f"doc_type {doc_type or '?'}"
+        if self.needs_text_layer:
+            if not file_path.lower().endswith(".pdf"):
+                return "no text layer"
+            if doc is None:
+                from ..document import PdfDocument
+                with PdfDocument(file_path) as own:
+                    return self._text_layer_skip(parsed, file_path, own)
+            return self._text_layer_skip(parsed, file_path, doc)
+        if not self.can_change(parsed, file_path, doc):
+            return "nothing to change"
+        return None
+
+    def _text_layer_skip(self, parsed: ParsedInvoice, file_path: str, doc) -> Optional[str]:
+        if not doc.has_text_layer:
+            return "no text layer"
+        if not self.can_change(parsed, file_path, doc):
+            return "nothing to change"
+        return None
 
 
 # ---------------------------------------------------------------------------
@@ -25,8 +25,12 @@ from __future__ import annotations
 
 import logging
 import re
+import time
+from functools import lru_cache
 
 from ...base import ParsedInvoice
+from ..fuzzy import FuzzyText
+from ..labels import FIELD_SCANNER, LabelHits
 from .base import PostProcessor, register_post_processor
 
 logger = logging.getLogger(__name__)
@@ -52,6 +56,18 @@ _LABEL_PATTERNS = {
     "seller_name": re.compile(r"名\s*称\s*[:：]?\s*(.+?)(?=\s+[销售]\s|$)", re.MULTILINE),
 }
 
+# Literal label each pattern starts with: the pattern is only tried where
+# FIELD_SCANNER found it. (Party names have no fixed label — "名 称" may
+# be space-split — and are matched over the whole text.)
+_LABEL_ANCHORS = {
+    "invoice_code": ("票据代码",),
+    "invoice_number": ("发票号码",),
+    "check_code": ("校验码",),
+    "buyer_tax_id": ("交款人统一社会信用代码",),
+    "invoice_date_raw": ("开票日期",),
+    "amount_in_figures": ("价税合计", "金额合计"),
+}
+
 # Fields we attempt to verify. Each maps to a label pattern (if known)
 # or a fallback edit-distance check.
 _VERIFY_FIELDS = [
@@ -66,67 +82,126 @@ _VERIFY_FIELDS = [
 ]
 
 
+# FIELD_SCANNER.scan, memoized on the text: can_change() and run() see
+# the same (memoized) text layer and share one scan.
+_scan_labels = lru_cache(maxsize=16)(FIELD_SCANNER.scan)
+
+
+def _applies(field: str, invoice_type: str) -> bool:
+    """Doc-type-aware guard: the VAT-style buyer/seller name pattern
+    (名称：<value>) only makes sense for VAT invoices.
+
+    For medical receipts, buyer_name comes from 交款人 (payer); for train
+    tickets, from the passenger ID line. Applying the VAT 名称： pattern
+    there grabs the wrong text (item table header, company name, etc.).
+      - buyer_name: only verify for VAT (交款人 is the payer)
+      - seller_name: verify for VAT AND medical (medical seller
+        = 收款单位（章）: hospital; pdfplumber reads the text layer even
+        when the stamp covers it in the rendered image, so it's MORE
+        reliable than OCR here)
+    """
+    if field == "buyer_name":
+        return "增值税" in invoice_type
+    if field == "seller_name":
+        return "增值税" in invoice_type or "医疗" in invoice_type
+    return True
+
+
 class PdfTextVerify(PostProcessor):
     """Cross-validate parsed fields against pdfplumber's lossless text."""
 
     name = "pdf_text_verify"
-
-    def run(self, parsed: ParsedInvoice, file_path: str) -> ParsedInvoice:
+    fields = tuple(_VERIFY_FIELDS)
+    needs_text_layer = True
+    # Label pass is milliseconds; the fuzzy fallback is what the budget caps.
+    budget = 2.0
+
+    def can_change(self, parsed: ParsedInvoice, file_path: str, doc=None) -> bool:
+        """False when every field already equals its label-anchored ground truth.
+
+        A field whose label is found in the text layer is settled when
+        the parsed value matches it; an empty field whose label is absent
+        stays empty (the fuzzy fallback needs a value to start from).
+        Anything else — a mismatch, or a value with no label to check it
+        against — needs run().
+        """
+        from ..document import PdfDocument
+        owned = doc is None
+        if owned:
+            doc = PdfDocument(file_path)
+        try:
+            full_text = doc.full_text
+        except Exception:
+            return True
+        finally:
+            if owned:
+                doc.close()
+        if not full_text.strip():
+            return False
+        labels = _scan_labels(full_text)
+        for field in self.fields:
+            if not _applies(field, parsed.invoice_type):
+                continue
+            value = getattr(parsed, field, "")
+            truth = self._extract_from_text(field, full_text, parsed.invoice_type, labels)
+            if truth is None:
+                if value:
+                    return True
+                continue
+            if _normalize_field(field, truth) != value:
+                return True
+        return False
+
+    def run(self, parsed: ParsedInvoice, file_path: str, doc=None, layout=None,
+            deadline: float | None = None) -> ParsedInvoice:
+        # Ground truth stays extract_text(): the patterns below rely on
+        # pdfplumber's own spacing, not on the Layout joined from words.
         try:
-            import pdfplumber
+            import pdfplumber  # noqa: F401
         except ImportError:
             logger.warning("pdfplumber not installed, skipping post-processing")
             return parsed
 
+        from ..document import PdfDocument
+        owned = doc is None
+        if owned:
+            doc = PdfDocument(file_path)
         try:
-            with pdfplumber.open(file_path) as pdf:
-                full_text = "\n".join(
-                    (p.extract_text() or "") for p in pdf.pages
-                )
+            # Page text is memoized on the shared document — page 1 was
+            # already extracted by the text-layer probe.
+            full_text = doc.full_text
         except Exception as e:
             logger.warning(f"PdfTextVerify: failed to extract text: {e}")
             return parsed
+        finally:
+            if owned:
+                doc.close()
 
         if not full_text.strip():
             return parsed
+        # One pass over the text finds every field label.
+        labels = _scan_labels(full_text)
+        fuzzy = FuzzyText(full_text)
 
-        for field in _VERIFY_FIELDS:
+        for field in self.fields:
             ocr_value = getattr(parsed, field, "")
-
-            # Doc-type-aware guard: the VAT-style buyer/seller name
-            # pattern (名称：<value>) only makes sense for VAT invoices.
-            # For medical receipts, buyer_name comes from 交款人 (payer);
-            # for train tickets, from the passenger ID line. Applying the
-            # VAT 名称： pattern there grabs the wrong text (item table
-            # header, company name, etc.).
-            #   - buyer_name: only verify for VAT (交款人 is the payer)
-            #   - seller_name: verify for VAT AND medical (medical seller
-            #     = 收款单位（章）: hospital; pdfplumber reads the text
-            #     layer even when the stamp covers it in the rendered
-            #     image, so it's MORE reliable than OCR here)
-            if field == "buyer_name" and not ("增值税" in parsed.invoice_type):
-                continue
-            if field == "seller_name" and not (
-                "增值税" in parsed.invoice_type
-                or "医疗" in parsed.invoice_type
-            ):
+            if not _applies(field, parsed.invoice_type):
                 continue
 
             # 1. Try label-anchored extraction from pdfplumber ground truth
-            ground_truth = self._extract_from_text(field, full_text, parsed.invoice_type)
+            ground_truth = self._extract_from_text(field, full_text, parsed.invoice_type, labels)
 
             # 2. If label not found AND we have an OCR value, try fuzzy
             if ground_truth is None and ocr_value:
-                ground_truth = self._find_similar(ocr_value, full_text, max_dist=2)
+                if deadline is not None and time.monotonic() > deadline:
+                    logger.warning(f"PdfTextVerify: budget exhausted, {field} not fuzzy-checked")
+                    continue
+                ground_truth = self._find_similar(ocr_value, full_text, max_dist=2, fuzzy=fuzzy)
 
             if ground_truth is None:
                 continue
 
-            # Normalize amount (strip commas, add ¥) and date
-            if field == "amount_in_figures":
-                ground_truth = _normalize_amount(ground_truth)
-            if field == "invoice_date_raw":
-                ground_truth = ground_truth.strip()
+            ground_truth = _normalize_field(field, ground_truth)
 
             # Fill if empty OR correct if different
             if not ocr_value or ground_truth == ocr_value:
@@ -163,8 +238,13 @@ class PdfTextVerify(PostProcessor):
         return parsed
 
     @staticmethod
-    def _extract_from_text(field: str, full_text: str, invoice_type: str = "") -> str | None:
-        """Extract the ground-truth value for `field` from pdfplumber text."""
+    def _extract_from_text(field: str, full_text: str, invoice_type: str = "",
+                           labels: LabelHits | None = None) -> str | None:
+        """Extract the ground-truth value for `field` from pdfplumber text.
+
+        `labels` is FIELD_SCANNER's scan of `full_text` (scanned here if
+        not given).
+        """
         if field == "seller_name" and "医疗" in invoice_type:
             # Medical receipts: seller = hospital. The label
             # (收款单位（章）：) may be unreadable in pdfplumber text when
@@ -202,19 +282,22 @@ class PdfTextVerify(PostProcessor):
             if len(matches) > idx:
                 return matches[idx].strip()
             return None
-        m = pattern.search(full_text)
+        if labels is None:
+            labels = FIELD_SCANNER.scan(full_text)
+        m = labels.search(pattern, *_LABEL_ANCHORS[field])
         if m:
             return m.group(1).strip()
         return None
 
     @staticmethod
-    def _find_similar(value: str, full_text: str, max_dist: int) -> str | None:
+    def _find_similar(value: str, full_text: str, max_dist: int,
+                      fuzzy: FuzzyText | None = None) -> str | None:
         """Fallback: find a substring within `max_dist` edits of `value`.
 
-        Unlike the previous version, this scans ALL positions (not just
+        Unlike the previous version, this considers ALL positions (not just
         first-char matches) so it works even when the OCR error is in the
-        first character. For typical invoice text (<10KB) this is fast
-        enough.
+        first character. `fuzzy` is the FuzzyText of `full_text`, shared
+        by the fields of one document.
         """
         if len(value) < 3:
             return None
@@ -237,32 +320,19 @@ class PdfTextVerify(PostProcessor):
         if any('\u4e00' <= c <= '\u9fff' for c in value):
             return None
 
-        # Sliding-window scan over all positions
-        best = None
-        best_dist = max_dist + 1
-        n = len(full_text)
-        m = len(value)
-        for pos in range(n - m + 1):
-            candidate = full_text[pos:pos + m]
-            d = _levenshtein(value, candidate, max_dist)
-            if d is not None and (d < best_dist or
-                                  (d == best_dist and best is not None and
-                                   len(candidate) > len(best))):
-                best = candidate
-                best_dist = d
-        # Also try slightly longer candidates (truncation)
-        if best is None:
-            for pos in range(n - m):
-                candidate = full_text[pos:pos + m + 1]
-                d = _levenshtein(value, candidate, max_dist)
-                if d is not None and (d < best_dist or
-                                      (d == best_dist and best is not None and
-                                       len(candidate) > len(best))):
-                    best = candidate
-                    best_dist = d
-        if best is not None and best_dist <= max_dist:
-            return best
-        return None
+        # Closest window of len(value), then len(value)+1 (truncation)
+        if fuzzy is None:
+            fuzzy = FuzzyText(full_text)
+        return fuzzy.find(value, max_dist)
+
+
+def _normalize_field(field: str, value: str) -> str:
+    """Normalize amount (strip commas, add ¥) and date."""
+    if field == "amount_in_figures":
+        return _normalize_amount(value)
+    if field == "invoice_date_raw":
+        return value.strip()
+    return value
 
 
 def _normalize_amount(amount_str: str) -> str:
@@ -297,29 +367,5 @@ def _normalize_date(raw: str) -> str:
     return raw
 
 
-def _levenshtein(a: str, b: str, max_dist: int) -> int | None:
-    """Levenshtein distance with early termination. Returns None if > max_dist."""
-    if a == b:
-        return 0
-    if abs(len(a) - len(b)) > max_dist:
-        return None
-    prev = list(range(len(b) + 1))
-    for i, ca in enumerate(a, 1):
-        cur = [i]
-        row_min = i
-        for j, cb in enumerate(b, 1):
-            cost = 0 if ca == cb else 1
-            cur.append(min(
-                prev[j] + 1,          # deletion
-                cur[j - 1] + 1,       # insertion
-                prev[j - 1] + cost,   # substitution
-            ))
-            row_min = min(row_min, cur[-1])
-        if row_min > max_dist:
-            return None
-        prev = cur
-    return prev[-1]
-
-
 # Register on import
 register_post_processor(PdfTextVerify())
@@ -0,0 +1,94 @@
+"""Post-processing pipeline: declarations, budgets, per-step timing.
+
+``run_pipeline`` runs the registered post-processors in order. For each:
+
+  1. ``skip_reason()`` checks its declarations (doc_types, text layer)
+     and ``can_change()``; skipped steps cost nothing and are logged at
+     debug level.
+  2. ``run()`` gets ``deadline = now + budget``. A step that raises is
+     logged and skipped; the parse it was given carries on.
+  3. The step's wall time goes to ``parsed.timings["post:<name>"]`` and
+     the log; finishing past the budget logs a warning.
+
+Budgets default to each class's ``budget`` and can be overridden with
+``configure("pdf_text_verify=2.5")`` (app config POSTPROCESS_BUDGETS).
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from ...base import ParsedInvoice
+from .base import PostProcessor, get_post_processors
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_budgets: Dict[str, float] = {}
+
+
+def parse_budgets(spec: str) -> Dict[str, float]:
+    """Parse ``"pdf_text_verify=2.5,other=0.5"`` into ``{name: seconds}``."""
+    budgets: Dict[str, float] = {}
+    for part in (spec or "").split(","):
+        name, sep, value = part.partition("=")
+        name = name.strip().lower()
+        if not sep or not name:
+            continue
+        try:
+            budgets[name] = max(0.0, float(value))
+        except ValueError:
+            continue
+    return budgets
+
+
+def configure(budgets: Dict[str, float] | str) -> None:
+    """Override per-step budgets (seconds), keyed by PostProcessor.name."""
+    global _budgets
+    with _lock:
+        _budgets = parse_budgets(budgets) if isinstance(budgets, str) else dict(budgets)
+
+
+def budget_for(pp: PostProcessor) -> float:
+    with _lock:
+        return _budgets.get(pp.name, pp.budget)
+
+
+def run_pipeline(
+    parsed: ParsedInvoice,
+    file_path: str,
+    doc_type: str = "",
+    doc=None,
+    layout=None,
+    processors: Optional[Iterable[PostProcessor]] = None,
+) -> ParsedInvoice:
+    """Run `processors` (default: every registered one) over `parsed`."""
+    for pp in get_post_processors() if processors is None else processors:
+        try:
+            reason = pp.skip_reason(parsed, file_path, doc_type=doc_type, doc=doc)
+        except Exception as e:
+            reason = f"skip check failed: {e}"
+        if reason:
+            logger.debug(f"PostProcessor {pp.name} skipped: {reason}")
+            continue
+
+        budget = budget_for(pp)
+        start = time.monotonic()
+        try:
+            parsed = pp.run(parsed, file_path, doc=doc, layout=layout,
+                            deadline=start + budget)
+        except Exception as e:
+            # Don't blow up the whole extraction if post-processing fails
+            logger.warning(f"PostProcessor {pp.__class__.__name__} failed: {e}")
+        elapsed = time.monotonic() - start
+        parsed.timings[f"post:{pp.name}"] = elapsed
+        if elapsed > budget:
+            logger.warning(
+                f"PostProcessor {pp.name} took {elapsed * 1000:.0f} ms "
+                f"(budget {budget * 1000:.0f} ms)"
+            )
+        else:
+            logger.debug(f"PostProcessor {pp.name} took {elapsed * 1000:.1f} ms")
+    return parsed
@@ -17,6 +17,9 @@ Configuration is entirely via env vars — no per-provider presets:
                       default: deepseek-ai/DeepSeek-OCR
   VLLM_OCR_ENDPOINT   base URL without /v1 suffix
                       default: https://api.siliconflow.cn/v1
+  VLLM_OCR_STREAM     1 = stream the completion (SSE), parse regions as
+                      they arrive and stop once the doc-type parser has
+                      every required field (frees the slot early)
 
 The model returns text regions in grounding format:
   <|ref|>text<|/ref|><|det|>[[x0,y0,x1,y1]]<|/det|>
@@ -25,9 +28,11 @@ which we parse into TextBlock list for the layout parsers.
 from __future__ import annotations
 
 import base64
+import json
 import logging
 import os
 import re
+import threading
 import time
 
 import requests
@@ -37,6 +42,15 @@ from .base import LocalBackend
 
 logger = logging.getLogger(__name__)
 
+#: Streaming: run the doc-type parser after this many new blocks.
+EARLY_STOP_CHECK_EVERY = 8
+#: Streaming: blocks still read once the required fields are filled.
+EARLY_STOP_GRACE_BLOCKS = 6
+
+
+def _stream_from_env() -> bool:
+    return os.environ.get("VLLM_OCR_STREAM", "0").lower() not in ("", "0", "false")
+
 
 class VLLMOCRBackend(LocalBackend):
     """OpenAI-compatible VLM OCR backend (SiliconFlow, Ollama, vLLM, ...)."""
@@ -49,26 +63,98 @@ class VLLMOCRBackend(LocalBackend):
         api_key: str | None = None,
         model: str | None = None,
         endpoint: str | None = None,
+        stream: bool | None = None,
     ):
-        # Precedence: constructor arg > env var > Settings table (web UI)
-        settings = self._load_settings()
-        self.api_key = (
-            api_key
-            or os.environ.get("VLLM_OCR_API_KEY")
-            or settings.get("VLLM_OCR_API_KEY", "")
-        )
-        self.model = (
-            model
-            or os.environ.get("VLLM_OCR_MODEL")
-            or settings.get("VLLM_OCR_MODEL")
-            or "deepseek-ai/DeepSeek-OCR"
-        )
-        self.endpoint = (
-            endpoint
-            or os.environ.get("VLLM_OCR_ENDPOINT")
-            or settings.get("VLLM_OCR_ENDPOINT")
-            or "https://api.siliconflow.cn/v1"
-        )
+        # Precedence: constructor arg > env var > Settings table (web UI).
+        # Values not passed here are resolved lazily on each use (see
+        # ``config``), so the instance registered at import time follows
+        # later Settings changes.
+        self._overrides = {
+            k: v for k, v in
+            (("api_key", api_key), ("model", model), ("endpoint", endpoint)) if v
+        }
+        if stream is not None:
+            self._overrides["stream"] = stream
+        self._session: requests.Session | None = None
+        self._session_size = 0
+        self._session_lock = threading.Lock()
+
+    @property
+    def config(self) -> dict:
+        """Effective api_key/model/endpoint/stream for this call.
+
+        Cached process-wide through core/clients.py and reloaded when the
+        Settings page saves new values. Outside an app context (no
+        Settings table to read) it is resolved fresh and not cached.
+        """
+        if all(self._overrides.get(k) for k in ("api_key", "model", "endpoint")):
+            return {"stream": _stream_from_env(), **self._overrides}
+        try:
+            from flask import has_app_context
+            in_app = has_app_context()
+        except ImportError:
+            in_app = False
+        if in_app:
+            from core import clients
+            resolved = clients.get("vllm-config", self.resolve_config, lambda config: config)
+        else:
+            resolved = self.resolve_config()
+        return {**resolved, **self._overrides}
+
+    @property
+    def api_key(self) -> str:
+        return self.config["api_key"]
+
+    @property
+    def model(self) -> str:
+        return self.config["model"]
+
+    @property
+    def endpoint(self) -> str:
+        return self.config["endpoint"]
+
+    def _http(self) -> requests.Session:
+        """Keep-alive session; per-host pool sized to the backend's slot count.
+
+        Rebuilt when OCR_CONCURRENCY changes the slot count, so every
+        concurrent call gets a warm connection and none is discarded.
+        An ``auto`` limit is sized by its ceiling, so it can move freely.
+        """
+        from core import concurrency
+        size = concurrency.max_limit_for(self.name) + 1   # +1 for health probes
+        with self._session_lock:
+            if self._session is None or self._session_size != size:
+                from requests.adapters import HTTPAdapter
+                if self._session is not None:
+                    self._session.close()
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session, self._session_size = session, size
+            return self._session
+
+    @classmethod
+    def resolve_config(cls) -> dict:
+        """Effective api_key/model/endpoint (env var > Settings table > default) + stream."""
+        settings = cls._load_settings()
+        return {
+            "api_key": (
+                os.environ.get("VLLM_OCR_API_KEY")
+                or settings.get("VLLM_OCR_API_KEY", "")
+            ),
+            "model": (
+                os.environ.get("VLLM_OCR_MODEL")
+                or settings.get("VLLM_OCR_MODEL")
+                or "deepseek-ai/DeepSeek-OCR"
+            ),
+            "endpoint": (
+                os.environ.get("VLLM_OCR_ENDPOINT")
+                or settings.get("VLLM_OCR_ENDPOINT")
+                or "https://api.siliconflow.cn/v1"
+            ),
+            "stream": _stream_from_env(),
+        }
 
     @staticmethod
     def _load_settings() -> dict:
@@ -85,22 +171,34 @@ class VLLMOCRBackend(LocalBackend):
             return {}
 
     def is_available(self) -> bool:
+        """True if the endpoint's last health probe succeeded.
+
+        Answered from the health registry (core/health.py), which re-runs
+        ``probe()`` in the background — uploads never wait on it, except
+        for the very first check of an endpoint.
+        """
+        endpoint = self.endpoint
+        if not endpoint:
+            return False
+        from core import health
+        return health.check(
+            self.name, lambda: self.probe(endpoint), target=endpoint,
+        )
+
+    def probe(self, endpoint: str | None = None) -> bool:
         """True if the endpoint responds to GET /models.
 
         For Ollama/local vLLM this is a fast sub-second probe.
         For SiliconFlow it requires the API key to be set (else 401).
+        The endpoint is bound when the probe is registered, so the
+        background health thread never needs to read Settings.
         """
-        if not self.endpoint:
-            return False
-        # If an API key is configured, require it to be non-empty.
-        try:
-            resp = requests.get(f"{self.endpoint}/models", timeout=5)
-            return resp.status_code < 500
-        except Exception:
-            return False
+        resp = self._http().get(f"{endpoint or self.endpoint}/models", timeout=5)
+        return resp.status_code < 500
 
-    def _call_ocr(self, file_path: str) -> list[TextBlock]:
-        if not self.endpoint:
+    def _call_ocr(self, file_path: str, doc=None, doc_type: str = "") -> list[TextBlock]:
+        config = self.config   # one consistent snapshot for this call
+        if not config["endpoint"]:
             raise RuntimeError(
                 "VLLM OCR endpoint not configured. "
                 "Set VLLM_OCR_ENDPOINT or pass endpoint=..."
@@ -111,14 +209,13 @@ class VLLMOCRBackend(LocalBackend):
         # local vLLM) accept images but NOT raw PDF data URLs.
         # DeepSeek-OCR on SiliconFlow accepts PDFs directly, but the
         # same request works with a rendered first page too — so we
-        # always render PDFs to PNG for maximum compatibility.
+        # always render PDFs to PNG for maximum compatibility. The render
+        # goes through the shared PdfDocument so the file is opened once.
         ext = file_path.lower().rsplit(".", 1)[-1]
         if ext == "pdf":
             try:
-                import fitz  # PyMuPDF
-                doc = fitz.open(file_path)
-                pix = doc[0].get_pixmap(matrix=fitz.Matrix(2.0, 2.0))
-                file_bytes = pix.tobytes("png")
+                from .document import open_document
+                file_bytes = open_document(file_path, doc).render_png(0, zoom=2.0)
                 mime = "image/png"
             except ImportError:
                 # No fitz — fall back to sending the PDF bytes raw
@@ -129,16 +226,21 @@ class VLLMOCRBackend(LocalBackend):
             with open(file_path, "rb") as f:
                 file_bytes = f.read()
             mime = f"image/{ext}"
+        # Downsample / grayscale / re-encode: fewer bytes on the wire and
+        # fewer image tokens in the prompt (see core/image_prep.py).
+        from core.image_prep import prepare_for
+        prepared = prepare_for(self.name, file_bytes, mime)
+        file_bytes, mime = prepared.data, prepared.mime
         data_url = f"data:{mime};base64,{base64.b64encode(file_bytes).decode()}"
 
         # Call the endpoint. Only send Bearer header if we have a key.
-        url = f"{self.endpoint}/chat/completions"
+        url = f"{config['endpoint']}/chat/completions"
         headers = {"Content-Type": "application/json"}
-        if self.api_key:
-            headers["Authorization"] = f"Bearer {self.api_key}"
+        if config["api_key"]:
+            headers["Authorization"] = f"Bearer {config['api_key']}"
 
         payload = {
-            "model": self.model,
+            "model": config["model"],
             "messages": [
                 {
                     "role": "user",
@@ -150,12 +252,35 @@ class VLLMOCRBackend(LocalBackend):
             ],
         }
 
-        logger.info(f"VLLMOCR: POST {url} model={self.model} file={file_path}")
-        t0 = time.time()
-        resp = requests.post(url, headers=headers, json=payload, timeout=180)
-        elapsed = time.time() - t0
-        logger.info(f"VLLMOCR: response in {elapsed:.1f}s, status={resp.status_code}")
+        # Size the completion budget to the document type, so a runaway
+        # generation can't hold an inference slot for minutes.
+        from .parsers import get_parser
+        doc_parser = get_parser(doc_type) if doc_type else None
+        if doc_parser is not None:
+            payload["max_tokens"] = doc_parser.max_output_tokens
 
+        # The server's inference slots are shared by every worker process:
+        # queue here instead of overloading it.
+        from core.ratelimit import provider_slot
+        with provider_slot(self.name) as waited:
+            if waited:
+                logger.info(f"VLLMOCR: queued {waited:.1f}s for a slot")
+            logger.info(f"VLLMOCR: POST {url} model={config['model']} file={file_path}")
+            t0 = time.time()
+            if config["stream"]:
+                blocks = self._stream(url, headers, payload, config["model"], doc_parser)
+            else:
+                blocks = self._complete(url, headers, payload, config["model"])
+            elapsed = time.time() - t0
+        logger.info(
+            f"VLLMOCR: parsed {len(blocks)} text blocks in {elapsed:.1f}s "
+            f"(model={config['model']})"
+        )
+        return blocks
+
+    def _complete(self, url: str, headers: dict, payload: dict, model: str) -> list[TextBlock]:
+        """One-shot request: wait for the whole completion, then parse it."""
+        resp = self._http().post(url, headers=headers, json=payload, timeout=180)
         if resp.status_code != 200:
             raise RuntimeError(
                 f"VLLM OCR failed: {resp.status_code} {resp.text[:500]}"
@@ -168,11 +293,69 @@ class VLLMOCRBackend(LocalBackend):
         # (see ocr_formats.py). New models with new output shapes just
         # register a parser — no backend changes.
         from .ocr_formats import get_format_parser
-        parser = get_format_parser(self.model)
-        blocks = parser(content)
-        logger.info(f"VLLMOCR: parsed {len(blocks)} text blocks (model={self.model})")
+        return get_format_parser(model)(content)
+
+    def _stream(self, url: str, headers: dict, payload: dict, model: str,
+                doc_parser=None) -> list[TextBlock]:
+        """Streamed request (SSE): parse regions as they arrive, stop early.
+
+        Every ``EARLY_STOP_CHECK_EVERY`` new blocks the doc-type parser
+        runs on what has arrived so far. Once ``is_complete()`` holds,
+        ``EARLY_STOP_GRACE_BLOCKS`` more blocks are read (fields printed
+        right after the last required one, e.g. the seller's address
+        under its tax id) and the connection is closed — the server
+        aborts the generation and frees its slot.
+        """
+        from .ocr_formats import get_stream_parser
+        stream = get_stream_parser(model)
+        blocks: list[TextBlock] = []
+        unchecked = 0
+        stop_after = None
+        payload = dict(payload, stream=True)
+
+        with self._http().post(url, headers=headers, json=payload,
+                               timeout=180, stream=True) as resp:
+            if resp.status_code != 200:
+                raise RuntimeError(
+                    f"VLLM OCR failed: {resp.status_code} {resp.text[:500]}"
+                )
+            for line in resp.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                try:
+                    choices = json.loads(data).get("choices") or []
+                except ValueError:
+                    continue
+                delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                if not delta:
+                    continue
+                new = stream.feed(delta)
+                blocks.extend(new)
+                unchecked += len(new)
+                if stop_after is None and doc_parser is not None \
+                        and unchecked >= EARLY_STOP_CHECK_EVERY:
+                    unchecked = 0
+                    if doc_parser.is_complete(doc_parser.parse(list(blocks))):
+                        stop_after = len(blocks) + EARLY_STOP_GRACE_BLOCKS
+                if stop_after is not None and len(blocks) >= stop_after:
+                    logger.info(
+                        f"VLLMOCR: required fields complete after {len(blocks)} blocks, "
+                        "stopping stream early"
+                    )
+                    return blocks
+        blocks.extend(stream.close())
         return blocks
 
 
+def get_vllm_backend() -> VLLMOCRBackend:
+    """The registered VLLMOCRBackend. Its configuration follows the Settings
+    table (see ``VLLMOCRBackend.config``) and its session stays warm."""
+    return _backend
+
+
 # Register on import
-register_backend(VLLMOCRBackend())
+_backend = VLLMOCRBackend()
+register_backend(_backend)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Backend health registry (后端健康状态缓存).
+
+Availability checks used to be network calls on the request path:
+``VLLMOCRBackend.is_available()`` did a ``GET /models`` with a 5 s
+timeout on every upload, so an endpoint that was down added 5 s to each
+request. Here each backend registers a probe once. A daemon thread
+re-runs due probes every ``interval`` seconds, and callers read the
+last result from memory.
+
+``check(name, probe)`` registers the probe on first use and returns the
+cached result while it is younger than ``ttl``. Only when there is no
+fresh result (first call, or the background thread is off — e.g. in a
+CLI command) does it probe synchronously. Each probe keeps a short
+window of recent latencies; ``snapshot()`` reports them for ``/health``
+without ever probing.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 30.0
+DEFAULT_TTL = 90.0
+LATENCY_WINDOW = 20
+
+
+@dataclass
+class _Probe:
+    fn: Callable[[], bool]
+    target: str = ""
+    ok: Optional[bool] = None
+    checked_at: float = 0.0          # time.monotonic()
+    checked_wall: float = 0.0        # time.time(), for reporting
+    error: str = ""
+    consecutive_failures: int = 0
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+
+
+class HealthRegistry:
+    """Probes registered backends in the background; answers from memory."""
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, ttl: float = DEFAULT_TTL,
+                 background: bool = True):
+        self.interval = interval
+        self.ttl = ttl
+        self.background = background
+        self._lock = threading.Lock()
+        self._probes: Dict[str, _Probe] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_pid: Optional[int] = None
+
+    # ------------------------------------------------------------------
+    # Registration / lookup
+    # ------------------------------------------------------------------
+
+    def register(self, name: str, probe: Callable[[], bool], target: str = "") -> None:
+        """Add or update a probe. A new `target` (e.g. endpoint URL) resets its status."""
+        with self._lock:
+            entry = self._probes.get(name)
+            if entry is None or entry.target != target:
+                self._probes[name] = _Probe(probe, target)
+            else:
+                entry.fn = probe
+        self._ensure_thread()
+
+    def check(self, name: str, probe: Optional[Callable[[], bool]] = None,
+              target: str = "") -> bool:
+        """Cached health of `name`; probes synchronously only without a fresh result."""
+        if probe is not None:
+            self.register(name, probe, target)
+        with self._lock:
+            entry = self._probes.get(name)
+            if entry is None:
+                return False
+            if entry.ok is not None and time.monotonic() - entry.checked_at <= self.ttl:
+                return entry.ok
+        return self.refresh(name)
+
+    def refresh(self, name: str) -> bool:
+        """Run `name`'s probe now and record the outcome."""
+        with self._lock:
+            entry = self._probes.get(name)
+        if entry is None:
+            return False
+        started = time.monotonic()
+        error = ""
+        try:
+            ok = bool(entry.fn())
+        except Exception as e:
+            ok, error = False, f"{type(e).__name__}: {e}"
+        latency = time.monotonic() - started
+        with self._lock:
+            if ok != entry.ok and entry.ok is not None:
+                logger.info(f"health: {name} {'up' if ok else 'down'} {error}".rstrip())
+            entry.ok = ok
+            entry.error = error
+            entry.checked_at = time.monotonic()
+            entry.checked_wall = time.time()
+            entry.latencies.append(latency)
+            entry.consecutive_failures = 0 if ok else entry.consecutive_failures + 1
+        return ok
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Last known state of every probe (never probes)."""
+        now = time.monotonic()
+        with self._lock:
+            result = {}
+            for name, entry in sorted(self._probes.items()):
+                lat = sorted(entry.latencies)
+                result[name] = {
+                    "ok": entry.ok,
+                    "target": entry.target,
+                    "age_s": round(now - entry.checked_at, 1) if entry.ok is not None else None,
+                    "stale": entry.ok is None or now - entry.checked_at > self.ttl,
+                    "checked_at": entry.checked_wall or None,
+                    "error": entry.error,
+                    "consecutive_failures": entry.consecutive_failures,
+                    "last_latency_ms": round(entry.latencies[-1] * 1000, 1) if lat else None,
+                    "avg_latency_ms": round(sum(lat) / len(lat) * 1000, 1) if lat else None,
+                    "max_latency_ms": round(lat[-1] * 1000, 1) if lat else None,
+                }
+            return result
+
+    # ------------------------------------------------------------------
+    # Background refresh
+    # ------------------------------------------------------------------
+
+    def _ensure_thread(self) -> None:
+        if not self.background or self.interval <= 0:
+            return
+        with self._lock:
+            alive = self._thread is not None and self._thread.is_alive()
+            if alive and self._thread_pid == os.getpid():
+                return
+            # First use, or a forked child (threads do not survive fork).
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="backend-health", daemon=True,
+            )
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _run(self) -> None:
+        tick = min(1.0, self.interval)
+        while not self._stop.wait(tick):
+            now = time.monotonic()
+            with self._lock:
+                due = [name for name, entry in self._probes.items()
+                       if now - entry.checked_at >= self.interval]
+            for name in due:
+                self.refresh(name)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+# ---------------------------------------------------------------------------
+# Process-wide registry
+# ---------------------------------------------------------------------------
+
+_registry = HealthRegistry()
+
+
+def configure(interval: float = DEFAULT_INTERVAL, ttl: float = DEFAULT_TTL,
+              background: bool = True) -> None:
+    """Apply settings to the shared registry; registered probes are kept."""
+    _registry.interval = interval
+    _registry.ttl = ttl
+    _registry.background = background
+
+
+def get_registry() -> HealthRegistry:
+    return _registry
+
+
+def check(name: str, probe: Optional[Callable[[], bool]] = None, target: str = "") -> bool:
+    return _registry.check(name, probe, target)
+
+
+def snapshot() -> Dict[str, dict]:
+    return _registry.snapshot()
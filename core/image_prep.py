@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Shrink images before they are sent to a cloud / VLM OCR backend (图片预处理).
+
+A phone photo of an invoice is typically 4000×3000 px and 5–12 MB; after
+base64 it becomes 7–16 MB of JSON per request. OCR needs nowhere near
+that resolution, and for VLM backends every extra pixel is prompt
+tokens. ``prepare()`` applies a per-backend ``ImageProfile``:
+
+  1. honour the EXIF orientation, then drop EXIF (and all other metadata);
+  2. downsample so the long edge is at most ``max_edge``;
+  3. optionally convert to grayscale;
+  4. re-encode as JPEG or WebP at ``quality``.
+
+The original bytes are kept whenever the re-encoded image would not be
+smaller and no resize was needed. PDFs and unreadable files pass through
+untouched. Bytes saved and time spent are tallied per backend
+(``stats()``).
+
+Profiles come from a spec string such as
+``"tencent=2400:color:jpeg:85,vllm=1600:gray:jpeg:80"``
+(``backend=max_edge:color|gray:jpeg|webp:quality``), set with
+``configure()`` from ``create_app`` (``IMAGE_PREP_PROFILES``). Backends
+without a profile are not preprocessed.
+"""
+from __future__ import annotations
+
+import io
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+#: Tencent OCR accepts PNG/JPG/BMP/PDF only, so its default stays JPEG.
+DEFAULT_PROFILES = "tencent=2400:color:jpeg:85,vllm=1600:gray:jpeg:80"
+
+_MIME = {"jpeg": "image/jpeg", "webp": "image/webp"}
+
+
+@dataclass(frozen=True)
+class ImageProfile:
+    max_edge: int = 2400
+    grayscale: bool = False
+    format: str = "jpeg"       # "jpeg" | "webp"
+    quality: int = 85
+
+
+@dataclass
+class PreparedImage:
+    data: bytes
+    mime: str
+    original_size: int
+    elapsed: float = 0.0
+
+    @property
+    def saved(self) -> int:
+        return self.original_size - len(self.data)
+
+
+def parse_profiles(spec: str) -> Dict[str, ImageProfile]:
+    """Parse ``"vllm=1600:gray:webp:80"`` into ImageProfiles (bad parts skipped)."""
+    profiles: Dict[str, ImageProfile] = {}
+    for part in (spec or "").split(","):
+        name, sep, value = part.partition("=")
+        name = name.strip().lower()
+        if not sep or not name:
+            continue
+        fields = [f.strip().lower() for f in value.split(":")]
+        try:
+            max_edge = int(fields[0])
+            grayscale = len(fields) > 1 and fields[1] in ("gray", "grey", "grayscale")
+            fmt = fields[2] if len(fields) > 2 and fields[2] else "jpeg"
+            quality = int(fields[3]) if len(fields) > 3 and fields[3] else 85
+        except ValueError:
+            continue
+        if fmt == "jpg":
+            fmt = "jpeg"
+        if fmt not in _MIME or max_edge <= 0:
+            continue
+        profiles[name] = ImageProfile(max_edge, grayscale, fmt, min(100, max(1, quality)))
+    return profiles
+
+
+def prepare(data: bytes, mime: str, profile: ImageProfile) -> PreparedImage:
+    """Apply `profile` to one image. Never raises: failures return the input."""
+    started = time.perf_counter()
+    result = PreparedImage(data, mime, len(data))
+    if not mime.startswith("image/"):
+        return result
+    try:
+        from PIL import Image, ImageOps
+
+        with Image.open(io.BytesIO(data)) as img:
+            img = ImageOps.exif_transpose(img)
+            resized = max(img.size) > profile.max_edge
+            if resized:
+                img.thumbnail((profile.max_edge, profile.max_edge), Image.LANCZOS)
+            if profile.grayscale:
+                img = img.convert("L")
+            elif img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            out = io.BytesIO()
+            img.save(out, format=profile.format.upper(), quality=profile.quality, optimize=True)
+        encoded = out.getvalue()
+        if resized or len(encoded) < len(data):
+            result = PreparedImage(encoded, _MIME[profile.format], len(data))
+    except Exception as e:
+        logger.warning(f"image_prep: keeping original ({e})")
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Process-wide profiles and counters
+# ---------------------------------------------------------------------------
+
+_lock = threading.Lock()
+_profiles: Dict[str, ImageProfile] = parse_profiles(DEFAULT_PROFILES)
+_enabled = True
+_stats: Dict[str, Dict[str, float]] = {}
+
+
+def configure(profiles: Dict[str, ImageProfile] | str, enabled: bool = True) -> None:
+    global _profiles, _enabled
+    with _lock:
+        _profiles = parse_profiles(profiles) if isinstance(profiles, str) else dict(profiles)
+        _enabled = enabled
+
+
+def profile_for(backend: str) -> Optional[ImageProfile]:
+    with _lock:
+        return _profiles.get(backend) if _enabled else None
+
+
+def prepare_for(backend: str, data: bytes, mime: str) -> PreparedImage:
+    """``prepare()`` with `backend`'s profile, recording bytes saved and time spent."""
+    profile = profile_for(backend)
+    if profile is None:
+        return PreparedImage(data, mime, len(data))
+    result = prepare(data, mime, profile)
+    with _lock:
+        s = _stats.setdefault(backend, {
+            "images": 0, "bytes_in": 0, "bytes_out": 0, "prep_seconds": 0.0,
+        })
+        s["images"] += 1
+        s["bytes_in"] += result.original_size
+        s["bytes_out"] += len(result.data)
+        s["prep_seconds"] += result.elapsed
+    if result.saved > 0:
+        logger.info(
+            f"image_prep[{backend}]: {result.original_size} -> {len(result.data)} bytes "
+            f"in {result.elapsed * 1000:.0f} ms"
+        )
+    return result
+
+
+def stats() -> Dict[str, dict]:
+    with _lock:
+        return {
+            name: dict(
+                s,
+                bytes_saved=s["bytes_in"] - s["bytes_out"],
+                prep_seconds=round(s["prep_seconds"], 4),
+            )
+            for name, s in _stats.items()
+        }
@@ -231,7 +231,49 @@ class InvoiceExporter:
             return {}
 
     @staticmethod
-    def export_project_to_excel(project_data, invoices, output_path=None):
+    def project_stats(invoices):
+        """由发票对象逐条汇总项目统计（未提供 SQL 汇总结果时使用）
+
+        返回与 app.utils.project_export_stats 相同结构的字典，金额单位为元:
+            total: 价税合计总额
+            invoice_totals: 发票列表合计行 {'金额', '税额', '价税合计'}
+            item_totals: 商品明细合计行 {'金额', '税额'}
+            monthly / types / sellers / buyers: {键: {'count', 'amount'}}
+        """
+        from core.money import to_cents, yuan
+
+        def add(group, key, cents):
+            entry = group.setdefault(key, {'count': 0, 'amount': 0})
+            entry['count'] += 1
+            entry['amount'] += yuan(cents)
+
+        cents = {'金额': 0, '税额': 0, '价税合计': 0}
+        item_cents = {'金额': 0, '税额': 0}
+        stats = {'monthly': {}, 'types': {}, 'sellers': {}, 'buyers': {}}
+        for invoice in invoices:
+            amount = to_cents(invoice.amount_in_figures)
+            cents['金额'] += to_cents(invoice.total_amount) or 0
+            cents['税额'] += to_cents(invoice.total_tax) or 0
+            cents['价税合计'] += amount or 0
+            for item in getattr(invoice, 'items', None) or []:
+                item_cents['金额'] += to_cents(item.amount) or 0
+                item_cents['税额'] += to_cents(item.tax) or 0
+            if invoice.invoice_date:
+                add(stats['monthly'], invoice.invoice_date.strftime('%Y-%m'), amount)
+            if invoice.invoice_type:
+                add(stats['types'], invoice.invoice_type, amount)
+            if invoice.seller_name:
+                add(stats['sellers'], invoice.seller_name, amount)
+            if invoice.buyer_name:
+                add(stats['buyers'], invoice.buyer_name, amount)
+
+        stats['total'] = yuan(cents['价税合计'])
+        stats['invoice_totals'] = {key: yuan(value) for key, value in cents.items()}
+        stats['item_totals'] = {key: yuan(value) for key, value in item_cents.items()}
+        return stats
+
+    @staticmethod
+    def export_project_to_excel(project_data, invoices, output_path=None, stats=None):
         """
         将项目数据和相关发票导出为Excel格式
         
@@ -239,6 +281,8 @@ class InvoiceExporter:
             project_data: 项目信息（字典）
             invoices: 项目下的发票列表
             output_path: 输出Excel文件的路径
+            stats: 已在数据库中汇总好的统计（结构见 project_stats），
+                   为 None 时由 invoices 逐条汇总
         
         返回:
             Excel文件路径
@@ -266,6 +310,9 @@ class InvoiceExporter:
             safe_name = "".join(x for x in project_data.get('name', '') if x.isalnum() or x in "._- ")
             output_path = os.path.join(output_dir, f"project_{safe_name}_{timestamp_str}.xlsx")
         
+        if stats is None:
+            stats = InvoiceExporter.project_stats(invoices)
+
         # 创建空的Excel文件
         writer = pd.ExcelWriter(output_path, engine='openpyxl')
         
@@ -278,8 +325,8 @@ class InvoiceExporter:
                 project_data.get('created_at', '').strftime('%Y-%m-%d') if project_data.get('created_at') else '',
                 project_data.get('updated_at', '').strftime('%Y-%m-%d') if project_data.get('updated_at') else '',
                 len(invoices),
-                sum(float(inv.get_total_amount_decimal()) for inv in invoices) if invoices else 0,
-                sum(float(inv.get_total_amount_decimal()) for inv in invoices) / len(invoices) if invoices else 0,
+                stats['total'],
+                stats['total'] / len(invoices) if invoices else 0,
                 datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             ]
         }
@@ -290,12 +337,6 @@ class InvoiceExporter:
         if invoices:
             invoice_list_data = []
             
-            # 按月统计数据
-            monthly_stats = {}
-            invoice_type_stats = {}
-            seller_stats = {}
-            buyer_stats = {}
-            
             for invoice in invoices:
                 # 发票列表数据
                 invoice_data = {
@@ -315,52 +356,6 @@ class InvoiceExporter:
                     '创建时间': invoice.created_at.strftime('%Y-%m-%d %H:%M:%S') if invoice.created_at else ''
                 }
                 invoice_list_data.append(invoice_data)
-                
-                # 收集按月统计
-                if invoice.invoice_date:
-                    month_key = invoice.invoice_date.strftime('%Y-%m')
-                    if month_key not in monthly_stats:
-                        monthly_stats[month_key] = {'count': 0, 'amount': 0}
-                    monthly_stats[month_key]['count'] += 1
-                    try:
-                        amount = float(invoice.get_total_amount_decimal())
-                        monthly_stats[month_key]['amount'] += amount
-                    except:
-                        pass
-                
-                # 按发票类型统计
-                if invoice.invoice_type:
-                    type_key = invoice.invoice_type
-                    if type_key not in invoice_type_stats:
-                        invoice_type_stats[type_key] = {'count': 0, 'amount': 0}
-                    invoice_type_stats[type_key]['count'] += 1
-                    try:
-                        amount = float(invoice.get_total_amount_decimal())
-                        invoice_type_stats[type_key]['amount'] += amount
-                    except:
-                        pass
-                
-                # 按销售方统计
-                if invoice.seller_name:
-                    if invoice.seller_name not in seller_stats:
-                        seller_stats[invoice.seller_name] = {'count': 0, 'amount': 0}
-                    seller_stats[invoice.seller_name]['count'] += 1
-                    try:
-                        amount = float(invoice.get_total_amount_decimal())
-                        seller_stats[invoice.seller_name]['amount'] += amount
-                    except:
-                        pass
-                
-                # 按购买方统计
-                if invoice.buyer_name:
-                    if invoice.buyer_name not in buyer_stats:
-                        buyer_stats[invoice.buyer_name] = {'count': 0, 'amount': 0}
-                    buyer_stats[invoice.buyer_name]['count'] += 1
-                    try:
-                        amount = float(invoice.get_total_amount_decimal())
-                        buyer_stats[invoice.buyer_name]['amount'] += amount
-                    except:
-                        pass
             
             # 写入发票列表（按开票日期排序，早的在前）
             invoice_list_df = pd.DataFrame(invoice_list_data)
@@ -374,14 +369,9 @@ class InvoiceExporter:
             total_row = {col: '' for col in invoice_list_df.columns}
             total_row['发票代码'] = '合计'
             
-            # 计算金额、税额和价税合计的总和
+            # 金额、税额和价税合计的总和
             for col in ['金额', '税额', '价税合计']:
-                try:
-                    # 提取数字部分计算总和
-                    numeric_values = invoice_list_df[col].str.replace('¥', '').str.strip().astype(float)
-                    total_row[col] = f"¥{numeric_values.sum():.2f}"
-                except:
-                    total_row[col] = ''
+                total_row[col] = f"¥{stats['invoice_totals'][col]:.2f}"
             
             # 添加合计行
             invoice_list_df = pd.concat([invoice_list_df, pd.DataFrame([total_row])], ignore_index=True)
@@ -421,13 +411,9 @@ class InvoiceExporter:
                 items_total = {col: '' for col in items_df.columns}
                 items_total['发票ID'] = 'SUM共计'
                 
-                # 计算商品明细表中的金额和税额总和
+                # 商品明细表中的金额和税额总和
                 for col in ['金额', '税额']:
-                    try:
-                        numeric_values = items_df[col].str.replace('¥', '').str.strip().astype(float)
-                        items_total[col] = f"¥{numeric_values.sum():.2f}"
-                    except:
-                        items_total[col] = ''
+                    items_total[col] = f"¥{stats['item_totals'][col]:.2f}"
                 
                 # 添加合计行到商品明细表
                 items_df = pd.concat([items_df, pd.DataFrame([items_total])], ignore_index=True)
@@ -435,6 +421,11 @@ class InvoiceExporter:
                 # 写入商品明细表
                 items_df.to_excel(writer, sheet_name='商品明细', index=False)
             
+            monthly_stats = stats['monthly']
+            invoice_type_stats = stats['types']
+            seller_stats = stats['sellers']
+            buyer_stats = stats['buyers']
+
             # 4. 按月统计表
             if monthly_stats:
                 monthly_data = []
@@ -502,9 +493,9 @@ def export_to_excel(invoice_data, output_path=None):
     """为了兼容旧代码，提供与类相同的静态方法"""
     return InvoiceExporter.export_to_excel(invoice_data, output_path)
 
-def export_project_to_excel(project_data, invoices, output_path=None):
+def export_project_to_excel(project_data, invoices, output_path=None, stats=None):
     """为了兼容旧代码，提供项目导出函数"""
-    return InvoiceExporter.export_project_to_excel(project_data, invoices, output_path)
+    return InvoiceExporter.export_project_to_excel(project_data, invoices, output_path, stats)
 
 def process_json_to_exports(json_file, formats=None):
     """为了兼容旧代码，提供与类相同的静态方法"""
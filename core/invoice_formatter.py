@@ -41,13 +41,15 @@ class InvoiceFormatter:
         json_file: str | None = None,
         json_string: str | None = None,
         doc_type: str | None = None,
+        response: dict | None = None,
     ) -> dict:
         """将OCR识别的发票数据格式化为更直观的结构。
 
         Parameters
         ----------
-        json_file / json_string:
-            原始OCR响应（二选一）。
+        json_file / json_string / response:
+            原始OCR响应（三选一）。``response`` 为已解码的响应 dict
+            （``OCRClient.recognize_response()``），不再重复解析。
         doc_type:
             Optional. ``"vat"`` / ``"medical"`` / etc. When omitted, the
             registry's ``detect()`` is asked to identify the type from the
@@ -56,7 +58,9 @@ class InvoiceFormatter:
             existed.
         """
         # 1. Load JSON
-        if json_file:
+        if response is not None:
+            response_json = response
+        elif json_file:
             with open(json_file, "r", encoding="utf-8") as f:
                 response_json = json.load(f)
         elif json_string:
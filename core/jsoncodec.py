@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""JSON encode/decode for the ingest path (JSON 编解码).
+
+An upload used to be (de)serialised several times: the Tencent response
+was decoded to str and ``json.loads``-ed by the formatter, the formatted
+dict was ``json.dumps``-ed once for the OCR cache and again for
+``Invoice.json_data``. The ingest path now decodes the response bytes
+once and encodes the formatted dict once, sharing that text between the
+cache and the database row.
+
+``orjson`` is used when installed (several times faster for large
+payloads such as base64 request bodies); otherwise the stdlib ``json``
+module. It is an optional extra, not in requirements.txt —
+``pip install orjson`` to enable it. Both produce UTF-8 text without ASCII escaping, i.e.
+``ensure_ascii=False`` — what the database and cache always stored.
+Values orjson refuses (non-str keys, Decimal, …) fall back to ``json``.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Compact UTF-8 JSON bytes (request bodies)."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps(obj: Any) -> str:
+    """JSON text with non-ASCII kept as-is (stored payloads)."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def loads(data: str | bytes) -> Any:
+    """Decode JSON text or UTF-8 bytes (no intermediate str for bytes)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
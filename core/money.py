@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Money strings to integer cents (金额规范化).
+
+Amounts are stored the way OCR returned them — ``¥1,234.50``,
+``1234.5元``, ``￥ 106.00`` — in the text columns
+``Invoice.amount_in_figures/total_amount/total_tax`` and
+``InvoiceItem.amount/tax``. Each of those has an integer ``*_cents``
+companion (``app/models.py``) so that sorting, range filters and sums
+run in SQL instead of re-parsing every row in Python.
+
+``to_cents`` is the one parser: currency symbols, ``元``, spaces and
+thousands separators are dropped, a leading minus sign is kept (red-letter
+invoices), and the value is rounded half-up to whole cents. Anything else
+yields ``None`` (stored as NULL, i.e. "unknown", never 0).
+"""
+from __future__ import annotations
+
+import re
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import Optional
+
+_NOISE = re.compile(r"[¥￥元,，\s]")
+_NUMBER = re.compile(r"[-+]?(?:\d+(?:\.\d*)?|\.\d+)")
+_CENT = Decimal("0.01")
+
+
+def to_cents(value) -> Optional[int]:
+    """``"¥1,234.50"`` → ``123450``; None when `value` is not an amount."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value * 100
+    if isinstance(value, (float, Decimal)):
+        text = str(value)
+    else:
+        text = _NOISE.sub("", str(value))
+    if not _NUMBER.fullmatch(text):
+        return None
+    try:
+        return int((Decimal(text) / _CENT).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except InvalidOperation:
+        return None
+
+
+def from_cents(cents: Optional[int]) -> Decimal:
+    """Integer cents → Decimal yuan (None/NULL counts as 0)."""
+    return (Decimal(cents or 0) * _CENT).quantize(_CENT)
+
+
+def yuan(cents: Optional[int]) -> float:
+    """Integer cents → float yuan, for charts and spreadsheet cells."""
+    return (cents or 0) / 100
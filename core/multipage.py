@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Group per-page recognition results of a multi-page PDF into invoices.
+
+Multi-page uploads come in two shapes, often mixed in one file:
+
+  - merged reimbursement PDFs: one complete invoice per page, each with
+    its own 发票号码;
+  - continuation pages: a 销货清单 (item list) attachment or an item
+    table that overflows onto page 2+. These either repeat the parent
+    invoice's number or carry no number at all.
+
+``group_pages`` walks the pages in order. A page whose invoice key
+(代码, 号码) differs from the current group's starts a new invoice; a
+page with the same key, or without a number, continues the current
+one and contributes its line items. Leading pages without a number
+(cover sheets, blank scans) have nothing to attach to, and pages whose
+recognition failed are not guessed at; both are reported as orphans.
+"""
+from __future__ import annotations
+
+import copy
+from typing import Optional
+
+#: Item names that only point at an attached item list ("详见销货清单").
+#: Dropped once the continuation pages supply the real items.
+_PLACEHOLDER_ITEM_MARKERS = ("详见销货清单", "详见清单", "详见附件")
+
+
+def invoice_key(formatted_data: Optional[dict]) -> Optional[tuple[str, str]]:
+    """(发票代码, 发票号码) of one page's result, or None without a number."""
+    if not formatted_data:
+        return None
+    basic = formatted_data.get("基本信息", {}) or {}
+    number = (basic.get("发票号码") or "").strip()
+    if not number:
+        return None
+    return (basic.get("发票代码") or "").strip(), number
+
+
+def _item_name(item: dict) -> str:
+    for key in ("Name", "项目名称", "name"):
+        if item.get(key):
+            return str(item[key])
+    return ""
+
+
+def _is_placeholder(item: dict) -> bool:
+    name = _item_name(item)
+    return any(marker in name for marker in _PLACEHOLDER_ITEM_MARKERS)
+
+
+def merge_continuation(base: dict, extra: dict) -> dict:
+    """Fold a continuation page into `base` (in place) and return it.
+
+    Line items are appended (placeholder rows replaced); other sections
+    only fill fields that are still empty — the first page wins.
+    """
+    extra_items = [i for i in extra.get("商品信息", []) or [] if not _is_placeholder(i)]
+    if extra_items:
+        items = [i for i in base.get("商品信息", []) or [] if not _is_placeholder(i)]
+        base["商品信息"] = items + extra_items
+
+    for section, values in extra.items():
+        if section == "商品信息" or not isinstance(values, dict):
+            continue
+        target = base.setdefault(section, {})
+        if not isinstance(target, dict):
+            continue
+        for name, value in values.items():
+            if value and not target.get(name):
+                target[name] = value
+    return base
+
+
+def group_pages(page_results: list[Optional[dict]]) -> tuple[list[dict], list[int]]:
+    """Group per-page formatted_data (None = recognition failed) into invoices.
+
+    Returns ``(groups, orphans)``. Each group is
+    ``{"formatted_data": merged dict, "pages": [1-based page numbers]}``;
+    ``orphans`` lists page numbers that could not be attached.
+    """
+    groups: list[dict] = []
+    orphans: list[int] = []
+    current: Optional[dict] = None
+    current_key: Optional[tuple[str, str]] = None
+
+    for page_number, data in enumerate(page_results, start=1):
+        if data is None:
+            # Recognition failed outright — don't guess where it belongs.
+            orphans.append(page_number)
+            continue
+        key = invoice_key(data)
+        if key is not None and key != current_key:
+            # A number that differs only by a missing 代码 is the same invoice
+            # (continuation pages often print just the number).
+            if current_key is not None and key[1] == current_key[1] and not (key[0] and current_key[0]):
+                key = current_key
+            else:
+                current = {"formatted_data": copy.deepcopy(data), "pages": [page_number]}
+                current_key = key
+                groups.append(current)
+                continue
+        if current is None:
+            orphans.append(page_number)
+            continue
+        merge_continuation(current["formatted_data"], data)
+        current["pages"].append(page_number)
+
+    for group in groups:
+        if len(group["pages"]) > 1:
+            group["formatted_data"]["来源页码"] = group["pages"]
+    return groups, orphans
@@ -14,14 +14,18 @@ import datetime
 import hashlib
 import hmac
 import json
+import mimetypes
 import os
 import sys
 import time
-from http.client import HTTPSConnection
 
 from dotenv import load_dotenv
 
 from core.doc_types import get as _get_type
+from core.image_prep import prepare_for
+from core.jsoncodec import dumps_bytes, loads
+from core.ratelimit import provider_slot
+from core.transport import TransportError, get_pool
 
 # Add project root so ``app.models`` is importable when running this script standalone.
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -64,9 +68,10 @@ class OCRClient:
     transport + signing.
     """
 
-    def __init__(self):
-        # 获取API凭证
-        secret_id, secret_key = get_api_credentials()
+    def __init__(self, secret_id=None, secret_key=None):
+        # 获取API凭证（未传入时从环境变量 / 系统设置读取）
+        if not secret_id or not secret_key:
+            secret_id, secret_key = get_api_credentials()
 
         if not secret_id or not secret_key:
             raise ValueError(
@@ -93,6 +98,7 @@ class OCRClient:
         image_url: str | None = None,
         image_base64: str | None = None,
         doc_type: str = "vat",
+        page_number: int = 1,
     ) -> str:
         """通用识别入口。
 
@@ -103,13 +109,35 @@ class OCRClient:
         doc_type:
             Document type id registered in ``core.doc_types``. Defaults to
             ``"vat"`` for backwards compatibility.
+        page_number:
+            PDF 页码（从 1 开始）。多页 PDF 逐页调用。
 
         Returns
         -------
         str
-            Raw API JSON response as a string (unchanged from v1.4 — the
-            formatter expects a string it can ``json.loads``).
+            Raw API JSON response as a string (unchanged from v1.4). The
+            ingest path uses ``recognize_response()``, which skips the str.
         """
+        return self._call_api(*self._build_request(
+            image_path, image_url, image_base64, doc_type, page_number,
+        ))
+
+    def recognize_response(
+        self,
+        image_path: str | None = None,
+        image_url: str | None = None,
+        image_base64: str | None = None,
+        doc_type: str = "vat",
+        page_number: int = 1,
+    ) -> dict:
+        """Same as ``recognize()`` but returns the decoded response dict,
+        parsed straight from the response bytes."""
+        return loads(self._request(*self._build_request(
+            image_path, image_url, image_base64, doc_type, page_number,
+        )))
+
+    def _build_request(self, image_path, image_url, image_base64, doc_type, page_number):
+        """(action, request_data) for one recognize call."""
         from core.doc_types import all_types as _all_types
         dt = _get_type(doc_type)
         if dt is None:
@@ -119,12 +147,14 @@ class OCRClient:
             )
 
         action = dt.ocr_action
-        request_data: dict = dict(dt.ocr_request_extras())
+        request_data: dict = dict(dt.ocr_request_extras(page_number=page_number))
 
-        # 图片/PDF → base64
+        # 图片/PDF → base64（图片先按 tencent 配置缩小、去 EXIF、重新编码）
         if image_path:
             with open(image_path, "rb") as f:
                 image_content = f.read()
+            mime = mimetypes.guess_type(image_path)[0] or ""
+            image_content = prepare_for("tencent", image_content, mime).data
             image_base64 = base64.b64encode(image_content).decode('utf-8')
 
         if image_base64:
@@ -134,7 +164,7 @@ class OCRClient:
         else:
             raise ValueError("必须提供图片路径、URL或Base64编码")
 
-        return self._call_api(action, request_data)
+        return action, request_data
 
     # ------------------------------------------------------------------
     # Backwards-compatible alias (v1.4 API)
@@ -157,11 +187,15 @@ class OCRClient:
         )
 
     # ------------------------------------------------------------------
-    # Tencent signed-request transport (unchanged from v1.4)
+    # Tencent signed-request transport
     # ------------------------------------------------------------------
 
     def _call_api(self, action, request_data):
-        payload = json.dumps(request_data)
+        return self._request(action, request_data).decode("utf-8")
+
+    def _request(self, action, request_data):
+        """Signed POST; returns the raw response body bytes."""
+        payload = dumps_bytes(request_data)
 
         http_request_method = "POST"
         canonical_uri = "/"
@@ -177,7 +211,7 @@ class OCRClient:
             % (ct, self.httpProfile.endpoint, action.lower())
         )
         signed_headers = "content-type;host;x-tc-action"
-        hashed_request_payload = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        hashed_request_payload = hashlib.sha256(payload).hexdigest()
         canonical_request = (
             http_request_method + "\n" +
             canonical_uri + "\n" +
@@ -222,13 +256,37 @@ class OCRClient:
             "X-TC-Version": "2018-11-19"
         }
 
+        # 所有进程共享腾讯云 QPS 配额：超出时在此排队。
+        # 连接池复用 keep-alive 连接；限流和 5xx 在 transport 内退避重试。
+        # 每次尝试单独取一个 provider_slot：重试重新从令牌桶取令牌，
+        # 退避等待期间不占用在途名额。
         try:
-            req = HTTPSConnection(self.httpProfile.endpoint)
-            req.request("POST", "/", headers=headers, body=payload.encode("utf-8"))
-            resp = req.getresponse()
-            return resp.read().decode("utf-8")
-        except Exception as err:
+            resp = get_pool(self.httpProfile.endpoint).request(
+                "POST", "/", headers=headers, body=payload,
+                retry_if=_is_rate_limited, slot=lambda: provider_slot("tencent"),
+            )
+        except TransportError as err:
             raise Exception(f"API请求失败: {err}")
+        return resp.body
+
+
+def _is_rate_limited(status, body):
+    """腾讯云限流错误（HTTP 200 + Error.Code=RequestLimitExceeded*）"""
+    if b"RequestLimitExceeded" not in body:
+        return False
+    try:
+        code = json.loads(body)["Response"]["Error"]["Code"]
+    except (ValueError, KeyError, TypeError):
+        return False
+    return code.startswith("RequestLimitExceeded")
+
+
+def get_ocr_client():
+    """进程内复用的 OCRClient（凭证变化时自动重建，见 core/clients.py）"""
+    from core import clients
+    return clients.get(
+        "tencent", get_api_credentials, lambda creds: OCRClient(*creds),
+    )
 
 
 # ---------------------------------------------------------------------------
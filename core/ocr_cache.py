@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""OCR 结果缓存（按文件内容哈希）。
+
+Every backend call (Tencent = paid, VLM = 30–180 s) is keyed by what
+actually determines its output:
+
+    sha256(file bytes) : doc_type : backend : pipeline version . config
+
+so re-uploading the same file returns the stored ``formatted_data``
+without touching any OCR endpoint. The pipeline version folds in the
+parser's ``version`` and the DocType's ``extra_schema_version`` —
+bumping either invalidates stale entries without a manual purge. The
+config part is a hash of ``backend_fingerprint()``: the vLLM model and
+endpoint, and the ``core.image_prep`` profile (downscale, grayscale,
+format) applied before upload — switching ``VLLM_OCR_MODEL`` or the
+prep settings misses instead of returning the old model's output.
+
+Storage is a standalone SQLite file (not the app DB) so the cache can be
+shared by every gunicorn worker and by ``flask import-dir`` processes,
+and can be deleted at any time without losing data. Eviction is LRU by
+``accessed_at`` once ``max_entries`` / ``max_bytes`` is exceeded, plus a
+hard ``max_age`` cut-off. Hit/miss counters are persisted in the same
+file so ``stats()`` reports process-wide numbers.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from core.jsoncodec import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+#: Bump when the shape of the cached payload changes.
+PIPELINE_VERSION = "1"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key         TEXT PRIMARY KEY,
+    sha256      TEXT NOT NULL,
+    doc_type    TEXT NOT NULL,
+    backend     TEXT NOT NULL,
+    version     TEXT NOT NULL,
+    payload     TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    created_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    hits        INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_entries_accessed ON entries (accessed_at);
+CREATE TABLE IF NOT EXISTS counters (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of the file bytes (streamed, constant memory)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def pipeline_version(doc_type: str) -> str:
+    """Version string covering everything that shapes the cached output."""
+    parts = [PIPELINE_VERSION]
+    try:
+        from core.extractors.local.parsers import get_parser
+        parser = get_parser(doc_type)
+        parts.append(f"p{getattr(parser, 'version', '0') if parser else '-'}")
+    except ImportError:
+        parts.append("p-")
+    from core.doc_types import get as _get_type
+    dt = _get_type(doc_type)
+    parts.append(f"x{dt.extra_schema_version if dt else '-'}")
+    return ".".join(parts)
+
+
+def backend_fingerprint(backend: str) -> str:
+    """The backend configuration that shapes its output, as one string.
+
+    ``vllm:<model>@<endpoint>`` for the VLM backend, plus the image_prep
+    profile sent to the backend (``raw`` when images go out unchanged).
+    """
+    parts = [backend]
+    if backend == "vllm":
+        try:
+            from core.extractors.local.vllm import get_vllm_backend
+            config = get_vllm_backend().config
+            parts[0] = f"vllm:{config['model']}@{config['endpoint']}"
+        except Exception as e:
+            logger.warning(f"OCRCache: vllm config unavailable for the key: {e}")
+            parts[0] = "vllm:?"
+    from core.image_prep import profile_for
+    profile = profile_for(backend)
+    parts.append(
+        f"{profile.max_edge}:{'gray' if profile.grayscale else 'color'}:"
+        f"{profile.format}:{profile.quality}" if profile else "raw"
+    )
+    return "|".join(parts)
+
+
+def make_key(
+    sha256: str,
+    doc_type: str,
+    backend: str,
+    version: str | None = None,
+    page: int | None = None,
+    fingerprint: str | None = None,
+) -> str:
+    """Cache key; `page` (1-based) scopes it to one page of a multi-page PDF.
+
+    `fingerprint` defaults to ``backend_fingerprint(backend)``.
+    """
+    if version is None:
+        version = pipeline_version(doc_type)
+    if fingerprint is None:
+        fingerprint = backend_fingerprint(backend)
+    config = hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:12]
+    key = f"{sha256}:{doc_type}:{backend}:{version}.c{config}"
+    return key if page is None else f"{key}:p{page}"
+
+
+class OCRCache:
+    """Persistent content-addressed cache for OCR results.
+
+    Thread-safe and multi-process safe (SQLite locking). Each call opens
+    a short-lived connection so the object can be shared freely across
+    worker threads.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 5000,
+        max_bytes: int = 256 * 1024 * 1024,
+        max_age: float = 90 * 86400,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """One short transaction on a fresh connection (commit or rollback)."""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached payload for `key`, or None on miss/expiry."""
+        payload = self.get_payload(key)
+        if payload is None:
+            return None
+        try:
+            return loads(payload)
+        except ValueError as e:
+            logger.warning(f"OCRCache: undecodable payload, treating as miss: {e}")
+            return None
+
+    def get_payload(self, key: str) -> Optional[str]:
+        """The stored JSON text for `key` (not decoded), or None on miss/expiry."""
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT payload, created_at FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[1] > self.max_age:
+                    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    row = None
+                if row is None:
+                    self._bump(conn, "misses")
+                    return None
+                conn.execute(
+                    "UPDATE entries SET accessed_at = ?, hits = hits + 1 WHERE key = ?",
+                    (now, key),
+                )
+                self._bump(conn, "hits")
+            return row[0]
+        except sqlite3.Error as e:
+            logger.warning(f"OCRCache: get failed, treating as miss: {e}")
+            return None
+
+    def put(self, key: str, value: Any) -> None:
+        """Store `value` (JSON-serialisable, or its JSON text) under `key`, then evict."""
+        payload = value if isinstance(value, str) else dumps(value)
+        sha256, doc_type, backend, version = (key.split(":", 3) + ["", "", ""])[:4]
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries "
+                    "(key, sha256, doc_type, backend, version, payload, size, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, sha256, doc_type, backend, version, payload,
+                     len(payload.encode("utf-8")), now, now),
+                )
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            logger.warning(f"OCRCache: put failed: {e}")
+
+    def invalidate(self, sha256: str) -> int:
+        """Drop every entry for one file (all doc_types/backends)."""
+        with self._connect() as conn:
+            cur = conn.execute("DELETE FROM entries WHERE sha256 = ?", (sha256,))
+            return cur.rowcount
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM counters")
+
+    def stats(self) -> dict:
+        """Hit/miss counters plus current size, shared by all processes."""
+        with self._connect() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+            entries, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "evictions": counters.get("evictions", 0),
+            "entries": entries,
+            "bytes": size,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+        }
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _bump(conn: sqlite3.Connection, name: str, n: int = 1) -> None:
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, n),
+        )
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """Age cut-off first, then LRU until under both size limits."""
+        evicted = conn.execute(
+            "DELETE FROM entries WHERE created_at < ?", (now - self.max_age,)
+        ).rowcount
+        count, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        if count > self.max_entries or size > self.max_bytes:
+            rows = conn.execute(
+                "SELECT key, size FROM entries ORDER BY accessed_at ASC"
+            ).fetchall()
+            doomed = []
+            for key, entry_size in rows:
+                if count <= self.max_entries and size <= self.max_bytes:
+                    break
+                doomed.append((key,))
+                count -= 1
+                size -= entry_size
+            conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+            evicted += len(doomed)
+        if evicted:
+            self._bump(conn, "evictions", evicted)
+
+
+# ---------------------------------------------------------------------------
+# Process-wide instances (one per cache file)
+# ---------------------------------------------------------------------------
+
+_INSTANCES: dict[str, OCRCache] = {}
+_INSTANCES_LOCK = threading.Lock()
+
+
+def get_ocr_cache(path: str, **limits) -> OCRCache:
+    """Return the shared OCRCache for `path`, creating it on first use."""
+    path = os.path.abspath(path)
+    with _INSTANCES_LOCK:
+        cache = _INSTANCES.get(path)
+        if cache is None:
+            cache = _INSTANCES[path] = OCRCache(path, **limits)
+        return cache
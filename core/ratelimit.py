@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Cross-process OCR provider rate limiter (跨进程 OCR 限流).
+
+``core.concurrency`` caps parallelism inside one process. Provider
+quotas are per account or per server, though: Tencent OCR enforces a QPS
+limit across every gunicorn worker, job worker and ``flask import-dir``
+process, and a local vLLM server has a fixed number of inference slots
+no matter who is calling. Without coordination, bursts turn into
+``RequestLimitExceeded`` errors and failed uploads.
+
+``RateLimiter`` keeps the shared state in a small SQLite file:
+
+  - a token bucket per provider (``rate`` tokens/s, up to ``burst``);
+  - one lease row per in-flight call, capped at ``max_in_flight``.
+    Leases expire after ``lease_ttl`` so a crashed process cannot hold a
+    slot forever.
+
+Each acquisition attempt is one ``BEGIN IMMEDIATE`` transaction, which
+serializes all processes on the file. A caller that cannot proceed
+sleeps for the computed wait (time to the next token, or a short poll
+for a free slot) and tries again — callers queue, they do not fail,
+unless they exceed ``max_wait``. Time spent queueing is recorded per
+provider in the same file, so ``stats()`` reports it across processes.
+
+Limits come from a spec string such as ``"tencent=10:10:10,vllm=0:0:2"``
+(``provider=rate[:burst[:max_in_flight]]``; 0 means unlimited), set with
+``configure()`` from ``create_app`` (``OCR_RATE_LIMITS``). Until
+configured, ``provider_slot()`` is a no-op.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    provider   TEXT PRIMARY KEY,
+    tokens     REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    id          TEXT PRIMARY KEY,
+    provider    TEXT NOT NULL,
+    pid         INTEGER NOT NULL,
+    acquired_at REAL NOT NULL,
+    expires_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_leases_provider ON leases (provider);
+CREATE TABLE IF NOT EXISTS waits (
+    provider   TEXT PRIMARY KEY,
+    acquired   INTEGER NOT NULL,
+    queued     INTEGER NOT NULL,
+    total_wait REAL NOT NULL,
+    max_wait   REAL NOT NULL
+);
+"""
+
+#: Longest single sleep while waiting for a free in-flight slot.
+POLL_INTERVAL = 0.2
+#: Waits shorter than this do not count as "queued".
+QUEUED_THRESHOLD = 0.01
+
+
+class RateLimitTimeout(RuntimeError):
+    """Waited longer than ``max_wait`` for a provider slot."""
+
+
+@dataclass(frozen=True)
+class ProviderLimit:
+    rate: float = 0.0          # tokens per second; 0 = no rate limit
+    burst: float = 0.0         # bucket size
+    max_in_flight: int = 0     # concurrent calls across processes; 0 = unlimited
+
+
+def parse_limits(spec: str) -> Dict[str, ProviderLimit]:
+    """Parse ``"tencent=10:20:5,vllm=0:0:2"`` into ProviderLimits."""
+    limits: Dict[str, ProviderLimit] = {}
+    for part in (spec or "").split(","):
+        name, sep, value = part.partition("=")
+        name = name.strip().lower()
+        if not sep or not name:
+            continue
+        fields = [f.strip() for f in value.split(":")]
+        try:
+            rate = max(0.0, float(fields[0] or 0))
+            burst = float(fields[1]) if len(fields) > 1 and fields[1] else rate
+            in_flight = int(fields[2]) if len(fields) > 2 and fields[2] else 0
+        except ValueError:
+            continue
+        limits[name] = ProviderLimit(rate, max(1.0, burst) if rate else 0.0, max(0, in_flight))
+    return limits
+
+
+class RateLimiter:
+    """Token bucket + in-flight cap per provider, shared through SQLite."""
+
+    def __init__(
+        self,
+        path: str,
+        limits: Dict[str, ProviderLimit] | str,
+        lease_ttl: float = 600.0,
+        max_wait: Optional[float] = 600.0,
+    ):
+        self.path = path
+        self.limits = parse_limits(limits) if isinstance(limits, str) else dict(limits)
+        self.lease_ttl = lease_ttl
+        self.max_wait = max_wait
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode: transactions are opened explicitly with BEGIN IMMEDIATE.
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def slot(self, provider: str) -> Iterator[float]:
+        """Hold one call's worth of quota for `provider`; yields seconds queued."""
+        limit = self.limits.get(provider)
+        if limit is None or not (limit.rate or limit.max_in_flight):
+            yield 0.0
+            return
+        lease_id, waited = self.acquire(provider, limit)
+        try:
+            yield waited
+        finally:
+            self.release(lease_id)
+
+    def acquire(self, provider: str, limit: ProviderLimit) -> tuple[str, float]:
+        """Block until a token and an in-flight slot are free; returns (lease id, wait)."""
+        lease_id = uuid.uuid4().hex
+        start = time.monotonic()
+        while True:
+            delay = self._try_acquire(provider, limit, lease_id, start)
+            if delay is None:
+                waited = time.monotonic() - start
+                if waited >= 1.0:
+                    logger.info(f"RateLimiter: {provider} queued {waited:.2f}s")
+                return lease_id, waited
+            if self.max_wait is not None and time.monotonic() - start + delay > self.max_wait:
+                raise RateLimitTimeout(
+                    f"{provider} 限流排队超过 {self.max_wait:.0f} 秒"
+                )
+            # Jitter so waiting processes don't wake in lockstep.
+            time.sleep(delay * random.uniform(1.0, 1.2))
+
+    def release(self, lease_id: str) -> None:
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM leases WHERE id = ?", (lease_id,))
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict[str, dict]:
+        """Per provider: configured limits, current in-flight, queue wait totals."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            in_flight = dict(conn.execute(
+                "SELECT provider, COUNT(*) FROM leases WHERE expires_at >= ? GROUP BY provider",
+                (now,),
+            ).fetchall())
+            waits = {
+                row[0]: row[1:]
+                for row in conn.execute(
+                    "SELECT provider, acquired, queued, total_wait, max_wait FROM waits"
+                )
+            }
+        finally:
+            conn.close()
+        result = {}
+        for name in sorted(set(self.limits) | set(in_flight) | set(waits)):
+            limit = self.limits.get(name, ProviderLimit())
+            acquired, queued, total_wait, max_wait = waits.get(name, (0, 0, 0.0, 0.0))
+            result[name] = {
+                "rate": limit.rate,
+                "burst": limit.burst,
+                "max_in_flight": limit.max_in_flight,
+                "in_flight": in_flight.get(name, 0),
+                "acquired": acquired,
+                "queued": queued,
+                "avg_wait": round(total_wait / acquired, 4) if acquired else 0.0,
+                "max_wait": round(max_wait, 4),
+            }
+        return result
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _try_acquire(self, provider: str, limit: ProviderLimit, lease_id: str,
+                     start: float) -> Optional[float]:
+        """One attempt. None on success, else seconds to wait before retrying."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                delay = self._reserve(conn, provider, limit, now)
+                if delay is None:
+                    conn.execute(
+                        "INSERT INTO leases (id, provider, pid, acquired_at, expires_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (lease_id, provider, os.getpid(), now, now + self.lease_ttl),
+                    )
+                    waited = time.monotonic() - start
+                    conn.execute(
+                        "INSERT INTO waits (provider, acquired, queued, total_wait, max_wait) "
+                        "VALUES (?, 1, ?, ?, ?) "
+                        "ON CONFLICT(provider) DO UPDATE SET "
+                        "acquired = acquired + 1, queued = queued + excluded.queued, "
+                        "total_wait = total_wait + excluded.total_wait, "
+                        "max_wait = MAX(max_wait, excluded.max_wait)",
+                        (provider, int(waited >= QUEUED_THRESHOLD), waited, waited),
+                    )
+                conn.execute("COMMIT")
+                return delay
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def _reserve(self, conn: sqlite3.Connection, provider: str, limit: ProviderLimit,
+                 now: float) -> Optional[float]:
+        # Reclaim slots of processes that died mid-call.
+        conn.execute("DELETE FROM leases WHERE expires_at < ?", (now,))
+        if limit.max_in_flight:
+            (running,) = conn.execute(
+                "SELECT COUNT(*) FROM leases WHERE provider = ?", (provider,)
+            ).fetchone()
+            if running >= limit.max_in_flight:
+                return POLL_INTERVAL
+        if not limit.rate:
+            return None
+
+        row = conn.execute(
+            "SELECT tokens, updated_at FROM buckets WHERE provider = ?", (provider,)
+        ).fetchone()
+        if row is None:
+            tokens = limit.burst
+        else:
+            tokens = min(limit.burst, row[0] + max(0.0, now - row[1]) * limit.rate)
+        delay = None
+        if tokens >= 1.0:
+            tokens -= 1.0
+        else:
+            delay = (1.0 - tokens) / limit.rate
+        conn.execute(
+            "INSERT OR REPLACE INTO buckets (provider, tokens, updated_at) VALUES (?, ?, ?)",
+            (provider, tokens, now),
+        )
+        return delay
+
+
+# ---------------------------------------------------------------------------
+# Process-wide limiter
+# ---------------------------------------------------------------------------
+
+_lock = threading.Lock()
+_limiter: Optional[RateLimiter] = None
+
+
+def configure(path: Optional[str], limits: Dict[str, ProviderLimit] | str, **options) -> None:
+    """Install the process-wide limiter. ``path=None`` disables limiting."""
+    global _limiter
+    with _lock:
+        _limiter = RateLimiter(path, limits, **options) if path else None
+
+
+def get_limiter() -> Optional[RateLimiter]:
+    with _lock:
+        return _limiter
+
+
+@contextmanager
+def provider_slot(provider: str) -> Iterator[float]:
+    """Queue for `provider`'s shared quota; yields seconds spent waiting.
+
+    The wait is reported to ``core.concurrency.exclude_wait`` so it does
+    not count as latency for an enclosing ``backend_slot``.
+    """
+    limiter = get_limiter()
+    if limiter is None:
+        yield 0.0
+        return
+    with limiter.slot(provider) as waited:
+        from core.concurrency import exclude_wait
+        exclude_wait(waited)
+        yield waited
+
+
+def stats() -> Dict[str, dict]:
+    limiter = get_limiter()
+    return limiter.stats() if limiter is not None else {}
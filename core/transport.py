@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Pooled keep-alive HTTPS transport for OCR API calls (OCR HTTPS 连接池).
+
+Opening a fresh ``HTTPSConnection`` per request costs a TCP + TLS
+handshake every time and, if the connection is never closed, leaks a
+socket per invoice. ``HTTPSPool`` keeps idle connections to one host and
+hands them out to whichever thread needs one; a connection goes back to
+the pool after its response has been read completely.
+
+Every connection has explicit timeouts: ``connect_timeout`` bounds the
+TCP + TLS handshake, ``read_timeout`` bounds each socket read while
+waiting for the response.
+
+``request()`` retries with exponential backoff and full jitter when
+connecting fails, the server answers 5xx, or the caller's
+``retry_if(status, body)`` says the response is retryable (e.g.
+Tencent's ``RequestLimitExceeded``, which comes back as HTTP 200). A
+failure after the request started going out — a read timeout, a reset
+while waiting for the response — is *not* retried: the server may have
+processed (and billed) the call, so it is raised as TransportError
+straight away. A connection the server closed while it sat idle is
+replaced silently and does not count as an attempt.
+
+``slot`` lets the caller wrap each attempt in its own context — the
+Tencent client passes ``provider_slot("tencent")`` so every retry takes
+a fresh token from the shared rate limiter, and the backoff sleep
+between attempts holds no in-flight lease.
+
+Pools are per process and shared through ``get_pool(host, port)``.
+Settings come from ``configure()`` (called by ``create_app`` with the
+``OCR_HTTP_*`` config values).
+"""
+from __future__ import annotations
+
+import os
+import random
+import ssl
+import threading
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass
+from http.client import HTTPException, HTTPSConnection, RemoteDisconnected
+from typing import Callable, ContextManager, Dict, List, Mapping, Optional, Tuple
+
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 30.0
+DEFAULT_POOL_SIZE = 8
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 8.0
+
+# Raised by a kept-alive connection the server has already closed.
+_STALE_ERRORS = (RemoteDisconnected, BrokenPipeError, ConnectionResetError, ConnectionAbortedError)
+
+
+class TransportError(Exception):
+    """The request failed at the network level (see ``HTTPSPool.request``)."""
+
+
+class _ConnectFailed(Exception):
+    """TCP + TLS setup failed: nothing was sent, so retrying is safe."""
+
+
+@dataclass
+class Response:
+    status: int
+    body: bytes
+    headers: Dict[str, str]
+    attempts: int = 1
+
+
+@dataclass
+class _Settings:
+    connect_timeout: float = DEFAULT_CONNECT_TIMEOUT
+    read_timeout: float = DEFAULT_READ_TIMEOUT
+    pool_size: int = DEFAULT_POOL_SIZE
+    max_retries: int = DEFAULT_MAX_RETRIES
+    backoff_base: float = DEFAULT_BACKOFF_BASE
+    backoff_max: float = DEFAULT_BACKOFF_MAX
+
+
+_settings = _Settings()
+
+
+def backoff_delay(attempt: int, base: float = DEFAULT_BACKOFF_BASE,
+                  cap: float = DEFAULT_BACKOFF_MAX) -> float:
+    """Full-jitter backoff before retry number `attempt` (1-based)."""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+class HTTPSPool:
+    """Thread-safe pool of keep-alive HTTPS connections to one host."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 443,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_base: float = DEFAULT_BACKOFF_BASE,
+        backoff_max: float = DEFAULT_BACKOFF_MAX,
+        ssl_context: Optional[ssl.SSLContext] = None,
+    ):
+        self.host = host
+        self.port = port
+        self.pool_size = max(1, pool_size)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.ssl_context = ssl_context or ssl.create_default_context()
+        self._lock = threading.Lock()
+        self._idle: List[HTTPSConnection] = []
+        self._stats = {"connections_opened": 0, "requests": 0, "retries": 0}
+
+    # ------------------------------------------------------------------
+    # Connection management
+    # ------------------------------------------------------------------
+
+    def _connect(self) -> HTTPSConnection:
+        conn = HTTPSConnection(
+            self.host, self.port, timeout=self.connect_timeout, context=self.ssl_context,
+        )
+        conn.connect()
+        conn.sock.settimeout(self.read_timeout)
+        with self._lock:
+            self._stats["connections_opened"] += 1
+        return conn
+
+    def _checkout(self) -> Tuple[HTTPSConnection, bool]:
+        """An idle connection (reused=True) or a freshly connected one."""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._connect(), False
+
+    def _checkin(self, conn: HTTPSConnection) -> None:
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self) -> None:
+        """Close every idle connection. The pool stays usable."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, idle=len(self._idle))
+
+    # ------------------------------------------------------------------
+    # Requests
+    # ------------------------------------------------------------------
+
+    def _send_once(self, method: str, path: str, body: Optional[bytes],
+                   headers: Mapping[str, str]) -> Response:
+        try:
+            conn, reused = self._checkout()
+        except (OSError, HTTPException) as e:
+            raise _ConnectFailed(e) from e
+        try:
+            try:
+                conn.request(method, path, body=body, headers=dict(headers))
+                resp = conn.getresponse()
+            except _STALE_ERRORS:
+                if not reused:
+                    raise
+                # Server dropped the idle connection — reconnect once.
+                conn.close()
+                try:
+                    conn = self._connect()
+                except (OSError, HTTPException) as e:
+                    raise _ConnectFailed(e) from e
+                conn.request(method, path, body=body, headers=dict(headers))
+                resp = conn.getresponse()
+            data = resp.read()
+        except BaseException:
+            conn.close()
+            raise
+        if resp.will_close:
+            conn.close()
+        else:
+            self._checkin(conn)
+        return Response(resp.status, data, {k.lower(): v for k, v in resp.getheaders()})
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        retry_if: Optional[Callable[[int, bytes], bool]] = None,
+        slot: Optional[Callable[[], ContextManager]] = None,
+    ) -> Response:
+        """Send a request, retrying connect failures, 5xx and `retry_if` hits.
+
+        When retries run out on a retryable *response*, that response is
+        returned so the caller can report the server's error. Connect
+        failures on every attempt raise TransportError; so does any
+        failure once the request was sent, without retrying — the call
+        is not idempotent (billed OCR, signed timestamp).
+
+        `slot()`, if given, is entered around each attempt only; the
+        backoff sleep between attempts runs outside it.
+        """
+        headers = headers or {}
+        attempts = self.max_retries + 1
+        for attempt in range(1, attempts + 1):
+            with self._lock:
+                self._stats["requests"] += 1
+            try:
+                with slot() if slot is not None else nullcontext():
+                    resp = self._send_once(method, path, body, headers)
+            except _ConnectFailed as e:
+                cause = e.__cause__
+                if attempt == attempts:
+                    raise TransportError(f"{type(cause).__name__}: {cause}") from cause
+            except (OSError, HTTPException) as e:
+                # Sent (perhaps processed) but no complete response.
+                raise TransportError(
+                    f"{type(e).__name__} after the request was sent: {e}"
+                ) from e
+            else:
+                resp.attempts = attempt
+                retryable = resp.status >= 500 or (
+                    retry_if is not None and retry_if(resp.status, resp.body)
+                )
+                if not retryable or attempt == attempts:
+                    return resp
+            with self._lock:
+                self._stats["retries"] += 1
+            time.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_max))
+        raise AssertionError("unreachable")
+
+
+# ---------------------------------------------------------------------------
+# Per-process pool registry
+# ---------------------------------------------------------------------------
+
+_registry_lock = threading.Lock()
+_pools: Dict[Tuple[str, int], HTTPSPool] = {}
+_pools_pid = os.getpid()
+
+
+def configure(
+    connect_timeout: Optional[float] = None,
+    read_timeout: Optional[float] = None,
+    pool_size: Optional[int] = None,
+    max_retries: Optional[int] = None,
+    backoff_base: Optional[float] = None,
+    backoff_max: Optional[float] = None,
+) -> None:
+    """Update settings for pools created from now on; existing pools are closed."""
+    values = {
+        "connect_timeout": connect_timeout, "read_timeout": read_timeout,
+        "pool_size": pool_size, "max_retries": max_retries,
+        "backoff_base": backoff_base, "backoff_max": backoff_max,
+    }
+    with _registry_lock:
+        for name, value in values.items():
+            if value is not None:
+                setattr(_settings, name, value)
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def get_pool(host: str, port: int = 443, ssl_context: Optional[ssl.SSLContext] = None) -> HTTPSPool:
+    """The shared pool for (host, port) in this process, created on first use."""
+    global _pools_pid
+    with _registry_lock:
+        if _pools_pid != os.getpid():
+            # Forked worker: never share sockets with the parent process.
+            _pools.clear()
+            _pools_pid = os.getpid()
+        pool = _pools.get((host, port))
+        if pool is None:
+            pool = _pools[(host, port)] = HTTPSPool(
+                host, port,
+                pool_size=_settings.pool_size,
+                connect_timeout=_settings.connect_timeout,
+                read_timeout=_settings.read_timeout,
+                max_retries=_settings.max_retries,
+                backoff_base=_settings.backoff_base,
+                backoff_max=_settings.backoff_max,
+                ssl_context=ssl_context,
+            )
+        return pool
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    with _registry_lock:
+        pools = dict(_pools)
+    return {f"{host}:{port}": pool.stats() for (host, port), pool in pools.items()}
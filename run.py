@@ -43,6 +43,11 @@ def check_and_init_db():
 
     with app.app_context():
         db.create_all()
+        # 旧库补列 / 回填（create_all 不会修改已有的表）
+        from app.migrations import upgrade
+        result = upgrade()
+        if result['added'] or result['backfilled']:
+            print(f"数据库已升级: 新增列 {len(result['added'])} 个, 回填 {result['backfilled']} 行")
 
         if not db_exists:
             print("数据库初始化完成！")
@@ -78,6 +83,97 @@ def cleanup_command(days):
     click.echo(f'成功清理了 {count} 个过期文件')
 
 
+@app.cli.command('jobs-worker')
+@click.option('--workers', default=None, type=int, help='并发执行的任务数（默认 INGEST_WORKERS）')
+@click.option('--once', is_flag=True, help='处理完当前队列后退出')
+@with_appcontext
+def jobs_worker_command(workers, once):
+    """独立进程执行识别任务队列（可与 Web 进程并行部署多个）"""
+    import time
+    from app.jobs import JobRunner, requeue_stale, work_once, _worker_name
+
+    if once:
+        worker = _worker_name(':cli')
+        requeue_stale()
+        count = 0
+        while work_once(worker):
+            count += 1
+        click.echo(f'处理了 {count} 个识别任务')
+        return
+
+    runner = JobRunner(
+        app,
+        workers=workers or app.config.get('INGEST_WORKERS', 2) or 1,
+        poll_interval=app.config.get('INGEST_POLL_INTERVAL', 2.0),
+    ).start()
+    click.echo(f'识别任务 worker 已启动（{runner.workers} 个线程），Ctrl+C 退出')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        runner.stop(timeout=5)
+        click.echo('worker 已停止')
+
+
+@app.cli.command('import-dir')
+@click.argument('path', type=click.Path(exists=True))
+@click.option('--workers', default=None, type=int, help='并行进程数（默认 CPU 核数）')
+@click.option('--doc-type', default='vat', help='文档类型（vat / medical / train …）')
+@click.option('--backend', default='tencent', help='本地提取失败时使用的 OCR 后端')
+@click.option('--project-id', default=None, type=int, help='导入到指定项目')
+@click.option('--manifest', default=None, help='清单文件路径（默认 data/imports/<名称>-<路径哈希>.db）')
+@click.option('--retry-failed', is_flag=True, help='重新处理上次失败的文件')
+@click.option('--batch-size', default=None, type=int,
+              help='每个进程任务的文件数（默认 vllm 为 8，组内 OCR 并发；其他后端为 1）')
+@with_appcontext
+def import_dir_command(path, workers, doc_type, backend, project_id, manifest, retry_failed,
+                       batch_size):
+    """批量导入目录或 zip 包中的发票（可中断，重新运行即续传）"""
+    from app.importer import default_manifest_path, import_path
+
+    if manifest is None:
+        manifest = default_manifest_path(path, app.config['BASE_DIR'])
+
+    def progress(done, total, relpath, result):
+        status = '✓' if result.get('success') else '✗'
+        line = f"[{done}/{total}] {status} {relpath} ({result.get('source') or '-'}, {result.get('elapsed')}s)"
+        if not result.get('success'):
+            line += f" {result.get('message')}"
+        click.echo(line)
+
+    stats = import_path(
+        path,
+        config_name=os.getenv('FLASK_CONFIG') or 'default',
+        manifest_path=manifest,
+        extensions=app.config['ALLOWED_EXTENSIONS'],
+        workers=workers,
+        project_id=project_id,
+        doc_type=doc_type,
+        backend=backend,
+        retry_failed=retry_failed,
+        progress=progress,
+        batch_size=batch_size,
+    )
+
+    click.echo()
+    click.echo(f"共 {stats['total']} 个文件，跳过已导入 {stats['skipped']} 个，本次处理 {stats['processed']} 个")
+    click.echo(f"成功 {stats['succeeded']}（其中重复 {stats['duplicates']}），失败 {stats['failed']}")
+    click.echo(f"节省 OCR 调用 {stats['ocr_saved']} 次（本地PDF提取 / 缓存命中）")
+    click.echo(f"耗时 {stats['elapsed']}s，吞吐 {stats['files_per_s']} 个/秒")
+    click.echo(f"清单: {manifest}")
+
+
+@app.cli.command('upgrade-db')
+@with_appcontext
+def upgrade_db_command():
+    """补齐旧数据库缺少的列与索引，并回填金额的整数分列"""
+    from app.migrations import upgrade
+    result = upgrade()
+    for column in result['added']:
+        click.echo(f'新增列: {column}')
+    click.echo(f"回填 {result['backfilled']} 行")
+
+
 @app.cli.command('create-admin')
 @click.option('--username', prompt=True, help='管理员用户名')
 @click.option('--email', prompt=True, help='管理员邮箱')
@@ -49,3 +49,54 @@ def parse_fixture(name: str, doc_type: str):
 @pytest.fixture
 def fixture_dir():
     return FIXTURE_DIR
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Flask app on a throwaway database; every shared state file in tmp_path."""
+    from app import create_app
+    from app.config import config
+    from app.models import db
+
+    monkeypatch.setattr(config['testing'], 'SQLALCHEMY_DATABASE_URI',
+                        'sqlite:///' + str(tmp_path / 'app.db'))
+    monkeypatch.setattr(config['testing'], 'INGEST_WORKERS', 0)
+    monkeypatch.setattr(config['testing'], 'OCR_CACHE_PATH', str(tmp_path / 'cache.db'))
+    monkeypatch.setattr(config['testing'], 'OCR_RATELIMIT_PATH', str(tmp_path / 'ratelimit.db'))
+    monkeypatch.setattr(config['testing'], 'CLIENT_STAMP_PATH', str(tmp_path / 'clients.stamp'))
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+def make_text_pdf(path, pages):
+    """Write a minimal text-layer PDF (Helvetica, ASCII only).
+
+    `pages` is a list of pages, each a list of text lines. Good enough
+    for pdfplumber to extract words/text without a PDF library.
+    """
+    chunks = [b"%PDF-1.4\n"]
+    offsets = []
+
+    def add(body):
+        offsets.append(sum(len(c) for c in chunks))
+        chunks.append(f"{len(offsets)} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages)))
+    add("<< /Type /Catalog /Pages 2 0 R >>")
+    add(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>")
+    add("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i, lines in enumerate(pages):
+        stream = "BT /F1 12 Tf 50 780 Td 14 TL " + " ".join(f"({ln}) Tj T*" for ln in lines) + " ET"
+        add(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>")
+        add(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    xref = sum(len(c) for c in chunks)
+    chunks.append(f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode())
+    chunks.extend(f"{o:010d} 00000 n \n".encode() for o in offsets)
+    chunks.append(f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\n"
+                  f"startxref\n{xref}\n%%EOF\n".encode())
+    with open(path, "wb") as f:
+        f.write(b"".join(chunks))
@@ -0,0 +1,143 @@
+"""Integer-cents amount columns: parsing, sync on write, backfill, SQL aggregation."""
+from datetime import date
+
+import pytest
+from sqlalchemy import inspect, text
+
+from core.money import from_cents, to_cents
+
+
+@pytest.mark.parametrize("value, cents", [
+    ("¥1,234.50", 123450),
+    ("1234.5元", 123450),
+    ("￥ 106.00", 10600),
+    ("-100.00", -10000),
+    ("0.005", 1),
+    (".5", 50),
+    (3, 300),
+    ("", None),
+    ("壹佰圆整", None),
+    ("1.2.3", None),
+    (None, None),
+])
+def test_to_cents(value, cents):
+    assert to_cents(value) == cents
+
+
+def test_from_cents():
+    assert str(from_cents(123450)) == "1234.50"
+    assert str(from_cents(None)) == "0.00"
+
+
+def _invoice(number, amount, **columns):
+    from app.models import Invoice
+    return Invoice(invoice_number=number, amount_in_figures=amount, **columns)
+
+
+def test_cents_follow_string_columns(app):
+    from app.models import Invoice, InvoiceItem, db
+    from app.persistence import save_invoice, sync_items
+
+    invoice = save_invoice(_invoice("1", "¥1,234.50", total_amount="1164.62", total_tax="69.88"),
+                           [{"name": "A", "amount": "¥100.00", "tax": "6.00"}])
+    assert (invoice.amount_in_figures_cents, invoice.total_amount_cents,
+            invoice.total_tax_cents) == (123450, 116462, 6988)
+    assert [(i.amount_cents, i.tax_cents) for i in InvoiceItem.query] == [(10000, 600)]
+
+    invoice.amount_in_figures = "不详"
+    sync_items(invoice.id, [{"name": "A", "amount": "50", "tax": "3"}])
+    db.session.commit()
+    invoice = db.session.get(Invoice, invoice.id)
+    assert invoice.amount_in_figures_cents is None
+    assert [(i.amount_cents, i.tax_cents) for i in InvoiceItem.query] == [(5000, 300)]
+
+
+def test_upgrade_adds_columns_and_backfills(app):
+    from app.migrations import upgrade
+    from app.models import Invoice, InvoiceItem, db
+
+    # 模拟升级前的旧库：没有 *_cents 列与索引
+    with db.engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_invoices_amount_in_figures_cents"))
+        for table, column in [("invoices", "total_amount_cents"), ("invoices", "total_tax_cents"),
+                              ("invoices", "amount_in_figures_cents"),
+                              ("invoice_items", "amount_cents"), ("invoice_items", "tax_cents")]:
+            conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+        conn.execute(text("INSERT INTO invoices (id, invoice_number, amount_in_figures, total_tax) "
+                          "VALUES (1, '1', '¥1,234.50', '6.00'), (2, '2', '不详', NULL), "
+                          "(3, '3', NULL, NULL)"))
+        conn.execute(text("INSERT INTO invoice_items (invoice_id, name, amount, tax) "
+                          "VALUES (1, 'A', '100.00', '6.00')"))
+
+    result = upgrade()
+    assert len(result["added"]) == 5
+    assert result["backfilled"] == 2
+    indexes = {ix["name"] for ix in inspect(db.engine).get_indexes("invoices")}
+    assert "ix_invoices_amount_in_figures_cents" in indexes
+
+    rows = {i.id: (i.amount_in_figures_cents, i.total_tax_cents) for i in Invoice.query}
+    assert rows == {1: (123450, 600), 2: (None, None), 3: (None, None)}
+    assert [(i.amount_cents, i.tax_cents) for i in InvoiceItem.query] == [(10000, 600)]
+
+    # 再次执行无事可做
+    assert upgrade() == {"added": [], "backfilled": 0}
+
+
+def _seed():
+    from app.models import Project, db
+    from app.persistence import save_invoice
+
+    project = Project(name="p")
+    db.session.add(project)
+    db.session.commit()
+    data = [
+        ("1", "¥100.00", date(2024, 1, 5), "增值税电子普通发票", "甲"),
+        ("2", "¥1,000.50", date(2024, 1, 20), "增值税电子专用发票", "乙"),
+        ("3", "20", date(2024, 2, 1), "增值税电子普通发票", "甲"),
+        ("4", "不详", None, "", ""),
+    ]
+    for number, amount, day, kind, seller in data:
+        save_invoice(_invoice(number, amount, invoice_date=day, invoice_type=kind, seller_name=seller,
+                              total_amount=amount, total_tax="1.00", project_id=project.id),
+                     [{"name": "x", "amount": amount, "tax": "1.00"}])
+    return project
+
+
+def test_sort_and_range_run_in_sql(app):
+    from app.models import Invoice
+    from app.routes import _filter_amount_range
+
+    _seed()
+    desc = Invoice.query.order_by(Invoice.amount_in_figures_cents.desc(), Invoice.id.desc())
+    assert [i.invoice_number for i in desc] == ["2", "1", "3", "4"]
+    in_range = _filter_amount_range(Invoice.query, "50", "¥1,000.50")
+    assert sorted(i.invoice_number for i in in_range) == ["1", "2"]
+    assert _filter_amount_range(Invoice.query, "abc", "").count() == 4
+
+
+def test_statistics_aggregate_in_sql(app):
+    from app.utils import get_invoice_statistics
+
+    _seed()
+    stats = get_invoice_statistics()
+    assert stats["invoice_count"] == 4
+    assert stats["total_amount"] == "1,120.50"
+    assert stats["monthly_data"] == {"labels": ["2024-01", "2024-02"], "counts": [2, 1],
+                                     "amounts": [1100.5, 20.0]}
+    assert stats["type_data"] == {"labels": ["增值税电子普通发票", "增值税电子专用发票"],
+                                  "counts": [2, 1]}
+
+
+def test_project_export_stats_match_python_fallback(app):
+    from sqlalchemy.orm import selectinload
+
+    from app.models import Invoice
+    from app.utils import project_export_stats
+    from core.invoice_export import InvoiceExporter
+
+    project = _seed()
+    stats = project_export_stats(project.id)
+    invoices = Invoice.query.options(selectinload(Invoice.items)).filter_by(project_id=project.id).all()
+    assert stats == InvoiceExporter.project_stats(invoices)
+    assert stats["invoice_totals"] == {"金额": 1120.5, "税额": 4.0, "价税合计": 1120.5}
+    assert stats["sellers"] == {"甲": {"count": 2, "amount": 120.0}, "乙": {"count": 1, "amount": 1000.5}}
@@ -0,0 +1,65 @@
+"""tools/bench_parsers.py: scale-ups, baseline comparison and scaling check."""
+import importlib.util
+import os
+
+import pytest
+
+from conftest import REPO_ROOT, get_parser
+
+
+@pytest.fixture(scope="module")
+def bench():
+    path = os.path.join(REPO_ROOT, "tools", "bench_parsers.py")
+    spec = importlib.util.spec_from_file_location("bench_parsers", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _result(total, blocks=100):
+    seconds = {stage: total / 5 for stage in ("layout", "index", "labels", "parse")}
+    return {"blocks": blocks, "seconds": dict(seconds, total=total), "peak_bytes": 0}
+
+
+def test_scale_ups_replicate_pages_and_item_rows(bench):
+    base = bench.load_fixture("vat_jd.json")
+    pages = bench.scale_pages(base, 3)
+    assert len(pages) == 3 * len(base)
+    assert max(b.page for b in pages) == 2
+    vat = get_parser("vat")
+    items = vat.parse(base).items
+    assert len(vat.parse(bench.scale_rows(base, 4)).items) == 4 * len(items)
+
+
+def test_run_bench_reports_every_parser_and_stage(bench):
+    current = bench.run_bench(["train_eticket.json"], ["pages×2"], repeat=1)
+    assert set(current["results"]) == {"train_eticket.json", "train_eticket.json@pages×2"}
+    assert current["cases"]["train_eticket.json@pages×2"] == ["train_eticket.json", 2]
+    for by_parser in current["results"].values():
+        assert {"vat", "medical", "train"} <= set(by_parser)
+        for result in by_parser.values():
+            assert set(result["seconds"]) == set(bench.STAGES)
+            assert result["peak_bytes"] > 0
+
+
+def test_compare_flags_slowdowns_beyond_threshold(bench):
+    baseline = {"results": {"a": {"vat": _result(0.010)}}, "calibration": {"a": 1.0}}
+    slower = {"results": {"a": {"vat": _result(0.014)}}, "calibration": {"a": 1.0}}
+    assert [r[:3] for r in bench.compare(slower, baseline, threshold=0.25)] == [
+        ("a", "vat", "total"),
+    ]
+    assert bench.compare(slower, baseline, threshold=0.5) == []
+    # The same slowdown on a machine that calibrates 1.5× slower is not one.
+    slower["calibration"]["a"] = 1.5
+    assert bench.compare(slower, baseline, threshold=0.25) == []
+
+
+def test_scaling_flags_superlinear_growth(bench):
+    current = {
+        "cases": {"a": ["a", 1], "a@pages×4": ["a", 4]},
+        "results": {"a": {"vat": _result(0.010, 100)},
+                    "a@pages×4": {"vat": _result(0.160, 400)}},
+    }
+    assert [r[:2] for r in bench.scaling(current)] == [("a@pages×4", "vat")]
+    current["results"]["a@pages×4"]["vat"] = _result(0.045, 400)
+    assert bench.scaling(current) == []
@@ -0,0 +1,61 @@
+"""BlockArray: columnar blocks behave like the TextBlock lists they replace."""
+import dataclasses
+
+import pytest
+
+from conftest import get_parser, load_blocks, make_text_pdf
+from core.extractors.base import TextBlock
+from core.extractors.local.blocks import BlockArray
+from core.extractors.local.layout import Layout
+from core.extractors.local.spatial import BlockIndex
+
+FIXTURES = ["vat_jd.json", "medical_inpatient_3page.json", "train_eticket.json"]
+
+
+def test_round_trip_and_views():
+    blocks = [TextBlock("发票", (1.5, 2, 3, 4), 0.9, 1, "c1"), TextBlock("号码", (5, 6, 7, 8))]
+    array = BlockArray.from_blocks(blocks)
+    assert len(array) == 2
+    assert list(array) == blocks
+    assert array.to_blocks() == blocks
+    assert array[0] is array[0] and array[-1] is array[1]
+    assert array[0].bbox == (1.5, 2.0, 3.0, 4.0)
+    assert (array[0].page, array[0].block_id, array[1].block_id) == (1, "c1", None)
+    assert array[1:] == [array[1]]
+    with pytest.raises(IndexError):
+        array[2]
+
+
+@pytest.mark.parametrize("name", FIXTURES)
+def test_layout_and_index_match_lists(name):
+    blocks = load_blocks(name)
+    array = BlockArray.from_blocks(blocks)
+    assert Layout(array).text == Layout(blocks).text
+    by_list, by_array = BlockIndex(blocks), BlockIndex(array)
+    assert [[b.text for b in ws] for _, ws in by_array.rows()] == \
+        [[b.text for b in ws] for _, ws in by_list.rows()]
+    for i in range(0, len(blocks), 7):
+        assert by_array.right_of(array[i], 4.0) == by_list.right_of(blocks[i], 4.0)
+
+
+@pytest.mark.parametrize("doc_type", ["vat", "medical", "train"])
+@pytest.mark.parametrize("name", FIXTURES)
+def test_parsers_accept_block_arrays(name, doc_type):
+    parser = get_parser(doc_type)
+    blocks = load_blocks(name)
+    expected = dataclasses.asdict(parser.parse(blocks))
+    assert dataclasses.asdict(parser.parse(BlockArray.from_blocks(blocks))) == expected
+
+
+def test_document_blocks_are_columnar(tmp_path):
+    pytest.importorskip("pdfplumber")
+    from core.extractors.local.document import PdfDocument
+
+    path = str(tmp_path / "a.pdf")
+    make_text_pdf(path, [["first page"], ["second page"]])
+    with PdfDocument(path) as doc:
+        blocks = doc.blocks()
+        assert isinstance(blocks, BlockArray)
+        assert [b.text for b in blocks] == ["first", "page", "second", "page"]
+        assert blocks.page.tolist() == [0, 0, 1, 1]
+        assert doc.page_blocks(1)[0] == blocks[2]
@@ -0,0 +1,68 @@
+"""Client registry: reuse until the configuration changes."""
+import os
+
+import pytest
+
+from core import clients
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry(tmp_path):
+    clients.configure(str(tmp_path / "clients.stamp"))
+    clients.clear()
+    yield
+    clients.clear()
+
+
+def test_reuse_until_invalidated_and_rebuild_only_on_change():
+    config = {"key": "a"}
+    loads, builds = [], []
+
+    def load():
+        loads.append(1)
+        return dict(config)
+
+    def build(cfg):
+        builds.append(cfg)
+        return object()
+
+    first = clients.get("x", load, build)
+    assert clients.get("x", load, build) is first
+    assert (len(loads), len(builds)) == (1, 1)
+
+    clients.invalidate()                       # same config → same client
+    assert clients.get("x", load, build) is first
+    assert (len(loads), len(builds)) == (2, 1)
+
+    config["key"] = "b"
+    clients.invalidate()
+    assert clients.get("x", load, build) is not first
+    assert builds[-1] == {"key": "b"}
+
+
+def test_stamp_from_another_process_invalidates(tmp_path):
+    loads = []
+    load = lambda: loads.append(1) or {}
+    clients.get("x", load, lambda cfg: object())
+    stamp = tmp_path / "clients.stamp"
+    stamp.write_text("other worker")
+    os.utime(stamp, ns=(1, 1))
+    clients.get("x", load, lambda cfg: object())
+    assert len(loads) == 2
+
+
+def test_saving_settings_rebuilds_ocr_client(app, monkeypatch):
+    pytest.importorskip("tencentcloud")
+    from app.models import Settings
+    from core.ocr_api import get_ocr_client
+
+    monkeypatch.delenv("TENCENT_SECRET_ID", raising=False)
+    monkeypatch.delenv("TENCENT_SECRET_KEY", raising=False)
+    clients.clear()
+    Settings.set_value("TENCENT_SECRET_ID", "id-1")
+    Settings.set_value("TENCENT_SECRET_KEY", "key-1")
+
+    client = get_ocr_client()
+    assert get_ocr_client() is client
+    Settings.set_value("TENCENT_SECRET_ID", "id-2")
+    assert get_ocr_client().cred.secretId == "id-2"
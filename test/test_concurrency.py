@@ -0,0 +1,132 @@
+"""Per-backend concurrency slots."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core import concurrency
+
+
+def test_parse_limits_ignores_garbage():
+    assert concurrency.parse_limits("tencent=5, vllm = 2,bad,x=y,local-pdf=0") == {
+        "tencent": 5, "vllm": 2, "local-pdf": 1,
+    }
+
+
+def test_backend_slot_caps_parallelism():
+    concurrency.configure({"test-backend": 2})
+    lock = threading.Lock()
+    running = peak = 0
+
+    def call(_):
+        nonlocal running, peak
+        with concurrency.backend_slot("test-backend"):
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.02)
+            with lock:
+                running -= 1
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(call, range(16)))
+
+    assert peak == 2
+    assert concurrency.stats()["test-backend"] == {"limit": 2, "in_flight": 0}
+
+
+def test_parse_auto_limits():
+    assert concurrency.parse_limits("vllm=auto, ollama=auto:8, bad=auto:x") == {
+        "vllm": concurrency.AutoLimit(concurrency.DEFAULT_AUTO_MAX),
+        "ollama": concurrency.AutoLimit(8),
+    }
+
+
+def test_adaptive_limit_follows_latency():
+    limit = concurrency.AdaptiveLimit(max_limit=16)
+    for _ in range(30):
+        limit.observe(1.0, limit.limit)
+    assert limit.limit == 16
+    # the server is full: latency now grows with every extra call
+    for _ in range(30):
+        limit.observe(limit.limit / 2, limit.limit)
+    assert limit.limit <= 4
+    # an idle backend does not earn a higher limit
+    idle = concurrency.AdaptiveLimit(max_limit=16)
+    for _ in range(30):
+        idle.observe(1.0, 1)
+    assert idle.limit == 2
+
+
+def test_dispatch_keeps_order_and_failures():
+    concurrency.configure({"test-dispatch": 3})
+    lock = threading.Lock()
+    running = peak = 0
+    finished = []
+
+    def call(n):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.01 * (n % 4))
+        with lock:
+            running -= 1
+        if n == 5:
+            raise ValueError("bad file")
+        return n * 10
+
+    results = concurrency.dispatch("test-dispatch", call, range(12),
+                                   on_result=lambda i, r: finished.append(i))
+    assert results[:5] == [0, 10, 20, 30, 40]
+    assert isinstance(results[5], ValueError)
+    assert results[6:] == [60, 70, 80, 90, 100, 110]
+    assert peak == 3
+    assert sorted(finished) == list(range(12))
+    assert concurrency.dispatch("test-dispatch", call, []) == []
+
+
+def test_extract_many_on_backend():
+    from core.extractors.base import Backend, ParsedInvoice
+
+    class Echo(Backend):
+        name = "test-echo"
+
+        def extract(self, file_path, doc_type="", doc=None):
+            return ParsedInvoice(source=self.name, invoice_number=file_path)
+
+        def is_available(self):
+            return True
+
+    parsed = Echo().extract_many([f"{n}.png" for n in range(8)], "vat", max_in_flight=2)
+    assert [p.invoice_number for p in parsed] == [f"{n}.png" for n in range(8)]
+
+
+def test_provider_wait_not_counted_as_latency(tmp_path):
+    from core import ratelimit
+
+    concurrency.configure({"test-auto": concurrency.AutoLimit(8)})
+    seen = []
+    concurrency._gate("test-auto").adaptive.observe = \
+        lambda latency, in_flight: seen.append(latency)
+    ratelimit.configure(str(tmp_path / "rl.db"), "test-auto=0:0:1")
+    held = threading.Event()
+
+    def other_process_call():
+        with ratelimit.provider_slot("test-auto"):
+            held.set()
+            time.sleep(0.3)
+
+    try:
+        other = threading.Thread(target=other_process_call)
+        other.start()
+        held.wait()
+        # queued ~0.3s behind the other call, then 0.05s of actual work
+        with concurrency.backend_slot("test-auto"):
+            with ratelimit.provider_slot("test-auto") as waited:
+                time.sleep(0.05)
+        other.join()
+    finally:
+        ratelimit.configure(None, "")
+
+    assert waited > 0.1
+    assert seen[0] < 0.15
@@ -0,0 +1,61 @@
+"""Local doc-type classifier: fixture titles, confidence, 'auto' upload resolution."""
+import pytest
+
+from conftest import load_blocks, make_text_pdf
+from core.doc_types.classify import classify_file, classify_text
+from core.extractors.local.layout import Layout
+
+FIXTURES = [
+    ("vat_jd.json", "vat"), ("vat_didi.json", "vat"), ("vat_travel_old2023.json", "vat"),
+    ("medical_outpatient.json", "medical"), ("medical_inpatient_3page.json", "medical"),
+    ("train_eticket.json", "train"),
+]
+
+
+class _Doc:
+    def __init__(self, text):
+        self.text = text
+
+    def page_text(self, page):
+        return self.text
+
+
+@pytest.mark.parametrize("name,expected", FIXTURES)
+def test_fixture_first_pages(name, expected):
+    result = classify_text(Layout(load_blocks(name)).text)
+    assert result.doc_type == expected
+    assert result.confidence >= 0.9
+
+
+def test_train_title_beats_shared_e_invoice_word():
+    result = classify_text("电子发票（铁路电子客票）\n电子客票号：123")
+    assert result.doc_type == "train" and result.ocr_action == "TrainTicketOCR"
+    assert result.scores["vat"] == 0
+
+
+def test_confidence_reflects_margin_and_evidence():
+    assert classify_text("hello world") is None
+    weak = classify_text("合计 税率 12%")
+    assert weak.doc_type == "vat" and weak.confidence < 0.5
+    tie = classify_text("交款人 价税合计")
+    assert tie.confidence == 0
+
+
+def test_classify_file_without_text_layer(tmp_path):
+    pytest.importorskip("pdfplumber")
+    path = str(tmp_path / "a.pdf")
+    make_text_pdf(path, [["no keywords here"]])
+    assert classify_file(path) is None
+    assert classify_file(str(tmp_path / "a.jpg")) is None
+    assert classify_file(path, doc=_Doc("医疗门诊收费票据\n交款人：张三")).doc_type == "medical"
+
+
+def test_auto_resolves_before_ocr_with_fallback(app):
+    from app.utils import _resolve_doc_type
+
+    assert _resolve_doc_type("a.pdf", _Doc("电子发票（普通发票）\n价税合计")) == ("vat", 1.0)
+    assert _resolve_doc_type("a.pdf", _Doc("电子客票 电子客票号 二等座"))[0] == "train"
+    assert _resolve_doc_type("a.jpg", None) == ("vat", None)
+    app.config["DOC_TYPE_AUTO_FALLBACK"] = "medical"
+    doc_type, confidence = _resolve_doc_type("a.pdf", _Doc("税率"))
+    assert doc_type == "medical" and confidence < 0.5
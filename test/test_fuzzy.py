@@ -0,0 +1,74 @@
+"""FuzzyText: same closest window as the old sliding Levenshtein scan."""
+import importlib.util
+import os
+import random
+
+import pytest
+
+from conftest import REPO_ROOT
+from core.extractors.local.fuzzy import FuzzyText, distance
+from core.extractors.local.postprocess.pdf_text_verify import PdfTextVerify
+
+
+def _dp(a, b):
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+def _scan(value, text, max_dist):
+    """The pre-FuzzyText scan: first closest window of m, then m+1 chars."""
+    for size in (len(value), len(value) + 1):
+        windows = [text[p:p + size] for p in range(len(text) - size + 1)]
+        scored = [(_dp(value, w), p) for p, w in enumerate(windows)]
+        best = min(scored, default=(max_dist + 1, 0))
+        if best[0] <= max_dist:
+            return windows[best[1]]
+    return None
+
+
+def test_distance_matches_dp():
+    rng = random.Random(0)
+    for _ in range(2000):
+        a = "".join(rng.choice("ab1") for _ in range(rng.randint(0, 10)))
+        b = "".join(rng.choice("ab1") for _ in range(rng.randint(0, 10)))
+        assert distance(a, b) == _dp(a, b), (a, b)
+
+
+@pytest.mark.parametrize("alphabet", ["ab", "0123456789.", "0123456789 \n年月日"])
+def test_find_matches_sliding_scan(alphabet):
+    rng = random.Random(alphabet)
+    for _ in range(300):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 80)))
+        value = "".join(rng.choice(alphabet) for _ in range(rng.randint(3, 9)))
+        fuzzy = FuzzyText(text)
+        for max_dist in (1, 2):
+            assert fuzzy.find(value, max_dist) == _scan(value, text, max_dist), (value, text)
+
+
+def test_dense_values_use_the_k_difference_scan():
+    text = "1" * 200 + "12345" + "2" * 50
+    fuzzy = FuzzyText(text)
+    assert fuzzy.best_window("12945", 2) == (200, 1)
+    assert fuzzy.best_window("1111", 0) == (0, 0)
+    assert fuzzy.best_window("99999", 2) is None
+
+
+def test_find_similar_first_char_error():
+    text = "发票号码\n24112000000012345678 开票日期"
+    assert PdfTextVerify._find_similar("34112000000012345678", text, 2) == "24112000000012345678"
+    assert PdfTextVerify._find_similar("2411200000001234567", text, 2) == "24112000000012345678"
+    assert PdfTextVerify._find_similar("99999999", text, 2) is None
+
+
+def test_bench_reports_identical_results():
+    path = os.path.join(REPO_ROOT, "tools", "bench_fuzzy.py")
+    spec = importlib.util.spec_from_file_location("bench_fuzzy", path)
+    bench = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(bench)
+    result = bench.run_bench(pages=1, count=2)
+    assert result["queries"] == 3 and result["mismatches"] == []
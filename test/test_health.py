@@ -0,0 +1,55 @@
+"""Backend health registry: cached answers, background refresh, /health."""
+import time
+
+from core.health import HealthRegistry
+
+
+def test_check_serves_cached_result_until_ttl():
+    calls = []
+    registry = HealthRegistry(ttl=0.2, background=False)
+    probe = lambda: calls.append(1) or True
+
+    assert registry.check("b", probe) and registry.check("b", probe)
+    assert len(calls) == 1
+    time.sleep(0.25)
+    assert registry.check("b", probe)
+    assert len(calls) == 2
+
+
+def test_failures_and_target_change():
+    registry = HealthRegistry(background=False)
+
+    def boom():
+        raise ConnectionError("refused")
+
+    assert registry.check("b", boom, target="http://a") is False
+    state = registry.snapshot()["b"]
+    assert state["error"] == "ConnectionError: refused"
+    assert state["consecutive_failures"] == 1 and state["last_latency_ms"] is not None
+
+    # New endpoint → old status no longer applies.
+    assert registry.check("b", lambda: True, target="http://b") is True
+    assert registry.snapshot()["b"]["consecutive_failures"] == 0
+
+
+def test_background_thread_refreshes_probes():
+    calls = []
+    registry = HealthRegistry(interval=0.05, ttl=10)
+    try:
+        registry.check("b", lambda: calls.append(1) or True)
+        time.sleep(1.3)
+        assert len(calls) >= 2
+        assert registry.snapshot()["b"]["stale"] is False
+    finally:
+        registry.stop()
+
+
+def test_health_endpoint_reports_backends(app):
+    from core import health
+
+    health.get_registry().register("probe-test", lambda: True)
+    health.get_registry().refresh("probe-test")
+    resp = app.test_client().get("/health")
+    assert resp.status_code == 200
+    assert resp.json["status"] == "ok"
+    assert resp.json["backends"]["probe-test"]["ok"] is True
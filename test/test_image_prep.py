@@ -0,0 +1,47 @@
+"""Image preprocessing before cloud / VLM OCR."""
+import io
+
+import pytest
+
+from core.image_prep import ImageProfile, parse_profiles, prepare
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def _jpeg(size, exif_orientation=None, quality=95):
+    img = Image.effect_noise(size, 64).convert("RGB")
+    out = io.BytesIO()
+    kwargs = {"quality": quality}
+    if exif_orientation:
+        exif = Image.Exif()
+        exif[0x0112] = exif_orientation
+        kwargs["exif"] = exif
+    img.save(out, format="JPEG", **kwargs)
+    return out.getvalue()
+
+
+def test_parse_profiles():
+    assert parse_profiles("tencent=2400:color:jpg:85, vllm=1600:gray:webp, x=abc, y=10:gray:gif") == {
+        "tencent": ImageProfile(2400, False, "jpeg", 85),
+        "vllm": ImageProfile(1600, True, "webp", 85),
+    }
+
+
+def test_downsample_grayscale_and_strip_exif():
+    data = _jpeg((3000, 2000), exif_orientation=6)      # rotated 90° on the phone
+    result = prepare(data, "image/jpeg", ImageProfile(1000, True, "jpeg", 70))
+
+    assert result.mime == "image/jpeg"
+    assert result.saved > 0 and result.original_size == len(data)
+    with Image.open(io.BytesIO(result.data)) as img:
+        assert img.size == (667, 1000)                  # orientation applied, long edge capped
+        assert img.mode == "L"
+        assert not img.getexif()
+
+
+def test_small_image_and_pdf_pass_through():
+    small = _jpeg((200, 100), quality=30)
+    assert prepare(small, "image/jpeg", ImageProfile(2400, False, "jpeg", 95)).data == small
+    assert prepare(small, "image/jpeg", ImageProfile(2400, False, "webp", 95)).data == small
+    assert prepare(b"%PDF-1.4", "application/pdf", ImageProfile()).data == b"%PDF-1.4"
+    assert prepare(b"not an image", "image/png", ImageProfile()).data == b"not an image"
@@ -0,0 +1,80 @@
+"""Bulk import: source listing and resumable manifest."""
+import os
+import zipfile
+
+from app.importer import Manifest, default_manifest_path, iter_sources
+
+EXTS = {'pdf', 'jpg'}
+
+
+def test_iter_sources_walks_dirs_and_zips(tmp_path):
+    root = tmp_path / "archive"
+    (root / "2024").mkdir(parents=True)
+    (root / "a.pdf").write_bytes(b"%PDF a")
+    (root / "2024" / "b.jpg").write_bytes(b"jpg b")
+    (root / "notes.txt").write_text("skip me")
+    (root / ".hidden.pdf").write_bytes(b"skip")
+
+    found = [(rel, size, loc[0]) for rel, size, _, loc in iter_sources(str(root), EXTS)]
+    assert found == [("a.pdf", 6, "file"), ("2024/b.jpg", 5, "file")]
+
+    zpath = tmp_path / "archive.zip"
+    with zipfile.ZipFile(zpath, "w") as zf:
+        zf.writestr("x/c.pdf", b"%PDF c")
+        zf.writestr("x/readme.md", b"skip")
+    found = [(rel, loc) for rel, _, _, loc in iter_sources(str(zpath), EXTS)]
+    assert found == [("x/c.pdf", ("zip", str(zpath), "x/c.pdf"))]
+
+
+def test_manifest_resume_rules(tmp_path):
+    manifest = Manifest(str(tmp_path / "m.db"))
+    manifest.record("a.pdf", 10, 1.0, {"success": True, "invoice_id": 1, "source": "local-pdf"})
+    manifest.record("b.pdf", 10, 1.0, {"success": False, "message": "boom"})
+
+    assert manifest.is_done("a.pdf", 10, 1.0)
+    assert not manifest.is_done("a.pdf", 11, 1.0)          # content changed
+    assert manifest.is_done("b.pdf", 10, 1.0)              # failures skipped by default
+    assert not manifest.is_done("b.pdf", 10, 1.0, retry_failed=True)
+    assert not manifest.is_done("c.pdf", 10, 1.0)
+    assert manifest.counts() == {"succeeded": 1, "failed": 1}
+    manifest.close()
+
+
+def test_default_manifest_is_keyed_on_absolute_path(tmp_path, monkeypatch):
+    (tmp_path / "a" / "invoices").mkdir(parents=True)
+    (tmp_path / "b" / "invoices").mkdir(parents=True)
+    first = default_manifest_path(str(tmp_path / "a" / "invoices"), "/base")
+    second = default_manifest_path(str(tmp_path / "b" / "invoices") + "/", "/base")
+    assert first != second
+    assert os.path.basename(first).startswith("invoices-")
+    # 相对路径与绝对路径指向同一目录时共用清单
+    monkeypatch.chdir(tmp_path / "a")
+    assert default_manifest_path("invoices", "/base") == first
+
+
+def test_import_batch_keeps_input_order(app, monkeypatch, tmp_path):
+    import app.importer as importer
+    import app.utils as utils
+
+    monkeypatch.setattr(importer, "_worker_app", app)
+    app.config["UPLOAD_FOLDER"] = str(tmp_path / "uploads")
+    seen = {}
+
+    def fake_batch(paths, max_workers=4, **options):
+        seen.update(options, paths=len(paths))
+        # 按完成先后返回：倒序
+        for index in reversed(range(len(paths))):
+            yield index, {"success": True, "message": os.path.basename(paths[index]).split("_", 2)[2]}
+
+    monkeypatch.setattr(utils, "process_invoice_batch", fake_batch)
+    for name in ("a.pdf", "b.pdf"):
+        (tmp_path / name).write_bytes(b"%PDF")
+    sources = [(("file", str(tmp_path / "a.pdf")), "a.pdf"),
+               (("file", str(tmp_path / "missing.pdf")), "missing.pdf"),
+               (("file", str(tmp_path / "b.pdf")), "b.pdf")]
+
+    results = importer._import_batch(sources, {"backend": "vllm", "doc_type": "vat", "project_id": None})
+    assert [r["success"] for r in results] == [True, False, True]
+    assert (results[0]["message"], results[2]["message"]) == ("a.pdf", "b.pdf")
+    assert seen == {"backend": "vllm", "doc_type": "vat", "project_id": None, "paths": 2}
+    assert not list((tmp_path / "uploads").iterdir())  # 临时副本已清理
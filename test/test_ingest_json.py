@@ -0,0 +1,86 @@
+"""Ingest path: response dict straight to the DocType, formatted JSON encoded once."""
+import json
+import shutil
+
+import pytest
+
+from core import jsoncodec
+
+RESPONSE = {"Response": {
+    "VatInvoiceInfos": [
+        {"Name": "发票类型", "Value": "增值税电子普通发票"},
+        {"Name": "发票代码", "Value": "044002300111"},
+        {"Name": "发票号码", "Value": "12345678"},
+        {"Name": "开票日期", "Value": "2024年01月02日"},
+        {"Name": "校验码", "Value": "12345 67890 12345 67890"},
+        {"Name": "销售方名称", "Value": "长沙某某餐饮有限公司"},
+        {"Name": "购买方名称", "Value": "湖南某某科技有限公司"},
+        {"Name": "合计金额", "Value": "100.00"},
+        {"Name": "合计税额", "Value": "6.00"},
+        {"Name": "小写金额", "Value": "¥106.00"},
+    ],
+    "Items": [
+        {"Name": "*餐饮服务*餐费", "Quantity": "1", "Price": "100.00", "Amount": "100.00",
+         "TaxRate": "6%", "Tax": "6.00"},
+    ],
+    "RequestId": "r-1",
+}}
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_codec_keeps_non_ascii(monkeypatch, use_orjson):
+    if use_orjson:
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(jsoncodec, "orjson", None)
+    text = jsoncodec.dumps({"名称": "¥1.00", "n": [1, 2.5, None]})
+    assert "名称" in text and json.loads(text) == {"名称": "¥1.00", "n": [1, 2.5, None]}
+    assert jsoncodec.loads(jsoncodec.dumps_bytes(RESPONSE)) == RESPONSE
+    assert jsoncodec.loads(json.dumps(RESPONSE).encode()) == RESPONSE
+
+
+def test_tencent_upload_encodes_formatted_data_once(app, monkeypatch, tmp_path):
+    import app.models as models
+    import app.utils as utils
+    from app.models import Invoice, InvoiceItem, db
+    from core.ocr_cache import file_digest, make_key
+
+    class FakeClient:
+        calls = 0
+
+        def recognize_response(self, **kwargs):
+            FakeClient.calls += 1
+            return json.loads(json.dumps(RESPONSE))
+
+    encoded = []
+
+    def counting_dumps(obj):
+        encoded.append(obj)
+        return jsoncodec.dumps(obj)
+
+    monkeypatch.setattr(utils, "get_ocr_client", lambda: FakeClient())
+    monkeypatch.setattr(utils, "dumps", counting_dumps)
+    monkeypatch.setattr(models, "dumps", counting_dumps)
+    monkeypatch.setattr(app, "root_path", str(tmp_path))
+    (tmp_path / "static" / "uploads").mkdir(parents=True)
+    image = tmp_path / "a.jpg"
+    image.write_bytes(b"\xff\xd8 not really a jpeg")
+    shutil.copy(image, tmp_path / "b.jpg")
+    key = make_key(file_digest(str(image)), "vat", "tencent")
+
+    result = utils.process_invoice_image(str(image), backend="tencent")
+    assert result["success"] and result["source"] == "tencent"
+    assert len(encoded) == 1  # shared by the cache entry and the row
+    invoice = db.session.get(Invoice, result["invoice_id"])
+    assert invoice.json_data == utils.get_app_ocr_cache().get_payload(key)
+    assert invoice.check_code == "12345 67890 12345 67890"
+    assert json.loads(invoice.json_data)["基本信息"]["发票号码"] == "12345678"
+    assert InvoiceItem.query.filter_by(invoice_id=invoice.id).count() == 1
+
+    # Same bytes again: served from the cache text, still no re-encode
+    Invoice.query.delete()
+    InvoiceItem.query.delete()
+    result = utils.process_invoice_image(str(tmp_path / "b.jpg"), backend="tencent")
+    assert result["source"] == "cache" and FakeClient.calls == 1
+    assert len(encoded) == 1
+    assert db.session.get(Invoice, result["invoice_id"]).json_data == invoice.json_data
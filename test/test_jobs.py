@@ -0,0 +1,107 @@
+"""Ingest job queue: atomic claiming, stale-job recovery, stage reporting."""
+from datetime import datetime, timedelta
+
+
+def test_claim_is_exclusive_and_fifo(app):
+    from app.jobs import claim_next, enqueue
+
+    first = enqueue('/tmp/a.pdf', original_name='a.pdf').id
+    second = enqueue('/tmp/b.pdf', original_name='b.pdf', project_id='').id
+
+    job = claim_next('w1')
+    assert job.id == first and job.status == 'running' and job.attempts == 1
+    assert claim_next('w2').id == second
+    assert claim_next('w3') is None
+
+
+def test_stale_running_jobs_are_requeued_then_failed(app):
+    from app.jobs import claim_next, enqueue, requeue_stale
+    from app.models import db, IngestJob
+
+    job_id = enqueue('/tmp/a.pdf').id
+    for attempt in (1, 2):
+        job = claim_next('w1')
+        assert job.id == job_id and job.attempts == attempt
+        job.heartbeat_at = datetime.now() - timedelta(hours=1)
+        db.session.commit()
+        requeue_stale(stale_after=60, max_attempts=2)
+
+    job = db.session.get(IngestJob, job_id)
+    db.session.refresh(job)
+    assert job.status == 'failed' and job.is_finished
+
+
+def test_run_job_records_stages_and_result(app, monkeypatch):
+    import app.utils as utils
+    from app.jobs import claim_next, enqueue, run_job
+
+    stages = []
+
+    def fake_process(path, project_id=None, doc_type='vat', backend='tencent', on_stage=None):
+        for stage in ('cache', 'ocr', 'saving'):
+            on_stage(stage)
+            stages.append(stage)
+        return {'success': True, 'invoice_id': 42, 'message': 'ok', 'source': 'tencent'}
+
+    monkeypatch.setattr(utils, 'process_invoice_image', fake_process)
+    enqueue('/tmp/a.pdf', project_id='7')
+    job = claim_next('w1')
+    assert job.project_id == 7
+    run_job(job)
+
+    data = job.to_dict()
+    assert stages == ['cache', 'ocr', 'saving']
+    assert data['status'] == 'succeeded' and data['invoice_id'] == 42
+    assert data['stage'] == 'done' and data['source'] == 'tencent'
+
+
+def test_reclaimed_job_keeps_new_owners_status(app, monkeypatch):
+    import app.utils as utils
+    from app.jobs import claim_next, enqueue, requeue_stale, run_job
+    from app.models import db, IngestJob
+
+    job_id = enqueue('/tmp/a.pdf').id
+    stale = claim_next('w1')
+
+    def slow_process(path, project_id=None, doc_type='vat', backend='tencent', on_stage=None):
+        # w1 卡住期间心跳超时，任务被回收并由 w2 重新领取
+        db.session.execute(db.update(IngestJob).where(IngestJob.id == job_id)
+                           .values(heartbeat_at=datetime.now() - timedelta(hours=1)))
+        db.session.commit()
+        requeue_stale(stale_after=60, max_attempts=3)
+        assert claim_next('w2').id == job_id
+        on_stage('ocr')
+        return {'success': False, 'message': 'timeout'}
+
+    monkeypatch.setattr(utils, 'process_invoice_image', slow_process)
+    run_job(stale)
+
+    job = db.session.get(IngestJob, job_id)
+    db.session.refresh(job)
+    assert job.status == 'running' and job.worker == 'w2' and job.attempts == 2
+    assert job.stage == 'starting' and job.finished_at is None
+
+
+def test_heartbeat_matches_the_full_claim(app):
+    from app.jobs import claim_next, enqueue, requeue_stale, touch_claims
+    from app.models import db, IngestJob
+
+    job_id = enqueue('/tmp/a.pdf').id
+    first = claim_next('w1')
+    old_claim = (job_id, 'w1', first.attempts)
+    assert touch_claims([old_claim]) == 1
+
+    # 回收后由同一个 worker 重新领取：旧的领取不能再续心跳
+    first.heartbeat_at = datetime.now() - timedelta(hours=1)
+    db.session.commit()
+    requeue_stale(stale_after=60, max_attempts=3)
+    second = claim_next('w1')
+    assert second.id == job_id and second.attempts == 2
+    assert touch_claims([old_claim]) == 0
+    assert touch_claims([(job_id, 'w1', 2)]) == 1
+
+    # 已结束的任务也不再刷新
+    db.session.execute(db.update(IngestJob).where(IngestJob.id == job_id)
+                       .values(status=IngestJob.STATUS_SUCCEEDED))
+    db.session.commit()
+    assert touch_claims([(job_id, 'w1', 2)]) == 0
@@ -0,0 +1,81 @@
+"""LabelScanner: one pass finds every label; anchored matches equal re.search."""
+import re
+
+import pytest
+
+from conftest import load_blocks
+from core.extractors.local.labels import FIELD_SCANNER, LabelScanner
+from core.extractors.local.layout import Layout
+from core.extractors.local.parsers import medical, train, vat
+
+FIXTURES = ["vat_jd.json", "vat_travel_old2023.json", "medical_inpatient_3page.json",
+            "medical_outpatient.json", "train_eticket.json"]
+
+ANCHORED = [
+    (vat._RE_INVOICE_NUMBER, "发票号码"),
+    (vat._RE_INVOICE_DATE, "开票日期"),
+    (vat._RE_CHECK_CODE, "校验码"),
+    (vat._RE_TOTAL, "价税合计"),
+    (vat._RE_ISSUER, "开票人"),
+    (medical._RE_INVOICE_NUMBER, "票据号码"),
+    (medical._RE_TAX_ID, "交款人统一社会信用代码"),
+    (medical._RE_PAYER_NAME_DATE, "交款人"),
+    (medical._RE_TOTAL_LINE, "金额合计"),
+    (medical._RE_TOTAL_LINE_SPLIT, "金额合计"),
+    (train._RE_TAX_ID, "统一社会信用代码"),
+]
+
+
+def _med_field_by_find(text, label):
+    """The pre-scanner _med_field: one str.find per other label."""
+    start = text.find(label)
+    if start < 0:
+        return ""
+    rest = re.sub(r"^\s*[:：]?\s*", "", text[start + len(label):])
+    stops = [rest.find(nl) for nl in medical._MED_LABELS if nl != label and rest.find(nl) >= 0]
+    if rest.find("\n") >= 0:
+        stops.append(rest.find("\n"))
+    return rest[:min(stops)] if stops else rest
+
+
+def test_overlapping_and_prefix_labels():
+    scanner = LabelScanner(["交款人", "交款人统一社会信用代码", "统一社会信用代码"])
+    hits = scanner.scan("交款人统一社会信用代码：1 交款人：张三")
+    assert hits.positions == {
+        "交款人统一社会信用代码": [0], "交款人": [0, 14], "统一社会信用代码": [3],
+    }
+    assert hits.first("统一社会信用代码") == 3
+    assert "开票日期" not in hits
+
+
+@pytest.mark.parametrize("name", FIXTURES)
+def test_anchored_search_matches_regex_search(name):
+    layout = Layout(load_blocks(name))
+    for regex, label in ANCHORED:
+        expected = regex.search(layout.text)
+        found = layout.labels.search(regex, label)
+        assert (found and found.span()) == (expected and expected.span()), regex.pattern
+
+
+@pytest.mark.parametrize("text", [
+    "医疗机构类型：综合医院医保类型：普通\n医保编号：123性别：女",
+    "医保类型：\n职工基本医疗保险 医保统筹基金支付：0.00其他支付：1.00",
+    "个人自付：2.00 个人自费：3.00\n个人现金支付：5.00",
+])
+def test_value_matches_find_per_label(text):
+    hits = FIELD_SCANNER.scan(text)
+    for label in medical._MED_LABELS:
+        assert hits.value(label, medical._MED_LABELS) == _med_field_by_find(text, label)
+
+
+def test_value_on_fixture_text():
+    text = Layout(load_blocks("medical_inpatient_3page.json")).text
+    hits = FIELD_SCANNER.scan(text)
+    for label in medical._MED_LABELS:
+        assert hits.value(label, medical._MED_LABELS) == _med_field_by_find(text, label)
+
+
+def test_findall_matches_regex_findall():
+    regex = re.compile(r"校验码[:：]?\s*(\d+)")
+    text = "校验码：123 校验码456 校验码：x"
+    assert FIELD_SCANNER.scan(text).findall(regex, "校验码") == regex.findall(text)
@@ -0,0 +1,60 @@
+"""Layout: lines, reading-order text and offsets built once per block list."""
+import pytest
+
+from conftest import load_blocks, make_text_pdf
+from core.extractors.base import TextBlock
+from core.extractors.local.layout import Layout
+
+
+def _blocks():
+    return [
+        TextBlock("合计", (10, 100, 30, 110)),
+        TextBlock("¥10.00", (120, 101, 160, 111)),   # > column_gap to the right
+        TextBlock("发票", (10, 50, 30, 60)),
+        TextBlock("号码", (31, 52, 51, 62)),          # same line (|dy| <= 4)
+        TextBlock("第二页", (10, 50, 40, 60), page=1),
+    ]
+
+
+def test_lines_are_clustered_per_page():
+    layout = Layout(_blocks())
+    assert layout.text == "发票号码\n合计 ¥10.00\n第二页"
+    assert [line.page for line in layout.lines] == [0, 0, 1]
+    assert [line.text for line in layout.page_lines(1)] == ["第二页"]
+    assert layout.lines[1].column_breaks == [75.0]
+
+
+def test_offsets_map_back_to_blocks():
+    blocks = _blocks()
+    layout = Layout(blocks)
+    for b in blocks:
+        start, end = layout.span(b)
+        assert layout.text[start:end] == b.text
+        assert layout.block_at(start) is b
+        assert layout.block_at(end - 1) is b
+    assert layout.block_at(layout.text.index(" ")) is None
+    assert layout.find_block("10.00") is blocks[1]
+    assert layout.position(blocks[3]) == 3
+
+
+@pytest.mark.parametrize("name", ["vat_jd.json", "medical_inpatient_3page.json"])
+def test_every_block_is_placed_once(name):
+    blocks = load_blocks(name)
+    layout = Layout(blocks)
+    placed = [b for line in layout.lines for b in line.blocks]
+    assert sorted(map(id, placed)) == sorted(map(id, blocks))
+    assert layout.text.count("\n") == len(layout.lines) - 1
+
+
+def test_document_memoizes_layout(tmp_path):
+    pytest.importorskip("pdfplumber")
+    from core.extractors.local.document import PdfDocument
+
+    path = str(tmp_path / "a.pdf")
+    make_text_pdf(path, [["first page"], ["second page"]])
+    with PdfDocument(path) as doc:
+        assert doc.layout() is doc.layout()
+        assert doc.layout().text == "firstpage\nsecondpage"  # word gaps < column_gap
+        page = doc.page_view(1)
+        assert page.layout() is doc.page_layout(1)
+        assert page.layout().blocks is page.blocks()
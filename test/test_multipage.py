@@ -0,0 +1,160 @@
+"""Multi-page PDFs: page views and grouping per-page results into invoices."""
+import pytest
+
+from conftest import make_text_pdf
+from core.multipage import group_pages, merge_continuation
+
+
+def _page(number, code="", items=()):
+    return {
+        "基本信息": {"发票号码": number, "发票代码": code},
+        "商品信息": [{"Name": name} for name in items],
+    }
+
+
+def test_group_pages_splits_invoices_and_merges_continuations():
+    pages = [
+        None,                                           # failed page → orphan
+        _page("", items=["cover"]),                     # nothing to attach to yet
+        _page("001", code="A", items=["详见销货清单"]),
+        _page("", items=["pen", "ink"]),                # item-list continuation
+        _page("001", items=["paper"]),                  # same number, code missing
+        _page("002", code="A", items=["train"]),
+    ]
+    groups, orphans = group_pages(pages)
+
+    assert orphans == [1, 2]
+    assert [g["pages"] for g in groups] == [[3, 4, 5], [6]]
+    first, second = (g["formatted_data"] for g in groups)
+    assert [i["Name"] for i in first["商品信息"]] == ["pen", "ink", "paper"]
+    assert first["来源页码"] == [3, 4, 5]
+    assert "来源页码" not in second
+    # Grouping works on copies — the per-page results (cached) stay intact.
+    assert pages[2]["商品信息"] == [{"Name": "详见销货清单"}]
+
+
+def test_merge_continuation_first_page_wins():
+    base = {"基本信息": {"发票号码": "1", "开票日期": ""}, "商品信息": [{"Name": "a"}]}
+    merge_continuation(base, {"基本信息": {"发票号码": "9", "开票日期": "2024-01-01"}, "商品信息": []})
+    assert base["基本信息"] == {"发票号码": "1", "开票日期": "2024-01-01"}
+    assert base["商品信息"] == [{"Name": "a"}]
+
+
+def test_page_view_restricts_document_to_one_page(tmp_path):
+    pytest.importorskip("pdfplumber")
+    from core.extractors.local.document import PdfDocument
+
+    path = str(tmp_path / "two.pdf")
+    make_text_pdf(path, [["first page"], ["second page"]])
+    with PdfDocument(path) as doc:
+        view = doc.page_view(1)
+        assert view.page_count == 1
+        assert view.full_text == "second page"
+        assert [b.text for b in view.blocks()] == ["second", "page"]
+        assert all(b.page == 1 for b in view.blocks())
+        with pytest.raises(IndexError):
+            view.page_text(1)
+        view.close()  # no-op: the parent still owns the file
+        assert doc.page_text(0) == "first page"
+
+
+def _fixture_document(path, *names):
+    """PdfDocument whose words come from block fixtures (one after another) instead of a PDF."""
+    from dataclasses import replace
+
+    from conftest import load_blocks
+    from core.extractors.local.blocks import BlockArray
+    from core.extractors.local.document import PdfDocument
+
+    blocks = []
+    for name in names:
+        offset = 1 + max((b.page for b in blocks), default=-1)
+        blocks += [replace(b, page=b.page + offset) for b in load_blocks(name)]
+
+    class FixtureDocument(PdfDocument):
+        @property
+        def page_count(self):
+            return 1 + max(b.page for b in blocks)
+
+        def page_blocks(self, page, min_text_len=1):
+            return BlockArray.from_blocks(
+                [b for b in blocks if b.page == page and len(b.text) >= min_text_len])
+
+        def page_text(self, page):
+            return "\n".join(b.text for b in blocks if b.page == page)
+
+    return FixtureDocument(path)
+
+
+def test_single_invoice_pdf_with_continuation_pages_parsed_locally(app, monkeypatch, tmp_path):
+    pytest.importorskip("pdfplumber")
+    import app.utils as utils
+    import core.extractors.local.document as document
+    from app.models import InvoiceItem
+
+    def no_ocr():
+        raise AssertionError("OCR must not be called for a text PDF")
+
+    monkeypatch.setattr(utils, "get_ocr_client", no_ocr)
+    monkeypatch.setattr(app, "root_path", str(tmp_path))
+    (tmp_path / "static" / "uploads").mkdir(parents=True)
+    path = tmp_path / "inpatient.pdf"
+    path.write_bytes(b"%PDF-1.4 stand-in")
+    monkeypatch.setattr(document, "open_document",
+                        lambda p, doc=None: _fixture_document(p, "medical_inpatient_3page.json"))
+
+    result = utils.process_invoice_image(str(path), doc_type="medical", backend="tencent")
+
+    assert result["success"], result
+    assert result["source"] == "local-pdf"
+    assert result["invoice_ids"] == [result["invoice_id"]]
+    assert "unassigned_pages" not in result
+    from app.models import Invoice, db
+    invoice = db.session.get(Invoice, result["invoice_id"])
+    assert invoice.invoice_number == "5557621496"
+    assert invoice.amount_in_figures_cents == 3303284
+    assert InvoiceItem.query.filter_by(invoice_id=invoice.id).count() == 105
+
+
+def test_continuation_page_kept_as_local_data(app, tmp_path):
+    pytest.importorskip("pdfplumber")
+    from app.utils import _recognize
+
+    doc = _fixture_document(str(tmp_path / "inpatient.pdf"), "medical_inpatient_3page.json")
+    data, source, _ = _recognize(doc.path, doc.page_view(1), "medical", "tencent",
+                                 page_number=2, allow_partial=True)
+    assert source == "local-pdf"
+    assert data["基本信息"]["发票号码"] == "5557621496"
+    assert len(data["商品信息"]) == 58
+
+
+def test_multi_invoice_text_pdf_parses_each_page_once(app, monkeypatch, tmp_path):
+    pytest.importorskip("pdfplumber")
+    import app.utils as utils
+    import core.extractors.local.document as document
+
+    def no_ocr():
+        raise AssertionError("OCR must not be called for a text PDF")
+
+    parsed_pages = []
+    local_extract = utils._local_pdf_extract
+
+    def counting_extract(image_path, doc, doc_type):
+        parsed_pages.append(getattr(doc, "page_index", None))
+        return local_extract(image_path, doc, doc_type)
+
+    monkeypatch.setattr(utils, "get_ocr_client", no_ocr)
+    monkeypatch.setattr(utils, "_local_pdf_extract", counting_extract)
+    monkeypatch.setattr(app, "root_path", str(tmp_path))
+    (tmp_path / "static" / "uploads").mkdir(parents=True)
+    path = tmp_path / "two.pdf"
+    path.write_bytes(b"%PDF-1.4 stand-in")
+    monkeypatch.setattr(document, "open_document",
+                        lambda p, doc=None: _fixture_document(p, "vat_jd.json", "vat_travel_1.json"))
+
+    result = utils.process_invoice_image(str(path), doc_type="vat", backend="tencent")
+
+    assert result["success"], result
+    assert result["source"] == "local-pdf"
+    assert len(result["invoice_ids"]) == 2
+    assert sorted(parsed_pages) == [0, 1]
@@ -0,0 +1,82 @@
+"""OCR result cache: content-hash keys, eviction, persisted counters."""
+import os
+import time
+
+from core.ocr_cache import OCRCache, file_digest, make_key
+
+
+def test_cache_roundtrip_and_counters(tmp_path):
+    cache = OCRCache(str(tmp_path / "cache.db"))
+    key = make_key("abc", "vat", "tencent", version="1")
+    assert cache.get(key) is None
+    cache.put(key, {"基本信息": {"发票号码": "123"}})
+    assert cache.get(key) == {"基本信息": {"发票号码": "123"}}
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["entries"] == 1
+
+
+def test_key_separates_doc_type_and_backend(tmp_path):
+    cache = OCRCache(str(tmp_path / "cache.db"))
+    cache.put(make_key("abc", "vat", "tencent", version="1"), {"v": 1})
+    assert cache.get(make_key("abc", "medical", "tencent", version="1")) is None
+    assert cache.get(make_key("abc", "vat", "vllm", version="1")) is None
+    assert cache.get(make_key("abc", "vat", "tencent", version="2")) is None
+
+
+def test_key_follows_backend_config(monkeypatch):
+    from core import image_prep
+
+    monkeypatch.setenv("VLLM_OCR_MODEL", "model-a")
+    monkeypatch.setenv("VLLM_OCR_ENDPOINT", "http://gpu:8000/v1")
+    base = make_key("abc", "vat", "vllm", version="1")
+    assert make_key("abc", "vat", "vllm", version="1") == base
+
+    monkeypatch.setenv("VLLM_OCR_MODEL", "model-b")
+    assert make_key("abc", "vat", "vllm", version="1") != base
+    monkeypatch.setenv("VLLM_OCR_MODEL", "model-a")
+    monkeypatch.setenv("VLLM_OCR_ENDPOINT", "http://other:8000/v1")
+    assert make_key("abc", "vat", "vllm", version="1") != base
+    monkeypatch.setenv("VLLM_OCR_ENDPOINT", "http://gpu:8000/v1")
+
+    tencent = make_key("abc", "vat", "tencent", version="1")
+    try:
+        image_prep.configure("vllm=1600:color:jpeg:80,tencent=2400:color:jpeg:85")
+        assert make_key("abc", "vat", "vllm", version="1") != base     # grayscale off
+        assert make_key("abc", "vat", "tencent", version="1") == tencent
+        image_prep.configure(image_prep.DEFAULT_PROFILES, enabled=False)
+        assert make_key("abc", "vat", "tencent", version="1") != tencent
+    finally:
+        image_prep.configure(image_prep.DEFAULT_PROFILES)
+    assert make_key("abc", "vat", "vllm", version="1") == base
+
+
+def test_lru_eviction_by_entry_count(tmp_path):
+    cache = OCRCache(str(tmp_path / "cache.db"), max_entries=2)
+    for name in ("a", "b"):
+        cache.put(make_key(name, "vat", "tencent", version="1"), {"n": name})
+        time.sleep(0.01)
+    cache.get(make_key("a", "vat", "tencent", version="1"))  # a is now most recent
+    cache.put(make_key("c", "vat", "tencent", version="1"), {"n": "c"})
+    assert cache.get(make_key("b", "vat", "tencent", version="1")) is None
+    assert cache.get(make_key("a", "vat", "tencent", version="1")) == {"n": "a"}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_max_age_expires_entries(tmp_path):
+    cache = OCRCache(str(tmp_path / "cache.db"), max_age=0)
+    key = make_key("abc", "vat", "tencent", version="1")
+    cache.put(key, {"v": 1})
+    time.sleep(0.01)
+    assert cache.get(key) is None
+
+
+def test_file_digest_is_content_based(tmp_path):
+    a = tmp_path / "a.pdf"
+    b = tmp_path / "b.pdf"
+    a.write_bytes(b"%PDF-1.4 same")
+    b.write_bytes(b"%PDF-1.4 same")
+    assert file_digest(str(a)) == file_digest(str(b))
+    b.write_bytes(b"%PDF-1.4 different")
+    assert file_digest(str(a)) != file_digest(str(b))
+    assert len(file_digest(str(a))) == 64 and os.path.exists(str(a))
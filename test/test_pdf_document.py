@@ -0,0 +1,59 @@
+"""PdfDocument: one open per ingest, memoized views shared by all stages."""
+import pytest
+
+from conftest import make_text_pdf
+
+pdfplumber = pytest.importorskip("pdfplumber")
+
+LONG_LINE = "Invoice number 12345678 total 100.00 padded past the text-layer probe"
+
+
+@pytest.fixture
+def count_opens(monkeypatch):
+    calls = []
+    original = pdfplumber.open
+
+    def counting(*args, **kwargs):
+        calls.append(args[0])
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(pdfplumber, "open", counting)
+    return calls
+
+
+def test_memoized_views(tmp_path, count_opens):
+    from core.extractors.local.document import PdfDocument
+
+    path = str(tmp_path / "a.pdf")
+    make_text_pdf(path, [[LONG_LINE], ["second page"]])
+    with PdfDocument(path) as doc:
+        assert doc.page_count == 2
+        assert doc.has_text_layer
+        assert doc.full_text == LONG_LINE + "\nsecond page"
+        blocks = doc.blocks()
+        assert blocks is doc.blocks()
+        assert [b.page for b in blocks][-2:] == [1, 1]
+        assert blocks[0].text == "Invoice"
+    assert len(count_opens) == 1
+
+
+def test_backends_share_one_open(tmp_path, count_opens):
+    from core.extractors import get_backend
+    from core.extractors.local.base import LocalBackend
+    from core.extractors.local.document import PdfDocument
+
+    class EchoBackend(LocalBackend):
+        name = "echo"
+
+        def is_available(self):
+            return True
+
+        def _call_ocr(self, file_path, doc=None, doc_type=""):
+            return doc.blocks()
+
+    path = str(tmp_path / "a.pdf")
+    make_text_pdf(path, [[LONG_LINE]])
+    with PdfDocument(path) as doc:
+        get_backend("local-pdf").extract(path, "vat", doc=doc)
+        EchoBackend().extract(path, "vat", doc=doc)  # probe + PdfTextVerify
+    assert len(count_opens) == 1
@@ -0,0 +1,79 @@
+"""Invoice + items written in one transaction; edits diff the items."""
+import pytest
+from sqlalchemy import event
+
+ITEMS = [
+    {"Name": "*餐饮服务*餐费", "Quantity": "1", "Price": "¥100.00", "Amount": "¥100.00",
+     "TaxRate": "6%", "Tax": "6.00"},
+    {"Name": "*餐饮服务*酒水", "Quantity": "2", "Price": "10.00", "Amount": "20.00",
+     "TaxRate": "6%", "Tax": "1.20"},
+]
+
+
+def _row(name, amount="1.00"):
+    return {"name": name, "specification": "", "unit": "", "quantity": "1",
+            "price": amount, "amount": amount, "tax_rate": "6", "tax": "0.06"}
+
+
+def _commits(db):
+    commits = []
+    event.listen(db.engine, "commit", lambda conn: commits.append(1))
+    return commits
+
+
+def test_save_invoice_commits_once(app):
+    from app.models import Invoice, InvoiceItem, db
+    from app.persistence import item_rows, save_invoice
+
+    commits = _commits(db)
+    invoice = save_invoice(Invoice(invoice_number="1"), item_rows(ITEMS))
+
+    assert len(commits) == 1
+    items = InvoiceItem.query.filter_by(invoice_id=invoice.id).order_by(InvoiceItem.id).all()
+    assert [(i.name, i.price, i.amount) for i in items] == [
+        ("*餐饮服务*餐费", "100.00", "100.00"), ("*餐饮服务*酒水", "10.00", "20.00")]
+    assert all(i.created_at is not None for i in items)
+
+
+def test_save_invoice_rolls_back_everything(app, monkeypatch):
+    from app.models import Invoice, InvoiceItem, db
+    from app.persistence import item_rows, save_invoice
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(db.session, "execute", fail)
+    with pytest.raises(RuntimeError):
+        save_invoice(Invoice(invoice_number="1"), item_rows(ITEMS))
+    monkeypatch.undo()
+
+    assert Invoice.query.count() == 0
+    assert InvoiceItem.query.count() == 0
+
+
+def test_sync_items_writes_only_changes(app):
+    from app.models import Invoice, InvoiceItem, db
+    from app.persistence import save_invoice, sync_items
+
+    invoice = save_invoice(Invoice(invoice_number="1"), [_row("A"), _row("B"), _row("C")])
+    before = {i.name: i.id for i in InvoiceItem.query.filter_by(invoice_id=invoice.id)}
+
+    # 删掉中间的 B：A、C 不动
+    assert sync_items(invoice.id, [_row("A"), _row("C")]) == (0, 0, 1)
+    db.session.commit()
+    assert {i.name: i.id for i in InvoiceItem.query} == {"A": before["A"], "C": before["C"]}
+
+    # 改 C 的金额（原地更新，id 不变），再加一行 D
+    assert sync_items(invoice.id, [_row("A"), _row("C", "2.00"), _row("D")]) == (1, 1, 0)
+    db.session.commit()
+    items = InvoiceItem.query.order_by(InvoiceItem.id).all()
+    assert [(i.name, i.amount) for i in items] == [("A", "1.00"), ("C", "2.00"), ("D", "1.00")]
+    assert items[1].id == before["C"]
+
+    # 没有变化时不产生任何 UPDATE
+    statements = []
+    event.listen(db.engine, "before_cursor_execute",
+                 lambda conn, cursor, sql, *args: statements.append(sql))
+    assert sync_items(invoice.id, [_row("A"), _row("C", "2.00"), _row("D")]) == (0, 0, 0)
+    db.session.commit()
+    assert not [s for s in statements if not s.lstrip().upper().startswith("SELECT")]
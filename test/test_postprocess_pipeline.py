@@ -0,0 +1,125 @@
+"""Post-processing pipeline: declarations, skips, budgets and stage timings."""
+import logging
+import time
+
+import pytest
+
+from conftest import make_text_pdf
+from core.extractors.base import ParsedInvoice
+from core.extractors.local.postprocess import PostProcessor, configure, run_pipeline
+from core.extractors.local.postprocess.pdf_text_verify import PdfTextVerify
+
+LONG_LINE = "Invoice 24112000000012345678 issued for the amount of 94.40 yuan"
+
+
+class Recorder(PostProcessor):
+    name = "recorder"
+
+    def __init__(self, sleep=0.0, fail=False, **declared):
+        self.sleep, self.fail, self.calls = sleep, fail, 0
+        for key, value in declared.items():
+            setattr(self, key, value)
+
+    def run(self, parsed, file_path, doc=None, layout=None, deadline=None):
+        self.calls += 1
+        time.sleep(self.sleep)
+        if self.fail:
+            raise RuntimeError("boom")
+        parsed.remarks = "seen"
+        return parsed
+
+
+@pytest.fixture(autouse=True)
+def default_budgets():
+    yield
+    configure("")
+
+
+def test_declarations_skip_steps(tmp_path):
+    path = str(tmp_path / "a.pdf")
+    make_text_pdf(path, [[LONG_LINE]])
+    vat_only = Recorder(doc_types=("vat",))
+    text_only = Recorder(needs_text_layer=True)
+    run_pipeline(ParsedInvoice(source="x"), path, "train", processors=[vat_only])
+    run_pipeline(ParsedInvoice(source="x"), "a.jpg", "vat", processors=[vat_only, text_only])
+    assert (vat_only.calls, text_only.calls) == (1, 0)
+    parsed = run_pipeline(ParsedInvoice(source="x"), path, "vat", processors=[text_only])
+    assert text_only.calls == 1 and parsed.remarks == "seen"
+    assert set(parsed.timings) == {"post:recorder"}
+
+
+def test_failures_and_budget_overruns_are_logged(caplog):
+    slow, broken, after = Recorder(sleep=0.02), Recorder(fail=True), Recorder()
+    configure("recorder=0.005")
+    with caplog.at_level(logging.WARNING):
+        parsed = run_pipeline(ParsedInvoice(source="x"), "a.jpg", processors=[slow, broken, after])
+    assert after.calls == 1 and parsed.remarks == "seen"
+    assert parsed.timings["post:recorder"] < 0.02  # the last step's time
+    messages = [r.getMessage() for r in caplog.records]
+    assert any("budget 5 ms" in m for m in messages)
+    assert any("failed: boom" in m for m in messages)
+
+
+def test_pdf_text_verify_declarations_and_deadline(tmp_path):
+    pytest.importorskip("pdfplumber")
+    from core.extractors.local.document import PdfDocument
+
+    pp = PdfTextVerify()
+    path = str(tmp_path / "a.pdf")
+    make_text_pdf(path, [[LONG_LINE]])
+    assert pp.skip_reason(ParsedInvoice(source="local-pdf"), path) == "nothing to change"
+    assert pp.skip_reason(ParsedInvoice(source="vllm"), "a.png") == "no text layer"
+    with PdfDocument(path) as doc:
+        ocr = ParsedInvoice(source="vllm", invoice_number="34112000000012345678")
+        late = pp.run(ocr, path, doc=doc, deadline=time.monotonic() - 1)
+        assert late.invoice_number == "34112000000012345678"
+        fixed = pp.run(ocr, path, doc=doc, deadline=time.monotonic() + 5)
+        assert fixed.invoice_number == "24112000000012345678"
+
+
+class _TextLayer:
+    """Stands in for a PdfDocument whose text layer is `full_text`."""
+    has_text_layer = True
+
+    def __init__(self, full_text):
+        self.full_text = full_text
+
+
+def test_pdf_text_verify_skips_when_fields_match_labels():
+    pp = PdfTextVerify()
+    doc = _TextLayer("发票号码：24112000000012345678\n开票日期：2024年01月05日\n" + LONG_LINE)
+    settled = ParsedInvoice(source="vllm", invoice_number="24112000000012345678",
+                            invoice_date_raw="2024年01月05日")
+    assert pp.skip_reason(settled, "a.pdf", doc=doc) == "nothing to change"
+    # a local-pdf parse that disagrees with the labels still gets verified
+    wrong = ParsedInvoice(source="local-pdf", invoice_number="24112000000012345679",
+                          invoice_date_raw="2024年01月05日")
+    assert pp.skip_reason(wrong, "a.pdf", doc=doc) is None
+    assert pp.run(wrong, "a.pdf", doc=doc).invoice_number == "24112000000012345678"
+    # a value without a label in the text goes to the fuzzy check
+    unlabeled = ParsedInvoice(source="vllm", invoice_number="24112000000012345678",
+                              invoice_date_raw="2024年01月05日", check_code="ABC123")
+    assert pp.skip_reason(unlabeled, "a.pdf", doc=doc) is None
+
+
+def test_backend_records_stage_timings(tmp_path, monkeypatch):
+    pytest.importorskip("pdfplumber")
+    from core.extractors.local.base import LocalBackend
+
+    class EchoBackend(LocalBackend):
+        name = "echo"
+
+        def is_available(self):
+            return True
+
+        def _call_ocr(self, file_path, doc=None, doc_type=""):
+            return doc.blocks()
+
+    # The ASCII fixture has no field labels, so pdf_text_verify would be
+    # skipped as having nothing to change; force it to run.
+    monkeypatch.setattr(PdfTextVerify, "can_change", lambda *args, **kwargs: True)
+    path = str(tmp_path / "a.pdf")
+    make_text_pdf(path, [[LONG_LINE]])
+    parsed = EchoBackend().extract(path, "vat")
+    assert {"ocr", "layout", "parse", "post:pdf_text_verify"} <= set(parsed.timings)
+    assert all(seconds >= 0 for seconds in parsed.timings.values())
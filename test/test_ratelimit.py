@@ -0,0 +1,63 @@
+"""Cross-process provider rate limiter (shared SQLite state)."""
+import threading
+import time
+
+import pytest
+
+from core.ratelimit import ProviderLimit, RateLimiter, RateLimitTimeout, parse_limits
+
+
+def test_parse_limits():
+    assert parse_limits("tencent=10:20:5, vllm=0:0:2, x=5, bad, y=z") == {
+        "tencent": ProviderLimit(10.0, 20.0, 5),
+        "vllm": ProviderLimit(0.0, 0.0, 2),
+        "x": ProviderLimit(5.0, 5.0, 0),
+    }
+
+
+def test_token_bucket_paces_calls(tmp_path):
+    limiter = RateLimiter(str(tmp_path / "rl.db"), {"p": ProviderLimit(rate=20, burst=2)})
+    start = time.monotonic()
+    waits = []
+    for _ in range(6):
+        with limiter.slot("p") as waited:
+            waits.append(waited)
+    # burst of 2, then 4 more tokens at 20/s
+    assert time.monotonic() - start >= 0.18
+    assert waits[:2] == [pytest.approx(0, abs=0.05)] * 2
+    stats = limiter.stats()["p"]
+    assert stats["acquired"] == 6 and stats["queued"] >= 3
+
+
+def test_in_flight_cap_is_shared_between_instances(tmp_path):
+    # Two limiter objects on one file stand in for two worker processes.
+    path = str(tmp_path / "rl.db")
+    limits = {"p": ProviderLimit(max_in_flight=1)}
+    a, b = RateLimiter(path, limits), RateLimiter(path, limits)
+    order = []
+
+    with a.slot("p"):
+        holder = threading.Thread(target=lambda: _hold(b, order))
+        holder.start()
+        time.sleep(0.3)
+        order.append("a-done")
+    holder.join(timeout=5)
+    assert order == ["a-done", "b"]
+    assert a.stats()["p"]["in_flight"] == 0
+
+
+def _hold(limiter, order):
+    with limiter.slot("p"):
+        order.append("b")
+
+
+def test_expired_leases_are_reclaimed_and_max_wait(tmp_path):
+    path = str(tmp_path / "rl.db")
+    limits = {"p": ProviderLimit(max_in_flight=1)}
+    crashed = RateLimiter(path, limits, lease_ttl=0.1)
+    crashed.acquire("p", limits["p"])          # never released
+    time.sleep(0.15)
+    with RateLimiter(path, limits).slot("p"):
+        with pytest.raises(RateLimitTimeout):
+            with RateLimiter(path, limits, max_wait=0.3).slot("p"):
+                pass
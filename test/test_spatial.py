@@ -0,0 +1,55 @@
+"""BlockIndex: spatial queries agree with a brute-force scan."""
+import random
+
+import pytest
+
+from core.extractors.base import TextBlock
+from core.extractors.local.spatial import BlockIndex
+
+
+@pytest.fixture
+def blocks():
+    rng = random.Random(7)
+    out = []
+    for i in range(600):
+        x, y = rng.uniform(0, 580), rng.uniform(0, 820)
+        out.append(TextBlock(f"w{i}", (x, y, x + rng.uniform(5, 60), y + 9), page=rng.randint(0, 2)))
+    return out
+
+
+def test_right_of_matches_scan(blocks):
+    index = BlockIndex(blocks)
+    for b in blocks[:100]:
+        expected = [
+            nb for nb in blocks
+            if nb is not b and nb.page == b.page
+            and abs(nb.bbox[1] - b.bbox[1]) <= 8.0
+            and 0 < nb.bbox[0] - b.bbox[0] <= 200.0
+        ]
+        assert index.right_of(b, 8.0, max_dx=200.0) == expected
+        assert index.row(b, 5.0) == [
+            nb for nb in blocks
+            if nb is not b and nb.page == b.page and abs(nb.bbox[1] - b.bbox[1]) <= 5.0
+        ]
+
+
+def test_below_and_above_match_scan(blocks):
+    index = BlockIndex(blocks)
+    for b in blocks[:100]:
+        below = [nb for nb in blocks if nb.page == b.page and nb.bbox[1] - b.bbox[1] > 4.0]
+        expected = min(below, key=lambda nb: nb.bbox[1] - b.bbox[1], default=None)
+        assert index.below(b, min_dy=4.0) is expected
+        above = [nb for nb in blocks if nb.page == b.page and b.bbox[1] - nb.bbox[1] > 0]
+        expected = min(above, key=lambda nb: b.bbox[1] - nb.bbox[1], default=None)
+        assert index.above(b) is expected
+
+
+def test_rows_are_sorted_by_x_within_page():
+    blocks = [
+        TextBlock("b", (50, 10, 60, 20)),
+        TextBlock("a", (10, 11, 20, 21)),
+        TextBlock("c", (10, 30, 20, 40)),
+        TextBlock("p1", (10, 10, 20, 20), page=1),
+    ]
+    rows = [[b.text for b in ws] for _, ws in BlockIndex(blocks).rows()]
+    assert rows == [["a", "b"], ["c"], ["p1"]]
@@ -0,0 +1,145 @@
+"""Pooled HTTPS transport against a local stand-in HTTPS server."""
+import datetime
+import ssl
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from core.ocr_api import _is_rate_limited
+from core.transport import HTTPSPool, TransportError
+
+x509 = pytest.importorskip("cryptography.x509")
+
+
+def _self_signed(tmp_path):
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName("localhost")]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path, key_path = tmp_path / "cert.pem", tmp_path / "key.pem"
+    cert_path.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ))
+    return str(cert_path), str(key_path)
+
+
+@pytest.fixture
+def server(tmp_path):
+    """HTTPS server replying from a script of (status, body[, delay]); counts TCP connections."""
+    cert, key = _self_signed(tmp_path)
+    state = {"connections": 0, "requests": 0, "script": []}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            state["connections"] += 1
+            super().setup()
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            state["requests"] += 1
+            status, body, *delay = state["script"].pop(0) if state["script"] else (200, b'{"ok": true}')
+            time.sleep(delay[0] if delay else 0)
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("localhost", 0), Handler)
+    server_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server_ctx.load_cert_chain(cert, key)
+    httpd.socket = server_ctx.wrap_socket(httpd.socket, server_side=True)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    client_ctx = ssl.create_default_context(cafile=cert)
+    state["pool"] = lambda **kw: HTTPSPool(
+        "localhost", httpd.server_address[1], ssl_context=client_ctx,
+        backoff_base=0.001, **kw,
+    )
+    yield state
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_connections_are_reused(server):
+    pool = server["pool"]()
+    for _ in range(5):
+        assert pool.request("POST", "/", body=b"{}").body == b'{"ok": true}'
+    assert server["connections"] == 1
+    assert pool.stats()["connections_opened"] == 1
+    pool.close()
+
+
+def test_retries_5xx_and_rate_limit(server):
+    limited = b'{"Response": {"Error": {"Code": "RequestLimitExceeded", "Message": "slow down"}}}'
+    server["script"] = [(503, b"busy"), (200, limited), (200, b'{"Response": {}}')]
+    pool = server["pool"](max_retries=3)
+
+    resp = pool.request("POST", "/", body=b"{}", retry_if=_is_rate_limited)
+    assert (resp.status, resp.body, resp.attempts) == (200, b'{"Response": {}}', 3)
+
+    # Out of retries: the last error response is handed back to the caller.
+    server["script"] = [(502, b"bad gateway")] * 2
+    resp = server["pool"](max_retries=1).request("POST", "/", body=b"{}")
+    assert (resp.status, resp.attempts) == (502, 2)
+
+
+def test_network_failure_raises_after_retries():
+    pool = HTTPSPool("localhost", 1, connect_timeout=0.5, max_retries=1, backoff_base=0.001)
+    with pytest.raises(TransportError):
+        pool.request("POST", "/", body=b"{}")
+    assert pool.stats()["retries"] == 1
+
+
+def test_read_timeout_is_not_retried(server):
+    # The server got (and may bill) the request; sending it again could charge twice.
+    server["script"] = [(200, b'{"late": true}', 0.5)]
+    pool = server["pool"](max_retries=3, read_timeout=0.1)
+    with pytest.raises(TransportError, match="after the request was sent"):
+        pool.request("POST", "/", body=b"{}")
+    time.sleep(0.5)
+    assert server["requests"] == 1
+    assert pool.stats()["retries"] == 0
+
+
+def test_each_attempt_takes_its_own_slot(server, monkeypatch):
+    from contextlib import contextmanager
+
+    import core.transport as transport
+
+    limited = b'{"Response": {"Error": {"Code": "RequestLimitExceeded", "Message": "slow down"}}}'
+    server["script"] = [(200, limited), (503, b"busy"), (200, b'{"Response": {}}')]
+    events = []
+
+    @contextmanager
+    def slot():
+        events.append("enter")
+        yield
+        events.append("exit")
+
+    monkeypatch.setattr(transport, "backoff_delay", lambda *args: events.append("sleep") or 0)
+    resp = server["pool"](max_retries=3).request("POST", "/", body=b"{}",
+                                                 retry_if=_is_rate_limited, slot=slot)
+    assert resp.attempts == 3
+    assert events == ["enter", "exit", "sleep"] * 2 + ["enter", "exit"]
@@ -0,0 +1,76 @@
+"""VLLMOCRBackend: warm keep-alive session and Settings-driven config."""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from core.extractors.local.vllm import VLLMOCRBackend
+
+CONTENT = "<|ref|>发票号码<|/ref|><|det|>[[10,10,100,30]]<|/det|>"
+
+
+@pytest.fixture
+def vlm_server():
+    state = {"connections": 0, "posts": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            state["connections"] += 1
+            super().setup()
+
+        def _reply(self, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._reply({"data": []})
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            state["posts"] += 1
+            self._reply({"choices": [{"message": {"content": CONTENT}}]})
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    state["endpoint"] = f"http://127.0.0.1:{httpd.server_address[1]}/v1"
+    yield state
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_calls_reuse_one_connection(app, vlm_server, tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    image = tmp_path / "invoice.png"
+    Image.new("RGB", (64, 32), "white").save(image)
+
+    backend = VLLMOCRBackend(api_key="k", model="deepseek-ai/DeepSeek-OCR",
+                             endpoint=vlm_server["endpoint"])
+    assert backend.probe()
+    for _ in range(3):
+        blocks = backend._call_ocr(str(image))
+    assert [b.text for b in blocks] == ["发票号码"]
+    assert vlm_server["posts"] == 3
+    assert vlm_server["connections"] == 1
+
+
+def test_config_follows_settings(app, monkeypatch):
+    from app.models import Settings
+
+    for name in ("VLLM_OCR_API_KEY", "VLLM_OCR_MODEL", "VLLM_OCR_ENDPOINT"):
+        monkeypatch.delenv(name, raising=False)
+    backend = VLLMOCRBackend()
+    Settings.set_value("VLLM_OCR_ENDPOINT", "http://vlm-a:8000/v1")
+    assert backend.endpoint == "http://vlm-a:8000/v1"
+    Settings.set_value("VLLM_OCR_ENDPOINT", "http://vlm-b:8000/v1")
+    assert backend.endpoint == "http://vlm-b:8000/v1"
+    assert backend.model == "deepseek-ai/DeepSeek-OCR"
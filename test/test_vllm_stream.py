@@ -0,0 +1,144 @@
+"""Streamed VLM OCR: incremental format parsing and early stop."""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from core.extractors.base import ParsedInvoice
+from core.extractors.local.ocr_formats import get_format_parser, get_stream_parser
+from core.extractors.local.parsers import get_parser
+from core.extractors.local.parsers.base import Parser, register_parser, unregister_parser
+from core.extractors.local.vllm import VLLMOCRBackend
+
+DEEPSEEK = "".join(
+    f"<|ref|>区域{i}<|/ref|><|det|>[[{i},{i},{i + 50},{i + 10}]]<|/det|>\n"
+    for i in range(20)
+)
+
+
+def _chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("model,content", [
+    ("deepseek-ai/DeepSeek-OCR", DEEPSEEK),
+    ("Qwen/Qwen3-VL", "发票号码：123\n\n开票日期：2024年01月02日\n合计 ¥10.00"),
+    ("frob/unlimited-ocr:q8_0", "text [1,2,3,4]发票号码\ntable [5,6,7,8]<td>a</td>"),
+])
+@pytest.mark.parametrize("size", [1, 7, 1000])
+def test_stream_parser_matches_one_shot(model, content, size):
+    stream = get_stream_parser(model)
+    blocks = []
+    for chunk in _chunks(content, size):
+        blocks.extend(stream.feed(chunk))
+    blocks.extend(stream.close())
+    assert blocks == get_format_parser(model)(content)
+
+
+def test_stream_parser_holds_back_unfinished_region():
+    stream = get_stream_parser("deepseek-ai/DeepSeek-OCR")
+    assert stream.feed("<|ref|>发票号码<|/ref|><|det|>[[1,2,3,4]]<|/de") == []
+    assert [b.text for b in stream.feed("t|>")] == ["发票号码"]
+
+
+def test_is_complete_follows_required_fields():
+    train = get_parser("train")
+    parsed = ParsedInvoice(source="vllm", invoice_number="1", invoice_date="2024-01-01",
+                           buyer_name="张三", amount_in_figures="¥1.00",
+                           travel_info={"车次": "G1", "出发站": "北京南"})
+    assert not train.is_complete(parsed)
+    parsed.travel_info["到达站"] = "上海虹桥"
+    assert train.is_complete(parsed)
+
+
+class _NumberOnly(Parser):
+    name = "test_number_only"
+    required_fields = ("invoice_number",)
+    max_output_tokens = 321
+
+    def parse(self, blocks, file_path="", doc=None):
+        texts = [b.text for b in blocks]
+        return ParsedInvoice(source="vllm",
+                             invoice_number="1" if "发票号码" in texts else "")
+
+
+@pytest.fixture
+def sse_server():
+    state = {"payloads": []}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            state["payloads"].append(
+                json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            )
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for i in range(100):
+                    text = "发票号码" if i == 2 else f"区域{i}"
+                    region = f"<|ref|>{text}<|/ref|><|det|>[[0,{i},50,{i + 1}]]<|/det|>\n"
+                    self._chunk(json.dumps({"choices": [{"delta": {"content": region}}]}))
+                self._chunk("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+            except OSError:
+                pass
+
+        def _chunk(self, data):
+            event = f"data: {data}\n\n".encode()
+            self.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+            self.wfile.flush()
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    state["endpoint"] = f"http://127.0.0.1:{httpd.server_address[1]}/v1"
+    yield state
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def image(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    path = tmp_path / "invoice.png"
+    Image.new("RGB", (64, 32), "white").save(path)
+    return str(path)
+
+
+def _backend(endpoint):
+    return VLLMOCRBackend(api_key="k", model="deepseek-ai/DeepSeek-OCR",
+                          endpoint=endpoint, stream=True)
+
+
+def test_stream_stops_once_required_fields_are_parsed(sse_server, image):
+    register_parser(_NumberOnly())
+    try:
+        blocks = _backend(sse_server["endpoint"])._call_ocr(image, doc_type="test_number_only")
+    finally:
+        unregister_parser("test_number_only")
+    # complete at the first check (8 blocks), then the grace blocks
+    assert len(blocks) == 8 + 6
+    assert blocks[2].text == "发票号码"
+    payload = sse_server["payloads"][0]
+    assert payload["stream"] is True and payload["max_tokens"] == 321
+
+
+def test_stream_without_parser_reads_everything(sse_server, image):
+    blocks = _backend(sse_server["endpoint"])._call_ocr(image)
+    assert len(blocks) == 100
+    assert "max_tokens" not in sse_server["payloads"][0]
+
+
+def test_stream_flag_from_env(monkeypatch):
+    monkeypatch.setenv("VLLM_OCR_STREAM", "1")
+    backend = VLLMOCRBackend(api_key="k", model="m", endpoint="http://x/v1")
+    assert backend.config["stream"] is True
+    monkeypatch.setenv("VLLM_OCR_STREAM", "0")
+    assert backend.config["stream"] is False
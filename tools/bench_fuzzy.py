@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+脚本名称: bench_fuzzy.py
+用途: 模糊匹配微基准 —— 比较 PdfTextVerify._find_similar 原先的逐位置
+      Levenshtein 扫描与 core/extractors/local/fuzzy.py 的 FuzzyText,
+      并核对两者对每个查询返回完全相同的结果
+创建日期: 2026-10-18
+
+文本: test/fixtures/blocks 全部版面的阅读顺序文本, 整体复制 --pages 次
+      (模拟多页 PDF 的文本层)。
+查询: 从文本中抽取的号码 / 金额 / 日期, 随机替换 1~2 个字符 (模拟 OCR 错误),
+      外加若干文本中不存在的数字串 (最坏情况: 扫完全文也找不到)。
+结果不一致时退出码为 1。
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+# 项目根目录
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+from core.extractors.local.fuzzy import FuzzyText  # noqa: E402
+from core.extractors.local.layout import Layout  # noqa: E402
+
+# 与 bench_parsers 共用 fixture 读取
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_parsers import FIXTURE_DIR, load_fixture  # noqa: E402
+
+_RE_TOKEN = re.compile(r'\d[\d.\-年月日]{5,}\d')
+
+
+def reference_levenshtein(a, b, max_dist):
+    """原先的 _levenshtein: 逐行 DP, 行最小值超限提前返回"""
+    if a == b:
+        return 0
+    if abs(len(a) - len(b)) > max_dist:
+        return None
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        row_min = i
+        for j, cb in enumerate(b, 1):
+            cost = 0 if ca == cb else 1
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost))
+            row_min = min(row_min, cur[-1])
+        if row_min > max_dist:
+            return None
+        prev = cur
+    return prev[-1]
+
+
+def reference_find(value, text, max_dist):
+    """原先 _find_similar 的滑动窗口扫描 (长度 m, 再 m+1)"""
+    m = len(value)
+    for size in (m, m + 1):
+        best, best_dist = None, max_dist + 1
+        for pos in range(len(text) - size + 1):
+            d = reference_levenshtein(value, text[pos:pos + size], max_dist)
+            if d is not None and d < best_dist:
+                best, best_dist = text[pos:pos + size], d
+        if best is not None:
+            return best
+    return None
+
+
+def build_text(pages):
+    """所有 fixture 的版面文本, 复制 pages 次"""
+    names = sorted(n for n in os.listdir(FIXTURE_DIR) if n.endswith('.json'))
+    text = '\n'.join(Layout(load_fixture(n)).text for n in names)
+    return '\n'.join([text] * pages)
+
+
+def build_queries(text, count, seed=0):
+    """从文本抽取号码类 token 并制造 1~2 处替换; 另加文本中不存在的数字串"""
+    rng = random.Random(seed)
+    tokens = sorted(set(_RE_TOKEN.findall(text)))
+    queries = []
+    for token in rng.sample(tokens, min(count, len(tokens))):
+        chars = list(token)
+        for _ in range(rng.randint(1, 2)):
+            chars[rng.randrange(len(chars))] = rng.choice('0123456789')
+        queries.append(''.join(chars))
+    queries += [''.join(rng.choice('0123456789') for _ in range(12)) for _ in range(max(1, count // 4))]
+    return queries
+
+
+def run_bench(pages=4, count=8, max_dist=2, seed=0):
+    """返回 {chars, queries, reference, fuzzy, mismatches}"""
+    text = build_text(pages)
+    queries = build_queries(text, count, seed)
+
+    start = time.perf_counter()
+    expected = [reference_find(q, text, max_dist) for q in queries]
+    reference = time.perf_counter() - start
+
+    # 一个文档的各字段共用一个 FuzzyText (与 PdfTextVerify 相同)
+    start = time.perf_counter()
+    fuzzy = FuzzyText(text)
+    found = [fuzzy.find(q, max_dist) for q in queries]
+    elapsed = time.perf_counter() - start
+
+    mismatches = [(q, e, f) for q, e, f in zip(queries, expected, found) if e != f]
+    return {
+        'chars': len(text),
+        'queries': len(queries),
+        'reference': reference,
+        'fuzzy': elapsed,
+        'mismatches': mismatches,
+    }
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='模糊匹配微基准')
+    parser.add_argument('--pages', type=int, action='append',
+                        help='文本复制倍数 (可重复), 默认 1 4')
+    parser.add_argument('--count', type=int, default=8, help='带 OCR 错误的查询数, 默认8')
+    parser.add_argument('--max-dist', type=int, default=2, help='最大编辑距离, 默认2')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子, 默认0')
+    args = parser.parse_args()
+
+    print(f'{"pages":>5} {"chars":>8} {"queries":>7} {"reference s":>12} {"fuzzy s":>10} {"speedup":>8}')
+    failed = False
+    for pages in args.pages or (1, 4):
+        r = run_bench(pages, args.count, args.max_dist, args.seed)
+        print(f'{pages:>5} {r["chars"]:>8} {r["queries"]:>7} {r["reference"]:>12.4f} '
+              f'{r["fuzzy"]:>10.4f} {r["reference"] / max(r["fuzzy"], 1e-9):>7.1f}×')
+        for query, expected, found in r['mismatches']:
+            print(f'结果不一致: {query!r} 原扫描={expected!r} FuzzyText={found!r}')
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
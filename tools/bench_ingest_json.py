@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+脚本名称: bench_ingest_json.py
+用途: 测量腾讯云识别一次上传中 JSON 编解码的 CPU 开销 —— 比较原先的
+      多次 (反)序列化路径与现在 "dict 直通、只编码一次" 的路径
+创建日期: 2026-10-18
+
+两条路径都包含 (不含网络与数据库 IO):
+  请求体编码 (base64 图片) → 响应解码 → DocType 格式化 → 缓存 / json_data 编码
+原路径:  json.dumps 请求体 + .encode → 响应 bytes.decode → json.loads →
+         format → json.dumps (缓存) → json.dumps (json_data)
+现路径:  jsoncodec.dumps_bytes 请求体 → jsoncodec.loads(bytes) →
+         format → jsoncodec.dumps 一次 (缓存与 json_data 共用)
+装有 orjson 时现路径使用 orjson, 可用 --no-orjson 只比较调用次数的差别。
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+
+# 项目根目录
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+from core import jsoncodec  # noqa: E402
+from core.doc_types import get as get_doc_type  # noqa: E402
+
+
+def build_response(items):
+    """模拟腾讯云 VatInvoiceOCR 响应, 含 items 行明细"""
+    infos = [
+        ('发票类型', '增值税电子普通发票'), ('发票代码', '044002300111'),
+        ('发票号码', '12345678'), ('开票日期', '2024年01月02日'),
+        ('校验码', '12345 67890 12345 67890'), ('销售方名称', '长沙某某餐饮有限公司'),
+        ('销售方识别号', '91430100MA4L000000'), ('购买方名称', '湖南某某科技有限公司'),
+        ('购买方识别号', '91430100MA4L111111'), ('合计金额', '100.00'),
+        ('合计税额', '6.00'), ('价税合计(大写)', '壹佰零陆圆整'), ('小写金额', '¥106.00'),
+        ('备注', '订单号 2024010200001'), ('开票人', '张三'),
+    ]
+    return {'Response': {
+        'VatInvoiceInfos': [{'Name': n, 'Value': v, 'Polygon': {}} for n, v in infos],
+        'Items': [
+            {'LineNo': str(i), 'Name': f'*餐饮服务*餐费{i}', 'Spec': '', 'Unit': '次',
+             'Quantity': '1', 'Price': '100.00', 'Total': '100.00', 'TaxRate': '6%',
+             'Tax': '6.00'}
+            for i in range(items)
+        ],
+        'RequestId': 'bench',
+    }}
+
+
+def old_path(request_data, body, doc_type):
+    """原路径: 每个环节各自 (反)序列化"""
+    payload = json.dumps(request_data).encode('utf-8')
+    response = json.loads(body.decode('utf-8'))
+    formatted = doc_type.format(response)
+    cached = json.dumps(formatted, ensure_ascii=False)
+    row = json.dumps(formatted, ensure_ascii=False)
+    return payload, cached, row
+
+
+def new_path(request_data, body, doc_type):
+    """现路径: dict 直通, 格式化结果只编码一次"""
+    payload = jsoncodec.dumps_bytes(request_data)
+    response = jsoncodec.loads(body)
+    formatted = doc_type.format(response)
+    text = jsoncodec.dumps(formatted)
+    return payload, text, text
+
+
+def measure(func, args, repeat):
+    """最小 CPU 时间 (秒)"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.process_time()
+        func(*args)
+        best = min(best, time.process_time() - start)
+    return best
+
+
+def run_bench(image_kb=800, items=(1, 50), repeat=20):
+    """返回 [(items, old_seconds, new_seconds)]"""
+    doc_type = get_doc_type('vat')
+    image = base64.b64encode(os.urandom(image_kb * 1024)).decode('ascii')
+    request_data = {'ImageBase64': image, 'IsPdf': True, 'PdfPageNumber': 1}
+    rows = []
+    for count in items:
+        body = json.dumps(build_response(count), ensure_ascii=False).encode('utf-8')
+        args = (request_data, body, doc_type)
+        rows.append((count, measure(old_path, args, repeat), measure(new_path, args, repeat)))
+    return rows
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='上传 JSON 编解码 CPU 开销对比')
+    parser.add_argument('--image-kb', type=int, default=800, help='模拟图片大小 (KB), 默认800')
+    parser.add_argument('--items', type=int, action='append', help='明细行数 (可重复), 默认 1 50')
+    parser.add_argument('--repeat', type=int, default=20, help='重复次数 (取最小值), 默认20')
+    parser.add_argument('--no-orjson', action='store_true', help='现路径也使用标准库 json')
+    args = parser.parse_args()
+
+    if args.no_orjson:
+        jsoncodec.orjson = None
+    print(f'orjson: {"是" if jsoncodec.orjson is not None else "否"}')
+    print(f'{"items":>6} {"old ms":>9} {"new ms":>9} {"saved":>7}')
+    for count, old, new in run_bench(args.image_kb, args.items or (1, 50), args.repeat):
+        print(f'{count:>6} {old * 1000:>9.2f} {new * 1000:>9.2f} {(1 - new / old) * 100:>6.1f}%')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+脚本名称: bench_parsers.py
+用途: 版面解析器性能基准 —— 在 test/fixtures/blocks 的真实版面及其放大版本上
+      运行所有已注册的 Parser，按阶段统计耗时与内存分配，并与保存的基线比较
+创建日期: 2026-10-18
+
+用例 (case):
+  <fixture>            原始 fixture
+  <fixture>@pages×N    整页复制 N 次 (页码顺延)
+  <fixture>@rows×N     每个明细行 (含金额、非合计行) 复制 N 次, 下方内容顺移
+
+阶段 (stage):
+  layout   Layout 构建 (行聚类 + 阅读顺序文本)
+  index    BlockIndex 构建
+  labels   字段标签扫描
+  parse    parser.parse (复用上面已建好的 Layout)
+  total    以上合计 (即 LocalBackend 中一次解析的全部开销)
+
+回归判定:
+  - 与 --baseline 比较, 任一 (用例, 解析器, 阶段) 的最小耗时超过基线
+    (1 + --threshold) 倍即为回归 (基线耗时过小的阶段按 --min-time 取下限,
+    避免计时噪声);
+  - 放大用例的总耗时相对原始用例, 按块数增长倍数计算幂次 (耗时 ∝ 块数^k),
+    k 超过 --max-exponent 即视为超线性 (与机器快慢无关, 无需基线)。
+  有回归时退出码为 1。
+"""
+
+import argparse
+import gc
+import json
+import math
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+# 项目根目录
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+from core.extractors.base import TextBlock  # noqa: E402
+from core.extractors.local.layout import Layout  # noqa: E402
+from core.extractors.local.parsers import all_parsers  # noqa: E402
+from core.extractors.local.spatial import BlockIndex  # noqa: E402
+
+FIXTURE_DIR = os.path.join(BASE_DIR, 'test', 'fixtures', 'blocks')
+DEFAULT_BASELINE = os.path.join(BASE_DIR, 'tools', 'bench_parsers_baseline.json')
+DEFAULT_SCALES = ('pages×4', 'rows×10')
+STAGES = ('layout', 'index', 'labels', 'parse', 'total')
+
+_RE_AMOUNT = re.compile(r'\d+\.\d{2}')
+
+
+# ---------------------------------------------------------------------------
+# 用例构造
+# ---------------------------------------------------------------------------
+
+def load_fixture(name):
+    """读取一个 fixture 为 TextBlock 列表"""
+    with open(os.path.join(FIXTURE_DIR, name), encoding='utf-8') as f:
+        data = json.load(f)
+    return [
+        TextBlock(
+            text=b['text'],
+            bbox=tuple(b['bbox']),
+            confidence=b.get('confidence', 1.0),
+            page=b.get('page', 0),
+            block_id=b.get('block_id'),
+        )
+        for b in data
+    ]
+
+
+def scale_pages(blocks, n):
+    """整页复制 n 次, 复制出的页码接在原页之后"""
+    pages = max((b.page for b in blocks), default=0) + 1
+    return [
+        TextBlock(b.text, b.bbox, b.confidence, b.page + k * pages, b.block_id)
+        for k in range(n) for b in blocks
+    ]
+
+
+def scale_rows(blocks, n):
+    """每个明细行复制 n 次; 行下方的内容按插入的高度顺移"""
+    out = []
+    for page in sorted({b.page for b in blocks}):
+        shift = 0.0
+        for _, row in BlockIndex([b for b in blocks if b.page == page]).rows():
+            text = ''.join(b.text for b in row)
+            moved = [_shifted(b, shift) for b in row]
+            out.extend(moved)
+            if _RE_AMOUNT.search(text) and '合计' not in text:
+                # 行高取 BlockIndex 行带 (4pt) 的整数倍, 复制行与原行分带一致
+                height = math.ceil((max(b.bbox[3] - b.bbox[1] for b in row) + 2.0) / 4.0) * 4.0
+                for k in range(1, n):
+                    out.extend(_shifted(b, k * height) for b in moved)
+                shift += (n - 1) * height
+    return out
+
+
+def _shifted(block, dy):
+    x0, top, x1, bottom = block.bbox
+    return TextBlock(block.text, (x0, top + dy, x1, bottom + dy),
+                     block.confidence, block.page, block.block_id)
+
+
+def build_cases(fixtures, scales):
+    """[(用例名, 基础用例名, 放大倍数, blocks)]"""
+    cases = []
+    for name in fixtures:
+        base = load_fixture(name)
+        cases.append((name, name, 1, base))
+        for scale in scales:
+            kind, _, factor = scale.partition('×')
+            factor = int(factor)
+            scaled = scale_pages(base, factor) if kind == 'pages' else scale_rows(base, factor)
+            cases.append((f'{name}@{scale}', name, factor, scaled))
+    return cases
+
+
+# ---------------------------------------------------------------------------
+# 计时
+# ---------------------------------------------------------------------------
+
+def run_once(parser, blocks):
+    """跑一遍各阶段, 返回 {stage: 秒}"""
+    t0 = time.perf_counter()
+    layout = Layout(blocks)
+    t1 = time.perf_counter()
+    layout.index
+    t2 = time.perf_counter()
+    layout.labels
+    t3 = time.perf_counter()
+    parser.parse(blocks, layout=layout)
+    t4 = time.perf_counter()
+    return {'layout': t1 - t0, 'index': t2 - t1, 'labels': t3 - t2,
+            'parse': t4 - t3, 'total': t4 - t0}
+
+
+def measure(parser, blocks, repeat):
+    """预热一次后跑 repeat 次取最小值 (同 timeit, 计时期间关闭 GC);
+    另跑一次 tracemalloc 统计分配峰值 (不计入耗时)"""
+    run_once(parser, blocks)
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        runs = [run_once(parser, blocks) for _ in range(repeat)]
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    timings = {stage: min(r[stage] for r in runs) for stage in STAGES}
+    tracemalloc.start()
+    try:
+        run_once(parser, blocks)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'blocks': len(blocks), 'seconds': timings, 'peak_bytes': peak}
+
+
+_CAL_TEXT = ' '.join(f'字段{i}：{i * 7919 % 10007}.{i % 100:02d}' for i in range(2000))
+_RE_CAL = re.compile(r'字段(\d+)：([\d.]+)')
+
+
+def calibrate(repeat=5):
+    """固定的纯 Python 工作量 (排序 + 正则 + 字典) 的最小耗时。
+
+    与被测代码无关, 只反映机器当下的快慢。每个用例前测一次, 比较时
+    按它缩放基线, 使不同机器 / 负载波动下的结果仍可比较。
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        values = sorted((i * 7919) % 10007 for i in range(20000))
+        found = {m.group(1): m.group(2) for m in _RE_CAL.finditer(_CAL_TEXT)}
+        sum(values) + len(found)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run_bench(fixtures=None, scales=DEFAULT_SCALES, repeat=7, parsers=None):
+    """返回 {'results': {用例: {解析器: 测量}}, 'cases': {用例: [基础用例, 倍数]},
+    'calibration': {用例: 秒}}"""
+    fixtures = fixtures or sorted(f for f in os.listdir(FIXTURE_DIR) if f.endswith('.json'))
+    selected = [p for p in all_parsers() if not parsers or p.name in parsers]
+    results = {}
+    cases = {}
+    calibration = {}
+    for case, base, factor, blocks in build_cases(fixtures, scales):
+        cases[case] = [base, factor]
+        calibration[case] = calibrate()
+        results[case] = {p.name: measure(p, blocks, repeat) for p in selected}
+    return {'results': results, 'cases': cases, 'calibration': calibration}
+
+
+# ---------------------------------------------------------------------------
+# 比较
+# ---------------------------------------------------------------------------
+
+def compare(current, baseline, threshold=0.25, min_time=0.005):
+    """与基线比较, 返回回归列表 [(用例, 解析器, 阶段, 当前, 基线)]
+
+    基线耗时先按两次运行的校准耗时 (calibrate) 之比缩放。
+    """
+    regressions = []
+    for case, by_parser in current['results'].items():
+        cal_now = current.get('calibration', {}).get(case)
+        cal_before = baseline.get('calibration', {}).get(case)
+        speed = cal_now / cal_before if cal_now and cal_before else 1.0
+        for name, result in by_parser.items():
+            base = baseline.get('results', {}).get(case, {}).get(name)
+            if base is None:
+                continue
+            for stage in STAGES:
+                now, before = result['seconds'][stage], base['seconds'][stage] * speed
+                if now > max(before, min_time) * (1 + threshold):
+                    regressions.append((case, name, stage, now, before))
+    return regressions
+
+
+def scaling(current, max_exponent=1.3, min_time=0.005):
+    """放大用例的增长幂次, 返回超线性列表 [(用例, 解析器, 幂次)]"""
+    superlinear = []
+    for case, (base, factor) in current['cases'].items():
+        if factor <= 1:
+            continue
+        for name, result in current['results'][case].items():
+            before = current['results'][base][name]['seconds']['total']
+            now = result['seconds']['total']
+            if now < min_time:
+                continue
+            # 放大后的 blocks 数并不恰好是 factor 倍 (rows×N 只复制明细行)
+            growth = result['blocks'] / current['results'][base][name]['blocks']
+            if growth <= 1:
+                continue
+            exponent = math.log(now / max(before, 1e-9)) / math.log(growth)
+            if exponent > max_exponent:
+                superlinear.append((case, name, exponent))
+    return superlinear
+
+
+def format_table(current):
+    lines = [f'{"case":<46}{"parser":<10}{"blocks":>7}'
+             + ''.join(f'{s + "(ms)":>12}' for s in STAGES) + f'{"peak(KB)":>10}']
+    for case, by_parser in current['results'].items():
+        for name, r in by_parser.items():
+            lines.append(
+                f'{case:<46}{name:<10}{r["blocks"]:>7}'
+                + ''.join(f'{r["seconds"][s] * 1000:>12.2f}' for s in STAGES)
+                + f'{r["peak_bytes"] / 1024:>10.0f}'
+            )
+    return '\n'.join(lines)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='版面解析器性能基准')
+    parser.add_argument('--fixture', action='append', help='只跑指定 fixture (可重复), 默认全部')
+    parser.add_argument('--parser', action='append', help='只跑指定解析器 (可重复), 默认全部')
+    parser.add_argument('--scale', action='append',
+                        help=f'放大方式, 如 pages×4 / rows×10 (可重复, x 亦可), 默认 {" ".join(DEFAULT_SCALES)}')
+    parser.add_argument('--repeat', type=int, default=7, help='每个用例重复次数 (取最小值), 默认7')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基线文件路径')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果写为基线')
+    parser.add_argument('--json', help='把本次结果写入 JSON 文件')
+    parser.add_argument('--threshold', type=float, default=0.25, help='回归阈值 (相对基线), 默认0.25')
+    parser.add_argument('--min-time', type=float, default=0.005,
+                        help='比较时基线耗时下限 (秒), 默认0.005')
+    parser.add_argument('--max-exponent', type=float, default=1.3,
+                        help='放大用例允许的最大增长幂次, 默认1.3')
+
+    args = parser.parse_args()
+    scales = [s.replace('x', '×') for s in args.scale] if args.scale else DEFAULT_SCALES
+
+    current = run_bench(args.fixture, scales, args.repeat, args.parser)
+    print(format_table(current))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(current, f, ensure_ascii=False, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(current, f, ensure_ascii=False, indent=1)
+        print(f'\n基线已保存: {args.baseline}')
+        return 0
+
+    failed = False
+    superlinear = scaling(current, args.max_exponent, args.min_time)
+    for case, name, exponent in superlinear:
+        print(f'超线性: {case} [{name}] 增长幂次 {exponent:.2f} > {args.max_exponent}')
+        failed = True
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold, args.min_time)
+        for case, name, stage, now, before in regressions:
+            print(f'回归: {case} [{name}] {stage} {before * 1000:.2f} ms -> {now * 1000:.2f} ms')
+        failed = failed or bool(regressions)
+        if not regressions:
+            print(f'\n与基线相比无回归 (阈值 {args.threshold:.0%})')
+    else:
+        print(f'\n未找到基线 {args.baseline}, 使用 --save-baseline 生成')
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())